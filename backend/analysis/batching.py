@@ -0,0 +1,171 @@
+"""
+跨请求的微批处理：把来自不同请求的小型关键词/概要分析任务在一个很短的时间窗口内收集起来，
+合并成一次结构化的多任务LLM调用，再把各任务的结果分发回等待中的请求。
+
+默认关闭。通过环境变量开启和配置：
+    ANALYSIS_BATCH_WINDOW_MS        收集窗口（毫秒），即每个任务最多增加的等待时间；0 表示关闭（默认）
+    ANALYSIS_BATCH_MAX_ITEMS        每批最多任务数（默认 8），达到后立即发送
+    ANALYSIS_BATCH_MAX_ITEM_TOKENS  只有不超过该输入规模的任务才参与批处理（默认 1500）
+    ANALYSIS_BATCH_MAX_TOKENS       每批输入token上限（默认 12000）
+"""
+import asyncio
+import json
+import os
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Set, Tuple
+
+from llm_providers.base_llm import BaseLLMProvider
+from observability.metrics import MetricsRegistry, count_fallback, stage_timer
+from .parsing import parse_batch_result
+from .prompts import STAGE_PROMPT_BUILDERS, build_batch_prompt
+from .tokens import estimate_tokens
+
+BATCHABLE_TYPES = ("keywords", "summary")
+
+BatchKey = Tuple[str, bool, str]  # (提供者, 是否对冲, 模型)
+
+
+@dataclass
+class _BatchItem:
+    analysis_type: str
+    content: str
+    future: "asyncio.Future[str]"
+
+
+@dataclass
+class _PendingBatch:
+    llm_provider: BaseLLMProvider
+    model_name: str
+    items: List[_BatchItem] = field(default_factory=list)
+    tokens: int = 0
+    timer: Optional[asyncio.TimerHandle] = None
+
+
+def _batch_key(llm_provider: BaseLLMProvider, model_name: str) -> BatchKey:
+    # RoutedLLMProvider 每个请求新建一个实例，按其指向的提供者分组，而不是按实例
+    provider_name = getattr(llm_provider, "provider_name", None) or type(llm_provider).__name__
+    return provider_name, bool(getattr(llm_provider, "hedge", False)), model_name
+
+
+class AnalysisBatcher:
+    def __init__(
+        self,
+        window_ms: Optional[float] = None,
+        max_items: Optional[int] = None,
+        max_item_tokens: Optional[int] = None,
+        max_tokens: Optional[int] = None
+    ):
+        self.window_ms = window_ms if window_ms is not None else float(os.getenv("ANALYSIS_BATCH_WINDOW_MS", "0"))
+        self.max_items = max_items if max_items is not None else int(os.getenv("ANALYSIS_BATCH_MAX_ITEMS", "8"))
+        self.max_item_tokens = max_item_tokens if max_item_tokens is not None else int(os.getenv("ANALYSIS_BATCH_MAX_ITEM_TOKENS", "1500"))
+        self.max_tokens = max_tokens if max_tokens is not None else int(os.getenv("ANALYSIS_BATCH_MAX_TOKENS", "12000"))
+        self._pending: Dict[BatchKey, _PendingBatch] = {}
+        self._running: Set["asyncio.Task"] = set()
+        self.batches_sent = 0
+        self.items_batched = 0
+        self.items_retried = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.window_ms > 0 and self.max_items > 1
+
+    def accepts(self, analysis_type: str, content: str) -> bool:
+        return self.enabled and analysis_type in BATCHABLE_TYPES and estimate_tokens(content) <= self.max_item_tokens
+
+    async def submit(self, llm_provider: BaseLLMProvider, analysis_type: str, content: str, model_name: str) -> str:
+        """
+        加入当前批次并等待结果。返回值与单独调用 generate_simple_text 得到的文本格式相同，
+        因此调用方可以沿用原有的解析和备用方案；批量调用失败时抛出同样的异常。
+        """
+        loop = asyncio.get_running_loop()
+        key = _batch_key(llm_provider, model_name)
+        tokens = estimate_tokens(content)
+
+        batch = self._pending.get(key)
+        if batch is not None and batch.tokens + tokens > self.max_tokens:
+            self._flush(key)
+            batch = None
+        if batch is None:
+            batch = _PendingBatch(llm_provider=llm_provider, model_name=model_name)
+            batch.timer = loop.call_later(self.window_ms / 1000, self._flush, key)
+            self._pending[key] = batch
+
+        item = _BatchItem(analysis_type=analysis_type, content=content, future=loop.create_future())
+        batch.items.append(item)
+        batch.tokens += tokens
+        if len(batch.items) >= self.max_items:
+            self._flush(key)
+        return await item.future
+
+    def _flush(self, key: BatchKey) -> None:
+        batch = self._pending.pop(key, None)
+        if batch is None:
+            return
+        if batch.timer is not None:
+            batch.timer.cancel()
+        task = asyncio.ensure_future(self._run(batch))
+        # 持有任务引用，避免发送中的批次被垃圾回收
+        self._running.add(task)
+        task.add_done_callback(self._running.discard)
+
+    async def _run_single(self, batch: _PendingBatch, item: _BatchItem) -> None:
+        prompt = STAGE_PROMPT_BUILDERS[item.analysis_type](item.content)
+        try:
+            result = await batch.llm_provider.generate_simple_text(prompt=prompt, model_name=batch.model_name)
+        except Exception as e:
+            if not item.future.done():
+                item.future.set_exception(e)
+            return
+        if not item.future.done():
+            item.future.set_result(result)
+
+    async def _run(self, batch: _PendingBatch) -> None:
+        items = [item for item in batch.items if not item.future.done()]  # 已取消的请求不再发送
+        if not items:
+            return
+        if len(items) == 1:
+            await self._run_single(batch, items[0])
+            return
+
+        self.batches_sent += 1
+        self.items_batched += len(items)
+        print(f"INFO: Sending {len(items)} analysis tasks as one batched call ({batch.tokens} input tokens)")
+        prompt = build_batch_prompt([(item.analysis_type, item.content) for item in items])
+        try:
+            result = await batch.llm_provider.generate_structured_text(prompt=prompt, model_name=batch.model_name)
+        except Exception as e:
+            for item in items:
+                if not item.future.done():
+                    item.future.set_exception(e)
+            return
+
+        with stage_timer("json_parse"):
+            parsed = parse_batch_result(result, len(items))
+        missing = []
+        for i, item in enumerate(items):
+            if i not in parsed:
+                missing.append(item)
+            elif not item.future.done():
+                item.future.set_result(json.dumps(parsed[i], ensure_ascii=False))
+        if missing:
+            # 批量结果中缺失的任务单独重新请求，保证每个请求都得到与非批处理时相同的结果
+            print(f"Batched analysis missing {len(missing)} task(s), requesting them individually")
+            self.items_retried += len(missing)
+            count_fallback("batch_item_individual", len(missing))
+            await asyncio.gather(*(self._run_single(batch, item) for item in missing))
+
+    def snapshot(self) -> Dict:
+        return {
+            "enabled": self.enabled,
+            "window_ms": self.window_ms,
+            "batches_sent": self.batches_sent,
+            "items_batched": self.items_batched,
+            "items_retried": self.items_retried,
+        }
+
+    def register_metrics(self, registry: MetricsRegistry) -> None:
+        registry.collector("analysis_batches_total", "counter", "Batched multi-item analysis calls sent.", lambda: [({}, self.batches_sent)])
+        registry.collector("analysis_batched_items_total", "counter", "Analysis tasks sent as part of a batch.", lambda: [({}, self.items_batched)])
+
+
+analysis_batcher = AnalysisBatcher()
@@ -0,0 +1,70 @@
+"""
+内容块与分析文本之间的转换。
+
+main.py 把内容块拼接成带 "文本块 1: " 之类标签的 combined_content 发送给LLM；
+本地分析需要按块拆回原文，才能给出正确的块索引和字符偏移。
+"""
+import re
+from typing import List, Tuple
+
+from schemas import ContentBlockItem
+
+_BLOCK_LABEL = re.compile(r'^(文本块|代码块|图片块) (\d+)(?: \([^)]*\))?: ', re.MULTILINE)
+
+
+def block_text(block: ContentBlockItem) -> str:
+    """内容块中可供本地分析的纯文本（代码块包含说明文字）。"""
+    if block.type == 'text':
+        return block.content
+    if block.type == 'code':
+        return f"{block.caption or ''}\n{block.code}"
+    return block.alt_text or block.caption or ''
+
+
+def block_label(block: ContentBlockItem) -> str:
+    """内容块的简短说明：代码块为说明文字或语言，图片块为说明文字。"""
+    if block.type == 'code':
+        return block.caption or block.language
+    if block.type == 'image':
+        return block.caption or ''
+    return ''
+
+
+def block_source_text(block: ContentBlockItem) -> str:
+    """ContentReference 的 start_position/end_position 所指向的原始字段。"""
+    if block.type == 'text':
+        return block.content
+    if block.type == 'code':
+        return block.code
+    return block.alt_text or block.caption or ''
+
+
+_LABEL_KINDS = {'文本块': 'text', '代码块': 'code', '图片块': 'image'}
+
+
+def split_labeled_blocks(content: str) -> List[Tuple[int, str, str]]:
+    """
+    把 combined_content 拆回 (块索引, 块类型, 块原文) 列表，块索引从0开始。
+    没有标签的内容作为文本块0返回。
+    """
+    matches = list(_BLOCK_LABEL.finditer(content))
+    if not matches:
+        return [(0, 'text', content)] if content.strip() else []
+
+    blocks = []
+    for i, match in enumerate(matches):
+        end = matches[i + 1].start() if i + 1 < len(matches) else len(content)
+        text = content[match.end():end]
+        if i + 1 < len(matches) and text.endswith("\n\n"):
+            text = text[:-2]
+        blocks.append((int(match.group(2)) - 1, _LABEL_KINDS[match.group(1)], text))
+    return blocks
+
+
+def split_labeled_content(content: str, include_code: bool = True) -> List[Tuple[int, str]]:
+    """split_labeled_blocks 的简化版本，返回 (块索引, 块原文)；include_code 为 False 时跳过代码块。"""
+    return [
+        (index, text)
+        for index, kind, text in split_labeled_blocks(content)
+        if include_code or kind != 'code'
+    ]
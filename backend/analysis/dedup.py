@@ -0,0 +1,423 @@
+"""
+近似重复检测：用 MinHash/LSH 找出内容块之间（以及整个 Obsidian 库中）几乎相同的段落。
+
+导入的库内容经常自我重复：日记把前一天的内容整段复制过来、同一段摘录被粘贴到多篇笔记里。
+这些段落在 /generate 和 /content-analysis 中每出现一次都要按输入token计费。
+
+段落以空行分隔，代码块整体作为一个单元，估算不足 MIN_PARAGRAPH_TOKENS 的段落不参与比较
+（标题、附加笔记的说明行之类折叠后省不了多少token，反而容易误判）。每个段落规范化
+（NFKC、小写、合并空白）后切成 SHINGLE_SIZE 个字符的 shingle，对 NUM_PERM 个哈希函数
+各取最小值得到签名；两个签名相同位置相等的比例即 shingle 集合 Jaccard 相似度的估计。
+签名分成 LSH_BANDS 段，任一段完全相同的段落才成为候选对，再用完整签名核对是否达到阈值，
+不需要两两比较。
+
+压缩内容块时，每个重复段落替换为指向最早出现的那一段的简短引用，块的数量和顺序不变
+（分段生成按块索引复用结果），没有重复的块原样保留。
+
+库范围的索引随 VaultIndex 增量更新：只为新增或修改的笔记计算签名（按 (路径, 修改时间, 大小)
+存入共享缓存），重复分组在查询时用 numpy 对每段 LSH 键排序分桶得到，并按版本缓存。
+更新可以在后台线程中进行，期间查询返回上一版本的结果。
+
+环境变量：
+    DEDUP_INDEX_VAULTS  服务启动时在后台建立重复索引的库路径（逗号分隔，默认不建立）
+"""
+import base64
+import json
+import os
+import re
+import threading
+import time
+import unicodedata
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from schemas import ContentBlockItem, TextBlock
+from shared_cache import shared_cache
+from vault.index import VaultIndex, get_vault_index
+from .content import block_text
+from .tokens import estimate_tokens
+
+SHINGLE_SIZE = 5  # 字符 shingle 长度，对中文和英文都适用，无需分词
+NUM_PERM = 120
+LSH_BANDS = 20  # 每段 NUM_PERM / LSH_BANDS = 6 行；候选阈值约为 (1/20)^(1/6) ≈ 0.61
+DUPLICATE_THRESHOLD = 0.8  # 估计的 Jaccard 相似度达到该值视为近似重复
+MIN_PARAGRAPH_TOKENS = 40
+SIGNATURE_CHUNK = 8192  # 每次计算的 shingle 列数：NUM_PERM × chunk 的临时矩阵约 4MB，留在CPU缓存内
+
+REFERENCE_TEMPLATE = "[Near-duplicate of block {block}, paragraph {paragraph}; omitted]"
+
+_ROWS = NUM_PERM // LSH_BANDS
+_rng = np.random.default_rng(0x5EED)
+_PERM_A = (_rng.integers(0, 1 << 32, NUM_PERM, dtype=np.uint64) | 1).astype(np.uint32)[:, None]
+_PERM_B = _rng.integers(0, 1 << 32, NUM_PERM, dtype=np.uint64).astype(np.uint32)[:, None]
+
+_WHITESPACE = re.compile(r'\s+')
+_PARAGRAPH_BREAK = re.compile(r'(\n[ \t]*\n\s*)')
+
+
+def split_paragraphs(text: str) -> List[str]:
+    """按空行切分，返回 [段落, 分隔符, 段落, ...]，拼接后与原文完全相同；第 i 段为 parts[2 * i]。"""
+    return _PARAGRAPH_BREAK.split(text)
+
+
+def _shingle_hashes(text: str) -> np.ndarray:
+    normalized = _WHITESPACE.sub(" ", unicodedata.normalize("NFKC", text).lower()).strip()
+    codes = np.frombuffer(normalized.encode("utf-32-le"), dtype=np.uint32)
+    if len(codes) < SHINGLE_SIZE:
+        codes = np.pad(codes, (0, SHINGLE_SIZE - len(codes)))
+    n = len(codes) - SHINGLE_SIZE + 1
+    hashes = np.zeros(n, dtype=np.uint32)
+    for j in range(SHINGLE_SIZE):
+        hashes = hashes * np.uint32(1000003) + codes[j:j + n]
+    hashes ^= hashes >> np.uint32(16)
+    hashes *= np.uint32(0x45D9F3B)
+    hashes ^= hashes >> np.uint32(16)
+    return hashes
+
+
+def minhash_signatures(texts: Sequence[str]) -> np.ndarray:
+    """
+    每段文本一行 NUM_PERM 个 uint32 的 MinHash 签名。第 k 个哈希函数为 32 位回绕的 a·x + b（a 为奇数，
+    是 32 位整数上的双射）再异或高位；比模梅森素数的写法快数倍，估计值同样无偏。
+    """
+    hashes = [_shingle_hashes(text) for text in texts]
+    starts = np.cumsum([0] + [len(h) for h in hashes[:-1]])
+    shingles = np.concatenate(hashes) if hashes else np.empty(0, dtype=np.uint32)
+    signatures = np.full((len(texts), NUM_PERM), np.iinfo(np.uint32).max, dtype=np.uint32)
+    for begin in range(0, len(shingles), SIGNATURE_CHUNK):
+        end = begin + SIGNATURE_CHUNK
+        permuted = _PERM_A * shingles[None, begin:end]
+        permuted += _PERM_B
+        permuted ^= permuted >> np.uint32(15)
+        # 与该列区间相交的文本：第一段可能从区间之前开始，其余都从区间内开始
+        first = int(np.searchsorted(starts, begin, side="right")) - 1
+        last = int(np.searchsorted(starts, end, side="left"))
+        offsets = np.maximum(starts[first:last], begin) - begin
+        minimums = np.minimum.reduceat(permuted, offsets, axis=1).T
+        np.minimum(signatures[first:last], minimums, out=signatures[first:last])
+    return signatures
+
+
+def _band_keys(signature: np.ndarray) -> List[Tuple[int, bytes]]:
+    return [(band, signature[band * _ROWS:(band + 1) * _ROWS].tobytes()) for band in range(LSH_BANDS)]
+
+
+def similarity(a: np.ndarray, b: np.ndarray) -> float:
+    return float(np.count_nonzero(a == b)) / NUM_PERM
+
+
+# --- 内容块压缩 ---
+
+
+@dataclass
+class ParagraphDuplicate:
+    block_index: int  # 从0开始
+    paragraph_index: int
+    duplicate_of: Tuple[int, int]  # 保留下来的 (块索引, 段落索引)
+    similarity: float
+    tokens_saved: int
+
+
+@dataclass
+class DeduplicationResult:
+    blocks: List[ContentBlockItem]
+    paragraphs: int  # 参与比较的段落数
+    duplicates: List[ParagraphDuplicate] = field(default_factory=list)
+    tokens_before: int = 0
+    tokens_after: int = 0
+
+    @property
+    def tokens_saved(self) -> int:
+        return self.tokens_before - self.tokens_after
+
+
+def _block_units(blocks: Sequence[ContentBlockItem]) -> List[Tuple[int, int, str]]:
+    units = []
+    for block_index, block in enumerate(blocks):
+        if block.type == 'text':
+            parts = split_paragraphs(block.content)
+            units += [(block_index, i // 2, parts[i]) for i in range(0, len(parts), 2)]
+        elif block.type == 'code':
+            units.append((block_index, 0, block.code))
+    return [unit for unit in units if estimate_tokens(unit[2]) >= MIN_PARAGRAPH_TOKENS]
+
+
+def deduplicate_blocks(
+    blocks: Sequence[ContentBlockItem], threshold: float = DUPLICATE_THRESHOLD, reference: str = REFERENCE_TEMPLATE
+) -> DeduplicationResult:
+    """
+    把与前面段落近似重复的段落替换为引用（reference 中的 {block}、{paragraph} 从1开始编号）。
+    只与保留下来的段落比较，重复的重复仍指向最早的原文。整块都是重复的代码块替换为只含引用的文本块。
+    """
+    units = _block_units(blocks)
+    signatures = minhash_signatures([text for _, _, text in units]) if units else np.empty((0, NUM_PERM), dtype=np.uint32)
+    buckets: Dict[Tuple[int, bytes], List[int]] = {}
+    replaced: Dict[Tuple[int, int], Tuple[ParagraphDuplicate, str]] = {}
+    for i, (block_index, paragraph_index, text) in enumerate(units):
+        keys = _band_keys(signatures[i])
+        best: Optional[Tuple[float, int]] = None
+        for candidate in sorted({c for key in keys for c in buckets.get(key, ())}):
+            score = similarity(signatures[i], signatures[candidate])
+            if score >= threshold and (best is None or score > best[0]):
+                best = (score, candidate)
+        if best is None:
+            for key in keys:
+                buckets.setdefault(key, []).append(i)
+            continue
+        original_block, original_paragraph, _ = units[best[1]]
+        marker = reference.format(block=original_block + 1, paragraph=original_paragraph + 1)
+        duplicate = ParagraphDuplicate(
+            block_index, paragraph_index, (original_block, original_paragraph), round(best[0], 4),
+            estimate_tokens(text) - estimate_tokens(marker)
+        )
+        replaced[(block_index, paragraph_index)] = (duplicate, marker)
+
+    compacted: List[ContentBlockItem] = list(blocks)
+    for block_index in sorted({b for b, _ in replaced}):
+        block = blocks[block_index]
+        if block.type == 'code':
+            compacted[block_index] = TextBlock(content=replaced[(block_index, 0)][1])
+            continue
+        parts = split_paragraphs(block.content)
+        for (b, paragraph_index), (_, marker) in replaced.items():
+            if b == block_index:
+                parts[paragraph_index * 2] = marker
+        compacted[block_index] = block.model_copy(update={"content": "".join(parts)})
+
+    return DeduplicationResult(
+        blocks=compacted,
+        paragraphs=len(units),
+        duplicates=[replaced[key][0] for key in sorted(replaced)],
+        tokens_before=sum(estimate_tokens(block_text(block)) for block in blocks),
+        tokens_after=sum(estimate_tokens(block_text(block)) for block in compacted),
+    )
+
+
+# --- 库范围的重复索引 ---
+
+
+@dataclass
+class DuplicateGroup:
+    paragraphs: List[Tuple[str, int]]  # (笔记路径, 段落索引)，第一个为保留的原文
+    similarity: float  # 组内各段与原文的最低相似度
+    tokens_saveable: int  # 除原文外各段的token数之和
+
+
+_SIGNATURE_CACHE_VERSION = f"minhash32-{SHINGLE_SIZE}-{NUM_PERM}-{MIN_PARAGRAPH_TOKENS}"
+
+
+def _note_signatures_key(vault_path: str, path: str, mtime: float, size: int) -> str:
+    return f"{_SIGNATURE_CACHE_VERSION}\0{vault_path}\0{path}\0{mtime!r}\0{size}"
+
+
+def note_paragraphs(text: str) -> List[Tuple[int, str]]:
+    """笔记中参与比较的 (段落索引, 段落)。"""
+    parts = split_paragraphs(text)
+    return [(i // 2, parts[i]) for i in range(0, len(parts), 2) if estimate_tokens(parts[i]) >= MIN_PARAGRAPH_TOKENS]
+
+
+@dataclass
+class _NoteSignatures:
+    mtime: float
+    size: int
+    paragraphs: List[int]
+    tokens: List[int]
+    signatures: np.ndarray
+
+    def to_json(self) -> Dict:
+        return {
+            "paragraphs": self.paragraphs, "tokens": self.tokens,
+            "signatures": base64.b64encode(self.signatures.tobytes()).decode("ascii"),
+        }
+
+    @classmethod
+    def from_json(cls, data: Dict, mtime: float, size: int) -> "_NoteSignatures":
+        signatures = np.frombuffer(base64.b64decode(data["signatures"]), dtype=np.uint32).reshape(-1, NUM_PERM)
+        return cls(mtime, size, data["paragraphs"], data["tokens"], signatures)
+
+
+class VaultDuplicateIndex:
+    def __init__(self, index: VaultIndex):
+        self.index = index
+        self.notes: Dict[str, _NoteSignatures] = {}
+        self.version = -1
+        self._lock = threading.Lock()  # 保护 notes 和派生的缓存，持有时间很短
+        self._update_lock = threading.Lock()  # 同一时间只有一个更新在计算签名
+        self._matrix: Optional[Tuple[np.ndarray, List[Tuple[str, int]], np.ndarray]] = None
+        self._groups: Dict[float, List[DuplicateGroup]] = {}
+        self._background: Optional[threading.Thread] = None
+
+    def _sign_changed(self, changed: List[Tuple[str, float, int]]) -> Dict[str, _NoteSignatures]:
+        vault_path = str(self.index.vault_path)
+        keys = {path: _note_signatures_key(vault_path, path, mtime, size) for path, mtime, size in changed}
+        shared = shared_cache.get_many("vault_note_minhash", keys.values())
+        signed: Dict[str, _NoteSignatures] = {}
+        computed: Dict[str, bytes] = {}
+        for path, mtime, size in changed:
+            cached = shared.get(keys[path])
+            if cached is not None:
+                signed[path] = _NoteSignatures.from_json(json.loads(cached), mtime, size)
+                continue
+            text = self.index.read_note(path)
+            if text is None:
+                continue
+            paragraphs = note_paragraphs(text)
+            signatures = minhash_signatures([p for _, p in paragraphs]) if paragraphs else np.empty((0, NUM_PERM), dtype=np.uint32)
+            signed[path] = _NoteSignatures(mtime, size, [i for i, _ in paragraphs], [estimate_tokens(p) for _, p in paragraphs], signatures)
+            if shared_cache.enabled:
+                computed[keys[path]] = json.dumps(signed[path].to_json()).encode("utf-8")
+        shared_cache.set_many("vault_note_minhash", computed)
+        return signed
+
+    def update(self) -> None:
+        with self._update_lock:
+            version, current = self.index.version, self.index.notes
+            if version == self.version:
+                return
+            start = time.perf_counter()
+            notes = self.notes
+            removed = [p for p in notes if p not in current]
+            changed = [
+                (p, e.mtime, e.size) for p, e in current.items()
+                if p not in notes or (notes[p].mtime, notes[p].size) != (e.mtime, e.size)
+            ]
+            signed = self._sign_changed(changed)
+            with self._lock:
+                self.notes = {p: s for p, s in notes.items() if p in current}
+                self.notes.update(signed)
+                self.version = version
+                self._matrix = None
+                self._groups = {}
+            print(f"INFO: Vault duplicate index updated ({len(signed)} signed, {len(removed)} removed, {len(self.notes)} notes, {(time.perf_counter() - start) * 1000:.0f}ms)")
+
+    def update_in_background(self) -> bool:
+        """索引落后于库时在后台线程中更新；返回是否有更新正在进行。"""
+        with self._lock:
+            if self._background is not None and self._background.is_alive():
+                return True
+            if self.version == self.index.version:
+                return False
+            self._background = threading.Thread(target=self._update_quietly, name="vault-duplicate-index", daemon=True)
+            self._background.start()
+            return True
+
+    def _update_quietly(self) -> None:
+        try:
+            self.update()
+        except Exception as e:
+            print(f"ERROR: Background update of the vault duplicate index failed: {e}")
+
+    @property
+    def paragraph_count(self) -> int:
+        with self._lock:
+            return sum(len(s.paragraphs) for s in self.notes.values())
+
+    def _load_matrix(self) -> Tuple[np.ndarray, List[Tuple[str, int]], np.ndarray]:
+        if self._matrix is None:
+            paths = sorted(self.notes)
+            owners = [(path, i) for path in paths for i in self.notes[path].paragraphs]
+            signatures = np.concatenate([self.notes[p].signatures for p in paths]) if paths else np.empty((0, NUM_PERM), dtype=np.uint32)
+            tokens = np.array([t for p in paths for t in self.notes[p].tokens], dtype=np.int64)
+            self._matrix = (signatures, owners, tokens)
+        return self._matrix
+
+    def groups(self, threshold: float = DUPLICATE_THRESHOLD) -> List[DuplicateGroup]:
+        """近似重复的段落分组，按可节省的token数从多到少排列。"""
+        with self._lock:
+            groups = self._groups.get(threshold)
+            if groups is None:
+                groups = self._groups[threshold] = self._find_groups(threshold)
+            return groups
+
+    def _find_groups(self, threshold: float) -> List[DuplicateGroup]:
+        signatures, owners, tokens = self._load_matrix()
+        n = len(owners)
+        if n < 2:
+            return []
+        # 每段 LSH 键相同的段落归入同一桶，桶内各段与桶中第一段组成候选对（避免大桶的平方级候选）
+        candidates = []
+        for band in range(LSH_BANDS):
+            keys = np.ascontiguousarray(signatures[:, band * _ROWS:(band + 1) * _ROWS]).view(np.dtype((np.void, 4 * _ROWS))).ravel()
+            _, first, inverse = np.unique(keys, return_index=True, return_inverse=True)
+            heads = first[inverse.ravel()]
+            members = np.nonzero(heads != np.arange(n))[0]
+            candidates.append(heads[members] * n + members)
+        pairs = np.unique(np.concatenate(candidates))
+        left, right = pairs // n, pairs % n
+        scores = np.count_nonzero(signatures[left] == signatures[right], axis=1) / NUM_PERM
+        matched = np.nonzero(scores >= threshold)[0]
+
+        # 与压缩内容块相同，不做传递闭包：按顺序处理，每段只归入与它本身足够相似的原文，
+        # 候选对的另一端已归入别的原文时改与那篇原文核对
+        originals: Dict[int, int] = {}  # 段落 -> 所属原文
+        similarities: Dict[int, float] = {}
+        for k in matched[np.lexsort((-scores[matched], right[matched]))].tolist():
+            a, b = int(left[k]), int(right[k])
+            if b in originals:
+                continue
+            original = originals.get(a, a)
+            score = float(scores[k]) if original == a else similarity(signatures[original], signatures[b])
+            if score >= threshold:
+                originals[b] = original
+                similarities[b] = score
+        members: Dict[int, List[int]] = {}
+        for b, original in originals.items():
+            members.setdefault(original, []).append(b)
+
+        groups = []
+        for original, duplicates in members.items():
+            duplicates.sort()
+            groups.append(DuplicateGroup(
+                [owners[original]] + [owners[i] for i in duplicates],
+                round(min(similarities[i] for i in duplicates), 4),
+                int(tokens[duplicates].sum())
+            ))
+        groups.sort(key=lambda g: (-g.tokens_saveable, g.paragraphs[0]))
+        return groups
+
+    def paragraph_preview(self, path: str, paragraph_index: int, limit: int = 160) -> str:
+        text = self.index.read_note(path)
+        if text is None:
+            return ""
+        parts = split_paragraphs(text)
+        paragraph = parts[paragraph_index * 2] if paragraph_index * 2 < len(parts) else ""
+        paragraph = _WHITESPACE.sub(" ", paragraph).strip()
+        return paragraph if len(paragraph) <= limit else paragraph[:limit].rstrip() + "…"
+
+
+_duplicate_indexes: Dict[str, VaultDuplicateIndex] = {}
+_duplicate_indexes_lock = threading.Lock()
+
+
+def get_vault_duplicate_index(vault_path: str) -> VaultDuplicateIndex:
+    """按库路径返回进程内共享的重复索引；只刷新库的扫描结果，签名由调用方同步或在后台更新。"""
+    index = get_vault_index(vault_path)
+    if not index.vault_path.is_dir():
+        raise FileNotFoundError(f"Vault path not found: {vault_path}")
+    with _duplicate_indexes_lock:
+        duplicates = _duplicate_indexes.get(str(index.vault_path))
+        if duplicates is None:
+            duplicates = VaultDuplicateIndex(index)
+            _duplicate_indexes[str(index.vault_path)] = duplicates
+    return duplicates
+
+
+def _index_vaults(paths: List[str]) -> None:
+    for path in paths:
+        try:
+            get_vault_duplicate_index(path).update()
+        except Exception as e:
+            print(f"ERROR: Could not build the duplicate index for vault {path}: {e}")
+
+
+def start_background_indexing(spec: Optional[str] = None) -> Optional[threading.Thread]:
+    """在后台为 DEDUP_INDEX_VAULTS 中的库建立重复索引，库的扫描也在后台线程中进行。"""
+    spec = (spec if spec is not None else os.getenv("DEDUP_INDEX_VAULTS", "")).strip()
+    paths = [path.strip() for path in spec.split(",") if path.strip()]
+    if not paths:
+        return None
+    thread = threading.Thread(target=_index_vaults, args=(paths,), name="vault-duplicate-index", daemon=True)
+    thread.start()
+    return thread
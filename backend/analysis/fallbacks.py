@@ -0,0 +1,59 @@
+"""
+备用分析方案，当LLM调用失败或JSON解析失败时使用。
+"""
+from typing import List
+
+from schemas import KeywordTag, MindMapNode, ContentSummary, ContentReference
+from .content import split_labeled_blocks, split_labeled_content
+from .mindmap import build_local_mindmap
+from .keywords import extract_keywords_local
+from .summary import summarize_local
+
+
+async def extract_keywords_fallback(llm_result: str, content: str) -> List[KeywordTag]:
+    """
+    备用关键词提取方案，当LLM JSON解析失败时使用
+    """
+    try:
+        return extract_keywords_local([text for _, text in split_labeled_content(content)], top_k=10)
+    except Exception as e:
+        print(f"Error in fallback keyword extraction: {e}")
+        return []
+
+
+async def generate_mindmap_fallback(llm_result: str, content: str) -> List[MindMapNode]:
+    """
+    备用思维导图生成方案，当LLM JSON解析失败时使用
+    优先根据标题和列表结构生成，没有结构时以关键词为分支
+    """
+    try:
+        print(f"Using fallback mindmap generation for content: {content[:100]}...")
+        sources = [(kind, text, '') for _, kind, text in split_labeled_blocks(content)]
+        nodes = build_local_mindmap(sources)
+        print(f"Generated fallback mindmap with root: {nodes[0].text}")
+        return nodes
+        
+    except Exception as e:
+        print(f"Error in fallback mindmap generation: {e}")
+        # 最后的备用方案
+        return [
+            MindMapNode(id="root", text="内容分析", level=1, children=["concept", "method"]),
+            MindMapNode(id="concept", text="核心概念", level=2, parent_id="root"),
+            MindMapNode(id="method", text="实现方法", level=2, parent_id="root")
+        ]
+
+
+async def generate_summary_fallback(llm_result: str, content: str) -> ContentSummary:
+    """
+    备用概要生成方案，当LLM JSON解析失败时使用
+    """
+    try:
+        return summarize_local(split_labeled_content(content, include_code=False))
+    except Exception:
+        return ContentSummary(
+            title="分析错误",
+            summary="无法生成内容概要",
+            key_points=[],
+            references=[]
+        )
+
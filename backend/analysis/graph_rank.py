@@ -0,0 +1,25 @@
+"""
+基于带权图的 PageRank 迭代（TextRank / LexRank 共用）。
+"""
+import numpy as np
+
+
+def pagerank(weights: np.ndarray, damping: float = 0.85, max_iter: int = 50, tol: float = 1e-6) -> np.ndarray:
+    """
+    对对称或有向的权重矩阵做幂迭代，weights[i, j] 表示 j 指向 i 的边权重。
+    没有出边的节点不传递分数。
+    """
+    size = weights.shape[0]
+    if size == 0:
+        return np.zeros(0)
+    out_degree = weights.sum(axis=0)
+    transition = np.divide(weights, out_degree, out=np.zeros_like(weights, dtype=np.float64), where=out_degree > 0)
+
+    ranks = np.full(size, 1.0 / size)
+    for _ in range(max_iter):
+        updated = (1 - damping) / size + damping * transition @ ranks
+        converged = np.abs(updated - ranks).sum() < tol
+        ranks = updated
+        if converged:
+            break
+    return ranks
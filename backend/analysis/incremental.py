@@ -0,0 +1,446 @@
+"""
+逐块增量分析：每个内容块的关键词和概要按内容哈希缓存，编辑时只有新增或修改的块才会交给模型，
+最后把各块的结果合并成整体的关键词、概要和思维导图。
+
+供 "边输入边分析" 的接口使用：同一会话的连续请求会先防抖，只有最后一次真正执行。
+启用共享缓存时，会话的最新请求序号保存在共享缓存中，多个工作进程之间同样能防抖。
+本地分析（关键词提取、LexRank）和共享缓存的读写都放到线程中执行，不阻塞事件循环。
+"""
+import asyncio
+import hashlib
+import json
+import math
+import secrets
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from llm_providers.base_llm import BaseLLMProvider
+from observability.metrics import count_cache, count_fallback, stage_timer
+from shared_cache import SharedCache, shared_cache
+from schemas import (
+    ContentAnalysisResponse, ContentBlockItem, ContentReference, ContentSummary,
+    IncrementalAnalysisRequest, KeywordTag
+)
+from .content import block_label, block_source_text, block_text
+from .keywords import extract_keywords_local
+from .mindmap import build_local_mindmap
+from .parsing import keywords_from_data
+from .prompts import build_blocks_prompt
+from .summary import _first_heading, _shorten, summarize_local
+from .tokens import estimate_tokens
+
+BLOCK_ANALYSIS_MODEL = "gemini-2.5-flash"  # 默认模型；服务端按 ANALYSIS_LLM_MODEL / 分析提供者传入实际模型
+BLOCK_CACHE_MAX_ENTRIES = 4096
+MAX_BLOCKS_PER_CALL = 8
+MAX_TOKENS_PER_CALL = 12000
+DEBOUNCE_SECONDS = 0.4
+DEBOUNCE_TTL_SECONDS = 60.0  # 共享缓存中会话最新请求标记的保留时间
+INFLIGHT_WAIT_SECONDS = 60.0  # 等待其他请求分析同一块的上限，超时后使用本地结果
+MERGED_KEYWORDS = 15
+MERGED_SUMMARY_TOKENS = 300
+MERGED_KEY_POINTS = 5
+
+
+@dataclass
+class BlockArtifact:
+    keywords: List[KeywordTag] = field(default_factory=list)
+    summary: str = ""
+    key_points: List[str] = field(default_factory=list)
+    quote: Optional[str] = None  # 块原文中的代表性句子，用于生成引用
+
+    def to_json(self) -> Dict:
+        return {
+            "keywords": [k.model_dump() for k in self.keywords],
+            "summary": self.summary,
+            "key_points": self.key_points,
+            "quote": self.quote,
+        }
+
+    @classmethod
+    def from_json(cls, data: Dict) -> "BlockArtifact":
+        return cls(
+            keywords=[KeywordTag(**k) for k in data.get("keywords", [])],
+            summary=data.get("summary", ""),
+            key_points=data.get("key_points", []),
+            quote=data.get("quote"),
+        )
+
+
+class BlockAnalysisCache:
+    """
+    按块内容哈希保存分析结果的LRU缓存。进程内未命中时再查跨进程共享缓存，
+    因此一个工作进程分析过的块在其他工作进程中也能命中。
+    """
+
+    def __init__(self, max_entries: int = BLOCK_CACHE_MAX_ENTRIES, shared: Optional[SharedCache] = shared_cache):
+        self.max_entries = max_entries
+        self.shared = shared
+        self._entries: "OrderedDict[str, BlockArtifact]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str) -> Optional[BlockArtifact]:
+        with self._lock:
+            artifact = self._entries.get(key)
+            if artifact is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                count_cache("analysis_blocks", hit=True)
+                return artifact
+        data = self.shared.get_json("analysis_blocks", key) if self.shared is not None else None
+        if data is None:
+            with self._lock:
+                self.misses += 1
+            count_cache("analysis_blocks", hit=False)
+            return None
+        artifact = BlockArtifact.from_json(data)
+        self._put_local(key, artifact)
+        with self._lock:
+            self.hits += 1
+        count_cache("analysis_blocks", hit=True)
+        return artifact
+
+    def _put_local(self, key: str, artifact: BlockArtifact) -> None:
+        with self._lock:
+            self._entries[key] = artifact
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def put(self, key: str, artifact: BlockArtifact) -> None:
+        self._put_local(key, artifact)
+        if self.shared is not None:
+            self.shared.set_json("analysis_blocks", key, artifact.to_json())
+
+    def get_many(self, keys: Sequence[str]) -> List[Optional[BlockArtifact]]:
+        """批量查询；可能读取共享缓存，应在线程中调用。"""
+        return [self.get(key) for key in keys]
+
+    def put_many(self, items: Sequence[Tuple[str, BlockArtifact]]) -> None:
+        """批量写入；会写共享缓存，应在线程中调用。"""
+        for key, artifact in items:
+            self.put(key, artifact)
+
+
+block_cache = BlockAnalysisCache()
+_inflight: Dict[str, "asyncio.Future[BlockArtifact]"] = {}
+
+
+def block_cache_key(engine: str, text: str, model_name: str = BLOCK_ANALYSIS_MODEL) -> str:
+    model = model_name if engine == "llm" else "local"
+    return hashlib.sha256(f"{engine}\0{model}\0{text}".encode("utf-8")).hexdigest()
+
+
+def local_block_artifact(text: str) -> BlockArtifact:
+    summary = summarize_local([(0, text)])  # CPU 密集，异步代码中通过 local_block_artifacts 在线程中调用
+    return BlockArtifact(
+        keywords=extract_keywords_local([text], top_k=8),
+        summary=summary.key_points[0] if summary.key_points else text[:50],
+        key_points=summary.key_points[:3],
+        quote=summary.references[0].source_text if summary.references else None
+    )
+
+
+async def local_block_artifacts(texts: Sequence[str]) -> List[BlockArtifact]:
+    if not texts:
+        return []
+    return await asyncio.to_thread(lambda: [local_block_artifact(text) for text in texts])
+
+
+def _parse_blocks_result(result: str, count: int) -> Dict[int, BlockArtifact]:
+    start_idx = result.find('[')
+    end_idx = result.rfind(']')
+    if start_idx == -1 or end_idx <= start_idx:
+        return {}
+    try:
+        items = json.loads(result[start_idx:end_idx+1])
+    except json.JSONDecodeError as e:
+        print(f"Failed to parse per-block analysis JSON: {e}")
+        return {}
+
+    artifacts: Dict[int, BlockArtifact] = {}
+    for item in items if isinstance(items, list) else []:
+        try:
+            index = int(item.get("block")) - 1
+            if not 0 <= index < count:
+                continue
+            artifacts[index] = BlockArtifact(
+                keywords=keywords_from_data(item.get("keywords")),
+                summary=str(item.get("summary", "")),
+                key_points=[str(p) for p in item.get("key_points", [])][:3],
+                quote=item.get("quote") or None
+            )
+        except (TypeError, ValueError, AttributeError) as e:
+            print(f"Skipping malformed per-block analysis item: {e}")
+    return artifacts
+
+
+async def _llm_block_artifacts(llm_provider: BaseLLMProvider, texts: List[str], model_name: str) -> List[Optional[BlockArtifact]]:
+    try:
+        result = await llm_provider.generate_structured_text(
+            prompt=build_blocks_prompt(texts),
+            model_name=model_name
+        )
+    except Exception as e:
+        print(f"Error during per-block analysis of {len(texts)} block(s): {e}")
+        return [None] * len(texts)
+    with stage_timer("json_parse"):
+        parsed = _parse_blocks_result(result, len(texts))
+    return [parsed.get(i) for i in range(len(texts))]
+
+
+def _chunk_texts(texts: List[str]) -> List[List[int]]:
+    """按块数和token预算把待分析的块分组，每组一次调用。"""
+    groups: List[List[int]] = []
+    current: List[int] = []
+    current_tokens = 0
+    for i, text in enumerate(texts):
+        tokens = estimate_tokens(text)
+        if current and (len(current) >= MAX_BLOCKS_PER_CALL or current_tokens + tokens > MAX_TOKENS_PER_CALL):
+            groups.append(current)
+            current, current_tokens = [], 0
+        current.append(i)
+        current_tokens += tokens
+    if current:
+        groups.append(current)
+    return groups
+
+
+async def _compute_artifacts(
+    llm_provider: Optional[BaseLLMProvider],
+    engine: str,
+    texts: List[str],
+    model_name: str
+) -> List[Tuple[BlockArtifact, bool]]:
+    """返回 (分析结果, 是否可缓存)；LLM失败时使用本地结果但不缓存，以便下次重试。"""
+    if engine == "local":
+        return [(artifact, True) for artifact in await local_block_artifacts(texts)]
+
+    groups = _chunk_texts(texts)
+    group_results = await asyncio.gather(*(_llm_block_artifacts(llm_provider, [texts[i] for i in g], model_name) for g in groups))
+    computed: List[Tuple[BlockArtifact, bool]] = [None] * len(texts)  # type: ignore[list-item]
+    failed: List[int] = []
+    for group, artifacts in zip(groups, group_results):
+        for i, artifact in zip(group, artifacts):
+            if artifact is None:
+                count_fallback("block_local")
+                failed.append(i)
+            else:
+                computed[i] = (artifact, True)
+    for i, artifact in zip(failed, await local_block_artifacts([texts[i] for i in failed])):
+        computed[i] = (artifact, False)
+    return computed
+
+
+async def resolve_block_artifacts(
+    llm_provider: Optional[BaseLLMProvider],
+    engine: str,
+    texts: Sequence[str],
+    model_name: str = BLOCK_ANALYSIS_MODEL
+) -> Tuple[List[BlockArtifact], int, int]:
+    """
+    获取每个块的分析结果：命中缓存的直接返回，其他请求正在分析的同一内容会等待其结果，
+    剩余的新块或修改过的块才会被分析。
+
+    Returns:
+        (分析结果列表, 缓存命中块数, 新分析块数)
+    """
+    loop = asyncio.get_running_loop()
+    results: List[Optional[BlockArtifact]] = [None] * len(texts)
+    waiting: Dict[int, "asyncio.Future[BlockArtifact]"] = {}
+    to_compute: Dict[str, List[int]] = {}
+    hits = 0
+
+    keys_by_block = [block_cache_key(engine, text, model_name) for text in texts]
+    cached_by_block = await asyncio.to_thread(block_cache.get_many, keys_by_block)
+    # 从这里到登记 _inflight 之间没有 await，同一内容不会被两个请求同时分析
+    for i, (key, cached) in enumerate(zip(keys_by_block, cached_by_block)):
+        if cached is not None:
+            results[i] = cached
+            hits += 1
+        elif key in _inflight:
+            waiting[i] = _inflight[key]
+            hits += 1
+        else:
+            to_compute.setdefault(key, []).append(i)
+
+    keys = list(to_compute)
+    futures = {key: loop.create_future() for key in keys}
+    _inflight.update(futures)
+    failure: BaseException = RuntimeError("block analysis was cancelled")
+    try:
+        computed = await _compute_artifacts(llm_provider, engine, [texts[to_compute[key][0]] for key in keys], model_name) if keys else []
+        cacheable = [(key, artifact) for key, (artifact, ok) in zip(keys, computed) if ok]
+        if cacheable:
+            await asyncio.to_thread(block_cache.put_many, cacheable)
+        for key, (artifact, _) in zip(keys, computed):
+            futures[key].set_result(artifact)
+            for i in to_compute[key]:
+                results[i] = artifact
+    except Exception as e:
+        failure = e
+        raise
+    finally:
+        # 出错或本请求被取消（客户端断开、被同一会话的新请求取代）时，等待这些块的其他请求改用本地结果
+        for key in keys:
+            _inflight.pop(key, None)
+            future = futures[key]
+            if not future.done():
+                future.set_exception(failure)
+                future.exception()  # 没有其他请求等待时不报告 "exception was never retrieved"
+
+    unresolved: List[int] = []
+    for i, future in waiting.items():
+        try:
+            # shield：超时只放弃等待，不取消其他请求正在进行的分析
+            results[i] = await asyncio.wait_for(asyncio.shield(future), timeout=INFLIGHT_WAIT_SECONDS)
+        except Exception:
+            unresolved.append(i)
+    for i, artifact in zip(unresolved, await local_block_artifacts([texts[i] for i in unresolved])):
+        results[i] = artifact
+
+    return results, hits, len(keys)  # type: ignore[return-value]
+
+
+def merge_keywords(artifacts: Sequence[BlockArtifact], weights: Sequence[float]) -> List[KeywordTag]:
+    """按块的权重累加各块关键词的重要性，出现在多个块中的关键词得分更高。"""
+    scores: Dict[str, float] = {}
+    categories: Dict[str, Tuple[float, Optional[str]]] = {}
+    for artifact, weight in zip(artifacts, weights):
+        for keyword in artifact.keywords:
+            key = keyword.keyword.lower()
+            scores[key] = scores.get(key, 0.0) + keyword.importance * weight
+            if key not in categories or keyword.importance > categories[key][0]:
+                categories[key] = (keyword.importance, keyword.category)
+    display = {kw.keyword.lower(): kw.keyword for artifact in artifacts for kw in artifact.keywords}
+
+    ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:MERGED_KEYWORDS]
+    peak = ranked[0][1] if ranked and ranked[0][1] > 0 else 1.0
+    return [
+        KeywordTag(keyword=display[key], importance=round(min(max(score / peak, 0.0), 1.0), 2), category=categories[key][1])
+        for key, score in ranked
+    ]
+
+
+def merge_summary(
+    blocks: Sequence[Tuple[int, ContentBlockItem]],
+    artifacts: Sequence[BlockArtifact],
+    weights: Sequence[float],
+    keywords: Sequence[KeywordTag]
+) -> ContentSummary:
+    """按原文顺序拼接各块概要，关键要点按块权重轮流选取。"""
+    title = _first_heading([(i, block_source_text(b)) for i, b in blocks if b.type == 'text'])
+    if not title:
+        title = keywords[0].keyword if keywords else "内容概要"
+
+    summary_text, summary_tokens = "", 0
+    for artifact in artifacts:
+        if not artifact.summary:
+            continue
+        if summary_text and summary_tokens + estimate_tokens(artifact.summary) > MERGED_SUMMARY_TOKENS:
+            break
+        if summary_text and summary_text[-1] not in "。！？；":
+            summary_text += " "
+        summary_text += artifact.summary
+        summary_tokens += estimate_tokens(artifact.summary)
+
+    by_weight = sorted(range(len(artifacts)), key=lambda i: weights[i], reverse=True)
+    key_points: List[str] = []
+    references: List[ContentReference] = []
+    referenced = set()
+    for round_index in range(3):
+        for i in by_weight:
+            if len(key_points) >= MERGED_KEY_POINTS:
+                break
+            if round_index < len(artifacts[i].key_points):
+                key_points.append(artifacts[i].key_points[round_index])
+                block_index, block = blocks[i]
+                if artifacts[i].quote and i not in referenced:
+                    referenced.add(i)
+                    source = block_source_text(block)
+                    start = source.find(artifacts[i].quote)
+                    references.append(ContentReference(
+                        source_block_index=block_index,
+                        source_text=artifacts[i].quote,
+                        reference_type="quote" if start != -1 else "paraphrase",
+                        start_position=start if start != -1 else None,
+                        end_position=start + len(artifacts[i].quote) if start != -1 else None
+                    ))
+
+    return ContentSummary(
+        title=_shorten(title, 20),
+        summary=summary_text,
+        key_points=key_points,
+        references=references
+    )
+
+
+class SessionDebouncer:
+    """
+    同一会话在防抖窗口内的多次请求只执行最后一次。
+    启用共享缓存时，每个会话最新请求的标记写入共享缓存，同一会话的请求落到不同工作进程也能互相取代；
+    否则只在本进程内防抖。
+    """
+
+    def __init__(self, delay: float = DEBOUNCE_SECONDS, shared: Optional[SharedCache] = shared_cache):
+        self.delay = delay
+        self.shared = shared
+        self._latest: Dict[str, str] = {}
+
+    def _shared_enabled(self) -> bool:
+        return self.shared is not None and self.shared.enabled
+
+    async def wait(self, session_id: str) -> bool:
+        """等待防抖窗口，返回该请求是否仍是会话中最新的请求。"""
+        token = secrets.token_hex(8)
+        self._latest[session_id] = token
+        if self._shared_enabled():
+            await asyncio.to_thread(self.shared.set, "analysis_debounce", session_id, token.encode(), DEBOUNCE_TTL_SECONDS)
+        await asyncio.sleep(self.delay)
+        if self._shared_enabled():
+            latest = await asyncio.to_thread(self.shared.get, "analysis_debounce", session_id)
+            if latest is not None and latest.decode() != token:
+                return False
+        if self._latest.get(session_id) != token:
+            return False
+        self._latest.pop(session_id, None)
+        return True
+
+
+debouncer = SessionDebouncer()
+
+
+async def run_incremental_analysis(
+    llm_provider: Optional[BaseLLMProvider],
+    request: IncrementalAnalysisRequest,
+    model_name: str = BLOCK_ANALYSIS_MODEL
+) -> ContentAnalysisResponse:
+    response_data = ContentAnalysisResponse(analysis_language=request.language, analysis_mode=f"incremental-{request.engine}")
+    if request.session_id and not await debouncer.wait(request.session_id):
+        response_data.superseded = True
+        return response_data
+
+    blocks = [(i, b) for i, b in enumerate(request.user_input.blocks) if b.type != 'image' and block_text(b).strip()]
+    texts = [block_text(b) for _, b in blocks]
+    artifacts, hits, analyzed = await resolve_block_artifacts(llm_provider, request.engine, texts, model_name) if texts else ([], 0, 0)
+    print(f"Incremental analysis: {len(texts)} block(s), {hits} from cache, {analyzed} analyzed")
+    # 块的权重随长度增长但增速递减，避免一个长块压过其他所有块
+    weights = [math.sqrt(max(estimate_tokens(text), 1)) for text in texts]
+
+    response_data.cached_blocks = hits
+    response_data.analyzed_blocks = analyzed
+    if "keywords" in request.analysis_types or "summary" in request.analysis_types:
+        keywords = merge_keywords(artifacts, weights)
+        if "keywords" in request.analysis_types:
+            response_data.keywords = keywords
+        if "summary" in request.analysis_types:
+            response_data.summary = merge_summary(blocks, artifacts, weights, keywords)
+    if "mindmap" in request.analysis_types:
+        # 思维导图依赖整体结构，直接在本地根据标题和列表重建
+        response_data.mindmap = await asyncio.to_thread(
+            build_local_mindmap, [(b.type, block_source_text(b), block_label(b)) for b in request.user_input.blocks]
+        )
+    return response_data
@@ -0,0 +1,336 @@
+"""
+本地关键词提取：CJK n-gram 切分 + TF-IDF + TextRank，不调用任何LLM。
+
+中文没有空格分词，这里把连续的汉字串按停用字切成片段，再生成2-4字的n-gram作为候选词；
+与更长候选词出现次数相同的子串视为其碎片并丢弃。英文等拉丁文本按单词切分。
+IDF 可以来自用户的 Obsidian 库（按哈希桶统计的文档频率，库变化时增量更新），
+否则在内容块之间计算。
+"""
+import re
+import threading
+import zlib
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+import numpy as np
+
+from schemas import KeywordTag
+from shared_cache import shared_cache
+from vault.index import NoteEntry, VaultIndex, get_vault_index
+from .graph_rank import pagerank
+
+MIN_NGRAM = 2
+MAX_NGRAM = 4
+TEXTRANK_WINDOW = 4
+TEXTRANK_DAMPING = 0.85
+TEXTRANK_MAX_VOCAB = 300  # TextRank 使用稠密矩阵，只对 TF-IDF 排名靠前的候选词建图
+IDF_HASH_BUCKETS = 1 << 20
+MIN_REPEATED_KEYWORDS = 5
+
+CJK_RUN = re.compile(r'[㐀-䶿一-鿿]+')
+_TOKEN = re.compile(r'[㐀-䶿一-鿿]+|[A-Za-z][A-Za-z0-9_+#]*(?:[.\-][A-Za-z0-9_+#]+)*')
+_SENTENCE_SPLIT = re.compile(r'[。！？!?；;\n]+|\.\s+')
+
+# 切分汉字串的停用字：这些字几乎不会出现在关键词的开头或结尾
+STOP_CHARS = set('的了是在和与及或也就都而把被从这那之其吗呢吧啊')
+STOP_WORDS = {
+    # 中文
+    '我们', '你们', '他们', '一个', '可以', '这个', '那个', '没有', '什么', '因为', '所以', '但是',
+    '如果', '就是', '进行', '通过', '以及', '其中', '一些', '这些', '那些', '非常', '已经', '还是',
+    '以下', '如下', '需要', '使用', '能够', '这样', '然后', '不是', '时候', '自己', '这里', '之后',
+    # English
+    'the', 'and', 'or', 'but', 'in', 'on', 'at', 'to', 'for', 'of', 'with', 'by', 'is', 'are', 'was',
+    'were', 'be', 'been', 'this', 'that', 'these', 'those', 'it', 'its', 'as', 'an', 'from', 'into',
+    'can', 'will', 'would', 'should', 'could', 'not', 'no', 'we', 'you', 'they', 'our', 'your',
+    'their', 'has', 'have', 'had', 'do', 'does', 'did', 'so', 'if', 'then', 'than', 'also', 'more',
+    'most', 'such', 'which', 'when', 'what', 'how', 'all', 'any', 'each', 'other', 'some', 'there',
+    'about', 'over', 'only', 'just', 'very', 'use', 'using', 'used', 'return', 'self', 'none', 'true',
+    'false', 'def', 'import', 'const', 'let', 'var', 'function',
+}
+
+
+def _cjk_segments(run: str) -> List[str]:
+    segments, current = [], []
+    for char in run:
+        if char in STOP_CHARS:
+            if current:
+                segments.append(''.join(current))
+                current = []
+        else:
+            current.append(char)
+    if current:
+        segments.append(''.join(current))
+    return segments
+
+
+def _latin_term(word: str) -> Optional[str]:
+    term = word.lower()
+    if term in STOP_WORDS:
+        return None
+    if len(term) < 3 and not (word.isupper() and len(word) >= 2):
+        return None
+    return term
+
+
+def tokenize(text: str) -> List[List[Tuple[str, bool]]]:
+    """
+    把文本切成句子，每个句子是按出现顺序排列的 (候选词, 是否为完整片段) 列表。
+    汉字片段会展开为其全部2-4字n-gram。
+    """
+    sentences = []
+    for sentence in _SENTENCE_SPLIT.split(text):
+        occurrences: List[Tuple[str, bool]] = []
+        for match in _TOKEN.finditer(sentence):
+            token = match.group(0)
+            if CJK_RUN.fullmatch(token):
+                for segment in _cjk_segments(token):
+                    length = len(segment)
+                    for n in range(MIN_NGRAM, min(MAX_NGRAM, length) + 1):
+                        for start in range(length - n + 1):
+                            gram = segment[start:start + n]
+                            if gram not in STOP_WORDS:
+                                occurrences.append((gram, n == length))
+            else:
+                term = _latin_term(token)
+                if term:
+                    occurrences.append((term, True))
+        if occurrences:
+            sentences.append(occurrences)
+    return sentences
+
+
+def _drop_fragments(counts: Counter, whole_segments: Set[str]) -> Dict[str, int]:
+    """
+    丢弃与包含它的更长候选词出现次数相同的n-gram（例如 "识管" 只出现在 "知识管理" 里）。
+    只出现一次的n-gram（包括二元组）没有统计依据，除非它本身是一个完整片段，否则也丢弃；
+    跨词边界的二元组（如 "织成"）大多只出现一次，由这一条过滤掉。
+    """
+    dropped = set()
+    for term in sorted(counts, key=len, reverse=True):
+        if len(term) < MIN_NGRAM or not CJK_RUN.fullmatch(term):
+            continue
+        count = counts[term]
+        if count < 2:
+            if term not in whole_segments:
+                dropped.add(term)
+            continue
+        if len(term) == MIN_NGRAM:
+            continue
+        for sub in (term[:-1], term[1:]):
+            if counts.get(sub) == count:
+                dropped.add(sub)
+    return {term: count for term, count in counts.items() if term not in dropped}
+
+
+def term_bucket(term: str) -> int:
+    return zlib.crc32(term.encode('utf-8')) % IDF_HASH_BUCKETS
+
+
+def _idf_lookup_terms(term: str) -> List[str]:
+    """长汉字n-gram的文档频率用其二元组的最小文档频率近似。"""
+    if CJK_RUN.fullmatch(term) and len(term) > MIN_NGRAM:
+        return [term[i:i + MIN_NGRAM] for i in range(len(term) - MIN_NGRAM + 1)]
+    return [term]
+
+
+def note_term_buckets(text: str) -> np.ndarray:
+    """一篇笔记中出现的全部二元组/英文单词的哈希桶（去重），用于文档频率统计。"""
+    terms = set()
+    for occurrences in tokenize(text):
+        for term, _ in occurrences:
+            if len(term) == MIN_NGRAM or not CJK_RUN.fullmatch(term):
+                terms.add(term)
+    return np.unique(np.fromiter((term_bucket(t) for t in terms), dtype=np.int64, count=len(terms)))
+
+
+def _note_terms_key(vault_path: str, entry: NoteEntry) -> str:
+    return f"{vault_path}\0{entry.path}\0{entry.mtime}\0{entry.size}"
+
+
+class VaultTermStatistics:
+    """
+    Obsidian 库的文档频率表。每篇笔记只保存其词项哈希桶数组，
+    库中笔记新增、修改或删除时对 df 数组做增量加减。
+    每篇笔记的哈希桶数组同时按 (路径, 修改时间, 大小) 存入共享缓存，
+    其他工作进程构建同一个库的统计时无需重新读取和切分笔记。
+    """
+
+    def __init__(self, index: VaultIndex):
+        self.index = index
+        self.df = np.zeros(IDF_HASH_BUCKETS, dtype=np.int32)
+        self.note_buckets: Dict[str, np.ndarray] = {}
+        self.note_mtimes: Dict[str, float] = {}
+        self.version = -1
+        self._lock = threading.Lock()
+
+    def update(self) -> None:
+        with self._lock:
+            if self.version == self.index.version:
+                return
+            current = set(self.index.notes)
+            stale = [p for p in self.note_buckets if p not in current]
+            changed = [p for p in current if self.note_mtimes.get(p) != self.index.notes[p].mtime]
+            for path in stale + changed:
+                old = self.note_buckets.pop(path, None)
+                if old is not None:
+                    np.subtract.at(self.df, old, 1)
+            vault_path = str(self.index.vault_path)
+            keys = {path: _note_terms_key(vault_path, self.index.notes[path]) for path in changed}
+            shared = shared_cache.get_many("vault_note_terms", keys.values())
+            computed: Dict[str, bytes] = {}
+            for path in changed:
+                cached = shared.get(keys[path])
+                if cached is not None:
+                    buckets = np.frombuffer(cached, dtype=np.int64)
+                else:
+                    text = self.index.read_note(path)
+                    if text is None:
+                        continue
+                    buckets = note_term_buckets(text)
+                    computed[keys[path]] = buckets.tobytes()
+                np.add.at(self.df, buckets, 1)
+                self.note_buckets[path] = buckets
+            shared_cache.set_many("vault_note_terms", computed)
+            self.note_mtimes = {p: self.index.notes[p].mtime for p in self.note_buckets}
+            self.version = self.index.version
+            print(f"INFO: Vault term statistics updated ({len(changed)} changed, {len(stale)} removed, {len(self.note_buckets)} notes)")
+
+    def document_frequencies(self, terms: Sequence[str]) -> Tuple[int, np.ndarray]:
+        df = np.array([
+            min(int(self.df[term_bucket(t)]) for t in _idf_lookup_terms(term))
+            for term in terms
+        ], dtype=np.float64)
+        return len(self.note_buckets), df
+
+
+_vault_statistics: Dict[str, VaultTermStatistics] = {}
+_vault_statistics_lock = threading.Lock()
+
+
+def get_vault_term_statistics(vault_path: str) -> Optional[VaultTermStatistics]:
+    try:
+        index = get_vault_index(vault_path)
+    except Exception as e:
+        print(f"Error loading vault index for IDF statistics: {e}")
+        return None
+    if not index.vault_path.is_dir():
+        return None
+    with _vault_statistics_lock:
+        stats = _vault_statistics.get(str(index.vault_path))
+        if stats is None:
+            stats = VaultTermStatistics(index)
+            _vault_statistics[str(index.vault_path)] = stats
+    stats.update()
+    return stats
+
+
+def _normalize(values: np.ndarray) -> np.ndarray:
+    peak = values.max() if values.size else 0.0
+    return values / peak if peak > 0 else values
+
+
+def _textrank(vocab: Dict[str, int], sentences: Iterable[List[Tuple[str, bool]]]) -> np.ndarray:
+    size = len(vocab)
+    rows, cols = [], []
+    for occurrences in sentences:
+        ids = [vocab[term] for term, _ in occurrences if term in vocab]
+        for i, source in enumerate(ids):
+            for target in ids[i + 1:i + TEXTRANK_WINDOW]:
+                if source != target:
+                    rows.extend((source, target))
+                    cols.extend((target, source))
+    graph = np.zeros((size, size), dtype=np.float64)
+    if rows:
+        np.add.at(graph, (np.array(rows), np.array(cols)), 1.0)
+    return pagerank(graph, damping=TEXTRANK_DAMPING)
+
+
+def extract_keywords_local(
+    documents: Sequence[str],
+    top_k: int = 15,
+    vault_path: Optional[str] = None
+) -> List[KeywordTag]:
+    """
+    从若干文档（通常是每个内容块一篇）中提取关键词。
+
+    Args:
+        documents: 待分析的文本列表。
+        top_k: 返回的关键词数量上限。
+        vault_path: 可选的 Obsidian 库路径，提供时使用库中的文档频率计算IDF。
+    """
+    tokenized = [tokenize(doc) for doc in documents if doc and doc.strip()]
+    sentences = [sentence for doc in tokenized for sentence in doc]
+    counts = Counter(term for sentence in sentences for term, _ in sentence)
+    if not counts:
+        return []
+
+    whole_segments = {term for sentence in sentences for term, whole in sentence if whole}
+    total = sum(counts.values())
+    min_count = 2 if total > 150 else 1
+    candidates = {t: c for t, c in _drop_fragments(counts, whole_segments).items() if c >= min_count}
+    if not candidates:
+        candidates = _drop_fragments(counts, whole_segments) or dict(counts)
+
+    terms = list(candidates)
+    tf = np.array([candidates[t] for t in terms], dtype=np.float64) / total
+
+    stats = get_vault_term_statistics(vault_path) if vault_path else None
+    if stats is not None and stats.note_buckets:
+        doc_count, df = stats.document_frequencies(terms)
+        # 库中从未出现过、也没有作为完整片段出现过的二元组多半是跨词边界的碎片
+        supported = [
+            i for i, t in enumerate(terms)
+            if df[i] > 0 or t in whole_segments or len(t) != MIN_NGRAM or not CJK_RUN.fullmatch(t)
+        ]
+        if supported and len(supported) < len(terms):
+            terms = [terms[i] for i in supported]
+            tf, df = tf[supported], df[supported]
+    elif len(tokenized) >= 3:
+        doc_terms = [set(term for sentence in doc for term, _ in sentence) for doc in tokenized]
+        doc_count = len(doc_terms)
+        df = np.array([sum(1 for d in doc_terms if t in d) for t in terms], dtype=np.float64)
+    else:
+        doc_count, df = 0, np.zeros(len(terms))
+    idf = np.log((doc_count + 1) / (df + 1)) + 1.0
+
+    # 作为完整片段（两侧是停用字或标点）出现过的候选词更可能是真正的词
+    boundary = np.array([1.5 if t in whole_segments else 1.0 for t in terms])
+    length_prior = np.array([min(len(t), MAX_NGRAM) / MAX_NGRAM + 0.5 if CJK_RUN.fullmatch(t) else 1.0 for t in terms])
+    tfidf = tf * idf * boundary * length_prior
+
+    order = np.argsort(-tfidf)[:TEXTRANK_MAX_VOCAB]
+    vocab = {terms[i]: rank for rank, i in enumerate(order)}
+    textrank = _textrank(vocab, sentences)
+    scores = 0.5 * _normalize(tfidf[order]) + 0.5 * _normalize(textrank)
+
+    # 只出现一次的候选词噪声较大，仅在重复出现的词不足 MIN_REPEATED_KEYWORDS 个时才补充
+    ranked = [(terms[order[p]], float(scores[p])) for p in np.argsort(-scores)]
+    repeated = [item for item in ranked if candidates[item[0]] >= 2]
+    if len(repeated) >= MIN_REPEATED_KEYWORDS:
+        ranked = repeated
+
+    selected: List[Tuple[str, float]] = []
+    for term, score in ranked:
+        if any(term in chosen or chosen in term for chosen, _ in selected):
+            continue
+        selected.append((term, score))
+        if len(selected) >= top_k:
+            break
+
+    # 英文词项按小写统计，展示时还原为文中第一次出现的写法
+    display = {}
+    for doc in documents:
+        for match in _TOKEN.finditer(doc or ''):
+            display.setdefault(match.group(0).lower(), match.group(0))
+
+    peak = selected[0][1] if selected and selected[0][1] > 0 else 1.0
+    keywords = []
+    for i, (term, score) in enumerate(selected):
+        if i < 3:
+            category = "核心概念"
+        elif not CJK_RUN.fullmatch(term):
+            category = "技术术语"
+        else:
+            category = "相关术语"
+        keywords.append(KeywordTag(keyword=display.get(term, term), importance=round(min(max(score / peak, 0.1), 1.0), 2), category=category))
+    return keywords
@@ -0,0 +1,153 @@
+"""
+根据 Markdown 结构确定性地生成思维导图：标题构成主干，列表项和代码块挂在所属章节下。
+
+结构化的笔记（有多级标题或列表）无需调用LLM即可得到思维导图；
+LLM 也可以在这个骨架的基础上补充和润色，而不是从零生成。
+"""
+import json
+import re
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from generation.markdown_render import md_parser
+from schemas import MindMapNode
+from .keywords import extract_keywords_local
+
+MAX_LEVEL = 4  # 根节点为1级
+MAX_CHILDREN = 8
+MAX_NODE_TEXT = 30
+MIN_STRUCTURE_NODES = 3  # 来自标题/列表的节点少于该数量时认为内容没有可用结构
+MAX_KEYWORD_BRANCHES = 5
+
+_WIKILINK = re.compile(r'\[\[([^\]|#]+)(?:[^\]]*?\|([^\]]+))?[^\]]*\]\]')
+_MD_LINK = re.compile(r'!?\[([^\]]*)\]\([^)]*\)')
+_EMPHASIS = re.compile(r'(\*\*|__|\*|_|~~|`)')
+
+# (块类型, 文本, 说明)：代码块的说明是 caption 或语言，图片块的说明是 caption
+MindmapSource = Tuple[str, str, str]
+
+
+def _clean_text(text: str) -> str:
+    text = _WIKILINK.sub(lambda m: m.group(2) or m.group(1), text)
+    text = _MD_LINK.sub(lambda m: m.group(1), text)
+    text = _EMPHASIS.sub('', text)
+    text = ' '.join(text.split())
+    return text if len(text) <= MAX_NODE_TEXT else text[:MAX_NODE_TEXT - 1] + "…"
+
+
+class _MindmapBuilder:
+    def __init__(self, root_text: str):
+        self.nodes: Dict[str, MindMapNode] = {
+            "root": MindMapNode(id="root", text=root_text, level=1, children=[])
+        }
+        self.order: List[str] = ["root"]
+        self.structure_nodes = 0
+
+    def add(self, parent_id: str, text: str, structural: bool = True) -> Optional[str]:
+        parent = self.nodes[parent_id]
+        if not text or parent.level >= MAX_LEVEL or len(parent.children) >= MAX_CHILDREN:
+            return None
+        node_id = f"n{len(self.order)}"
+        self.nodes[node_id] = MindMapNode(id=node_id, text=text, level=parent.level + 1, parent_id=parent_id, children=[])
+        parent.children.append(node_id)
+        self.order.append(node_id)
+        if structural:
+            self.structure_nodes += 1
+        return node_id
+
+    def result(self) -> List[MindMapNode]:
+        return [self.nodes[node_id] for node_id in self.order]
+
+
+def _single_h1(parsed: Sequence[Optional[list]]) -> Optional[str]:
+    """整篇内容只有一个一级标题时，用它作为根节点。"""
+    titles = []
+    for tokens in parsed:
+        for i, token in enumerate(tokens or []):
+            if token.type == 'heading_open' and token.tag == 'h1':
+                titles.append(tokens[i + 1].content)
+    return titles[0] if len(titles) == 1 else None
+
+
+def build_structural_mindmap(sources: Sequence[MindmapSource], root_text: Optional[str] = None) -> Tuple[List[MindMapNode], bool]:
+    """
+    解析内容块的标题、列表和代码块，生成思维导图节点列表。
+
+    Returns:
+        (节点列表, 是否有足够的结构)。结构不足时节点列表只包含根节点和少量节点，
+        调用方可以改用其他方式生成。
+    """
+    parsed = [md_parser().parse(text) if kind == 'text' else None for kind, text, _ in sources]
+    h1_title = _single_h1(parsed)
+    if root_text is None:
+        root_text = h1_title
+    if root_text is None:
+        keywords = extract_keywords_local([text for _, text, _ in sources], top_k=1)
+        root_text = keywords[0].keyword if keywords else "内容结构"
+    builder = _MindmapBuilder(_clean_text(root_text))
+
+    # 标题栈：(标题级别, 节点ID)，根节点视为0级标题
+    heading_stack: List[Tuple[int, Optional[str]]] = [(0, "root")]
+    for (kind, text, label), tokens in zip(sources, parsed):
+        section_id = heading_stack[-1][1] or "root"
+        if kind == 'code':
+            builder.add(section_id, _clean_text(f"代码: {label}" if label else "代码示例"))
+            continue
+        if kind == 'image':
+            builder.add(section_id, _clean_text(f"图片: {label or text}" if (label or text) else "图片"), structural=False)
+            continue
+
+        list_parents: Dict[int, Optional[str]] = {}
+        list_depth = 0
+        pending_item = False
+        for i, token in enumerate(tokens):
+            if token.type == 'heading_open':
+                level = int(token.tag[1])
+                heading_text = tokens[i + 1].content
+                if level == 1 and h1_title is not None and heading_text == h1_title:
+                    continue
+                while heading_stack[-1][0] >= level:
+                    heading_stack.pop()
+                parent_id = heading_stack[-1][1]
+                node_id = builder.add(parent_id, _clean_text(heading_text)) if parent_id else None
+                heading_stack.append((level, node_id))
+                list_parents = {}
+            elif token.type == 'list_item_open':
+                list_depth += 1
+                pending_item = True
+            elif token.type == 'list_item_close':
+                list_depth -= 1
+            elif token.type == 'inline' and pending_item:
+                pending_item = False
+                parent_id = list_parents.get(list_depth - 1) if list_depth > 1 else heading_stack[-1][1]
+                list_parents[list_depth] = builder.add(parent_id, _clean_text(token.content)) if parent_id else None
+            elif token.type == 'fence':
+                parent_id = heading_stack[-1][1]
+                if parent_id:
+                    language = token.info.strip().split(' ')[0]
+                    builder.add(parent_id, f"代码: {language}" if language else "代码示例")
+
+    return builder.result(), builder.structure_nodes >= MIN_STRUCTURE_NODES
+
+
+def build_keyword_mindmap(sources: Sequence[MindmapSource]) -> List[MindMapNode]:
+    """没有可用结构时，以关键词为分支生成一个简单的两级思维导图。"""
+    keywords = extract_keywords_local([text for _, text, _ in sources], top_k=MAX_KEYWORD_BRANCHES + 1)
+    if not keywords:
+        return [MindMapNode(id="root", text="内容分析", level=1, children=[])]
+    builder = _MindmapBuilder(keywords[0].keyword)
+    for keyword in keywords[1:]:
+        builder.add("root", keyword.keyword)
+    return builder.result()
+
+
+def build_local_mindmap(sources: Sequence[MindmapSource]) -> List[MindMapNode]:
+    nodes, structured = build_structural_mindmap(sources)
+    return nodes if structured else build_keyword_mindmap(sources)
+
+
+def mindmap_skeleton_json(nodes: Sequence[MindMapNode]) -> str:
+    """把思维导图骨架序列化为提示词中使用的JSON。"""
+    return json.dumps(
+        [{"id": n.id, "text": n.text, "level": n.level, "parent_id": n.parent_id, "children": n.children} for n in nodes],
+        ensure_ascii=False
+    )
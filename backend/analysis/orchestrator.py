@@ -0,0 +1,184 @@
+"""
+内容分析编排：在融合模式（一次调用返回全部结果）、分阶段模式（每种分析类型一次调用）
+和本地模式（不调用LLM）之间选择并执行。
+"""
+import asyncio
+from typing import Any, Dict, List, Optional, Tuple
+
+from llm_providers.base_llm import BaseLLMProvider
+from observability.metrics import count_fallback, stage_timer
+from schemas import ContentAnalysisRequest, ContentAnalysisResponse
+from .content import block_label, block_text, block_source_text
+from .prompts import STAGE_PROMPT_BUILDERS, build_fused_prompt, build_mindmap_prompt
+from .parsing import STAGE_PARSERS, parse_fused_result
+from .fallbacks import extract_keywords_fallback, generate_mindmap_fallback, generate_summary_fallback
+from .keywords import extract_keywords_local
+from .mindmap import build_local_mindmap, build_structural_mindmap, mindmap_skeleton_json
+from .summary import summarize_local
+from .tokens import estimate_tokens
+from .batching import analysis_batcher
+
+ANALYSIS_MODEL = "gemini-2.5-flash"  # 默认模型；服务端按 ANALYSIS_LLM_MODEL / 分析提供者传入实际模型
+
+# 融合模式至少需要请求两种分析类型才能节省输入token
+FUSED_MIN_TYPES = 2
+# 超过该输入规模时改用分阶段模式：单次调用要串行生成全部输出，且一次解析失败会让所有类型都重新请求
+FUSED_MAX_INPUT_TOKENS = 32000
+
+ANALYSIS_ORDER = ["keywords", "mindmap", "summary"]
+
+_FALLBACKS = {
+    "keywords": extract_keywords_fallback,
+    "mindmap": generate_mindmap_fallback,
+    "summary": generate_summary_fallback,
+}
+
+
+def choose_analysis_mode(requested_mode: str, analysis_types: List[str], content: str) -> str:
+    """根据请求的模式、分析类型数量和内容规模决定实际使用 "fused"、"staged" 还是 "local"。"""
+    if requested_mode in ("fused", "staged", "local"):
+        return requested_mode
+    if len(set(analysis_types)) < FUSED_MIN_TYPES:
+        return "staged"
+    if estimate_tokens(content) > FUSED_MAX_INPUT_TOKENS:
+        return "staged"
+    return "fused"
+
+
+async def run_stage(
+    llm_provider: BaseLLMProvider,
+    analysis_type: str,
+    content: str,
+    mindmap_skeleton: Optional[str] = None,
+    model_name: str = ANALYSIS_MODEL
+) -> Any:
+    """执行单个分析阶段，解析失败时使用备用方案。"""
+    try:
+        if analysis_batcher.accepts(analysis_type, content):
+            # 小任务与其他请求的任务合并成一次调用，返回格式与单独调用相同
+            result = await analysis_batcher.submit(llm_provider, analysis_type, content, model_name)
+        else:
+            with stage_timer("prompt_build"):
+                if analysis_type == "mindmap":
+                    prompt = build_mindmap_prompt(content, mindmap_skeleton)
+                else:
+                    prompt = STAGE_PROMPT_BUILDERS[analysis_type](content)
+            result = await llm_provider.generate_simple_text(prompt=prompt, model_name=model_name)
+    except Exception as e:
+        print(f"Error generating {analysis_type}: {e}")
+        count_fallback(f"{analysis_type}_error")
+        # 与原有行为保持一致：思维导图使用备用方案，其余类型返回空结果
+        if analysis_type == "mindmap":
+            return await generate_mindmap_fallback("", content)
+        return [] if analysis_type == "keywords" else None
+
+    with stage_timer("json_parse"):
+        parsed = STAGE_PARSERS[analysis_type](result)
+    if parsed is None:
+        count_fallback(f"{analysis_type}_unparsable")
+        return await _FALLBACKS[analysis_type](result, content)
+    return parsed
+
+
+async def run_staged_analysis(
+    llm_provider: BaseLLMProvider,
+    analysis_types: List[str],
+    content: str,
+    mindmap_skeleton: Optional[str] = None,
+    model_name: str = ANALYSIS_MODEL
+) -> Dict[str, Any]:
+    """每种分析类型单独调用一次LLM，各阶段并发执行。"""
+    results = await asyncio.gather(*(run_stage(llm_provider, t, content, mindmap_skeleton, model_name) for t in analysis_types))
+    return dict(zip(analysis_types, results))
+
+
+async def run_fused_analysis(
+    llm_provider: BaseLLMProvider,
+    analysis_types: List[str],
+    content: str,
+    mindmap_skeleton: Optional[str] = None,
+    model_name: str = ANALYSIS_MODEL
+) -> Dict[str, Any]:
+    """
+    一次结构化输出调用返回全部请求的分析结果。
+    融合结果中缺失或无法解析的类型会退回到分阶段调用。
+    """
+    with stage_timer("prompt_build"):
+        prompt = build_fused_prompt(content, analysis_types, mindmap_skeleton)
+    results: Dict[str, Any] = {}
+    try:
+        fused_result = await llm_provider.generate_structured_text(prompt=prompt, model_name=model_name, json_object=True)
+        with stage_timer("json_parse"):
+            results = parse_fused_result(fused_result)
+    except Exception as e:
+        print(f"Error during fused analysis, falling back to staged calls: {e}")
+
+    missing = [t for t in analysis_types if t not in results]
+    if missing:
+        print(f"Fused analysis missing {missing}, running staged calls for them")
+        count_fallback("fused_to_staged", len(missing))
+        results.update(await run_staged_analysis(llm_provider, missing, content, mindmap_skeleton, model_name))
+    return results
+
+
+def mindmap_sources(request: ContentAnalysisRequest) -> List[Tuple[str, str, str]]:
+    return [(block.type, block_source_text(block), block_label(block)) for block in request.user_input.blocks]
+
+
+async def run_local_analysis(analysis_types: List[str], request: ContentAnalysisRequest, content: str) -> Dict[str, Any]:
+    """完全在本地完成的分析，不产生任何上游调用。"""
+    results: Dict[str, Any] = {}
+    if "keywords" in analysis_types:
+        documents = [block_text(block) for block in request.user_input.blocks]
+        # 首次使用库IDF时需要读取整个库，放到线程中执行以免阻塞事件循环
+        results["keywords"] = await asyncio.to_thread(extract_keywords_local, documents, 15, request.vault_path)
+    # 思维导图和摘要（LexRank）同样是 CPU 密集的计算，也放到线程中
+    if "mindmap" in analysis_types:
+        results["mindmap"] = await asyncio.to_thread(build_local_mindmap, mindmap_sources(request))
+    if "summary" in analysis_types:
+        # 摘要只从文本和图片说明中抽取句子，代码块不参与
+        documents = [
+            (i, block_source_text(block))
+            for i, block in enumerate(request.user_input.blocks)
+            if block.type != 'code'
+        ]
+        results["summary"] = await asyncio.to_thread(summarize_local, documents)
+    return results
+
+
+async def run_content_analysis(
+    llm_provider: BaseLLMProvider,
+    request: ContentAnalysisRequest,
+    combined_content: str,
+    model_name: str = ANALYSIS_MODEL
+) -> ContentAnalysisResponse:
+    analysis_types = [t for t in ANALYSIS_ORDER if t in request.analysis_types]
+    mode = choose_analysis_mode(request.mode, analysis_types, combined_content)
+    print(f"Content analysis mode: {mode} (requested: {request.mode}, types: {analysis_types})")
+
+    results: Dict[str, Any] = {}
+    mindmap_skeleton = None
+    if mode != "local" and "mindmap" in analysis_types:
+        # 有标题/列表结构的内容直接使用结构化思维导图；要求完善时把骨架交给LLM
+        skeleton, structured = await asyncio.to_thread(build_structural_mindmap, mindmap_sources(request))
+        if structured and request.mindmap_refine:
+            mindmap_skeleton = mindmap_skeleton_json(skeleton)
+        elif structured:
+            results["mindmap"] = skeleton
+            analysis_types = [t for t in analysis_types if t != "mindmap"]
+            # 没有剩余类型时整个请求都在本地完成
+            mode = choose_analysis_mode(request.mode, analysis_types, combined_content) if analysis_types else "local"
+            print(f"Using structural mindmap without LLM call, remaining types: {analysis_types}")
+
+    if mode == "local":
+        results.update(await run_local_analysis(analysis_types, request, combined_content))
+    elif mode == "fused":
+        results.update(await run_fused_analysis(llm_provider, analysis_types, combined_content, mindmap_skeleton, model_name))
+    else:
+        results.update(await run_staged_analysis(llm_provider, analysis_types, combined_content, mindmap_skeleton, model_name))
+
+    response_data = ContentAnalysisResponse(analysis_language=request.language, analysis_mode=mode)
+    response_data.keywords = results.get("keywords")
+    response_data.mindmap = results.get("mindmap")
+    response_data.summary = results.get("summary")
+    return response_data
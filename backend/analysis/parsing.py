@@ -0,0 +1,185 @@
+"""
+解析LLM返回的分析结果。
+
+每个 parse_* 函数在无法解析时返回 None，由调用方决定是否使用备用方案。
+"""
+import json
+import re
+from typing import Any, Dict, List, Optional
+
+from schemas import KeywordTag, MindMapNode, ContentSummary, ContentReference
+
+
+def keywords_from_data(keywords_data: Any) -> List[KeywordTag]:
+    keywords_list = []
+    for item in keywords_data or []:
+        if isinstance(item, dict) and all(k in item for k in ['keyword', 'importance', 'category']):
+            keywords_list.append(KeywordTag(
+                keyword=item['keyword'],
+                importance=min(max(float(item['importance']), 0.0), 1.0),
+                category=item['category']
+            ))
+    return keywords_list[:15]  # 限制最多15个关键词
+
+
+def mindmap_from_data(mindmap_data: Any) -> List[MindMapNode]:
+    mindmap_nodes = []
+    for item in mindmap_data or []:
+        if isinstance(item, dict) and all(k in item for k in ['id', 'text', 'level']):
+            mindmap_nodes.append(MindMapNode(
+                id=item['id'],
+                text=item['text'],
+                level=int(item['level']),
+                parent_id=item.get('parent_id'),
+                children=item.get('children', [])
+            ))
+    return mindmap_nodes
+
+
+def summary_from_data(summary_data: Dict[str, Any]) -> ContentSummary:
+    references = []
+    for ref in summary_data.get('references', []):
+        if isinstance(ref, dict) and 'source_text' in ref:
+            references.append(ContentReference(
+                source_block_index=ref.get('source_block_index', 0),
+                source_text=ref['source_text'],
+                reference_type=ref.get('reference_type', 'quote'),
+                start_position=ref.get('start_position'),
+                end_position=ref.get('end_position')
+            ))
+
+    return ContentSummary(
+        title=summary_data.get('title', '内容概要'),
+        summary=summary_data.get('summary', ''),
+        key_points=summary_data.get('key_points', []),
+        references=references
+    )
+
+
+def parse_keywords_result(keywords_result: str) -> Optional[List[KeywordTag]]:
+    # 清理响应，提取JSON部分
+    json_match = re.search(r'\[(.*?)\]', keywords_result, re.DOTALL)
+    if not json_match:
+        return None
+    json_str = '[' + json_match.group(1) + ']'
+    try:
+        return keywords_from_data(json.loads(json_str))
+    except (json.JSONDecodeError, ValueError, KeyError) as e:
+        print(f"Failed to parse keywords JSON: {e}")
+        return None
+
+
+def parse_mindmap_result(mindmap_result: str) -> Optional[List[MindMapNode]]:
+    # 尝试多种JSON提取方法
+    json_str = None
+
+    # 方法1: 提取完整的JSON数组 (贪婪匹配)
+    json_match = re.search(r'\[.*\]', mindmap_result, re.DOTALL)
+    if json_match:
+        json_str = json_match.group(0)
+    else:
+        # 方法2: 查找第一个[到最后一个]之间的内容
+        start_idx = mindmap_result.find('[')
+        end_idx = mindmap_result.rfind(']')
+        if start_idx != -1 and end_idx != -1 and end_idx > start_idx:
+            json_str = mindmap_result[start_idx:end_idx+1]
+
+    if not json_str:
+        print("No JSON array found in mindmap result")
+        return None
+
+    try:
+        mindmap_nodes = mindmap_from_data(json.loads(json_str.strip()))
+    except (json.JSONDecodeError, ValueError, KeyError) as e:
+        print(f"Failed to parse mindmap JSON: {e}")
+        print(f"JSON string that failed: {json_str}")
+        return None
+
+    if not mindmap_nodes:
+        print("No valid mindmap nodes found, using fallback")
+        return None
+    print(f"Successfully parsed {len(mindmap_nodes)} mindmap nodes")
+    return mindmap_nodes
+
+
+def parse_summary_result(summary_result: str) -> Optional[ContentSummary]:
+    json_match = re.search(r'\{.*\}', summary_result, re.DOTALL)
+    if not json_match:
+        return None
+    try:
+        return summary_from_data(json.loads(json_match.group(0)))
+    except (json.JSONDecodeError, ValueError, KeyError, AttributeError) as e:
+        print(f"Failed to parse summary JSON: {e}")
+        return None
+
+
+STAGE_PARSERS = {
+    "keywords": parse_keywords_result,
+    "mindmap": parse_mindmap_result,
+    "summary": parse_summary_result,
+}
+
+
+def parse_fused_result(fused_result: str) -> Dict[str, Any]:
+    """
+    解析融合模式的返回结果，返回 {分析类型: 解析后的模型}。
+    解析失败的类型不会出现在返回值中。
+    """
+    parsed: Dict[str, Any] = {}
+    start_idx = fused_result.find('{')
+    end_idx = fused_result.rfind('}')
+    if start_idx == -1 or end_idx <= start_idx:
+        print("No JSON object found in fused analysis result")
+        return parsed
+
+    try:
+        fused_data = json.loads(fused_result[start_idx:end_idx+1])
+    except json.JSONDecodeError as e:
+        print(f"Failed to parse fused analysis JSON: {e}")
+        return parsed
+    if not isinstance(fused_data, dict):
+        return parsed
+
+    converters = {
+        "keywords": keywords_from_data,
+        "mindmap": mindmap_from_data,
+        "summary": summary_from_data,
+    }
+    for analysis_type, convert in converters.items():
+        if analysis_type not in fused_data:
+            continue
+        try:
+            value = convert(fused_data[analysis_type])
+        except (ValueError, KeyError, TypeError, AttributeError) as e:
+            print(f"Failed to convert fused {analysis_type} result: {e}")
+            continue
+        if value:
+            parsed[analysis_type] = value
+    return parsed
+
+
+def parse_batch_result(batch_result: str, count: int) -> Dict[int, Any]:
+    """
+    解析微批处理的返回结果，返回 {任务下标(从0开始): 该任务的原始JSON数据}。
+    缺失或编号无效的任务不会出现在返回值中，由调用方单独重试。
+    """
+    start_idx = batch_result.find('[')
+    end_idx = batch_result.rfind(']')
+    if start_idx == -1 or end_idx <= start_idx:
+        print("No JSON array found in batched analysis result")
+        return {}
+    try:
+        items = json.loads(batch_result[start_idx:end_idx+1])
+    except json.JSONDecodeError as e:
+        print(f"Failed to parse batched analysis JSON: {e}")
+        return {}
+
+    parsed: Dict[int, Any] = {}
+    for item in items if isinstance(items, list) else []:
+        try:
+            index = int(item.get("item")) - 1
+        except (TypeError, ValueError, AttributeError):
+            continue
+        if 0 <= index < count and item.get("result") is not None:
+            parsed[index] = item["result"]
+    return parsed
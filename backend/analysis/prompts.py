@@ -0,0 +1,186 @@
+"""
+内容分析的提示词模板。
+
+分阶段模式下每种分析类型各自使用一个提示词；融合模式把所需的分析类型合并进同一个提示词，
+只发送一次 combined_content。
+"""
+from typing import List, Optional, Tuple
+
+
+KEYWORDS_TASK = "提取10-15个最重要的关键词，并按重要性排序。对每个关键词给出0-1的重要性评分（1为最重要），并将其分类（如：核心概念、技术方法、工具平台、设计理念、实现细节等）。"
+
+MINDMAP_TASK = (
+    "创建一个思维导图结构，包含主要概念和子概念的层级关系。要求：\n"
+    "   1) 识别一个核心主题作为根节点\n"
+    "   2) 创建2-4个主要分支（二级节点）\n"
+    "   3) 每个主要分支下可以有1-3个子节点（三级节点）\n"
+    "   4) 保持层级关系清晰"
+)
+
+SUMMARY_TASK = (
+    "生成一个详细的概要总结。要求：\n"
+    "   1) 提取一个简洁明确的标题（10字以内）\n"
+    "   2) 生成核心摘要（150-200字）\n"
+    "   3) 列出3-5个最重要的关键要点\n"
+    "   4) 为每个要点标注来源内容的引用"
+)
+
+KEYWORDS_FORMAT = """[
+  {"keyword": "关键词1", "importance": 0.9, "category": "核心概念"},
+  {"keyword": "关键词2", "importance": 0.8, "category": "技术方法"},
+  ...
+]"""
+
+MINDMAP_FORMAT = """[
+  {"id": "root", "text": "根节点主题", "level": 1, "parent_id": null, "children": ["node1", "node2", "node3"]},
+  {"id": "node1", "text": "主要概念1", "level": 2, "parent_id": "root", "children": ["node1_1", "node1_2"]},
+  {"id": "node1_1", "text": "子概念1-1", "level": 3, "parent_id": "node1", "children": []},
+  ...
+]"""
+
+SUMMARY_FORMAT = """{
+  "title": "内容标题",
+  "summary": "核心摘要内容...",
+  "key_points": ["要点1", "要点2", "要点3"],
+  "references": [
+    {"source_block_index": 0, "source_text": "引用的具体文本", "reference_type": "quote", "start_position": 0, "end_position": 50}
+  ]
+}"""
+
+_TASKS = {
+    "keywords": ("关键词", KEYWORDS_TASK, KEYWORDS_FORMAT),
+    "mindmap": ("思维导图", MINDMAP_TASK, MINDMAP_FORMAT),
+    "summary": ("内容概要", SUMMARY_TASK, SUMMARY_FORMAT),
+}
+
+
+def build_keywords_prompt(content: str) -> str:
+    return f"""
+请分析以下内容，{KEYWORDS_TASK}
+
+分析内容：
+{content}
+
+请严格按照以下JSON格式返回结果，不要添加任何其他文字：
+{KEYWORDS_FORMAT}
+"""
+
+
+def _skeleton_instruction(mindmap_skeleton: Optional[str]) -> str:
+    if not mindmap_skeleton:
+        return ""
+    return (
+        "\n以下是根据内容的标题和列表结构生成的思维导图骨架。请在此基础上完善：可以合并、改写或补充节点，"
+        f"但保持骨架的主要层级：\n{mindmap_skeleton}\n"
+    )
+
+
+def build_mindmap_prompt(content: str, mindmap_skeleton: Optional[str] = None) -> str:
+    return f"""
+请为以下内容{MINDMAP_TASK}
+{_skeleton_instruction(mindmap_skeleton)}
+分析内容：
+{content}
+
+请严格按照以下JSON格式返回思维导图结构，不要添加任何其他文字：
+{MINDMAP_FORMAT}
+"""
+
+
+def build_summary_prompt(content: str) -> str:
+    return f"""
+请为以下内容{SUMMARY_TASK}
+
+分析内容：
+{content}
+
+请严格按照以下JSON格式返回，不要添加任何其他文字：
+{SUMMARY_FORMAT}
+"""
+
+
+STAGE_PROMPT_BUILDERS = {
+    "keywords": build_keywords_prompt,
+    "mindmap": build_mindmap_prompt,
+    "summary": build_summary_prompt,
+}
+
+
+def build_fused_prompt(content: str, analysis_types: List[str], mindmap_skeleton: Optional[str] = None) -> str:
+    """构建融合模式的提示词：一次调用同时返回所有请求的分析结果。"""
+    task_lines = []
+    format_lines = []
+    for i, analysis_type in enumerate(analysis_types):
+        name, task, fmt = _TASKS[analysis_type]
+        task_lines.append(f"{i+1}. {name}（字段 \"{analysis_type}\"）：{task}")
+        format_lines.append(f'  "{analysis_type}": {fmt}')
+
+    tasks_text = "\n".join(task_lines)
+    format_text = ",\n".join(format_lines)
+    skeleton_text = _skeleton_instruction(mindmap_skeleton) if "mindmap" in analysis_types else ""
+    return f"""
+请对以下内容进行综合分析，一次性完成下列全部任务：
+{tasks_text}
+{skeleton_text}
+分析内容：
+{content}
+
+请严格按照以下JSON格式返回一个对象，只包含上面列出的字段，不要添加任何其他文字：
+{{
+{format_text}
+}}
+"""
+
+
+BLOCKS_FORMAT = """[
+  {"block": 1, "keywords": [{"keyword": "关键词", "importance": 0.9, "category": "核心概念"}], "summary": "一句话概要", "key_points": ["要点1"], "quote": "块中最能代表核心内容的原文句子"},
+  ...
+]"""
+
+
+def build_blocks_prompt(blocks: List[str]) -> str:
+    """构建逐块分析的提示词：一次调用分别返回每个内容块的关键词和概要。"""
+    blocks_text = "\n\n".join(f"--- 内容块 {i+1} ---\n{text}" for i, text in enumerate(blocks))
+    return f"""
+请分别分析下面的每个内容块（各块独立分析，不要混合不同块的内容）。对每个块：
+1. 提取3-8个关键词，给出0-1的重要性评分并分类（如：核心概念、技术方法、工具平台、设计理念、实现细节等）
+2. 用一句话（50字以内）概括该块
+3. 列出1-3个关键要点
+4. 从该块原文中逐字摘录一句最能代表核心内容的句子作为 quote
+
+{blocks_text}
+
+请严格按照以下JSON格式返回一个数组，每个内容块对应一个元素，"block" 为内容块编号，不要添加任何其他文字：
+{BLOCKS_FORMAT}
+"""
+
+
+BATCH_FORMAT = """[
+  {"item": 1, "result": <该任务要求的JSON结果>},
+  ...
+]"""
+
+
+def build_batch_prompt(items: List[Tuple[str, str]]) -> str:
+    """
+    构建微批处理的提示词：把来自不同请求的多个小分析任务 (分析类型, 内容) 合并成一次调用，
+    每个任务独立完成并按编号返回。
+    """
+    sections = []
+    for i, (analysis_type, content) in enumerate(items):
+        name, task, fmt = _TASKS[analysis_type]
+        sections.append(
+            f"--- 分析任务 {i+1}（{name}） ---\n"
+            f"任务：{task}\n"
+            f"结果格式：\n{fmt}\n"
+            f"分析内容：\n{content}"
+        )
+    items_text = "\n\n".join(sections)
+    return f"""
+下面有多个互相独立的分析任务，请分别完成每个任务（只使用该任务自己的分析内容，不要混合不同任务的内容）：
+
+{items_text}
+
+请严格按照以下JSON格式返回一个数组，每个任务对应一个元素，"item" 为任务编号，"result" 为该任务按其结果格式给出的JSON，不要添加任何其他文字：
+{BATCH_FORMAT}
+"""
@@ -0,0 +1,340 @@
+"""
+相关笔记检索：为当前内容块在 Obsidian 库中找出最相关的笔记，不调用任何LLM。
+
+每篇笔记表示为一个 VECTOR_DIM 维的向量：切分方式与关键词提取相同（汉字二元组 + 英文单词），
+词项权重为 (1 + log tf) × idf（idf 来自库的文档频率表），再用带符号的特征哈希投影到固定维度并做L2归一化。
+查询时对内容块做同样的投影，与全部笔记向量做一次矩阵乘法取 top-k。
+
+向量矩阵以 float32 追加写入磁盘文件并内存映射：多个工作进程共享同一份页缓存，重启后无需重建。
+笔记变化时只为新增或修改的笔记追加新行，旧行作废；作废行多于有效行时压缩到新文件。
+元数据（路径 -> 行号、修改时间、大小）保存在旁边的 JSON 文件中，更新时持有文件锁，
+其他进程在元数据变化后重新映射。库的笔记数量相对上次全量构建变化超过 REBUILD_DRIFT 时，
+idf 已明显漂移，全部重新计算。
+
+检索到的笔记和链接图中的邻居笔记（vault/links.py）都通过 note_context_blocks 在token预算内
+作为附加内容块交给生成流程。
+
+环境变量：
+    VECTOR_INDEX_DIR  向量文件目录（默认 backend/.cache/vectors）
+"""
+import hashlib
+import json
+import math
+import os
+import threading
+import time
+from collections import Counter
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from schemas import ContentBlockItem, TextBlock
+from vault.index import VaultIndex, get_vault_index
+from vault.links import get_link_graph
+from .content import block_text
+from .keywords import CJK_RUN, MIN_NGRAM, VaultTermStatistics, get_vault_term_statistics, term_bucket, tokenize
+from .tokens import estimate_tokens
+
+VECTOR_DIM = 1024  # 必须整除 keywords.IDF_HASH_BUCKETS：维度取哈希桶的低位，符号取其上一位
+REBUILD_DRIFT = 0.25
+DUPLICATE_SCORE = 0.95  # 与内容块几乎相同的笔记（多半就是粘贴进来的那篇）不作为相关笔记返回
+MIN_CONTEXT_TOKENS = 100  # 剩余预算不足以容纳有意义的片段时停止附加
+
+VECTOR_INDEX_DIR = Path(os.getenv("VECTOR_INDEX_DIR", str(Path(__file__).resolve().parent.parent / ".cache" / "vectors")))
+
+
+@dataclass
+class RelatedNoteHit:
+    path: str
+    score: float
+
+
+def _note_terms(text: str) -> Counter:
+    return Counter(
+        term
+        for occurrences in tokenize(text)
+        for term, _ in occurrences
+        if len(term) == MIN_NGRAM or not CJK_RUN.fullmatch(term)
+    )
+
+
+def embed_text(text: str, stats: Optional[VaultTermStatistics]) -> np.ndarray:
+    """文本的归一化哈希向量；stats 为 None 时不做 idf 加权。"""
+    vector = np.zeros(VECTOR_DIM, dtype=np.float32)
+    counts = _note_terms(text)
+    if not counts:
+        return vector
+    buckets = np.fromiter((term_bucket(t) for t in counts), dtype=np.int64, count=len(counts))
+    weights = 1.0 + np.log(np.fromiter(counts.values(), dtype=np.float64, count=len(counts)))
+    if stats is not None:
+        total = len(stats.note_buckets)
+        weights *= np.log((total + 1) / (stats.df[buckets] + 1.0)) + 1.0
+    signs = np.where((buckets // VECTOR_DIM) & 1, -1.0, 1.0)
+    vector += np.bincount(buckets % VECTOR_DIM, weights=weights * signs, minlength=VECTOR_DIM).astype(np.float32)
+    norm = float(np.linalg.norm(vector))
+    return vector / norm if norm > 0 else vector
+
+
+class _FileLock:
+    """跨进程互斥（POSIX flock）；没有 fcntl 的平台上只在进程内互斥。"""
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.fd: Optional[int] = None
+
+    def __enter__(self):
+        self.fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            import fcntl
+            fcntl.flock(self.fd, fcntl.LOCK_EX)
+        except ImportError:
+            pass
+        return self
+
+    def __exit__(self, *exc_info):
+        os.close(self.fd)  # 关闭文件描述符即释放 flock
+        self.fd = None
+
+
+class RelatedNotesIndex:
+    def __init__(self, index: VaultIndex, directory: Optional[Path] = None):
+        self.index = index
+        self.directory = (directory or VECTOR_INDEX_DIR) / hashlib.sha1(str(index.vault_path).encode("utf-8")).hexdigest()[:16]
+        self.meta_path = self.directory / "meta.json"
+        self.meta: Dict = {}
+        self.meta_mtime_ns = 0
+        self.matrix: Optional[np.ndarray] = None
+        self.live_rows = np.zeros(0, dtype=np.int64)
+        self.live_paths: List[str] = []
+        self.version = -1
+        self._lock = threading.Lock()
+
+    # --- 磁盘上的矩阵与元数据 ---
+
+    def _vectors_path(self, generation: int) -> Path:
+        return self.directory / f"vectors-{generation}.f32"
+
+    def _empty_meta(self, generation: int) -> Dict:
+        return {"vault": str(self.index.vault_path), "dim": VECTOR_DIM, "generation": generation, "rows": 0, "notes": {}, "built_notes": 0}
+
+    def _load_meta(self) -> None:
+        """元数据文件在磁盘上变化（本进程或其他进程更新）后重新读取并重新映射矩阵。"""
+        for _ in range(3):
+            try:
+                self._read_meta()
+                return
+            except FileNotFoundError:
+                # 读取元数据之后、映射之前，另一个进程压缩出了新一代文件并删除了旧文件
+                self.meta_mtime_ns = 0
+        raise RuntimeError(f"Vector index at {self.directory} keeps changing underneath")
+
+    def _read_meta(self) -> None:
+        try:
+            mtime_ns = self.meta_path.stat().st_mtime_ns
+        except FileNotFoundError:
+            if not self.meta:
+                self.meta = self._empty_meta(0)
+                self._map()
+            return
+        if mtime_ns == self.meta_mtime_ns:
+            return
+        try:
+            meta = json.loads(self.meta_path.read_text(encoding="utf-8"))
+        except (OSError, ValueError) as e:
+            print(f"WARNING: Ignoring unreadable vector index metadata {self.meta_path}: {e}")
+            meta = None
+        if meta is None or meta.get("dim") != VECTOR_DIM:
+            meta = self._empty_meta(int(meta.get("generation", 0)) + 1 if meta else 0)
+        self.meta = meta
+        self.meta_mtime_ns = mtime_ns
+        self._map()
+
+    def _map(self) -> None:
+        rows = self.meta["rows"]
+        path = self._vectors_path(self.meta["generation"])
+        self.matrix = np.memmap(path, dtype=np.float32, mode="r", shape=(rows, VECTOR_DIM)) if rows else None
+        notes = self.meta["notes"]
+        self.live_paths = list(notes)
+        self.live_rows = np.fromiter((notes[p][0] for p in self.live_paths), dtype=np.int64, count=len(self.live_paths))
+
+    def _save_meta(self) -> None:
+        temp = self.meta_path.with_name(f".meta.{os.getpid()}.tmp")
+        temp.write_text(json.dumps(self.meta, ensure_ascii=False), encoding="utf-8")
+        os.replace(temp, self.meta_path)
+        self.meta_mtime_ns = self.meta_path.stat().st_mtime_ns
+
+    def _append(self, vectors: np.ndarray) -> int:
+        """把向量追加到当前矩阵文件末尾，返回第一行的行号。"""
+        first = self.meta["rows"]
+        with open(self._vectors_path(self.meta["generation"]), "ab") as f:
+            f.truncate(first * VECTOR_DIM * 4)  # 丢弃上次中断的更新留下的、元数据未记录的行
+            f.write(np.ascontiguousarray(vectors, dtype=np.float32).tobytes())
+        self.meta["rows"] = first + len(vectors)
+        return first
+
+    def _start_generation(self, keep: Dict[str, list]) -> None:
+        """把仍然有效的行复制到新一代文件（不重新计算向量），旧文件在其他进程重新映射前依然可读。"""
+        old_generation = self.meta["generation"]
+        old_matrix = self.matrix
+        meta = self._empty_meta(old_generation + 1)
+        meta["built_notes"] = self.meta.get("built_notes", 0)
+        self.meta = meta
+        self._vectors_path(meta["generation"]).unlink(missing_ok=True)
+        if keep and old_matrix is not None:
+            paths = list(keep)
+            first = self._append(old_matrix[[keep[p][0] for p in paths]])
+            meta["notes"] = {p: [first + i, *keep[p][1:]] for i, p in enumerate(paths)}
+        else:
+            open(self._vectors_path(meta["generation"]), "wb").close()
+        for stale in self.directory.glob("vectors-*.f32"):
+            if stale.name != self._vectors_path(meta["generation"]).name:
+                stale.unlink(missing_ok=True)
+
+    # --- 增量更新与查询 ---
+
+    def update(self) -> None:
+        with self._lock:
+            if self.version == self.index.version and self.meta:
+                self._load_meta()
+                return
+            self.directory.mkdir(parents=True, exist_ok=True)
+            with _FileLock(self.directory / "lock"):
+                self._load_meta()
+                self._update_locked()
+            self.version = self.index.version
+
+    def _update_locked(self) -> None:
+        start = time.perf_counter()
+        current = dict(self.index.notes)
+        indexed: Dict[str, list] = self.meta["notes"]
+        built = self.meta.get("built_notes", 0)
+        rebuild = abs(len(current) - built) > REBUILD_DRIFT * max(built, 1)
+        if rebuild:
+            changed = list(current)
+            self._start_generation({})
+            self.meta["built_notes"] = len(current)
+        else:
+            changed = [p for p, e in current.items() if indexed.get(p, [None, None, None])[1:] != [e.mtime, e.size]]
+            removed = [p for p in indexed if p not in current]
+            if not changed and not removed:
+                return
+            keep = {p: v for p, v in indexed.items() if p in current and p not in changed}
+            dead = self.meta["rows"] - len(keep)
+            if dead > max(len(keep), 64):
+                self._start_generation(keep)
+            else:
+                self.meta["notes"] = keep
+
+        stats = get_vault_term_statistics(str(self.index.vault_path))
+        paths, vectors = [], []
+        for path in changed:
+            text = self.index.read_note(path)
+            if text is None:
+                continue
+            paths.append(path)
+            vectors.append(embed_text(text, stats))
+        if vectors:
+            first = self._append(np.vstack(vectors))
+            for i, path in enumerate(paths):
+                entry = current[path]
+                self.meta["notes"][path] = [first + i, entry.mtime, entry.size]
+        self._save_meta()
+        self._map()
+        print(f"INFO: Related-notes index updated for {self.index.vault_path} ({len(paths)} embedded{', full rebuild' if rebuild else ''}, {len(self.live_paths)} notes, {(time.perf_counter() - start) * 1000:.0f}ms)")
+
+    def search(self, text: str, top_k: int = 5, min_score: float = 0.05, exclude: Sequence[str] = ()) -> List[RelatedNoteHit]:
+        self.update()
+        matrix, live_rows, live_paths = self.matrix, self.live_rows, self.live_paths
+        if matrix is None or not live_paths:
+            return []
+        query = embed_text(text, get_vault_term_statistics(str(self.index.vault_path)))
+        if not query.any():
+            return []
+        scores = (matrix @ query)[live_rows]
+        excluded = set(exclude)
+        candidates = min(len(scores), top_k + len(excluded) + 8)
+        top = np.argpartition(-scores, candidates - 1)[:candidates]
+        hits = []
+        for i in top[np.argsort(-scores[top])]:
+            score = float(scores[i])
+            if score < min_score or len(hits) >= top_k:
+                break
+            if score >= DUPLICATE_SCORE or live_paths[i] in excluded:
+                continue
+            hits.append(RelatedNoteHit(live_paths[i], score))
+        return hits
+
+
+_related_indexes: Dict[str, RelatedNotesIndex] = {}
+_related_indexes_lock = threading.Lock()
+
+
+def get_related_notes_index(vault_path: str) -> RelatedNotesIndex:
+    index = get_vault_index(vault_path)
+    if not index.vault_path.is_dir():
+        raise FileNotFoundError(f"Vault path not found: {vault_path}")
+    with _related_indexes_lock:
+        related = _related_indexes.get(str(index.vault_path))
+        if related is None:
+            related = RelatedNotesIndex(index)
+            _related_indexes[str(index.vault_path)] = related
+    return related
+
+
+def blocks_query_text(blocks: Sequence[ContentBlockItem]) -> str:
+    return "\n".join(block_text(block) for block in blocks)
+
+
+def find_related_notes(
+    vault_path: str, blocks: Sequence[ContentBlockItem], top_k: int = 5, min_score: float = 0.05, exclude: Sequence[str] = ()
+) -> List[RelatedNoteHit]:
+    return get_related_notes_index(vault_path).search(blocks_query_text(blocks), top_k, min_score, exclude)
+
+
+def note_context_blocks(index: VaultIndex, paths: Sequence[str], token_budget: int, description: str) -> List[TextBlock]:
+    """
+    把笔记转换为附加的文本块，按给定顺序依次加入，总token数不超过 token_budget；
+    放不下的笔记截断到剩余预算。
+    """
+    added: List[TextBlock] = []
+    remaining = token_budget
+    for path in paths:
+        if remaining < MIN_CONTEXT_TOKENS:
+            break
+        text = index.read_note(path)
+        if not text:
+            continue
+        header = f"{description} ({path}), for background only:\n\n"
+        tokens = estimate_tokens(header + text)
+        if tokens > remaining:
+            # 按token密度估算可保留的字符数
+            text = text[:max(0, math.floor(len(text) * (remaining - estimate_tokens(header)) / tokens))].rstrip() + "\n…"
+            tokens = estimate_tokens(header + text)
+        added.append(TextBlock(content=header + text))
+        remaining -= tokens
+    if added:
+        print(f"INFO: Attached {len(added)} vault notes as context ({token_budget - remaining} tokens of {token_budget})")
+    return added
+
+
+def related_note_blocks(
+    vault_path: str, blocks: Sequence[ContentBlockItem], top_k: int = 5, token_budget: int = 2000, min_score: float = 0.05
+) -> List[TextBlock]:
+    """与内容块最相关的笔记，按相关度依次作为附加文本块。"""
+    related = get_related_notes_index(vault_path)
+    hits = related.search(blocks_query_text(blocks), top_k, min_score)
+    return note_context_blocks(related.index, [hit.path for hit in hits], token_budget, "Related note from the user's Obsidian vault")
+
+
+def linked_note_blocks(
+    vault_path: str, paths: Sequence[str], depth: int = 1, direction: str = "both",
+    max_notes: int = 10, token_budget: int = 2000, include_seeds: bool = False
+) -> List[TextBlock]:
+    """给定笔记在链接图中 depth 步以内的邻居，按距离由近到远作为附加文本块。"""
+    graph = get_link_graph(vault_path)
+    seeds = [found for found in (graph.find_note(p) for p in paths) if found]
+    distances, _ = graph.neighborhood(seeds, depth, direction, max_notes + len(seeds))
+    ordered = [p for p, d in distances.items() if include_seeds or d > 0][:max_notes]
+    return note_context_blocks(graph.index, ordered, token_budget, "Note linked in the user's Obsidian vault")
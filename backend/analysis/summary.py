@@ -0,0 +1,167 @@
+"""
+本地抽取式摘要：把各内容块切成句子，用句子间的余弦相似度建图并做 LexRank 排序，
+选出排名靠前的句子组成摘要和关键要点，引用中的块索引和字符偏移指向原始内容块。
+
+不调用LLM，可作为LLM摘要返回前的即时预览，也可以单独作为零成本的摘要模式。
+"""
+import re
+from dataclasses import dataclass
+from typing import Dict, List, Sequence, Tuple
+
+import numpy as np
+
+from schemas import ContentSummary, ContentReference
+from .graph_rank import pagerank
+from .keywords import MIN_NGRAM, CJK_RUN, extract_keywords_local, tokenize
+from .tokens import estimate_tokens
+
+SUMMARY_TARGET_TOKENS = 200
+MAX_KEY_POINTS = 5
+MIN_KEY_POINTS = 3
+KEY_POINT_MAX_CHARS = 80
+REDUNDANCY_THRESHOLD = 0.7  # 与已选句子的相似度超过该值时视为重复
+LEAD_BONUS = 1.15  # 每个块第一句的位置加权
+MIN_SENTENCE_CHARS = 6
+
+_SENTENCE = re.compile(r'[^。！？!?]+?(?:[。！？!?]+|\.(?=\s|$)|$)')
+_LIST_MARKER = re.compile(r'^\s*(?:[-*+]|\d+[.)])\s+')
+_HEADING = re.compile(r'^\s{0,3}#{1,6}\s+(.*?)\s*#*\s*$')
+
+
+@dataclass
+class Sentence:
+    block_index: int
+    text: str
+    start: int  # 在块原文中的起始偏移
+    end: int
+
+
+def split_sentences(block_index: int, text: str) -> List[Sentence]:
+    """按行切分块原文（跳过标题和代码围栏），再把每行切成句子，保留原文偏移。"""
+    sentences = []
+    offset = 0
+    in_fence = False
+    for line in text.splitlines(keepends=True):
+        line_start = offset
+        offset += len(line)
+        stripped = line.strip()
+        if stripped.startswith("```") or stripped.startswith("~~~"):
+            in_fence = not in_fence
+            continue
+        if in_fence or not stripped or _HEADING.match(line):
+            continue
+
+        marker = _LIST_MARKER.match(line)
+        body_start = marker.end() if marker else 0
+        for match in _SENTENCE.finditer(line, body_start):
+            raw = match.group(0)
+            leading = len(raw) - len(raw.lstrip())
+            sentence_text = raw.strip()
+            if len(sentence_text) < MIN_SENTENCE_CHARS:
+                continue
+            start = line_start + match.start() + leading
+            sentences.append(Sentence(block_index, sentence_text, start, start + len(sentence_text)))
+    return sentences
+
+
+def _first_heading(documents: Sequence[Tuple[int, str]]) -> str:
+    for _, text in documents:
+        for line in text.splitlines():
+            heading = _HEADING.match(line)
+            if heading and heading.group(1).strip():
+                return heading.group(1).strip()
+    return ""
+
+
+def _sentence_vectors(sentences: Sequence[Sentence]) -> np.ndarray:
+    """以二元组和英文单词为特征的句子TF向量，按行做L2归一化。"""
+    vocab: Dict[str, int] = {}
+    rows, cols = [], []
+    for row, sentence in enumerate(sentences):
+        for occurrences in tokenize(sentence.text):
+            for term, _ in occurrences:
+                if CJK_RUN.fullmatch(term) and len(term) != MIN_NGRAM:
+                    continue
+                rows.append(row)
+                cols.append(vocab.setdefault(term, len(vocab)))
+    matrix = np.zeros((len(sentences), max(len(vocab), 1)), dtype=np.float64)
+    if rows:
+        np.add.at(matrix, (np.array(rows), np.array(cols)), 1.0)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return np.divide(matrix, norms, out=np.zeros_like(matrix), where=norms > 0)
+
+
+def _shorten(text: str, limit: int = KEY_POINT_MAX_CHARS) -> str:
+    return text if len(text) <= limit else text[:limit - 1] + "…"
+
+
+def summarize_local(documents: Sequence[Tuple[int, str]]) -> ContentSummary:
+    """
+    对 (块索引, 块原文) 列表生成抽取式摘要。
+
+    Args:
+        documents: 块索引从0开始，偏移量相对于块原文计算。
+
+    Returns:
+        ContentSummary，references 与 key_points 一一对应。
+    """
+    sentences = [s for block_index, text in documents for s in split_sentences(block_index, text)]
+    title = _first_heading(documents)
+    if not title:
+        keywords = extract_keywords_local([text for _, text in documents], top_k=1)
+        title = keywords[0].keyword if keywords else "内容概要"
+
+    if not sentences:
+        return ContentSummary(title=_shorten(title, 20), summary="", key_points=[], references=[])
+
+    vectors = _sentence_vectors(sentences)
+    similarity = vectors @ vectors.T
+    np.fill_diagonal(similarity, 0.0)
+    scores = pagerank(similarity)
+
+    lead = np.ones(len(sentences))
+    seen_blocks = set()
+    for position, sentence in enumerate(sentences):
+        if sentence.block_index not in seen_blocks:
+            seen_blocks.add(sentence.block_index)
+            lead[position] = LEAD_BONUS
+    scores = scores * lead
+
+    selected: List[int] = []
+    summary_tokens = 0
+    for position in np.argsort(-scores):
+        if selected and similarity[position, selected].max() > REDUNDANCY_THRESHOLD:
+            continue
+        if summary_tokens >= SUMMARY_TARGET_TOKENS and len(selected) >= MIN_KEY_POINTS:
+            break
+        selected.append(int(position))
+        summary_tokens += estimate_tokens(sentences[position].text)
+
+    # 摘要按原文顺序拼接，关键要点按重要性排序
+    in_order = sorted(selected, key=lambda p: (sentences[p].block_index, sentences[p].start))
+    summary_text = ""
+    for p in in_order:
+        # 中文句末标点后直接拼接，其余句子之间补一个空格
+        if summary_text and summary_text[-1] not in "。！？；":
+            summary_text += " "
+        summary_text += sentences[p].text
+
+    key_positions = selected[:MAX_KEY_POINTS]
+    key_points = [_shorten(sentences[p].text) for p in key_positions]
+    references = [
+        ContentReference(
+            source_block_index=sentences[p].block_index,
+            source_text=sentences[p].text,
+            reference_type="quote",
+            start_position=sentences[p].start,
+            end_position=sentences[p].end
+        )
+        for p in key_positions
+    ]
+
+    return ContentSummary(
+        title=_shorten(title, 20),
+        summary=summary_text,
+        key_points=key_points,
+        references=references
+    )
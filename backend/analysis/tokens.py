@@ -0,0 +1,17 @@
+"""
+不依赖分词器的token数量估算，用于在调用LLM之前做模式选择和预算控制。
+"""
+import re
+
+_CJK_CHAR_PATTERN = re.compile(r'[぀-ヿ㐀-䶿一-鿿가-힯豈-﫿]')
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    粗略估算文本的token数量：CJK字符约1个token/字，其余文本约4个字符/token。
+    """
+    if not text:
+        return 0
+    cjk_count = len(_CJK_CHAR_PATTERN.findall(text))
+    other_count = len(text) - cjk_count
+    return cjk_count + (other_count + 3) // 4
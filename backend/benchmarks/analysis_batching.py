@@ -0,0 +1,97 @@
+"""
+比较开启与关闭跨请求微批处理时，大量并发的小型关键词/概要请求产生的上游调用次数和延迟。
+
+使用模拟提供者（延迟按输入/输出token数线性增长），不会产生API费用：
+    uv run python -m benchmarks.analysis_batching
+    uv run python -m benchmarks.analysis_batching --requests 64 --window-ms 20
+"""
+import argparse
+import asyncio
+import time
+from typing import Dict, List
+
+import numpy as np
+
+from analysis import orchestrator
+from analysis.batching import AnalysisBatcher
+from llm_providers.stub_llm import StubLLMProvider
+from .analysis_modes import TokenCountingProvider
+
+
+class SimulatedStubProvider(StubLLMProvider):
+    """桩提供者的响应 + 按token数计算的延迟：首token延迟 + 输入预填充 + 逐token输出。"""
+
+    def __init__(self, base_latency: float = 0.3, input_tokens_per_sec: float = 20000, output_tokens_per_sec: float = 150):
+        super().__init__(latency_ms=0, jitter_ms=0, error_rate=0)
+        self.base_latency = base_latency
+        self.input_tokens_per_sec = input_tokens_per_sec
+        self.output_tokens_per_sec = output_tokens_per_sec
+
+    async def generate_simple_text(self, prompt: str, model_name: str = "stub") -> str:
+        output = self.respond(prompt)
+        delay = (
+            self.base_latency
+            + orchestrator.estimate_tokens(prompt) / self.input_tokens_per_sec
+            + orchestrator.estimate_tokens(output) / self.output_tokens_per_sec
+        )
+        await asyncio.sleep(delay)
+        return output
+
+
+def small_inputs(count: int) -> List[str]:
+    paragraph = "在知识管理系统中，笔记之间的双向链接帮助我们发现概念之间的关联，而定期回顾则能够巩固记忆并产生新的想法。"
+    return [f"文本块 1: 第{i}条笔记。{paragraph * (1 + i % 3)}" for i in range(count)]
+
+
+async def measure(batcher: AnalysisBatcher, requests: int) -> Dict[str, float]:
+    orchestrator.analysis_batcher = batcher
+    provider = TokenCountingProvider(SimulatedStubProvider())
+    inputs = small_inputs(requests)
+    latencies: List[float] = []
+
+    async def one_request(i: int) -> None:
+        start = time.perf_counter()
+        analysis_type = "keywords" if i % 2 == 0 else "summary"
+        await orchestrator.run_stage(provider, analysis_type, inputs[i])
+        latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one_request(i) for i in range(requests)))
+    elapsed = time.perf_counter() - start
+    return {
+        "calls": provider.calls,
+        "input_tokens": provider.input_tokens,
+        "output_tokens": provider.output_tokens,
+        "p50_s": round(float(np.percentile(latencies, 50)), 3),
+        "p95_s": round(float(np.percentile(latencies, 95)), 3),
+        "wall_s": round(elapsed, 3),
+    }
+
+
+async def main(requests: int, window_ms: float, max_items: int) -> List[Dict]:
+    rows = []
+    for name, batcher in (
+        ("off", AnalysisBatcher(window_ms=0)),
+        (f"{window_ms:g}ms", AnalysisBatcher(window_ms=window_ms, max_items=max_items)),
+    ):
+        rows.append({"batching": name, **await measure(batcher, requests)})
+
+    header = f"{'batching':<10}{'calls':>7}{'in_tok':>9}{'out_tok':>9}{'p50_s':>8}{'p95_s':>8}{'wall_s':>8}"
+    print(f"{requests} concurrent small analysis requests")
+    print(header)
+    print("-" * len(header))
+    for row in rows:
+        print(
+            f"{row['batching']:<10}{row['calls']:>7}{row['input_tokens']:>9}{row['output_tokens']:>9}"
+            f"{row['p50_s']:>8}{row['p95_s']:>8}{row['wall_s']:>8}"
+        )
+    return rows
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=32, help="并发请求数")
+    parser.add_argument("--window-ms", type=float, default=10, help="批处理收集窗口（毫秒）")
+    parser.add_argument("--max-items", type=int, default=8, help="每批最多任务数")
+    args = parser.parse_args()
+    asyncio.run(main(args.requests, args.window_ms, args.max_items))
@@ -0,0 +1,150 @@
+"""
+比较内容分析的融合模式与分阶段模式的token消耗和延迟。
+
+默认使用模拟提供者（延迟按输入/输出token数线性增长），不会产生API费用：
+    uv run python -m benchmarks.analysis_modes
+设置 GOOGLE_API_KEY 后可加 --live 使用真实的 Gemini 调用：
+    uv run python -m benchmarks.analysis_modes --live
+"""
+import argparse
+import asyncio
+import json
+import time
+from typing import Dict, List
+
+from llm_providers.base_llm import BaseLLMProvider
+from analysis.orchestrator import run_fused_analysis, run_staged_analysis
+from analysis.tokens import estimate_tokens
+
+ANALYSIS_TYPES = ["keywords", "mindmap", "summary"]
+
+_KEYWORDS_JSON = [{"keyword": f"关键词{i}", "importance": round(1 - i * 0.05, 2), "category": "核心概念"} for i in range(12)]
+_MINDMAP_JSON = [{"id": "root", "text": "主题", "level": 1, "parent_id": None, "children": ["n1", "n2", "n3"]}] + [
+    {"id": f"n{i}", "text": f"概念{i}", "level": 2, "parent_id": "root", "children": []} for i in range(1, 4)
+]
+_SUMMARY_JSON = {
+    "title": "内容标题",
+    "summary": "这是一段用于基准测试的模拟摘要。" * 10,
+    "key_points": ["要点一", "要点二", "要点三"],
+    "references": [{"source_block_index": 0, "source_text": "引用文本", "reference_type": "quote"}],
+}
+
+
+class SimulatedLLMProvider(BaseLLMProvider):
+    """按token数模拟上游延迟的提供者：首token延迟 + 输入预填充 + 逐token输出。"""
+
+    def __init__(self, base_latency: float = 0.3, input_tokens_per_sec: float = 20000, output_tokens_per_sec: float = 150):
+        self.base_latency = base_latency
+        self.input_tokens_per_sec = input_tokens_per_sec
+        self.output_tokens_per_sec = output_tokens_per_sec
+
+    async def generate_content_from_blocks(self, user_input, llm_selection, output_preferences=None):
+        raise NotImplementedError
+
+    async def generate_simple_text(self, prompt: str, model_name: str = "default") -> str:
+        if "综合分析" in prompt:
+            payload = {}
+            if '字段 "keywords"' in prompt:
+                payload["keywords"] = _KEYWORDS_JSON
+            if '字段 "mindmap"' in prompt:
+                payload["mindmap"] = _MINDMAP_JSON
+            if '字段 "summary"' in prompt:
+                payload["summary"] = _SUMMARY_JSON
+        elif '"keyword"' in prompt:
+            payload = _KEYWORDS_JSON
+        elif '"level"' in prompt:
+            payload = _MINDMAP_JSON
+        else:
+            payload = _SUMMARY_JSON
+        output = json.dumps(payload, ensure_ascii=False)
+        delay = (
+            self.base_latency
+            + estimate_tokens(prompt) / self.input_tokens_per_sec
+            + estimate_tokens(output) / self.output_tokens_per_sec
+        )
+        await asyncio.sleep(delay)
+        return output
+
+
+class TokenCountingProvider(BaseLLMProvider):
+    """包装任意提供者，统计每次调用的估算输入/输出token。"""
+
+    def __init__(self, inner: BaseLLMProvider):
+        self.inner = inner
+        self.calls = 0
+        self.input_tokens = 0
+        self.output_tokens = 0
+
+    async def generate_content_from_blocks(self, user_input, llm_selection, output_preferences=None):
+        return await self.inner.generate_content_from_blocks(user_input, llm_selection, output_preferences)
+
+    async def generate_simple_text(self, prompt: str, model_name: str = "default") -> str:
+        return self._count(prompt, await self.inner.generate_simple_text(prompt=prompt, model_name=model_name))
+
+    async def generate_structured_text(self, prompt: str, model_name: str = "default", json_object: bool = False) -> str:
+        return self._count(prompt, await self.inner.generate_structured_text(prompt=prompt, model_name=model_name, json_object=json_object))
+
+    def _count(self, prompt: str, output: str) -> str:
+        self.calls += 1
+        self.input_tokens += estimate_tokens(prompt)
+        self.output_tokens += estimate_tokens(output)
+        return output
+
+
+def representative_inputs() -> Dict[str, str]:
+    paragraph_zh = "在知识管理系统中，笔记之间的双向链接帮助我们发现概念之间的关联，而定期回顾则能够巩固记忆并产生新的想法。"
+    paragraph_en = "Retrieval practice and spaced repetition turn scattered notes into durable knowledge. "
+    code = "def build_index(notes):\n    return {n.title: n for n in notes}\n"
+    return {
+        "short_zh": f"文本块 1: {paragraph_zh * 2}",
+        "medium_mixed": "\n\n".join(
+            [f"文本块 {i+1}: {paragraph_zh * 4} {paragraph_en * 3}" for i in range(6)]
+            + [f"代码块 7 (python): {code * 5}"]
+        ),
+        "long_zh": "\n\n".join(f"文本块 {i+1}: {paragraph_zh * 10}" for i in range(30)),
+    }
+
+
+async def measure(provider_factory, mode: str, content: str) -> Dict[str, float]:
+    provider = TokenCountingProvider(provider_factory())
+    runner = run_fused_analysis if mode == "fused" else run_staged_analysis
+    start = time.perf_counter()
+    await runner(provider, ANALYSIS_TYPES, content)
+    elapsed = time.perf_counter() - start
+    return {
+        "calls": provider.calls,
+        "input_tokens": provider.input_tokens,
+        "output_tokens": provider.output_tokens,
+        "latency_s": round(elapsed, 3),
+    }
+
+
+async def main(live: bool) -> List[Dict]:
+    if live:
+        from llm_providers.google_gemini_llm import GoogleGeminiLLMProvider
+        provider_factory = GoogleGeminiLLMProvider
+    else:
+        provider_factory = SimulatedLLMProvider
+
+    rows = []
+    for name, content in representative_inputs().items():
+        for mode in ("staged", "fused"):
+            result = await measure(provider_factory, mode, content)
+            rows.append({"input": name, "content_tokens": estimate_tokens(content), "mode": mode, **result})
+
+    header = f"{'input':<14}{'content_tok':>12}{'mode':>8}{'calls':>7}{'in_tok':>9}{'out_tok':>9}{'latency_s':>11}"
+    print(header)
+    print("-" * len(header))
+    for row in rows:
+        print(
+            f"{row['input']:<14}{row['content_tokens']:>12}{row['mode']:>8}{row['calls']:>7}"
+            f"{row['input_tokens']:>9}{row['output_tokens']:>9}{row['latency_s']:>11}"
+        )
+    return rows
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--live", action="store_true", help="使用真实的 Gemini API（需要 GOOGLE_API_KEY）")
+    args = parser.parse_args()
+    asyncio.run(main(args.live))
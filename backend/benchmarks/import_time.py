@@ -0,0 +1,78 @@
+"""
+启动导入耗时预算：在全新的解释器中多次执行 `import main`，报告导入耗时的中位数和累计耗时最多的模块，
+并检查各提供者的重型依赖没有在启动时被导入（它们应在第一次使用时才加载）。
+超出预算或重型依赖被提前导入时以非零状态退出，可以放进CI跟踪冷启动回退。
+
+    uv run python -m benchmarks.import_time
+    uv run python -m benchmarks.import_time --budget-ms 500 --runs 9 --top 20
+"""
+import argparse
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+# 只应在第一次调用对应提供者或渲染时导入的模块
+LAZY_MODULES = ["google.generativeai", "PIL", "httpx", "markdown_it"]
+
+_CHILD = (
+    "import json, sys, time\n"
+    "start = time.perf_counter()\n"
+    "import main\n"
+    "elapsed = time.perf_counter() - start\n"
+    f"print(json.dumps({{'ms': elapsed * 1000, 'loaded': [m for m in {LAZY_MODULES!r} if m in sys.modules]}}))\n"
+)
+_IMPORTTIME_LINE = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)$")
+
+
+def run_once() -> Tuple[Dict, List[Tuple[int, str]]]:
+    """在子进程中导入应用，返回 (测量结果, [(累计微秒, 顶层模块)])。"""
+    env = {k: v for k, v in os.environ.items() if k not in ("LLM_PROVIDER_WARMUP", "PYTHONPROFILEIMPORTTIME")}
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", _CHILD],
+        cwd=BACKEND_DIR, env=env, capture_output=True, text=True, check=True
+    )
+    result = json.loads(proc.stdout.strip().splitlines()[-1])
+    modules = []
+    for line in proc.stderr.splitlines():
+        match = _IMPORTTIME_LINE.match(line)
+        # 只统计 main 直接导入的模块（缩进两格），避免子模块重复计算
+        if match and len(match.group(3)) == 3:
+            modules.append((int(match.group(2)), match.group(4)))
+    return result, sorted(modules, reverse=True)
+
+
+def main(args: argparse.Namespace) -> int:
+    run_once()  # 第一次运行会编译字节码，不计入结果
+    runs = [run_once() for _ in range(args.runs)]
+    timings = [result["ms"] for result, _ in runs]
+    median_ms = statistics.median(timings)
+    loaded = sorted({m for result, _ in runs for m in result["loaded"]})
+
+    print(f"import main: median {median_ms:.0f}ms, min {min(timings):.0f}ms, max {max(timings):.0f}ms over {args.runs} runs (budget {args.budget_ms:.0f}ms)")
+    print(f"Slowest imports of main (cumulative, last run):")
+    for micros, module in runs[-1][1][:args.top]:
+        print(f"  {micros / 1000:8.1f}ms  {module}")
+
+    failed = False
+    if median_ms > args.budget_ms:
+        print(f"OVER BUDGET: import main took {median_ms:.0f}ms, budget is {args.budget_ms:.0f}ms")
+        failed = True
+    if loaded:
+        print(f"EAGER IMPORT: {', '.join(loaded)} imported at startup; these should load on first use")
+        failed = True
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--budget-ms", type=float, default=600, help="import main 耗时中位数的上限")
+    parser.add_argument("--runs", type=int, default=5, help="测量次数")
+    parser.add_argument("--top", type=int, default=15, help="列出累计耗时最多的模块数")
+    sys.exit(main(parser.parse_args()))
@@ -0,0 +1,239 @@
+"""
+离线负载测试：用桩LLM提供者和合成 Obsidian 库对主要接口施压，报告 p50/p95/p99 延迟、吞吐量和
+峰值RSS，并与保存的基线比较，使性能回退一目了然。不会调用任何付费API。
+
+默认在进程内通过 ASGI 直接调用应用（自动开启桩提供者，在临时目录中生成库和上传目录）：
+    uv run python -m benchmarks.load_test
+    uv run python -m benchmarks.load_test --scenario generate --concurrency 32 --requests 400
+    uv run python -m benchmarks.load_test --vault-notes 100000 --scenario obsidian_files --requests 5
+也可以压测已启动的服务（用 ENABLE_STUB_LLM=1 ANALYSIS_LLM_PROVIDER=stub 启动，--vault 指向服务可读的库），
+传入服务进程号时会采样其RSS：
+    uv run python -m benchmarks.load_test --url http://localhost:8000 --vault /tmp/vault-10k --server-pid 12345
+
+基线保存在 benchmarks/baselines/load_test.json：
+    uv run python -m benchmarks.load_test --save-baseline
+    uv run python -m benchmarks.load_test --fail-on-regression   # 有回退时以非零状态退出
+"""
+import argparse
+import asyncio
+import io
+import json
+import os
+import resource
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+import httpx
+import numpy as np
+from PIL import Image
+
+from .synthetic_vault import generate_vault
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+BASELINE_PATH = Path(__file__).resolve().parent / "baselines" / "load_test.json"
+SCENARIOS = ["generate", "content_analysis", "obsidian_files", "obsidian_directories", "upload_image"]
+RSS_SAMPLE_INTERVAL = 0.05
+
+RequestSpec = Tuple[str, str, Dict]  # (method, path, httpx request kwargs)
+
+_PARAGRAPH = "在知识管理系统中，笔记之间的双向链接帮助我们发现概念之间的关联，而定期回顾则能够巩固记忆并产生新的想法。"
+
+
+def _blocks(i: int) -> List[Dict]:
+    blocks = [{"type": "text", "content": f"第{i}次请求。{_PARAGRAPH * (2 + i % 4)}"} for _ in range(3 + i % 3)]
+    blocks.append({"type": "code", "language": "python", "code": "def build_index(notes):\n    return {n.title: n for n in notes}\n"})
+    return blocks
+
+
+def _png_bytes() -> bytes:
+    buffer = io.BytesIO()
+    Image.new("RGB", (256, 256), (120, 160, 200)).save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def scenario_requests(vault_path: str) -> Dict[str, Callable[[int], RequestSpec]]:
+    png = _png_bytes()
+    return {
+        "generate": lambda i: ("POST", "/api/v1/generate", {"json": {
+            "user_input": {"blocks": _blocks(i)},
+            "llm_selection": {"provider": "stub", "model_name": "stub-model"},
+        }}),
+        "content_analysis": lambda i: ("POST", "/api/v1/content-analysis", {"json": {
+            "user_input": {"blocks": _blocks(i)},
+            "analysis_types": ["keywords", "mindmap", "summary"],
+        }}),
+        "obsidian_files": lambda i: ("POST", "/api/v1/obsidian/files", {"json": {"vault_path": vault_path}}),
+        "obsidian_directories": lambda i: ("POST", "/api/v1/obsidian/directories", {"json": {"vault_path": vault_path}}),
+        "upload_image": lambda i: ("POST", "/api/v1/upload_image", {"files": {"file": (f"load-{i}.png", png, "image/png")}}),
+    }
+
+
+def current_rss_bytes(pid: int) -> Optional[int]:
+    try:
+        with open(f"/proc/{pid}/status", encoding="ascii") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        return None
+    return None
+
+
+async def sample_peak_rss(pid: int, stop: asyncio.Event) -> int:
+    peak = current_rss_bytes(pid) or 0
+    while not stop.is_set():
+        peak = max(peak, current_rss_bytes(pid) or 0)
+        try:
+            await asyncio.wait_for(stop.wait(), RSS_SAMPLE_INTERVAL)
+        except asyncio.TimeoutError:
+            pass
+    return max(peak, current_rss_bytes(pid) or 0)
+
+
+async def run_scenario(client: httpx.AsyncClient, build: Callable[[int], RequestSpec], requests: int, concurrency: int, pid: Optional[int]) -> Dict:
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies: List[float] = []
+    errors = 0
+
+    async def one(i: int) -> None:
+        nonlocal errors
+        method, path, kwargs = build(i)
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                response = await client.request(method, path, **kwargs)
+                failed = response.status_code >= 400
+            except httpx.HTTPError:
+                failed = True
+            latencies.append(time.perf_counter() - start)
+        errors += failed
+
+    stop = asyncio.Event()
+    sampler = asyncio.ensure_future(sample_peak_rss(pid, stop)) if pid else None
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(requests)))
+    wall = time.perf_counter() - start
+    stop.set()
+    peak_rss = await sampler if sampler else 0
+    if not peak_rss and pid == os.getpid():
+        peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024  # 无 /proc 时退回进程历史峰值
+
+    ms = np.array(latencies) * 1000
+    return {
+        "requests": requests,
+        "concurrency": concurrency,
+        "errors": errors,
+        "p50_ms": round(float(np.percentile(ms, 50)), 1),
+        "p95_ms": round(float(np.percentile(ms, 95)), 1),
+        "p99_ms": round(float(np.percentile(ms, 99)), 1),
+        "throughput_rps": round((requests - errors) / wall, 1),
+        "peak_rss_mb": round(peak_rss / 2 ** 20, 1),
+    }
+
+
+def compare_to_baseline(results: Dict[str, Dict], baseline: Dict[str, Dict], tolerance: float) -> List[str]:
+    regressions = []
+    for name, result in results.items():
+        base = baseline.get(name)
+        if not base:
+            continue
+        if base["p95_ms"] and result["p95_ms"] > base["p95_ms"] * (1 + tolerance):
+            regressions.append(f"{name}: p95 {result['p95_ms']}ms vs baseline {base['p95_ms']}ms")
+        if base["throughput_rps"] and result["throughput_rps"] < base["throughput_rps"] * (1 - tolerance):
+            regressions.append(f"{name}: throughput {result['throughput_rps']}/s vs baseline {base['throughput_rps']}/s")
+        if result["errors"] > base.get("errors", 0):
+            regressions.append(f"{name}: {result['errors']} errors vs baseline {base.get('errors', 0)}")
+    return regressions
+
+
+def print_report(results: Dict[str, Dict], baseline: Dict[str, Dict]) -> None:
+    header = f"{'scenario':<22}{'reqs':>6}{'conc':>6}{'err':>5}{'p50_ms':>9}{'p95_ms':>9}{'p99_ms':>9}{'rps':>8}{'rss_mb':>8}{'Δp95':>8}{'Δrps':>8}"
+    print(header)
+    print("-" * len(header))
+    for name, r in results.items():
+        base = baseline.get(name)
+        dp95 = f"{(r['p95_ms'] / base['p95_ms'] - 1) * 100:+.0f}%" if base and base["p95_ms"] else "-"
+        drps = f"{(r['throughput_rps'] / base['throughput_rps'] - 1) * 100:+.0f}%" if base and base["throughput_rps"] else "-"
+        print(
+            f"{name:<22}{r['requests']:>6}{r['concurrency']:>6}{r['errors']:>5}{r['p50_ms']:>9}{r['p95_ms']:>9}"
+            f"{r['p99_ms']:>9}{r['throughput_rps']:>8}{r['peak_rss_mb']:>8}{dp95:>8}{drps:>8}"
+        )
+
+
+def in_process_app(workdir: Path, stub_latency_ms: float, stub_jitter_ms: float, stub_error_rate: float):
+    """在临时工作目录中导入应用（PIC_DIR 指向该目录的 pic/，上传不会写进 backend/pic），并把分析接口切换到桩提供者。"""
+    os.environ.setdefault("ENABLE_STUB_LLM", "1")
+    os.environ.setdefault("ANALYSIS_LLM_PROVIDER", "stub")
+    os.environ["STUB_LLM_LATENCY_MS"] = str(stub_latency_ms)
+    os.environ["STUB_LLM_JITTER_MS"] = str(stub_jitter_ms)
+    os.environ["STUB_LLM_ERROR_RATE"] = str(stub_error_rate)
+    if str(BACKEND_DIR) not in sys.path:
+        sys.path.insert(0, str(BACKEND_DIR))
+    (workdir / "pic").mkdir(exist_ok=True)
+    os.environ["PIC_DIR"] = str(workdir / "pic")
+    os.chdir(workdir)
+    import main
+    return main.app
+
+
+async def main(args: argparse.Namespace) -> int:
+    with tempfile.TemporaryDirectory(prefix="load-test-") as tmp:
+        workdir = Path(tmp)
+        vault_path = args.vault
+        if vault_path is None:
+            start = time.perf_counter()
+            vault_path = str(generate_vault(workdir / "vault", args.vault_notes, depth=args.vault_depth))
+            print(f"Generated synthetic vault with {args.vault_notes} notes in {time.perf_counter() - start:.1f}s")
+
+        if args.url:
+            client = httpx.AsyncClient(base_url=args.url, timeout=args.timeout)
+            pid = args.server_pid
+        else:
+            app = in_process_app(workdir, args.stub_latency_ms, args.stub_jitter_ms, args.stub_error_rate)
+            client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://load-test", timeout=args.timeout)
+            pid = os.getpid()
+
+        builders = scenario_requests(vault_path)
+        results: Dict[str, Dict] = {}
+        async with client:
+            for name in args.scenario or SCENARIOS:
+                # 库扫描类场景每次都遍历整个库，默认请求数按比例减少
+                requests = args.requests if not name.startswith("obsidian") else max(1, args.requests // 10)
+                results[name] = await run_scenario(client, builders[name], requests, args.concurrency, pid)
+
+    baseline = json.loads(BASELINE_PATH.read_text(encoding="utf-8")) if BASELINE_PATH.exists() else {}
+    print_report(results, baseline)
+
+    if args.save_baseline:
+        BASELINE_PATH.parent.mkdir(parents=True, exist_ok=True)
+        BASELINE_PATH.write_text(json.dumps({**baseline, **results}, indent=2, ensure_ascii=False) + "\n", encoding="utf-8")
+        print(f"Saved baseline to {BASELINE_PATH}")
+        return 0
+
+    regressions = compare_to_baseline(results, baseline, args.tolerance)
+    for line in regressions:
+        print(f"REGRESSION: {line}")
+    return 1 if regressions and args.fail_on_regression else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenario", action="append", choices=SCENARIOS, help="只运行指定场景（可重复）")
+    parser.add_argument("--requests", type=int, default=200, help="每个场景的请求数（库扫描场景为其十分之一）")
+    parser.add_argument("--concurrency", type=int, default=16, help="并发请求数")
+    parser.add_argument("--timeout", type=float, default=120.0)
+    parser.add_argument("--url", help="压测已启动的服务，而不是进程内应用")
+    parser.add_argument("--server-pid", type=int, help="服务进程号，用于采样峰值RSS（配合 --url）")
+    parser.add_argument("--vault", help="使用已有的库，而不是生成合成库")
+    parser.add_argument("--vault-notes", type=int, default=2000, help="合成库的笔记数")
+    parser.add_argument("--vault-depth", type=int, default=3, help="合成库的目录深度")
+    parser.add_argument("--stub-latency-ms", type=float, default=50)
+    parser.add_argument("--stub-jitter-ms", type=float, default=25)
+    parser.add_argument("--stub-error-rate", type=float, default=0.0)
+    parser.add_argument("--tolerance", type=float, default=0.2, help="判定回退的相对阈值")
+    parser.add_argument("--save-baseline", action="store_true", help="把本次结果保存为基线")
+    parser.add_argument("--fail-on-regression", action="store_true")
+    sys.exit(asyncio.run(main(parser.parse_args())))
@@ -0,0 +1,69 @@
+"""
+近似重复检测的耗时与效果：在合成库上全量建立 MinHash 索引，把部分笔记的段落复制到其他笔记后测量增量更新
+和分组查询，再把随机笔记拼成内容块（含复制过来的段落）测量压缩耗时和节省的token。
+
+    uv run python -m benchmarks.synthetic_vault /tmp/vault-10k --notes 10000
+    uv run python -m benchmarks.near_duplicates /tmp/vault-10k --copies 200
+"""
+import argparse
+import random
+import statistics
+import time
+from pathlib import Path
+
+from analysis.dedup import deduplicate_blocks, get_vault_duplicate_index, note_paragraphs
+from schemas import TextBlock
+
+
+def main(args: argparse.Namespace) -> None:
+    start = time.perf_counter()
+    duplicates = get_vault_duplicate_index(str(args.vault))
+    duplicates.update()
+    print(f"Full build: {duplicates.paragraph_count} paragraphs in {len(duplicates.notes)} notes in {time.perf_counter() - start:.2f}s")
+    start = time.perf_counter()
+    groups = duplicates.groups(args.threshold)
+    print(
+        f"Groups at {args.threshold}: {len(groups)} groups, {sum(g.tokens_saveable for g in groups)} tokens saveable "
+        f"in {(time.perf_counter() - start) * 1000:.0f}ms"
+    )
+
+    # 模拟日记把前一天的段落复制过来
+    rng = random.Random(args.seed)
+    paths = duplicates.index.note_paths()
+    for source, target in zip(rng.sample(paths, args.copies), rng.sample(paths, args.copies)):
+        paragraphs = note_paragraphs(duplicates.index.read_note(source) or "")
+        if paragraphs:
+            note = duplicates.index.vault_path / target
+            note.write_text(note.read_text(encoding="utf-8") + "\n\n" + rng.choice(paragraphs)[1] + "\n", encoding="utf-8")
+    duplicates.index.refresh(force=True)
+    start = time.perf_counter()
+    duplicates.update()
+    print(f"Incremental update after copying paragraphs into {args.copies} notes: {(time.perf_counter() - start) * 1000:.1f}ms")
+    start = time.perf_counter()
+    groups = duplicates.groups(args.threshold)
+    print(f"Groups after the update: {len(groups)} groups in {(time.perf_counter() - start) * 1000:.0f}ms")
+
+    timings, saved, total = [], 0, 0
+    for _ in range(args.requests):
+        blocks = [TextBlock(content=duplicates.index.read_note(path) or "") for path in rng.sample(paths, args.blocks)]
+        blocks.append(blocks[0].model_copy())  # 同一篇笔记被粘贴了两次
+        start = time.perf_counter()
+        result = deduplicate_blocks(blocks, args.threshold)
+        timings.append((time.perf_counter() - start) * 1000)
+        saved += result.tokens_saved
+        total += result.tokens_before
+    print(
+        f"Compaction of {args.blocks + 1} blocks: median {statistics.median(timings):.2f}ms, max {max(timings):.2f}ms, "
+        f"{saved} of {total} tokens saved ({saved / max(total, 1):.1%}, {args.requests} requests)"
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("vault", type=Path, help="Obsidian 库路径（可用 benchmarks.synthetic_vault 生成；会被修改）")
+    parser.add_argument("--threshold", type=float, default=0.8)
+    parser.add_argument("--copies", type=int, default=100, help="复制段落的笔记数")
+    parser.add_argument("--requests", type=int, default=50)
+    parser.add_argument("--blocks", type=int, default=10, help="每个请求拼接的笔记数")
+    parser.add_argument("--seed", type=int, default=7)
+    main(parser.parse_args())
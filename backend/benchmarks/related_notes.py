@@ -0,0 +1,58 @@
+"""
+相关笔记检索的构建与查询耗时：在合成库上全量构建向量索引，修改少量笔记后测量增量更新，
+再用随机笔记的片段作为查询测量 top-k 检索延迟。
+
+    uv run python -m benchmarks.synthetic_vault /tmp/vault-10k --notes 10000
+    uv run python -m benchmarks.related_notes /tmp/vault-10k --queries 200
+"""
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+
+def main(args: argparse.Namespace) -> None:
+    os.environ.setdefault("VECTOR_INDEX_DIR", tempfile.mkdtemp(prefix="related-notes-"))
+    from analysis.related import get_related_notes_index
+
+    start = time.perf_counter()
+    related = get_related_notes_index(args.vault)
+    related.update()
+    print(f"Full build: {len(related.live_paths)} notes in {time.perf_counter() - start:.2f}s (index at {related.directory})")
+
+    rng = random.Random(args.seed)
+    paths = related.index.note_paths()
+    for path in rng.sample(paths, min(args.modify, len(paths))):
+        note = related.index.vault_path / path
+        note.write_text(note.read_text(encoding="utf-8") + "\n\n追加的段落 appended paragraph\n", encoding="utf-8")
+    related.index.refresh(force=True)
+    start = time.perf_counter()
+    related.update()
+    print(f"Incremental update after modifying {args.modify} notes: {(time.perf_counter() - start) * 1000:.1f}ms")
+
+    timings = []
+    for path in rng.choices(paths, k=args.queries):
+        text = (related.index.vault_path / path).read_text(encoding="utf-8")[:args.query_chars]
+        start = time.perf_counter()
+        related.search(text, top_k=args.top_k)
+        timings.append((time.perf_counter() - start) * 1000)
+    print(
+        f"Query top-{args.top_k} over {len(related.live_paths)} notes: median {statistics.median(timings):.2f}ms, "
+        f"p95 {float(np.percentile(timings, 95)):.2f}ms, max {max(timings):.2f}ms ({args.queries} queries)"
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("vault", type=Path, help="Obsidian 库路径（可用 benchmarks.synthetic_vault 生成）")
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--query-chars", type=int, default=500, help="每个查询取笔记开头的字符数")
+    parser.add_argument("--modify", type=int, default=20, help="增量更新前修改的笔记数")
+    parser.add_argument("--seed", type=int, default=7)
+    main(parser.parse_args())
@@ -0,0 +1,87 @@
+"""
+生成用于基准测试的合成 Obsidian 库：可配置笔记数量、目录深度和分支数，正文为中英混合文本，
+带标题、列表、标签和指向其他笔记的 [[wikilink]]。相同参数和种子总是生成相同的库。
+
+    uv run python -m benchmarks.synthetic_vault /tmp/vault-10k --notes 10000
+    uv run python -m benchmarks.synthetic_vault /tmp/vault-100k --notes 100000 --depth 6 --fanout 4
+"""
+import argparse
+import random
+import time
+from pathlib import Path
+from typing import List
+
+CJK_TERMS = [
+    "知识管理", "双向链接", "间隔重复", "主动回忆", "卡片笔记", "概念图谱", "学习方法", "信息架构",
+    "写作流程", "思维导图", "检索练习", "长期记忆", "项目复盘", "阅读笔记", "研究方法", "认知负荷",
+]
+CJK_FILLER = "在日常学习中，我们把零散的想法记录下来，再通过链接和回顾把它们组织成可以复用的知识。"
+LATIN_TERMS = [
+    "retrieval", "spaced repetition", "zettelkasten", "graph", "index", "embedding", "outline",
+    "backlink", "vault", "markdown", "review", "synthesis",
+]
+
+
+def folder_paths(depth: int, fanout: int) -> List[str]:
+    """深度优先列出目录树中的全部目录（包含根目录 ""）。"""
+    folders = [""]
+    frontier = [""]
+    for level in range(depth):
+        next_frontier = []
+        for parent in frontier:
+            for i in range(fanout):
+                path = f"{parent}目录{level + 1}-{i + 1}/"
+                folders.append(path)
+                next_frontier.append(path)
+        frontier = next_frontier
+    return folders
+
+
+def note_title(index: int) -> str:
+    return f"{CJK_TERMS[index % len(CJK_TERMS)]} {index:06d}"
+
+
+def note_body(rng: random.Random, index: int, total: int, paragraphs: int, links: int) -> str:
+    lines = [f"# {note_title(index)}", "", f"tags: #{CJK_TERMS[rng.randrange(len(CJK_TERMS))]} #{LATIN_TERMS[rng.randrange(len(LATIN_TERMS))].replace(' ', '-')}", ""]
+    for p in range(paragraphs):
+        if p % 2 == 1:
+            lines.append(f"## {CJK_TERMS[rng.randrange(len(CJK_TERMS))]}")
+            lines.append("")
+        terms = rng.sample(CJK_TERMS, 3)
+        latin = rng.sample(LATIN_TERMS, 2)
+        lines.append(f"{terms[0]}与{terms[1]}密切相关。{CJK_FILLER}{terms[2]} helps with {latin[0]} and {latin[1]}.")
+        lines.append("")
+    lines.append("- " + "；".join(rng.sample(CJK_TERMS, 3)))
+    targets = [rng.randrange(total) for _ in range(links)]
+    if targets:
+        lines.append("")
+        lines.append("相关笔记：" + " ".join(f"[[{note_title(t)}]]" for t in targets if t != index))
+    return "\n".join(lines) + "\n"
+
+
+def generate_vault(root: Path, notes: int, depth: int = 3, fanout: int = 4, paragraphs: int = 4, links: int = 3, seed: int = 42) -> Path:
+    rng = random.Random(seed)
+    folders = folder_paths(depth, fanout)
+    root.mkdir(parents=True, exist_ok=True)
+    for folder in folders:
+        (root / folder).mkdir(parents=True, exist_ok=True)
+    for i in range(notes):
+        folder = folders[rng.randrange(len(folders))]
+        (root / folder / f"{note_title(i)}.md").write_text(note_body(rng, i, notes, paragraphs, links), encoding="utf-8")
+    return root
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("path", type=Path, help="输出目录")
+    parser.add_argument("--notes", type=int, default=10000, help="笔记数量")
+    parser.add_argument("--depth", type=int, default=3, help="目录深度")
+    parser.add_argument("--fanout", type=int, default=4, help="每个目录的子目录数")
+    parser.add_argument("--paragraphs", type=int, default=4, help="每篇笔记的段落数")
+    parser.add_argument("--links", type=int, default=3, help="每篇笔记的 wikilink 数")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    generate_vault(args.path, args.notes, args.depth, args.fanout, args.paragraphs, args.links, args.seed)
+    print(f"Generated {args.notes} notes in {len(folder_paths(args.depth, args.fanout))} folders at {args.path} ({time.perf_counter() - start:.1f}s)")
@@ -0,0 +1,119 @@
+# File: agent-app/backend/generation/instructions.py
+"""
+Prompt instructions and suggestion heuristics shared by every article generation path
+(single-call generation in the providers and the outline-first long-form mode).
+"""
+from typing import List, Optional
+
+from schemas import UserInput, OutputPreferences
+
+LANGUAGE_INSTRUCTIONS = {
+    "en": "Write the entire article in English.",
+    "zh": "请用中文写整篇文章。",
+    "es": "Escribe todo el artículo en español.",
+    "fr": "Rédigez tout l'article en français.",
+    "de": "Schreiben Sie den gesamten Artikel auf Deutsch.",
+    "ja": "記事全体を日本語で書いてください。",
+    "ko": "전체 기사를 한국어로 작성하세요.",
+    "pt": "Escreva todo o artigo em português.",
+    "ru": "Напишите всю статью на русском языке.",
+    "ar": "اكتب المقال بالكامل باللغة العربية."
+}
+
+STYLE_INSTRUCTIONS = {
+    "formal": "Maintain a formal and authoritative tone throughout.",
+    "casual": "Use a casual, friendly, and conversational tone.",
+    "academic": "Write in an academic style with proper citations and scholarly language.",
+    "conversational": "Write as if you're having a conversation with the reader.",
+    "professional": "Use a professional, business-appropriate tone.",
+    "creative": "Use creative language and engaging storytelling techniques.",
+    "technical": "Focus on technical accuracy and detailed explanations.",
+    "journalistic": "Write in a journalistic style with facts and balanced reporting."
+}
+
+FUSION_INSTRUCTIONS = {
+    "low": (
+        "- **Content Fusion - LOW**: Maintain the original structure and clear separation of content blocks. "
+        "Keep each content block relatively distinct while creating smooth transitions between them. "
+        "Preserve the original organization and flow as much as possible."
+    ),
+    "medium": (
+        "- **Content Fusion - MEDIUM**: Moderately integrate the content while maintaining logical clarity. "
+        "Blend related content naturally while preserving important structural elements. "
+        "Balance readability with coherent narrative flow."
+    ),
+    "high": (
+        "- **Content Fusion - HIGH**: Deeply understand and reconstruct all content into a highly coherent whole. "
+        "Break down original content blocks completely and weave them into a seamless, unified narrative. "
+        "Prioritize overall coherence and flow over preserving original structure. Think holistically about the content."
+    )
+}
+
+
+def build_word_count_instruction(min_word_count: Optional[int], max_word_count: Optional[int]) -> str:
+    if min_word_count and max_word_count:
+        return f"- **Word Count**: The article should be between {min_word_count} and {max_word_count} words.\n"
+    elif min_word_count:
+        return f"- **Word Count**: The article should be at least {min_word_count} words.\n"
+    elif max_word_count:
+        return f"- **Word Count**: The article should be no more than {max_word_count} words.\n"
+    return ""
+
+
+def content_suggestions(user_input: UserInput, generated_markdown: str, language: str, style: str, output_preferences: Optional[OutputPreferences] = None) -> List[str]:
+    """Generate meaningful suggestions based on the content and user input."""
+    has_images = any(block.type == "image" for block in user_input.blocks)
+    has_code = any(block.type == "code" for block in user_input.blocks)
+    return suggestions_for_blocks(has_images, has_code, generated_markdown, language, style, output_preferences)
+
+
+def suggestions_for_blocks(has_images: bool, has_code: bool, generated_markdown: str, language: str, style: str, output_preferences: Optional[OutputPreferences] = None) -> List[str]:
+    """content_suggestions() for callers that only kept which kinds of blocks the input had."""
+    suggestions = []
+
+    # Content analysis
+    word_count = len(generated_markdown.split())
+    has_headings = "#" in generated_markdown
+
+    # Content improvement suggestions
+    if word_count < 300:
+        suggestions.append("考虑添加更多细节和例子来丰富文章内容" if language == "zh" else "Consider adding more details and examples to enrich the article content")
+
+    if not has_headings:
+        suggestions.append("添加章节标题可以提高文章的可读性" if language == "zh" else "Adding section headings can improve article readability")
+
+    if has_code and not has_images:
+        suggestions.append("考虑添加图表或截图来可视化代码概念" if language == "zh" else "Consider adding diagrams or screenshots to visualize code concepts")
+
+    if has_images and not has_code:
+        suggestions.append("添加相关代码示例可以增强技术文章的实用性" if language == "zh" else "Adding relevant code examples can enhance the practicality of technical articles")
+
+    # Style-specific suggestions
+    if style == "academic":
+        suggestions.append("考虑添加引用和参考文献来支持论点" if language == "zh" else "Consider adding citations and references to support your arguments")
+    elif style == "conversational":
+        suggestions.append("可以添加更多问答形式的内容来增强互动性" if language == "zh" else "You could add more Q&A style content to enhance interactivity")
+    elif style == "technical":
+        suggestions.append("考虑添加性能指标和最佳实践建议" if language == "zh" else "Consider adding performance metrics and best practice recommendations")
+
+    # Fusion degree specific suggestions
+    fusion_degree = output_preferences.model_dump().get("fusion_degree", "medium") if output_preferences else "medium"
+    if fusion_degree == "low":
+        suggestions.append("尝试提高融合度来获得更连贯的内容流" if language == "zh" else "Try increasing fusion degree for more coherent content flow")
+    elif fusion_degree == "high":
+        suggestions.append("如果需要保持原始结构，可以降低融合度" if language == "zh" else "Consider lowering fusion degree if you need to maintain original structure")
+
+    # SVG output suggestions
+    enable_svg = output_preferences.model_dump().get("enable_svg_output", False) if output_preferences else False
+    if not enable_svg and (has_code or "数据" in generated_markdown or "data" in generated_markdown.lower()):
+        suggestions.append("启用SVG输出可以添加图表和可视化元素" if language == "zh" else "Enable SVG output to add charts and visualization elements")
+    elif enable_svg:
+        suggestions.append("SVG图表已启用，可以进一步优化视觉元素" if language == "zh" else "SVG charts are enabled, consider further optimizing visual elements")
+
+    # General improvement suggestions
+    suggestions.append("审查内容确保逻辑流畅和信息准确" if language == "zh" else "Review content to ensure logical flow and information accuracy")
+
+    if language != "en":
+        suggestions.append("Check if technical terms are properly localized for your target audience")
+
+    return suggestions[:6]  # Limit to 6 suggestions to avoid overwhelming the user
@@ -0,0 +1,407 @@
+# File: agent-app/backend/generation/longform.py
+"""
+Outline-first long-form generation.
+
+A single call has to write the whole article sequentially and runs into the model's
+max_output_tokens for long word counts. Long-form mode first asks for a JSON outline that
+assigns the user's content blocks to sections, then writes all sections concurrently, each
+with only its own source blocks, and stitches them into one GeneratedContent. Sections that
+stop at the output limit are continued automatically.
+"""
+import asyncio
+import json
+import math
+import re
+from typing import List, Optional, Set, Tuple
+
+from llm_providers.base_llm import BaseLLMProvider
+from observability.metrics import count_fallback, stage_timer
+from schemas import (
+    GenerationRequest, GeneratedContent, GeneratedSection, OutputPreferences, RegenerationRequest, UserInput
+)
+from .instructions import (
+    LANGUAGE_INSTRUCTIONS, STYLE_INSTRUCTIONS, FUSION_INSTRUCTIONS, content_suggestions
+)
+from .markdown_render import md_parser
+from .sections import (
+    ArticleOutline, ArticleRecord, OutlineSection, article_store, block_fingerprint,
+    new_article_id, remap_outline, section_cache, section_cache_key
+)
+
+LONGFORM_MIN_WORDS = 2500  # "auto" switches to long-form at this min_word_count
+SECTION_TARGET_WORDS = 700
+MIN_SECTIONS = 3
+MAX_SECTIONS = 12
+SECTION_CONCURRENCY = 6
+MAX_CONTINUATIONS = 2
+CONTINUATION_TAIL_CHARS = 2000
+DIGEST_CHARS = 160  # per-block excerpt given to sections without source blocks (intro, conclusion)
+
+MAX_FAILED_SECTION_FRACTION = 0.5  # more failed sections than this fraction fail the whole article
+FAILED_SECTION_PLACEHOLDER = "*(This section could not be generated. Regenerate the article to try again.)*"
+
+_HEADING_LINE = re.compile(r'^\s*#{1,6}\s+(.*?)\s*#*\s*$')
+
+
+def use_longform(output_preferences: Optional[OutputPreferences]) -> bool:
+    mode = (output_preferences.generation_mode if output_preferences else None) or "auto"
+    if mode != "auto":
+        return mode == "longform"
+    min_word_count = output_preferences.min_word_count if output_preferences else None
+    return bool(min_word_count and min_word_count >= LONGFORM_MIN_WORDS)
+
+
+def _target_words(output_preferences: Optional[OutputPreferences]) -> int:
+    prefs = output_preferences or OutputPreferences()
+    if prefs.min_word_count and prefs.max_word_count:
+        return (prefs.min_word_count + prefs.max_word_count) // 2
+    return prefs.min_word_count or prefs.max_word_count or LONGFORM_MIN_WORDS
+
+
+def writing_instructions(output_preferences: Optional[OutputPreferences]) -> str:
+    prefs = output_preferences or OutputPreferences()
+    return (
+        f"- **Language**: {LANGUAGE_INSTRUCTIONS.get(prefs.language, LANGUAGE_INSTRUCTIONS['zh'])}\n"
+        f"- **Writing Style**: {STYLE_INSTRUCTIONS.get(prefs.style, STYLE_INSTRUCTIONS['professional'])}\n"
+        f"{FUSION_INSTRUCTIONS.get(prefs.fusion_degree, FUSION_INSTRUCTIONS['medium'])}\n"
+    )
+
+
+def describe_block(index: int, block) -> str:
+    """Text-only rendering of a content block; long-form prompts describe images by alt text and caption."""
+    header = f"--- User Content Block {index+1}: {block.type.upper()} ---"
+    if block.type == "text":
+        return f"{header}\nText Content:\n{block.content}"
+    if block.type == "code":
+        lang = block.language or "plaintext"
+        caption_text = f"\nCode Block Caption: {block.caption}" if block.caption else ""
+        return f"{header}\nCode Snippet (language: {lang}):\n```{lang}\n{block.code}\n```{caption_text}"
+    return (
+        f"{header}\nImage (Alt: '{block.alt_text or 'N/A'}', Caption: '{block.caption or 'N/A'}')\n"
+        "(Integrate its theme/caption naturally into the text; do not render it as a Markdown image.)"
+    )
+
+
+def block_digest(index: int, block) -> str:
+    if block.type == "text":
+        text = block.content
+    elif block.type == "code":
+        text = f"{block.language} code: {block.caption or block.code}"
+    else:
+        text = f"image: {block.alt_text or block.caption or 'N/A'}"
+    text = " ".join(text.split())
+    return f"- Block {index+1}: {text[:DIGEST_CHARS]}{'…' if len(text) > DIGEST_CHARS else ''}"
+
+
+def build_outline_prompt(user_input: UserInput, output_preferences: Optional[OutputPreferences], section_count: int) -> str:
+    total_words = _target_words(output_preferences)
+    blocks_text = "\n\n".join(describe_block(i, block) for i, block in enumerate(user_input.blocks))
+    return (
+        "You are an expert article writer and content strategist. Plan a long, well-structured article "
+        "that weaves the user's content blocks below into a coherent, publishable piece.\n\n"
+        "Key instructions:\n"
+        f"{writing_instructions(output_preferences)}"
+        f"- **Length**: The whole article should be about {total_words} words, split into about {section_count} sections.\n"
+        "- Every content block should be used by at least one section; list the block numbers each section draws on.\n"
+        "- The first section may be an introduction and the last a conclusion; these may use no blocks.\n\n"
+        f"{blocks_text}\n\n"
+        "Return only a JSON object of this shape, with headings and briefs in the article's language:\n"
+        '{"title": "Article title", "sections": [{"heading": "Section heading", "brief": "What this section covers, 1-2 sentences", '
+        '"blocks": [1, 2], "target_words": 600}]}'
+    )
+
+
+def parse_outline(result: str, block_count: int, total_words: int) -> Optional[ArticleOutline]:
+    start_idx = result.find('{')
+    end_idx = result.rfind('}')
+    if start_idx == -1 or end_idx <= start_idx:
+        return None
+    try:
+        data = json.loads(result[start_idx:end_idx+1])
+        sections = []
+        for item in data.get("sections", [])[:MAX_SECTIONS]:
+            heading = str(item.get("heading", "")).strip()
+            if not heading:
+                continue
+            indices = sorted({int(n) - 1 for n in item.get("blocks", []) if 1 <= int(n) <= block_count})
+            sections.append(OutlineSection(
+                heading=heading,
+                brief=str(item.get("brief", "")).strip(),
+                block_indices=indices,
+                target_words=int(item.get("target_words") or 0)
+            ))
+        title = str(data.get("title", "")).strip()
+    except (json.JSONDecodeError, TypeError, ValueError, AttributeError) as e:
+        print(f"ERROR: Failed to parse long-form outline: {e}")
+        return None
+    if not title or not sections:
+        return None
+
+    _assign_unused_blocks(sections, block_count)
+    # Scale section targets so they add up to the requested length
+    planned = sum(s.target_words for s in sections)
+    for section in sections:
+        section.target_words = (
+            max(int(section.target_words * total_words / planned), 150) if planned > 0
+            else max(total_words // len(sections), 150)
+        )
+    return ArticleOutline(title=title, sections=sections)
+
+
+def _assign_unused_blocks(sections: List[OutlineSection], block_count: int) -> None:
+    """Attach blocks the outline left out to the section using the nearest block index."""
+    used = {i for section in sections for i in section.block_indices}
+    anchored = [s for s in sections if s.block_indices]
+    for index in range(block_count):
+        if index in used:
+            continue
+        if anchored:
+            target = min(anchored, key=lambda s: min(abs(i - index) for i in s.block_indices))
+        else:
+            target = sections[min(index * len(sections) // max(block_count, 1), len(sections) - 1)]
+        target.block_indices = sorted(target.block_indices + [index])
+
+
+def fallback_outline(user_input: UserInput, output_preferences: Optional[OutputPreferences], section_count: int) -> ArticleOutline:
+    """Outline without the model: consecutive blocks are grouped evenly, headings come from the blocks."""
+    blocks = user_input.blocks
+    total_words = _target_words(output_preferences)
+    section_count = max(1, min(section_count, len(blocks)))
+    sections = []
+    for n in range(section_count):
+        indices = list(range(n * len(blocks) // section_count, (n + 1) * len(blocks) // section_count))
+        heading = next(
+            (m.group(1) for i in indices if blocks[i].type == "text"
+             for m in [_HEADING_LINE.match(line) for line in blocks[i].content.splitlines()] if m),
+            f"Part {n+1}"
+        )
+        sections.append(OutlineSection(heading=heading, brief="", block_indices=indices, target_words=total_words // section_count))
+    title = next((s.heading for s in sections if not s.heading.startswith("Part ")), "Article")
+    return ArticleOutline(title=title, sections=sections)
+
+
+def build_section_prompt(outline: ArticleOutline, position: int, user_input: UserInput, output_preferences: Optional[OutputPreferences]) -> str:
+    section = outline.sections[position]
+    plan = "\n".join(
+        f"{n+1}. {s.heading}{' — ' + s.brief if s.brief else ''}{'  <-- this section' if n == position else ''}"
+        for n, s in enumerate(outline.sections)
+    )
+    if section.block_indices:
+        # Blocks are numbered within the section so that edits elsewhere do not change this prompt
+        sources = "\n\n".join(describe_block(n, user_input.blocks[i]) for n, i in enumerate(section.block_indices))
+    else:
+        sources = "(No dedicated blocks. Overview of the article's material:)\n" + "\n".join(
+            block_digest(i, block) for i, block in enumerate(user_input.blocks)
+        )
+    return (
+        f"You are writing one section of a longer article titled \"{outline.title}\".\n\n"
+        f"Article plan:\n{plan}\n\n"
+        "Key instructions:\n"
+        f"{writing_instructions(output_preferences)}"
+        f"- **This section**: Write only section {position+1}, \"{section.heading}\". {section.brief}\n"
+        f"- **Length**: About {section.target_words} words.\n"
+        f"- **Output Format**: Markdown starting with the line '## {section.heading}'. Use H3 or lower for subheadings. "
+        "Do not write the article title or any other section, and do not add a summary of the whole article "
+        "unless this is the concluding section.\n\n"
+        f"Source material for this section:\n{sources}"
+    )
+
+
+def _join_continuation(text: str, continuation: str) -> str:
+    if not text or not continuation:
+        return text + continuation
+    # Generated text is stripped, so restore the space between words split across the two calls
+    if text[-1].isascii() and text[-1].isalnum() and continuation[0].isascii() and continuation[0].isalnum():
+        return f"{text} {continuation}"
+    if continuation[0] in "#-*>|`" or text[-1] in ".!?:" or re.match(r'\d+\.', continuation):
+        return f"{text}\n\n{continuation}" if not text.endswith("\n") else text + continuation
+    return text + continuation
+
+
+async def generate_section(llm_provider: BaseLLMProvider, model_name: str, prompt: str) -> str:
+    text, truncated = await llm_provider.generate_long_text(prompt=prompt, model_name=model_name)
+    continuations = 0
+    while truncated and continuations < MAX_CONTINUATIONS:
+        continuations += 1
+        print(f"INFO: Section stopped at the output limit, requesting continuation {continuations}")
+        continuation_prompt = (
+            f"{prompt}\n\n---\nYou already wrote the beginning of this section but were cut off. "
+            f"The last part you wrote was:\n\n{text[-CONTINUATION_TAIL_CHARS:]}\n\n"
+            "Continue exactly where it stops. Do not repeat any of it and do not restart the heading."
+        )
+        continuation, truncated = await llm_provider.generate_long_text(prompt=continuation_prompt, model_name=model_name)
+        text = _join_continuation(text, continuation)
+    return text
+
+
+def normalize_section_markdown(heading: str, markdown: str) -> str:
+    """Make sure a section starts with its H2 heading and contains no H1."""
+    lines = markdown.strip().splitlines()
+    lines = ["#" + line if line.startswith("# ") else line for line in lines]
+    if not lines or not lines[0].startswith("## "):
+        lines = [f"## {heading}", ""] + lines
+    return "\n".join(lines)
+
+
+async def plan_outline(llm_provider: BaseLLMProvider, request: GenerationRequest) -> ArticleOutline:
+    prefs = request.output_preferences
+    total_words = _target_words(prefs)
+    section_count = max(MIN_SECTIONS, min(MAX_SECTIONS, math.ceil(total_words / SECTION_TARGET_WORDS)))
+    block_count = len(request.user_input.blocks)
+    try:
+        result = await llm_provider.generate_structured_text(
+            prompt=build_outline_prompt(request.user_input, prefs, section_count),
+            model_name=request.llm_selection.model_name,
+            json_object=True
+        )
+        with stage_timer("json_parse"):
+            outline = parse_outline(result, block_count, total_words)
+    except Exception as e:
+        print(f"ERROR: Long-form outline generation failed: {e}")
+        outline = None
+    if outline is None:
+        print("INFO: Using block-based fallback outline for long-form generation")
+        count_fallback("longform_outline")
+        outline = fallback_outline(request.user_input, prefs, section_count)
+    return outline
+
+
+def assemble_article(
+    outline: ArticleOutline,
+    section_markdown: List[str],
+    user_input: UserInput,
+    output_preferences: Optional[OutputPreferences]
+) -> GeneratedContent:
+    prefs = output_preferences or OutputPreferences()
+    article_markdown = f"# {outline.title}\n\n" + "\n\n".join(section_markdown) + "\n"
+    with stage_timer("markdown_render"):
+        preview_html = md_parser().render(article_markdown)
+    return GeneratedContent(
+        title=outline.title,
+        article_markdown=article_markdown,
+        preview_html=preview_html,
+        suggestions=content_suggestions(user_input, article_markdown, prefs.language, prefs.style, output_preferences)
+    )
+
+
+class SectionGenerationError(RuntimeError):
+    """Too many sections of a long-form article failed to generate for the article to be useful."""
+
+
+class ArticleNotFoundError(LookupError):
+    """The article_id of a regeneration request is unknown or its record has expired."""
+
+
+async def write_sections(
+    llm_provider: BaseLLMProvider,
+    outline: ArticleOutline,
+    request: GenerationRequest,
+    force_positions: Optional[Set[int]] = None
+) -> Tuple[List[str], List[str], List[bool], List[bool]]:
+    """
+    Writes every section concurrently, reusing cached sections whose prompt is unchanged.
+    A section that fails gets a generic placeholder; the upstream error is only logged.
+
+    Returns:
+        (section markdown, section cache keys, whether each section came from the cache, whether it failed)
+    """
+    model_name = request.llm_selection.model_name
+    prompts = [build_section_prompt(outline, i, request.user_input, request.output_preferences) for i in range(len(outline.sections))]
+    keys = [section_cache_key(model_name, prompt) for prompt in prompts]
+    semaphore = asyncio.Semaphore(SECTION_CONCURRENCY)
+
+    async def write(position: int) -> Tuple[str, bool, bool]:
+        section = outline.sections[position]
+        if position not in (force_positions or set()):
+            cached = await asyncio.to_thread(section_cache.get, keys[position])
+            if cached is not None:
+                return cached, True, False
+        async with semaphore:
+            try:
+                markdown = await generate_section(llm_provider, model_name, prompts[position])
+            except Exception as e:
+                print(f"ERROR: Failed to generate section '{section.heading}': {e}")
+                count_fallback("longform_section_placeholder")
+                return f"## {section.heading}\n\n{FAILED_SECTION_PLACEHOLDER}", False, True
+        markdown = normalize_section_markdown(section.heading, markdown)
+        await asyncio.to_thread(section_cache.put, keys[position], markdown)
+        return markdown, False, False
+
+    results = await asyncio.gather(*(write(i) for i in range(len(outline.sections))))
+    return [r[0] for r in results], keys, [r[1] for r in results], [r[2] for r in results]
+
+
+async def _generate_from_outline(
+    llm_provider: BaseLLMProvider,
+    request: GenerationRequest,
+    outline: ArticleOutline,
+    article_id: str,
+    force_positions: Optional[Set[int]] = None
+) -> GeneratedContent:
+    section_markdown, keys, cached, failed = await write_sections(llm_provider, outline, request, force_positions)
+    print(f"INFO: Article {article_id}: {len(keys)} sections, {sum(cached)} reused from cache, {sum(failed)} failed")
+    if sum(failed) > len(failed) * MAX_FAILED_SECTION_FRACTION:
+        raise SectionGenerationError(f"{sum(failed)} of {len(failed)} sections could not be generated")
+    await asyncio.to_thread(article_store.save, ArticleRecord(
+        article_id=article_id,
+        outline=outline,
+        block_fingerprints=[block_fingerprint(block) for block in request.user_input.blocks],
+        model_name=request.llm_selection.model_name,
+        output_preferences=request.output_preferences,
+        section_keys=keys
+    ))
+    content = assemble_article(outline, section_markdown, request.user_input, request.output_preferences)
+    content.article_id = article_id
+    content.sections = [
+        GeneratedSection(heading=section.heading, source_block_indices=section.block_indices, cached=was_cached, failed=has_failed)
+        for section, was_cached, has_failed in zip(outline.sections, cached, failed)
+    ]
+    content.failed_sections = [section.heading for section, has_failed in zip(outline.sections, failed) if has_failed] or None
+    return content
+
+
+async def generate_longform_article(llm_provider: BaseLLMProvider, request: GenerationRequest) -> GeneratedContent:
+    """
+    Generates an article outline-first: one outline call, then every section concurrently.
+    Wall-clock time is roughly outline + slowest section instead of growing with article length.
+    """
+    outline = await plan_outline(llm_provider, request)
+    print(f"INFO: Long-form outline '{outline.title}' with {len(outline.sections)} sections")
+    return await _generate_from_outline(llm_provider, request, outline, new_article_id())
+
+
+def _rescale_targets(outline: ArticleOutline, old_prefs: Optional[OutputPreferences], new_prefs: Optional[OutputPreferences]) -> None:
+    old_total, new_total = _target_words(old_prefs), _target_words(new_prefs)
+    if old_total != new_total:
+        for section in outline.sections:
+            section.target_words = max(int(section.target_words * new_total / old_total), 150)
+
+
+async def regenerate_article(llm_provider: BaseLLMProvider, request: RegenerationRequest) -> GeneratedContent:
+    """
+    Rebuilds a stored long-form article after its blocks or preferences changed, generating only
+    the sections whose inputs differ and reusing the rest. Changing the language or the model
+    re-plans the outline under the same article_id, since headings and the title are written in
+    that language. Raises ArticleNotFoundError for an unknown article_id.
+    """
+    generation_request = GenerationRequest(
+        user_input=request.user_input,
+        llm_selection=request.llm_selection,
+        output_preferences=request.output_preferences
+    )
+    record = await asyncio.to_thread(article_store.get, request.article_id)
+    if record is None:
+        raise ArticleNotFoundError(f"Article {request.article_id} not found")
+    old_language = (record.output_preferences or OutputPreferences()).language
+    new_language = (request.output_preferences or OutputPreferences()).language
+    if record.model_name != request.llm_selection.model_name or old_language != new_language:
+        print(f"INFO: Article {request.article_id} changed model or language, generating a new outline")
+        outline = await plan_outline(llm_provider, generation_request)
+        return await _generate_from_outline(llm_provider, generation_request, outline, record.article_id)
+
+    outline = remap_outline(record, [block_fingerprint(block) for block in request.user_input.blocks])
+    _assign_unused_blocks(outline.sections, len(request.user_input.blocks))
+    _rescale_targets(outline, record.output_preferences, request.output_preferences)
+    return await _generate_from_outline(
+        llm_provider, generation_request, outline, record.article_id, set(request.regenerate_sections or [])
+    )
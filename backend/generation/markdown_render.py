@@ -0,0 +1,16 @@
+# File: agent-app/backend/generation/markdown_render.py
+"""
+The shared markdown-it parser, created on first use so importing the app does not import
+markdown_it. The parser keeps no per-document state and is safe to share between threads.
+"""
+from functools import lru_cache
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from markdown_it import MarkdownIt
+
+
+@lru_cache(maxsize=1)
+def md_parser() -> "MarkdownIt":
+    from markdown_it import MarkdownIt
+    return MarkdownIt()
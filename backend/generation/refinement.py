@@ -0,0 +1,218 @@
+# File: agent-app/backend/generation/refinement.py
+"""
+Stateful refinement sessions.
+
+The first turn generates the article from the full request (all blocks and images). Follow-up
+instructions such as "make it shorter" are then sent as the next turn of a chat whose context is
+only a short digest of the sources, the revisions applied so far and the current article, so
+iterative editing no longer resends every block and image.
+
+Sessions live in process memory and are evicted when idle, when there are too many of them, or
+when their combined size exceeds the memory budget. With several workers, follow-up requests
+usually reach a different worker than the one that opened the session, so every saved turn is also
+written to the shared SQLite tier (expiring after the idle timeout), which is then authoritative:
+a worker reloads a session whose stored turn differs from its local copy, and a session deleted
+or expired there is gone for every worker.
+"""
+import asyncio
+import json
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+from llm_providers.base_llm import BaseLLMProvider
+from observability.metrics import stage_timer
+from schemas import GenerationRequest, GeneratedContent, OutputPreferences
+from shared_cache import shared_cache
+from .instructions import suggestions_for_blocks
+from .markdown_render import md_parser
+from .longform import block_digest, writing_instructions
+
+SESSION_IDLE_SECONDS = 30 * 60
+MAX_SESSIONS = 200
+MAX_TOTAL_SESSION_CHARS = 20_000_000  # across all sessions, roughly 2 bytes per char for CJK text
+MAX_REVISION_HISTORY = 8  # earlier instructions repeated in the context so they keep applying
+SESSION_NAMESPACE = "refinement_sessions"
+
+
+@dataclass
+class RefinementSession:
+    session_id: str
+    provider_name: str
+    model_name: str
+    has_images: bool  # which kinds of blocks the input had, for the suggestions; the blocks themselves are not kept
+    has_code: bool
+    output_preferences: Optional[OutputPreferences]
+    article_markdown: str
+    source_digest: str
+    revisions: List[str] = field(default_factory=list)
+    turn: int = 0
+    last_used: float = field(default_factory=time.monotonic)
+    lock: asyncio.Lock = field(default_factory=asyncio.Lock, repr=False)
+
+    def size(self) -> int:
+        return len(self.article_markdown) + len(self.source_digest) + sum(len(r) for r in self.revisions)
+
+    def to_json(self) -> Dict:
+        return {
+            "session_id": self.session_id,
+            "provider_name": self.provider_name,
+            "model_name": self.model_name,
+            "has_images": self.has_images,
+            "has_code": self.has_code,
+            "output_preferences": self.output_preferences.model_dump() if self.output_preferences else None,
+            "article_markdown": self.article_markdown,
+            "source_digest": self.source_digest,
+            "revisions": self.revisions,
+            "turn": self.turn,
+        }
+
+    @classmethod
+    def from_json(cls, data: Dict) -> "RefinementSession":
+        preferences = data["output_preferences"]
+        return cls(
+            session_id=data["session_id"],
+            provider_name=data["provider_name"],
+            model_name=data["model_name"],
+            has_images=data["has_images"],
+            has_code=data["has_code"],
+            output_preferences=OutputPreferences(**preferences) if preferences is not None else None,
+            article_markdown=data["article_markdown"],
+            source_digest=data["source_digest"],
+            revisions=data["revisions"],
+            turn=data["turn"]
+        )
+
+
+class SessionStore:
+    def __init__(
+        self,
+        idle_seconds: float = SESSION_IDLE_SECONDS,
+        max_sessions: int = MAX_SESSIONS,
+        max_total_chars: int = MAX_TOTAL_SESSION_CHARS
+    ):
+        self.idle_seconds = idle_seconds
+        self.max_sessions = max_sessions
+        self.max_total_chars = max_total_chars
+        self._sessions: "OrderedDict[str, RefinementSession]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _evict(self) -> None:
+        now = time.monotonic()
+        for session_id in [sid for sid, s in self._sessions.items() if now - s.last_used > self.idle_seconds]:
+            print(f"INFO: Evicting idle refinement session {session_id}")
+            del self._sessions[session_id]
+        total = sum(s.size() for s in self._sessions.values())
+        while self._sessions and (len(self._sessions) > self.max_sessions or total > self.max_total_chars):
+            session_id, session = self._sessions.popitem(last=False)
+            total -= session.size()
+            print(f"INFO: Evicting refinement session {session_id} to stay within limits")
+
+    def get(self, session_id: str) -> Optional[RefinementSession]:
+        stored = shared_cache.get_json(SESSION_NAMESPACE, session_id) if shared_cache.enabled else None
+        with self._lock:
+            self._evict()
+            session = self._sessions.get(session_id)
+            if shared_cache.enabled:
+                if stored is None:
+                    self._sessions.pop(session_id, None)  # deleted or expired on another worker
+                    return None
+                if session is None or session.turn != stored["turn"]:
+                    session = RefinementSession.from_json(stored)
+                    self._sessions[session_id] = session
+            if session is not None:
+                session.last_used = time.monotonic()
+                self._sessions.move_to_end(session_id)
+                self._evict()
+            return session
+
+    def save(self, session: RefinementSession) -> None:
+        with self._lock:
+            session.last_used = time.monotonic()
+            self._sessions[session.session_id] = session
+            self._sessions.move_to_end(session.session_id)
+            self._evict()
+        shared_cache.set_json(SESSION_NAMESPACE, session.session_id, session.to_json(), ttl=self.idle_seconds)
+
+    def delete(self, session_id: str) -> bool:
+        with self._lock:
+            deleted = self._sessions.pop(session_id, None) is not None
+        return shared_cache.delete(SESSION_NAMESPACE, session_id) or deleted
+
+
+session_store = SessionStore()
+
+
+def _content_from_markdown(session: RefinementSession) -> GeneratedContent:
+    prefs = session.output_preferences or OutputPreferences()
+    title = f"Generated by {session.model_name}"
+    lines = session.article_markdown.splitlines()
+    if lines and lines[0].strip().startswith("# "):
+        title = lines[0].strip()[2:].strip()
+    with stage_timer("markdown_render"):
+        preview_html = md_parser().render(session.article_markdown)
+    return GeneratedContent(
+        title=title,
+        article_markdown=session.article_markdown,
+        preview_html=preview_html,
+        suggestions=suggestions_for_blocks(
+            session.has_images, session.has_code, session.article_markdown, prefs.language, prefs.style, session.output_preferences
+        )
+    )
+
+
+def create_session(request: GenerationRequest, content: GeneratedContent) -> RefinementSession:
+    """Starts a session from an article that was generated from the full request."""
+    session = RefinementSession(
+        session_id=uuid.uuid4().hex,
+        provider_name=request.llm_selection.provider,
+        model_name=request.llm_selection.model_name,
+        has_images=any(block.type == "image" for block in request.user_input.blocks),
+        has_code=any(block.type == "code" for block in request.user_input.blocks),
+        output_preferences=request.output_preferences,
+        article_markdown=content.article_markdown,
+        source_digest="\n".join(block_digest(i, block) for i, block in enumerate(request.user_input.blocks))
+    )
+    session_store.save(session)
+    return session
+
+
+def build_refinement_history(session: RefinementSession) -> List[Dict[str, str]]:
+    revisions = "\n".join(f"- {r}" for r in session.revisions[-MAX_REVISION_HISTORY:])
+    return [
+        {
+            "role": "user",
+            "content": (
+                "Write an article from my content blocks following these instructions:\n"
+                f"{writing_instructions(session.output_preferences)}\n"
+                f"Overview of the content blocks:\n{session.source_digest}\n"
+                + (f"\nRevisions already applied, which must keep applying:\n{revisions}\n" if revisions else "")
+            )
+        },
+        {"role": "model", "content": session.article_markdown}
+    ]
+
+
+async def refine_session(llm_provider: BaseLLMProvider, session: RefinementSession, instruction: str) -> GeneratedContent:
+    """Applies one follow-up instruction to the session's current article."""
+    async with session.lock:
+        message = (
+            f"Revise the article: {instruction}\n\n"
+            "Reply with the complete revised article in Markdown, starting with the H1 title, and nothing else."
+        )
+        revised = await llm_provider.generate_chat_reply(
+            history=build_refinement_history(session),
+            message=message,
+            model_name=session.model_name
+        )
+        if not revised.strip():
+            raise ValueError("The model returned an empty revision")
+        session.article_markdown = revised
+        session.revisions.append(instruction)
+        session.turn += 1
+        await asyncio.to_thread(session_store.save, session)
+        print(f"INFO: Refinement session {session.session_id} turn {session.turn} applied")
+        return _content_from_markdown(session)
@@ -0,0 +1,200 @@
+# File: agent-app/backend/generation/sections.py
+"""
+Section-level storage for long-form articles.
+
+Each generated article is kept as its outline plus a fingerprint of every input block, and each
+section's Markdown is cached under a hash of the exact prompt that produced it. A section prompt
+contains everything the section depends on (its source blocks, the writing preferences, the
+article plan and its length target), so after an edit only sections whose prompt changed have to
+be generated again.
+
+Article records and section Markdown are needed again by /generate/regenerate, which may be
+answered by a different worker, so both stores write through to the shared SQLite tier and read
+from it on a local miss. Records are updated in place on regeneration, so with the shared tier on
+a record is always read from it.
+"""
+import copy
+import dataclasses
+import difflib
+import hashlib
+import json
+import threading
+import uuid
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+from observability.metrics import count_cache
+from schemas import OutputPreferences
+from shared_cache import shared_cache
+
+ARTICLE_STORE_MAX_ENTRIES = 64
+SECTION_CACHE_MAX_ENTRIES = 1024
+
+
+@dataclass
+class OutlineSection:
+    heading: str
+    brief: str
+    block_indices: List[int] = field(default_factory=list)  # 0-based indices into user_input.blocks
+    target_words: int = 0
+
+
+@dataclass
+class ArticleOutline:
+    title: str
+    sections: List[OutlineSection]
+
+
+@dataclass
+class ArticleRecord:
+    article_id: str
+    outline: ArticleOutline
+    block_fingerprints: List[str]
+    model_name: str
+    output_preferences: Optional[OutputPreferences]
+    section_keys: List[str]
+
+    def to_json(self) -> Dict:
+        data = dataclasses.asdict(self)
+        data["output_preferences"] = self.output_preferences.model_dump() if self.output_preferences else None
+        return data
+
+    @classmethod
+    def from_json(cls, data: Dict) -> "ArticleRecord":
+        outline = ArticleOutline(
+            title=data["outline"]["title"],
+            sections=[OutlineSection(**section) for section in data["outline"]["sections"]]
+        )
+        preferences = data["output_preferences"]
+        return cls(
+            article_id=data["article_id"],
+            outline=outline,
+            block_fingerprints=data["block_fingerprints"],
+            model_name=data["model_name"],
+            output_preferences=OutputPreferences(**preferences) if preferences is not None else None,
+            section_keys=data["section_keys"]
+        )
+
+
+class _LRUStore(ABC):
+    cache_name = "lru"  # label of the cache hit/miss metrics
+    shared_namespace = ""  # namespace in the shared SQLite tier
+    shared_first = False  # values change under the same key: read the shared tier even on a local hit
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, object]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @abstractmethod
+    def _encode(self, value) -> bytes:
+        """Serializes a value for the shared tier."""
+
+    @abstractmethod
+    def _decode(self, data: bytes):
+        """Inverse of _encode."""
+
+    def _put_local(self, key: str, value) -> None:
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def get(self, key: str):
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+        if shared_cache.enabled and (value is None or self.shared_first):
+            data = shared_cache.get(self.shared_namespace, key)
+            if data is not None:
+                value = self._decode(data)
+                self._put_local(key, value)
+        count_cache(self.cache_name, hit=value is not None)
+        return value
+
+    def put(self, key: str, value) -> None:
+        self._put_local(key, value)
+        shared_cache.set(self.shared_namespace, key, self._encode(value))
+
+
+class SectionCache(_LRUStore):
+    """Section Markdown keyed by section_cache_key()."""
+
+    cache_name = "sections"
+    shared_namespace = "longform_sections"
+
+    def _encode(self, value: str) -> bytes:
+        return value.encode("utf-8")
+
+    def _decode(self, data: bytes) -> str:
+        return data.decode("utf-8")
+
+    def get(self, key: str) -> Optional[str]:
+        return super().get(key)
+
+
+class ArticleStore(_LRUStore):
+    """Recently generated long-form articles keyed by article_id."""
+
+    cache_name = "articles"
+    shared_namespace = "longform_articles"
+    shared_first = True
+
+    def _encode(self, value: ArticleRecord) -> bytes:
+        return json.dumps(value.to_json(), ensure_ascii=False).encode("utf-8")
+
+    def _decode(self, data: bytes) -> ArticleRecord:
+        return ArticleRecord.from_json(json.loads(data))
+
+    def get(self, article_id: str) -> Optional[ArticleRecord]:
+        return super().get(article_id)
+
+    def save(self, record: ArticleRecord) -> None:
+        self.put(record.article_id, record)
+
+
+section_cache = SectionCache(SECTION_CACHE_MAX_ENTRIES)
+article_store = ArticleStore(ARTICLE_STORE_MAX_ENTRIES)
+
+
+def new_article_id() -> str:
+    return uuid.uuid4().hex
+
+
+def block_fingerprint(block) -> str:
+    return hashlib.sha256(block.model_dump_json().encode("utf-8")).hexdigest()
+
+
+def section_cache_key(model_name: str, prompt: str) -> str:
+    return hashlib.sha256(f"{model_name}\0{prompt}".encode("utf-8")).hexdigest()
+
+
+def remap_outline(record: ArticleRecord, new_fingerprints: List[str]) -> ArticleOutline:
+    """
+    Carries the stored outline over to an edited block list.
+
+    Blocks are aligned by fingerprint: unchanged blocks keep their sections, a block edited in
+    place takes over the sections of the block it replaced, and inserted blocks are left
+    unassigned for the caller to place. Sections whose blocks were all deleted are dropped.
+    """
+    old_to_new: Dict[int, int] = {}
+    matcher = difflib.SequenceMatcher(a=record.block_fingerprints, b=new_fingerprints, autojunk=False)
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag in ("equal", "replace"):
+            for offset in range(min(i2 - i1, j2 - j1)):
+                old_to_new[i1 + offset] = j1 + offset
+
+    outline = copy.deepcopy(record.outline)
+    sections = []
+    for section in outline.sections:
+        had_blocks = bool(section.block_indices)
+        section.block_indices = sorted({old_to_new[i] for i in section.block_indices if i in old_to_new})
+        if had_blocks and not section.block_indices:
+            continue
+        sections.append(section)
+    outline.sections = sections or outline.sections[:1]
+    return outline
@@ -0,0 +1,342 @@
+# File: agent-app/backend/http_cache.py
+"""
+Response compression and conditional requests.
+
+CompressionMiddleware encodes response bodies with the best encoding the client accepts: zstd
+and brotli when their modules are installed (compression.zstd on Python 3.14+, or zstandard;
+brotli), gzip from the standard library otherwise. Complete bodies are compressed in one go and
+the result is kept per strong ETag, so an unchanged payload is not compressed again; streamed
+bodies are compressed chunk by chunk and flushed after every chunk so clients see them at once.
+Large complete bodies are compressed in a worker thread so the event loop keeps serving requests.
+
+conditional_json() answers If-None-Match with 304 before the handler builds the payload, and
+otherwise serves the serialized body cached under its ETag. Handlers derive the ETag from
+something cheaper than the payload: a content hash of static data or the vault index fingerprint.
+
+Environment:
+    HTTP_COMPRESSION_MIN_BYTES  smaller bodies are sent uncompressed (default 1024)
+    HTTP_BODY_CACHE_MB          budget of each cache of serialized and compressed bodies (default 64)
+"""
+import asyncio
+import hashlib
+import importlib
+import importlib.util
+import json
+import os
+import threading
+import zlib
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from fastapi import Request, Response
+from pydantic import BaseModel
+from starlette.datastructures import Headers, MutableHeaders
+
+from observability.metrics import count_cache, registry
+
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5  # quality 11 is far too slow for dynamic responses
+ZSTD_LEVEL = 3
+OFFLOAD_MIN_BYTES = 256 * 1024  # complete bodies at least this large are compressed in a worker thread
+COMPRESSIBLE_TYPES = ("text/", "application/json", "application/x-ndjson", "application/javascript", "application/xml", "image/svg+xml")
+
+RESPONSE_BYTES = registry.counter("http_response_bytes_total", "Response body bytes before (identity) and after compression, by encoding.", ("encoding",))
+
+
+class _Encoder:
+    """Incremental compressor: compress() may buffer, flush() emits everything so far, finish() ends the stream."""
+
+    def __init__(self, compress: Callable[[bytes], bytes], flush: Callable[[], bytes], finish: Callable[[], bytes]):
+        self.compress = compress
+        self.flush = flush
+        self.finish = finish
+
+
+def _gzip_encoder() -> _Encoder:
+    compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    return _Encoder(compressor.compress, lambda: compressor.flush(zlib.Z_SYNC_FLUSH), compressor.flush)
+
+
+def _brotli_encoder() -> _Encoder:
+    brotli = importlib.import_module("brotli")
+    compressor = brotli.Compressor(quality=BROTLI_QUALITY)
+    return _Encoder(compressor.process, compressor.flush, compressor.finish)
+
+
+def _zstd_encoder() -> _Encoder:
+    if importlib.util.find_spec("compression") is not None and importlib.util.find_spec("compression.zstd") is not None:
+        zstd = importlib.import_module("compression.zstd")
+        compressor = zstd.ZstdCompressor(level=ZSTD_LEVEL)
+        return _Encoder(compressor.compress, lambda: compressor.flush(zstd.ZstdCompressor.FLUSH_BLOCK), compressor.flush)
+    zstandard = importlib.import_module("zstandard")
+    compressor = zstandard.ZstdCompressor(level=ZSTD_LEVEL).compressobj()
+    return _Encoder(compressor.compress, lambda: compressor.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK), compressor.flush)
+
+
+def _module_available(name: str) -> bool:
+    try:
+        return importlib.util.find_spec(name) is not None
+    except (ImportError, ValueError):
+        return False
+
+
+def _available_encoders() -> Dict[str, Callable[[], _Encoder]]:
+    """Encodings in server preference order; optional modules are only imported when first used."""
+    encoders: Dict[str, Callable[[], _Encoder]] = {}
+    if _module_available("compression.zstd") or _module_available("zstandard"):
+        encoders["zstd"] = _zstd_encoder
+    if _module_available("brotli"):
+        encoders["br"] = _brotli_encoder
+    encoders["gzip"] = _gzip_encoder
+    return encoders
+
+
+ENCODERS = _available_encoders()
+
+
+def negotiate_encoding(accept_encoding: str) -> Optional[str]:
+    """Picks the encoding with the highest q-value the client accepts; ties go to the server's preference."""
+    accepted: Dict[str, float] = {}
+    for item in accept_encoding.split(","):
+        name, _, params = item.strip().partition(";")
+        name = name.strip().lower()
+        if not name:
+            continue
+        q = 1.0
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if key.strip() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        accepted[name] = q
+    best, best_q = None, 0.0
+    for encoding in ENCODERS:
+        q = accepted.get(encoding, accepted.get("*", 0.0))
+        if q > best_q:
+            best, best_q = encoding, q
+    return best
+
+
+def make_etag(*parts: Any) -> str:
+    """Strong ETag from a content hash of the given parts."""
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(part if isinstance(part, bytes) else str(part).encode("utf-8"))
+        digest.update(b"\0")
+    return f'"{digest.hexdigest()[:32]}"'
+
+
+def _opaque_tag(etag: str) -> str:
+    """Strips the weak prefix and the suffix CompressionMiddleware adds per encoding."""
+    tag = etag.strip()
+    if tag.startswith("W/"):
+        tag = tag[2:]
+    tag = tag.strip('"')
+    base, sep, suffix = tag.rpartition("-")
+    if sep and suffix in ENCODERS:
+        tag = base
+    return tag
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """If-None-Match uses the weak comparison: W/ prefixes and encoding suffixes are ignored."""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    wanted = _opaque_tag(etag)
+    return any(_opaque_tag(candidate) == wanted for candidate in if_none_match.split(","))
+
+
+class BodyCache:
+    """Size-bounded LRU of response bodies keyed by ETag (and encoding)."""
+
+    def __init__(self, max_bytes: Optional[int] = None):
+        self.max_bytes = max_bytes if max_bytes is not None else int(float(os.getenv("HTTP_BODY_CACHE_MB", "64")) * 2 ** 20)
+        self._entries: "OrderedDict[Tuple[str, str], bytes]" = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def get(self, etag: str, encoding: str = "identity") -> Optional[bytes]:
+        with self._lock:
+            body = self._entries.get((etag, encoding))
+            if body is not None:
+                self._entries.move_to_end((etag, encoding))
+            return body
+
+    def put(self, etag: str, body: bytes, encoding: str = "identity") -> None:
+        if len(body) > self.max_bytes // 4:
+            return
+        with self._lock:
+            previous = self._entries.pop((etag, encoding), None)
+            if previous is not None:
+                self._size -= len(previous)
+            self._entries[(etag, encoding)] = body
+            self._size += len(body)
+            while self._size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._size -= len(evicted)
+
+
+json_bodies = BodyCache()
+compressed_bodies = BodyCache()
+
+
+def _serialize(payload: Any) -> bytes:
+    if isinstance(payload, BaseModel):
+        return payload.model_dump_json().encode("utf-8")
+    return json.dumps(payload, ensure_ascii=False).encode("utf-8")
+
+
+async def conditional_json(request: Request, etag: str, build: Callable[[], Any], offload: bool = False) -> Response:
+    """
+    304 when the client already has this ETag; otherwise the JSON body cached under the ETag, built
+    with build() on a miss (in a worker thread when offload is set, for payloads that read the disk).
+    """
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        count_cache("http_not_modified", hit=True)
+        return Response(status_code=304, headers=headers)
+    count_cache("http_not_modified", hit=False)
+    body = json_bodies.get(etag)
+    count_cache("http_body", hit=body is not None)
+    if body is None:
+        payload = await asyncio.to_thread(build) if offload else build()
+        body = _serialize(payload)
+        json_bodies.put(etag, body)
+    return Response(body, media_type="application/json", headers=headers)
+
+
+def _compress_body(encoding: str, body: bytes) -> bytes:
+    encoder = ENCODERS[encoding]()
+    return encoder.compress(body) + encoder.finish()
+
+
+class CompressionMiddleware:
+    """ASGI middleware; see the module docstring."""
+
+    def __init__(self, app, minimum_size: Optional[int] = None):
+        self.app = app
+        self.minimum_size = minimum_size if minimum_size is not None else int(os.getenv("HTTP_COMPRESSION_MIN_BYTES", "1024"))
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] != "http" or scope["method"] == "HEAD":
+            await self.app(scope, receive, send)
+            return
+        encoding = negotiate_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        await self.app(scope, receive, _CompressingSender(send, encoding, self.minimum_size).send)
+
+
+class _CompressingSender:
+    def __init__(self, send, encoding: Optional[str], minimum_size: int):
+        self._send = send
+        self.encoding = encoding
+        self.minimum_size = minimum_size
+        self.start: Optional[dict] = None
+        self.mode = "undecided"  # passthrough, buffered or streaming
+        self.expected_length: Optional[int] = None
+        self.chunks: List[bytes] = []
+        self.buffered = 0
+        self.encoder: Optional[_Encoder] = None
+
+    async def send(self, message) -> None:
+        if message["type"] == "http.response.start":
+            self.start = message
+            return
+        if message["type"] != "http.response.body":
+            await self._send(message)
+            return
+        if self.mode == "undecided":
+            await self._decide(message)
+        if self.mode == "passthrough":
+            await self._send(message)
+        elif self.mode == "buffered":
+            await self._buffer(message)
+        else:
+            await self._stream(message)
+
+    async def _decide(self, message) -> None:
+        headers = MutableHeaders(raw=self.start["headers"])
+        content_type = headers.get("content-type", "")
+        compressible = any(content_type.startswith(t) for t in COMPRESSIBLE_TYPES)
+        if compressible:
+            headers.add_vary_header("Accept-Encoding")
+        length = headers.get("content-length")
+        more_body = message.get("more_body", False)
+        if (
+            self.encoding is None or not compressible or "content-encoding" in headers
+            or self.start["status"] in (204, 206, 304)
+            or (length is not None and int(length) < self.minimum_size)
+            or (length is None and not more_body and len(message.get("body", b"")) < self.minimum_size)
+        ):
+            self.mode = "passthrough"
+            if self.start["status"] == 304 and self.encoding is not None:
+                # Same ETag as the compressed 200 the client revalidates, so caches keep the right variant
+                headers.add_vary_header("Accept-Encoding")
+                self._retag(headers)
+            await self._send(self.start)
+            return
+        if length is not None or not more_body:
+            # Complete body (possibly split into chunks by a BaseHTTPMiddleware): compress it at once
+            self.mode = "buffered"
+            self.expected_length = int(length) if length is not None else None
+            return
+        self.mode = "streaming"
+        del headers["content-length"]
+        headers["content-encoding"] = self.encoding
+        self._retag(headers)
+        self.encoder = ENCODERS[self.encoding]()
+        await self._send(self.start)
+
+    def _retag(self, headers: MutableHeaders) -> Optional[str]:
+        """A compressed representation gets its own ETag; returns the original strong ETag."""
+        etag = headers.get("etag")
+        if etag is None or etag.startswith("W/"):
+            return None
+        headers["etag"] = f'{etag[:-1]}-{self.encoding}"' if etag.endswith('"') else f"{etag}-{self.encoding}"
+        return etag
+
+    async def _buffer(self, message) -> None:
+        body = message.get("body", b"")
+        self.chunks.append(body)
+        self.buffered += len(body)
+        if message.get("more_body", False) and (self.expected_length is None or self.buffered < self.expected_length):
+            return
+        body = b"".join(self.chunks)
+        self.chunks = []
+        self.mode = "passthrough"  # anything after the declared length is the empty closing message
+        headers = MutableHeaders(raw=self.start["headers"])
+        etag = self._retag(headers)
+        encoded = compressed_bodies.get(etag, self.encoding) if etag else None
+        if etag:
+            count_cache("http_compressed", hit=encoded is not None)
+        if encoded is None:
+            if len(body) >= OFFLOAD_MIN_BYTES:
+                encoded = await asyncio.to_thread(_compress_body, self.encoding, body)
+            else:
+                encoded = _compress_body(self.encoding, body)
+            if etag:
+                compressed_bodies.put(etag, encoded, self.encoding)
+        if len(encoded) >= len(body):
+            if etag:
+                headers["etag"] = etag
+            encoded, encoding = body, "identity"
+        else:
+            headers["content-encoding"] = self.encoding
+            encoding = self.encoding
+        headers["content-length"] = str(len(encoded))
+        RESPONSE_BYTES.inc(len(body), encoding="identity")
+        if encoding != "identity":
+            RESPONSE_BYTES.inc(len(encoded), encoding=encoding)
+        await self._send(self.start)
+        await self._send({"type": "http.response.body", "body": encoded, "more_body": message.get("more_body", False)})
+
+    async def _stream(self, message) -> None:
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+        RESPONSE_BYTES.inc(len(body), encoding="identity")
+        encoded = self.encoder.compress(body) + (self.encoder.flush() if more_body else self.encoder.finish())
+        RESPONSE_BYTES.inc(len(encoded), encoding=self.encoding)
+        await self._send({"type": "http.response.body", "body": encoded, "more_body": more_body})
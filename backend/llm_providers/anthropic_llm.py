@@ -0,0 +1,124 @@
+# File: agent-app/backend/llm_providers/anthropic_llm.py
+import os
+from typing import Dict, List, Optional, Tuple
+
+import httpx
+
+from .base_llm import BaseLLMProvider
+from observability.metrics import record_llm_usage, upstream_timer
+from .article_prompt import (
+    PromptPart, fetch_block_images, build_article_parts, image_to_base64_jpeg,
+    article_from_markdown, not_configured_article
+)
+from schemas import UserInput, LLMSelection, GeneratedContent, OutputPreferences
+
+ANTHROPIC_API_VERSION = "2023-06-01"
+DEFAULT_MODEL = "claude-3-haiku-20240307"
+MAX_OUTPUT_TOKENS = 4096  # Claude 3 models, as advertised in /api/v1/llms
+REQUEST_TIMEOUT = 120.0
+
+
+class AnthropicLLMProvider(BaseLLMProvider):
+    """Anthropic Messages API over plain HTTP, so no extra SDK dependency is needed."""
+
+    display_name = "Anthropic"
+
+    def __init__(self):
+        self.api_key = os.getenv("ANTHROPIC_API_KEY")
+        self.base_url = os.getenv("ANTHROPIC_BASE_URL", "https://api.anthropic.com").rstrip("/")
+        if not self.api_key:
+            print("WARNING: ANTHROPIC_API_KEY environment variable not found. AnthropicLLMProvider will not be functional.")
+
+    def is_configured(self) -> bool:
+        return bool(self.api_key)
+
+    async def _create_message(
+        self,
+        model_name: str,
+        messages: List[Dict],
+        temperature: float = 0.7,
+        max_tokens: int = MAX_OUTPUT_TOKENS
+    ) -> Tuple[str, bool]:
+        if not self.api_key:
+            raise ValueError("Anthropic API key is not configured")
+        async with httpx.AsyncClient(timeout=REQUEST_TIMEOUT) as client:
+            with upstream_timer("anthropic", model_name):
+                response = await client.post(
+                    f"{self.base_url}/v1/messages",
+                    headers={
+                        "x-api-key": self.api_key,
+                        "anthropic-version": ANTHROPIC_API_VERSION,
+                        "content-type": "application/json",
+                    },
+                    json={"model": model_name, "max_tokens": max_tokens, "temperature": temperature, "messages": messages},
+                )
+            response.raise_for_status()
+            data = response.json()
+
+        usage = data.get("usage") or {}
+        record_llm_usage(
+            "anthropic", model_name, usage.get("input_tokens", 0), usage.get("output_tokens", 0),
+            len(response.request.content), len(response.content)
+        )
+        text = "".join(block.get("text", "") for block in data.get("content", []) if block.get("type") == "text")
+        if not text.strip():
+            raise ValueError("Anthropic API response did not contain any usable text content")
+        truncated = data.get("stop_reason") == "max_tokens"
+        print(f"INFO: Received Anthropic response from {model_name} (length: {len(text)} chars, stop_reason: {data.get('stop_reason')})")
+        return text.strip(), truncated
+
+    @staticmethod
+    def _to_content(parts: List[PromptPart]) -> List[Dict]:
+        content = []
+        for part in parts:
+            if isinstance(part, str):
+                content.append({"type": "text", "text": part})
+            else:
+                content.append({
+                    "type": "image",
+                    "source": {"type": "base64", "media_type": "image/jpeg", "data": image_to_base64_jpeg(part)},
+                })
+        return content
+
+    async def generate_content_from_blocks(
+        self,
+        user_input: UserInput,
+        llm_selection: LLMSelection,
+        output_preferences: Optional[OutputPreferences] = None
+    ) -> GeneratedContent:
+        if not self.api_key:
+            return not_configured_article("Anthropic", "ANTHROPIC_API_KEY", "Check the Anthropic Console for API key permissions")
+
+        # All Claude 3 models accept image input
+        fetched_image_objects = await fetch_block_images(user_input, True)
+        parts = build_article_parts(user_input, output_preferences, fetched_image_objects, True)
+        print(f"INFO: Final prompt for Anthropic API contains {len(parts)} parts.")
+        try:
+            generated_markdown, _ = await self._create_message(
+                llm_selection.model_name,
+                [{"role": "user", "content": self._to_content(parts)}]
+            )
+            return article_from_markdown(user_input, generated_markdown, llm_selection.model_name, output_preferences)
+        except Exception as e:
+            print(f"ERROR: An error occurred during Anthropic API call or response processing: {e}")
+            raise
+
+    async def generate_simple_text(self, prompt: str, model_name: str = DEFAULT_MODEL) -> str:
+        text, _ = await self._create_message(model_name, [{"role": "user", "content": prompt}])
+        return text
+
+    async def generate_structured_text(self, prompt: str, model_name: str = DEFAULT_MODEL, json_object: bool = False) -> str:
+        text, _ = await self._create_message(model_name, [{"role": "user", "content": prompt}], temperature=0.4)
+        return text
+
+    async def generate_long_text(self, prompt: str, model_name: str = DEFAULT_MODEL) -> Tuple[str, bool]:
+        return await self._create_message(model_name, [{"role": "user", "content": prompt}])
+
+    async def generate_chat_reply(self, history: List[Dict[str, str]], message: str, model_name: str = DEFAULT_MODEL) -> str:
+        messages = [
+            {"role": "assistant" if turn["role"] == "model" else "user", "content": turn["content"]}
+            for turn in history
+        ]
+        messages.append({"role": "user", "content": message})
+        text, _ = await self._create_message(model_name, messages)
+        return text
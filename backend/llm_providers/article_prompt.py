@@ -0,0 +1,325 @@
+# File: agent-app/backend/llm_providers/article_prompt.py
+"""
+Provider-independent pieces of article generation: the writing instructions, the ordered prompt
+parts built from the user's content blocks (text and PIL images), image fetching, and turning the
+generated Markdown into a GeneratedContent. Each provider only converts the parts into its own
+request format and makes the call.
+"""
+import asyncio
+import io
+import base64
+from typing import Dict, List, Optional, Union
+
+import httpx
+from PIL import Image, UnidentifiedImageError
+
+from schemas import UserInput, GeneratedContent, OutputPreferences
+from observability.metrics import stage_timer
+from shared_cache import shared_cache
+from generation.markdown_render import md_parser
+from generation.instructions import (
+    LANGUAGE_INSTRUCTIONS, STYLE_INSTRUCTIONS, FUSION_INSTRUCTIONS,
+    build_word_count_instruction, content_suggestions
+)
+
+PromptPart = Union[str, Image.Image]
+
+IMAGE_CACHE_TTL = 3600.0  # fetched image bytes are reused across workers for this long
+
+
+
+async def _fetch_image_bytes(url: str) -> bytes:
+    """Downloads an image, going through the shared cache so each URL is fetched once per host."""
+    if shared_cache.enabled:
+        cached = await asyncio.to_thread(shared_cache.get, "image_bytes", url)
+        if cached is not None:
+            return cached
+    async with httpx.AsyncClient() as client:
+        response = await client.get(url, timeout=15.0)
+        response.raise_for_status()
+        image_bytes = await response.aread()
+    if shared_cache.enabled:
+        await asyncio.to_thread(shared_cache.set, "image_bytes", url, image_bytes, IMAGE_CACHE_TTL)
+    return image_bytes
+
+
+async def fetch_image_from_url(url: str) -> Optional[Image.Image]:
+    try:
+        image_bytes = await _fetch_image_bytes(url)
+        image = Image.open(io.BytesIO(image_bytes))
+        if image.mode == 'RGBA' or image.mode == 'LA' or (image.mode == 'P' and 'transparency' in image.info):
+            background = Image.new("RGB", image.size, (255, 255, 255))
+            background.paste(image, mask=image.split()[-1])
+            image = background
+        elif image.mode != 'RGB':
+            image = image.convert("RGB")
+        print(f"INFO: Fetched and processed image from {url}. Format: {image.format}, Mode: {image.mode}, Size: {image.size}")
+        return image
+    except httpx.HTTPStatusError as e:
+        print(f"ERROR: HTTP error fetching image from {url}: {e.response.status_code} - {e.request.url}")
+    except httpx.RequestError as e:
+        print(f"ERROR: Network error fetching image from {url}: {e}")
+    except UnidentifiedImageError:
+        print(f"ERROR: Content at {url} could not be identified as an image by Pillow.")
+    except Exception as e:
+        print(f"ERROR: Unexpected error fetching or processing image from {url}: {e}")
+    return None
+
+
+def image_to_base64_jpeg(image: Image.Image) -> str:
+    buffer = io.BytesIO()
+    image.save(buffer, format="JPEG", quality=90)
+    return base64.b64encode(buffer.getvalue()).decode("ascii")
+
+
+def build_article_instructions(output_preferences: Optional[OutputPreferences] = None) -> str:
+    # Get language, style, word count, and fusion preferences
+    language = "zh"  # Default to Chinese
+    style = "professional"  # Default style
+    min_word_count = None
+    max_word_count = None
+    fusion_degree = "medium"  # Default fusion degree
+    enable_svg_output = False  # Default SVG output
+    
+    if output_preferences:
+        # Convert Pydantic model to dict if needed
+        prefs_dict = output_preferences.model_dump() if hasattr(output_preferences, 'model_dump') else output_preferences
+        language = prefs_dict.get("language", "zh")
+        style = prefs_dict.get("style", "professional")
+        min_word_count = prefs_dict.get("min_word_count")
+        max_word_count = prefs_dict.get("max_word_count")
+        fusion_degree = prefs_dict.get("fusion_degree", "medium")
+        enable_svg_output = prefs_dict.get("enable_svg_output", False)
+    
+    # Language-specific instructions
+    language_instruction = LANGUAGE_INSTRUCTIONS.get(language, LANGUAGE_INSTRUCTIONS["zh"])
+    style_instruction = STYLE_INSTRUCTIONS.get(style, STYLE_INSTRUCTIONS["professional"])
+    
+    # Word count instruction
+    word_count_instruction = build_word_count_instruction(min_word_count, max_word_count)
+    
+    fusion_instruction = FUSION_INSTRUCTIONS.get(fusion_degree, FUSION_INSTRUCTIONS["medium"])
+    
+    # SVG output instruction
+    svg_instruction = ""
+    if enable_svg_output:
+        svg_instruction = (
+            "- **SVG Enhanced Output**: In addition to the regular markdown content, create relevant SVG illustrations and diagrams. "
+            "Integrate SVG code directly into the HTML output where appropriate to enhance visual understanding. "
+            "Create custom charts, diagrams, flowcharts, or conceptual illustrations that complement the content. "
+            "Use meaningful colors and clear labeling in SVG elements.\n"
+        )
+    
+    system_prompt_text = (
+         "You are an expert article writer and content strategist. "
+         "Your primary task is to take the following user-provided content blocks (which may include text, code snippets, and actual image data) "
+         "and weave them into a coherent, well-structured, and engaging article suitable for publication. "
+         "The article should have a clear narrative flow and logical progression.\n\n"
+         "Key instructions:\n"
+         "- **Title Generation**: Generate a suitable and compelling title for the article. Present this title as the very first H1 header in your response (e.g., '# Article Title'). Do not add any text before the H1 title.\n"
+         "- **Output Format**: The entire response, starting with the H1 title, must be in well-formatted Markdown.\n"
+         "- **Content Integration**: Seamlessly integrate the provided text, expand on ideas, explain code snippets contextually, and incorporate images by referring to them or describing their relevance. Do not try to re-render images as Markdown image tags unless explicitly asked.\n"
+         "- **Structure and Flow**: Ensure the article is well-organized with appropriate headings (H2, H3, etc.), paragraphs, lists, and other Markdown elements to enhance readability.\n"
+         f"- **Language**: {language_instruction}\n"
+         f"- **Writing Style**: {style_instruction}\n"
+         f"{word_count_instruction}"
+         f"{fusion_instruction}\n"
+         f"{svg_instruction}"
+         "The user's content blocks (text, code, and image data if provided) are given below. Process them to build the article:\n"
+         "---"
+    )
+    return system_prompt_text
+
+
+async def fetch_block_images(user_input: UserInput, current_model_supports_images: bool) -> Dict[int, Optional[Image.Image]]:
+    image_blocks_to_fetch = []
+    if current_model_supports_images:
+        for i, block in enumerate(user_input.blocks):
+            if block.type == "image":
+                image_blocks_to_fetch.append({"index": i, "url": str(block.image_path), "block_ref": block})
+    
+    fetched_image_objects: Dict[int, Optional[Image.Image]] = {}
+    if image_blocks_to_fetch:
+        print(f"INFO: Attempting to fetch {len(image_blocks_to_fetch)} image(s).")
+        tasks = [fetch_image_from_url(img_block["url"]) for img_block in image_blocks_to_fetch]
+        with stage_timer("image_fetch"):
+            results = await asyncio.gather(*tasks, return_exceptions=True)
+        for i, result in enumerate(results):
+            original_block_index = image_blocks_to_fetch[i]["index"]
+            if isinstance(result, Image.Image):
+                fetched_image_objects[original_block_index] = result
+            else:
+                fetched_image_objects[original_block_index] = None
+                if isinstance(result, Exception):
+                    print(f"ERROR: Failed to fetch image for block {original_block_index} from {image_blocks_to_fetch[i]['url']}: {result}")
+                else:
+                    print(f"WARNING: Fetching image for block {original_block_index} from {image_blocks_to_fetch[i]['url']} returned None.")
+    return fetched_image_objects
+
+
+def build_article_parts(
+    user_input: UserInput,
+    output_preferences: Optional[OutputPreferences],
+    fetched_image_objects: Dict[int, Optional[Image.Image]],
+    current_model_supports_images: bool
+) -> List[PromptPart]:
+    with stage_timer("prompt_build"):
+        api_call_parts: List[PromptPart] = [build_article_instructions(output_preferences)]
+
+        if not user_input.blocks:
+            api_call_parts.append("\n\n(No specific content blocks were provided by the user. Please generate a general article based on any inferred topic or a generic welcome/placeholder article about AI content generation.)")
+
+        for i, block in enumerate(user_input.blocks):
+            api_call_parts.append(f"\n\n--- User Content Block {i+1}: {block.type.upper()} ---")
+            if block.type == "text":
+                api_call_parts.append(f"Text Content:\n{block.content}")
+            elif block.type == "code":
+                lang = block.language or "plaintext"
+                caption_text = f"\nCode Block Caption: {block.caption}" if block.caption else ""
+                api_call_parts.append(f"Code Snippet (language: {lang}):\n```{lang}\n{block.code}\n```{caption_text}")
+            elif block.type == "image":
+                image_data = fetched_image_objects.get(i) if current_model_supports_images else None
+                if image_data:
+                    api_call_parts.append(f"Image Content (Caption: {block.caption or 'N/A'}, Alt: {block.alt_text or 'N/A'}):")
+                    api_call_parts.append(image_data)
+                else:
+                    reason = "fetch failed or image is invalid" if current_model_supports_images else "model does not support image input"
+                    api_call_parts.append(
+                        f"Image Placeholder ({reason}):\n"
+                        f"[URL: {block.image_path}, Alt Text: '{block.alt_text or 'N/A'}', Caption: '{block.caption or 'N/A'}]\n"
+                        "(Task: Describe this image or integrate its theme/caption naturally into the article based on this textual information.)"
+                    )
+
+        if output_preferences:
+            api_call_parts.append("\n\n--- Output Preferences from User ---")
+            # Convert Pydantic model to dict if needed
+            prefs_dict = output_preferences.model_dump() if hasattr(output_preferences, 'model_dump') else output_preferences
+            for key, value in prefs_dict.items():
+                api_call_parts.append(f"- {key.replace('_', ' ').capitalize()}: {value}")
+            api_call_parts.append("Please try to adhere to these preferences when crafting the article.")
+
+        api_call_parts.append(
+            "\n\n---\nBased on all the above, please generate the complete article now, starting with the H1 title and following all instructions for Markdown formatting and content integration. Be comprehensive and aim for a high-quality, publishable piece."
+        )
+        return api_call_parts
+
+
+def article_from_markdown(
+    user_input: UserInput,
+    generated_markdown: str,
+    model_name: str,
+    output_preferences: Optional[OutputPreferences] = None
+) -> GeneratedContent:
+    language = output_preferences.language if output_preferences else "zh"
+    style = output_preferences.style if output_preferences else "professional"
+    extracted_title = f"Generated by {model_name}"
+    lines = generated_markdown.splitlines()
+    if lines and lines[0].strip().startswith("# "):
+        extracted_title = lines[0].strip()[2:].strip()
+
+    with stage_timer("markdown_render"):
+        # Convert Markdown to HTML using markdown-it-py
+        actual_preview_html = md_parser().render(generated_markdown)
+
+        # Enhance HTML with custom styling for SVG output
+        if output_preferences and output_preferences.enable_svg_output:
+            actual_preview_html = enhance_html_with_svg_styling(actual_preview_html)
+
+    # Generate meaningful suggestions based on the content
+    suggestions = content_suggestions(user_input, generated_markdown, language, style, output_preferences)
+
+    print(f"INFO: Successfully generated content with title: {extracted_title}")
+    return GeneratedContent(
+        title=extracted_title,
+        article_markdown=generated_markdown,
+        preview_html=actual_preview_html, # Use actual HTML
+        suggestions=suggestions
+    )
+
+
+def generation_error_article(provider_label: str, error: Exception) -> GeneratedContent:
+    error_suggestion = "An error occurred. Please check server logs. If images were used, ensure URLs are valid and publicly accessible."
+    article_markdown = f"# Error During Generation\n\nAn error occurred while trying to generate content with the {provider_label} API: {str(error)}"
+    return GeneratedContent(
+        title="Error: Content Generation Failed",
+        article_markdown=article_markdown,
+        preview_html=md_parser().render(article_markdown),
+        suggestions=[error_suggestion, "Check your API key configuration and network connection", "Verify that all image URLs are accessible"]
+    )
+
+
+def not_configured_article(provider_label: str, env_var: str, console_hint: str) -> GeneratedContent:
+    error_message = f"The {provider_label} LLM provider is not configured because the {env_var} is missing or invalid."
+    return GeneratedContent(
+        title=f"Error: {provider_label} Provider Not Configured",
+        article_markdown=f"# Error\n\n{error_message}",
+        preview_html=f"<h1>Error</h1><p>{error_message}</p>",
+        suggestions=[f"Ensure {env_var} is set in your environment variables", "Restart the backend service after setting the API key", console_hint]
+    )
+
+
+def enhance_html_with_svg_styling(html_content: str) -> str:
+    """Enhance HTML content with better styling for SVG elements and overall presentation."""
+    # Add custom CSS for SVG-enhanced content
+    enhanced_css = """
+    <style>
+    body { 
+        font-family: -apple-system, BlinkMacSystemFont, 'Segoe UI', Roboto, sans-serif;
+        line-height: 1.6;
+        color: #333;
+        max-width: 900px;
+        margin: 0 auto;
+        padding: 20px;
+    }
+    h1, h2, h3 { 
+        color: #2c3e50;
+        margin-top: 2em;
+        margin-bottom: 0.5em;
+    }
+    h1 { 
+        border-bottom: 3px solid #3498db;
+        padding-bottom: 0.5em;
+    }
+    svg { 
+        max-width: 100%;
+        height: auto;
+        display: block;
+        margin: 20px auto;
+        border: 1px solid #eee;
+        border-radius: 8px;
+        background: #fafafa;
+    }
+    .svg-container {
+        text-align: center;
+        margin: 30px 0;
+        padding: 20px;
+        background: #f8f9fa;
+        border-radius: 12px;
+    }
+    code {
+        background: #f4f4f4;
+        padding: 2px 6px;
+        border-radius: 4px;
+        font-family: 'Monaco', 'Menlo', monospace;
+    }
+    pre {
+        background: #f8f8f8;
+        padding: 15px;
+        border-radius: 8px;
+        overflow-x: auto;
+        border-left: 4px solid #3498db;
+    }
+    blockquote {
+        border-left: 4px solid #3498db;
+        margin: 0;
+        padding-left: 20px;
+        font-style: italic;
+        color: #666;
+    }
+    </style>
+    """
+    
+    # Insert the CSS at the beginning of the HTML content
+    if html_content.strip():
+        return enhanced_css + html_content
+    return html_content
@@ -1,8 +1,14 @@
 from abc import ABC, abstractmethod
-from typing import Optional, Dict
+from typing import Optional, Dict, List, Tuple
 from schemas import UserInput, LLMSelection, GeneratedContent, OutputPreferences
 
 class BaseLLMProvider(ABC):
+    display_name = "LLM"  # Used in user-facing error messages
+
+    def is_configured(self) -> bool:
+        """Whether the provider has the credentials it needs; unconfigured providers are skipped as hedge targets."""
+        return True
+
     @abstractmethod
     async def generate_content_from_blocks(
         self,
@@ -40,3 +46,65 @@ class BaseLLMProvider(ABC):
             The generated text response as a string.
         """
         pass
+
+    async def generate_structured_text(
+        self,
+        prompt: str,
+        model_name: str = "default",
+        json_object: bool = False
+    ) -> str:
+        """
+        Generates a JSON response from a prompt. Providers with a native structured-output
+        mode should override this; the default simply delegates to generate_simple_text.
+
+        Args:
+            prompt: The text prompt to send to the LLM. It should describe the expected JSON shape.
+            model_name: The model name to use for generation.
+            json_object: True when the expected JSON is an object rather than an array.
+                Providers whose JSON mode only accepts objects enable it only then.
+
+        Returns:
+            The generated JSON text as a string.
+        """
+        return await self.generate_simple_text(prompt=prompt, model_name=model_name)
+
+    async def generate_long_text(
+        self,
+        prompt: str,
+        model_name: str = "default"
+    ) -> Tuple[str, bool]:
+        """
+        Generates a long free-form text response and reports whether it was cut off by the
+        output token limit, so callers can ask the model to continue. Providers that cannot
+        detect truncation return False.
+
+        Args:
+            prompt: The text prompt to send to the LLM.
+            model_name: The model name to use for generation.
+
+        Returns:
+            A (text, truncated) tuple.
+        """
+        return await self.generate_simple_text(prompt=prompt, model_name=model_name), False
+
+    async def generate_chat_reply(
+        self,
+        history: List[Dict[str, str]],
+        message: str,
+        model_name: str = "default"
+    ) -> str:
+        """
+        Continues a conversation. Providers with a native chat API should override this; the
+        default flattens the turns into a single prompt for generate_long_text.
+
+        Args:
+            history: Earlier turns as {"role": "user" | "model", "content": text} dicts.
+            message: The new user message.
+            model_name: The model name to use for generation.
+
+        Returns:
+            The model's reply as a string.
+        """
+        transcript = "\n\n".join(f"[{turn['role']}]\n{turn['content']}" for turn in history)
+        text, _ = await self.generate_long_text(prompt=f"{transcript}\n\n[user]\n{message}", model_name=model_name)
+        return text
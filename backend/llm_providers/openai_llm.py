@@ -0,0 +1,139 @@
+# File: agent-app/backend/llm_providers/openai_llm.py
+import os
+from typing import Dict, List, Optional, Tuple
+
+import httpx
+
+from .base_llm import BaseLLMProvider
+from observability.metrics import record_llm_usage, upstream_timer
+from .article_prompt import (
+    PromptPart, fetch_block_images, build_article_parts, image_to_base64_jpeg,
+    article_from_markdown, not_configured_article
+)
+from schemas import UserInput, LLMSelection, GeneratedContent, OutputPreferences
+
+DEFAULT_MODEL = "gpt-4o-mini"
+REQUEST_TIMEOUT = 120.0
+
+# Output limits as advertised in /api/v1/llms
+MAX_OUTPUT_TOKENS = {
+    "gpt-4o-mini": 16384,
+    "gpt-4o": 4096,
+    "gpt-3.5-turbo": 4096,
+}
+
+
+def model_supports_images_lookup(model_id: str) -> bool:
+    return model_id in ("gpt-4o-mini", "gpt-4o")
+
+
+class OpenAILLMProvider(BaseLLMProvider):
+    """OpenAI Chat Completions API over plain HTTP. OPENAI_BASE_URL allows compatible servers."""
+
+    display_name = "OpenAI"
+
+    def __init__(self):
+        self.api_key = os.getenv("OPENAI_API_KEY")
+        self.base_url = os.getenv("OPENAI_BASE_URL", "https://api.openai.com/v1").rstrip("/")
+        if not self.api_key:
+            print("WARNING: OPENAI_API_KEY environment variable not found. OpenAILLMProvider will not be functional.")
+
+    def is_configured(self) -> bool:
+        return bool(self.api_key)
+
+    async def _chat_completion(
+        self,
+        model_name: str,
+        messages: List[Dict],
+        temperature: float = 0.7,
+        json_output: bool = False
+    ) -> Tuple[str, bool]:
+        if not self.api_key:
+            raise ValueError("OpenAI API key is not configured")
+        payload = {
+            "model": model_name,
+            "messages": messages,
+            "temperature": temperature,
+            "max_tokens": MAX_OUTPUT_TOKENS.get(model_name, 4096),
+        }
+        if json_output:
+            payload["response_format"] = {"type": "json_object"}
+        async with httpx.AsyncClient(timeout=REQUEST_TIMEOUT) as client:
+            with upstream_timer("openai", model_name):
+                response = await client.post(
+                    f"{self.base_url}/chat/completions",
+                    headers={"Authorization": f"Bearer {self.api_key}"},
+                    json=payload,
+                )
+            response.raise_for_status()
+            data = response.json()
+
+        usage = data.get("usage") or {}
+        record_llm_usage(
+            "openai", model_name, usage.get("prompt_tokens", 0), usage.get("completion_tokens", 0),
+            len(response.request.content), len(response.content)
+        )
+        choice = (data.get("choices") or [{}])[0]
+        text = (choice.get("message") or {}).get("content") or ""
+        if not text.strip():
+            raise ValueError("OpenAI API response did not contain any usable text content")
+        truncated = choice.get("finish_reason") == "length"
+        print(f"INFO: Received OpenAI response from {model_name} (length: {len(text)} chars, finish_reason: {choice.get('finish_reason')})")
+        return text.strip(), truncated
+
+    @staticmethod
+    def _to_content(parts: List[PromptPart]) -> List[Dict]:
+        content = []
+        for part in parts:
+            if isinstance(part, str):
+                content.append({"type": "text", "text": part})
+            else:
+                content.append({
+                    "type": "image_url",
+                    "image_url": {"url": f"data:image/jpeg;base64,{image_to_base64_jpeg(part)}"},
+                })
+        return content
+
+    async def generate_content_from_blocks(
+        self,
+        user_input: UserInput,
+        llm_selection: LLMSelection,
+        output_preferences: Optional[OutputPreferences] = None
+    ) -> GeneratedContent:
+        if not self.api_key:
+            return not_configured_article("OpenAI", "OPENAI_API_KEY", "Check the OpenAI dashboard for API key permissions")
+
+        current_model_supports_images = model_supports_images_lookup(llm_selection.model_name)
+        fetched_image_objects = await fetch_block_images(user_input, current_model_supports_images)
+        parts = build_article_parts(user_input, output_preferences, fetched_image_objects, current_model_supports_images)
+        print(f"INFO: Final prompt for OpenAI API contains {len(parts)} parts.")
+        try:
+            generated_markdown, _ = await self._chat_completion(
+                llm_selection.model_name,
+                [{"role": "user", "content": self._to_content(parts)}]
+            )
+            return article_from_markdown(user_input, generated_markdown, llm_selection.model_name, output_preferences)
+        except Exception as e:
+            print(f"ERROR: An error occurred during OpenAI API call or response processing: {e}")
+            raise
+
+    async def generate_simple_text(self, prompt: str, model_name: str = DEFAULT_MODEL) -> str:
+        text, _ = await self._chat_completion(model_name, [{"role": "user", "content": prompt}])
+        return text
+
+    async def generate_structured_text(self, prompt: str, model_name: str = DEFAULT_MODEL, json_object: bool = False) -> str:
+        # JSON mode only accepts a top-level object, so array-shaped results use plain text output
+        text, _ = await self._chat_completion(model_name, [{"role": "user", "content": prompt}], temperature=0.4, json_output=json_object)
+        return text
+
+    async def generate_long_text(self, prompt: str, model_name: str = DEFAULT_MODEL) -> Tuple[str, bool]:
+        return await self._chat_completion(model_name, [{"role": "user", "content": prompt}])
+
+    async def generate_chat_reply(self, history: List[Dict[str, str]], message: str, model_name: str = DEFAULT_MODEL) -> str:
+        messages = [
+            {"role": "assistant" if turn["role"] == "model" else "user", "content": turn["content"]}
+            for turn in history
+        ]
+        messages.append({"role": "user", "content": message})
+        text, _ = await self._chat_completion(model_name, messages)
+        return text
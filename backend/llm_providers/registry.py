@@ -0,0 +1,97 @@
+# File: agent-app/backend/llm_providers/registry.py
+"""
+Lazily loaded provider plugins.
+
+Providers are registered by name with a "module:Class" path and imported the first time a request
+needs them, so worker start-up does not pay for SDKs (google.generativeai, httpx, PIL, markdown_it)
+of providers it may never call. ProviderRegistry is a read-only mapping of name -> provider class:
+membership and listing never import anything, indexing imports on first use.
+
+Extra providers can be plugged in without code changes:
+    LLM_PROVIDER_PLUGINS="mistral=my_plugins.mistral:MistralLLMProvider"
+and loaded ahead of the first request from a background thread:
+    LLM_PROVIDER_WARMUP="google,anthropic"   # or "all"
+"""
+import importlib
+import os
+import threading
+import time
+from typing import Dict, Iterable, Iterator, Mapping, Optional, Type, Union
+
+from .base_llm import BaseLLMProvider
+
+ProviderSpec = Union[str, Type[BaseLLMProvider]]
+
+
+def parse_provider_plugins(spec: str) -> Dict[str, str]:
+    plugins = {}
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        name, sep, path = item.partition("=")
+        if not sep or ":" not in path:
+            print(f"WARNING: Ignoring malformed LLM_PROVIDER_PLUGINS entry: {item}")
+            continue
+        plugins[name.strip().lower()] = path.strip()
+    return plugins
+
+
+class ProviderRegistry(Mapping[str, Type[BaseLLMProvider]]):
+    def __init__(self, providers: Optional[Dict[str, ProviderSpec]] = None):
+        self._specs: Dict[str, ProviderSpec] = {}
+        self._loaded: Dict[str, Type[BaseLLMProvider]] = {}
+        self._lock = threading.Lock()
+        for name, spec in (providers or {}).items():
+            self.register(name, spec)
+
+    def register(self, name: str, spec: ProviderSpec) -> None:
+        name = name.lower()
+        self._specs[name] = spec
+        self._loaded.pop(name, None)
+        if not isinstance(spec, str):
+            self._loaded[name] = spec
+
+    def is_loaded(self, name: str) -> bool:
+        return name.lower() in self._loaded
+
+    def __getitem__(self, name: str) -> Type[BaseLLMProvider]:
+        name = name.lower()
+        provider_class = self._loaded.get(name)
+        if provider_class is not None:
+            return provider_class
+        spec = self._specs[name]
+        with self._lock:
+            if name not in self._loaded:
+                module_name, _, class_name = spec.partition(":")
+                start = time.perf_counter()
+                self._loaded[name] = getattr(importlib.import_module(module_name), class_name)
+                print(f"INFO: Loaded LLM provider '{name}' from {spec} in {(time.perf_counter() - start) * 1000:.0f}ms")
+        return self._loaded[name]
+
+    def __contains__(self, name: object) -> bool:
+        return isinstance(name, str) and name.lower() in self._specs
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._specs)
+
+    def __len__(self) -> int:
+        return len(self._specs)
+
+    def warm_up(self, names: Optional[Iterable[str]] = None) -> None:
+        """Imports the given providers (all registered ones by default); failures are logged, not raised."""
+        for name in (names if names is not None else list(self._specs)):
+            if name not in self:
+                print(f"WARNING: Cannot warm up unknown LLM provider '{name}'")
+                continue
+            try:
+                self[name]
+            except Exception as e:
+                print(f"ERROR: Failed to load LLM provider '{name}': {e}")
+
+    def start_warm_up(self, spec: Optional[str] = None) -> Optional[threading.Thread]:
+        """Starts a background import of the providers in LLM_PROVIDER_WARMUP ("all" or a comma list)."""
+        spec = (spec if spec is not None else os.getenv("LLM_PROVIDER_WARMUP", "")).strip()
+        if not spec:
+            return None
+        names = None if spec.lower() == "all" else [name.strip().lower() for name in spec.split(",") if name.strip()]
+        thread = threading.Thread(target=self.warm_up, args=(names,), name="provider-warm-up", daemon=True)
+        thread.start()
+        return thread
@@ -0,0 +1,249 @@
+# File: agent-app/backend/llm_providers/replay_llm.py
+"""
+Record and replay of upstream LLM calls.
+
+With LLM_RECORD_PATH set, the router wraps every provider in RecordingLLMProvider, which appends
+each successful call (request hash, model, raw response text and upstream latency) to a
+gzip-compressed JSON-lines corpus. With LLM_REPLAY_PATH set, provider "replay" serves responses
+from such a corpus instead of calling an API, so the real prompt building, parsing and rendering
+paths can be profiled offline with real model output.
+
+Requests are keyed by method, model and request payload, not by provider, so a corpus recorded
+against Gemini replays under provider "replay" with the same model names (set
+ANALYSIS_LLM_PROVIDER=replay for the analysis endpoints). A key recorded several times is
+replayed in recording order, wrapping around.
+
+Recorded calls are compressed and appended by a background thread, so the event loop never waits
+on the file. Every append holds an exclusive flock on the corpus, so the serve.py workers can all
+record to the same file without interleaving their gzip members.
+
+Environment:
+    LLM_RECORD_PATH    corpus file to append to, e.g. corpus/gemini.jsonl.gz
+    LLM_REPLAY_PATH    corpus file to serve from
+    LLM_REPLAY_SPEED   1 = original latency (default), 10 = ten times faster, 0 = no delay
+"""
+import asyncio
+import gzip
+import hashlib
+import json
+import os
+import queue
+import threading
+import time
+from collections import defaultdict
+from typing import Dict, List, Optional, Tuple
+
+from .base_llm import BaseLLMProvider
+from schemas import UserInput, LLMSelection, GeneratedContent, OutputPreferences
+
+
+class ReplayMissError(LookupError):
+    """The corpus has no recording for this request."""
+
+
+def request_key(method: str, model_name: str, payload: str) -> str:
+    return hashlib.sha256(json.dumps([method, model_name, payload], ensure_ascii=False).encode("utf-8")).hexdigest()
+
+
+def _blocks_payload(user_input: UserInput, output_preferences: Optional[OutputPreferences]) -> str:
+    prefs = output_preferences.model_dump_json() if output_preferences else ""
+    return user_input.model_dump_json() + "\n" + prefs
+
+
+def _chat_payload(history: List[Dict[str, str]], message: str) -> str:
+    return json.dumps([history, message], ensure_ascii=False)
+
+
+class ReplayCorpus:
+    """Append-only corpus; each write is one gzip member, which gzip readers concatenate."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._entries: Dict[str, List[Dict]] = defaultdict(list)
+        self._cursor: Dict[str, int] = defaultdict(int)
+        self._lock = threading.Lock()
+        self._queue: "queue.Queue[str]" = queue.Queue()
+        self._writer: Optional[threading.Thread] = None
+        self._writer_pid: Optional[int] = None
+        if os.path.exists(path):
+            with gzip.open(path, "rt", encoding="utf-8") as f:
+                for line in f:
+                    if line.strip():
+                        entry = json.loads(line)
+                        self._entries[entry["key"]].append(entry)
+            print(f"INFO: Loaded {sum(len(v) for v in self._entries.values())} recorded LLM responses from {path}")
+
+    def __len__(self) -> int:
+        return sum(len(v) for v in self._entries.values())
+
+    def append(self, entry: Dict) -> None:
+        """Makes the entry replayable at once and queues it for the background writer."""
+        with self._lock:
+            self._entries[entry["key"]].append(entry)
+            # Threads do not survive fork: each serve.py worker starts its own writer
+            if self._writer is None or self._writer_pid != os.getpid():
+                self._queue = queue.Queue()
+                self._writer = threading.Thread(target=self._run, name="replay-corpus-writer", daemon=True)
+                self._writer_pid = os.getpid()
+                self._writer.start()
+            self._queue.put(json.dumps(entry, ensure_ascii=False) + "\n")
+
+    def flush(self) -> None:
+        """Blocks until every queued entry has been written."""
+        self._queue.join()
+
+    def _run(self) -> None:
+        while True:
+            lines = [self._queue.get()]
+            while True:  # everything queued meanwhile goes into the same gzip member
+                try:
+                    lines.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                self._write(gzip.compress("".join(lines).encode("utf-8")))
+            except Exception as e:
+                print(f"ERROR: Failed to record {len(lines)} LLM responses to {self.path}: {e}")
+            finally:
+                for _ in lines:
+                    self._queue.task_done()
+
+    def _write(self, member: bytes) -> None:
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(self.path, "ab") as f:
+            try:
+                import fcntl
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX)  # released when the file is closed
+            except ImportError:
+                pass
+            f.write(member)
+            f.flush()
+
+    def next(self, key: str) -> Optional[Dict]:
+        with self._lock:
+            entries = self._entries.get(key)
+            if not entries:
+                return None
+            entry = entries[self._cursor[key] % len(entries)]
+            self._cursor[key] += 1
+            return entry
+
+
+class RecordingLLMProvider(BaseLLMProvider):
+    """Passes every call to the wrapped provider and records successful responses."""
+
+    def __init__(self, inner: BaseLLMProvider, corpus: ReplayCorpus):
+        self.inner = inner
+        self.corpus = corpus
+        self.display_name = inner.display_name
+
+    def is_configured(self) -> bool:
+        return self.inner.is_configured()
+
+    def _record(self, method: str, model_name: str, payload: str, start: float, response: str, truncated: bool = False) -> None:
+        self.corpus.append({
+            "key": request_key(method, model_name, payload),
+            "method": method,
+            "model": model_name,
+            "latency_s": round(time.perf_counter() - start, 4),
+            "response": response,
+            "truncated": truncated,
+        })
+
+    async def generate_content_from_blocks(
+        self,
+        user_input: UserInput,
+        llm_selection: LLMSelection,
+        output_preferences: Optional[OutputPreferences] = None
+    ) -> GeneratedContent:
+        start = time.perf_counter()
+        content = await self.inner.generate_content_from_blocks(user_input, llm_selection, output_preferences)
+        if not content.title.startswith("Error"):
+            self._record("blocks", llm_selection.model_name, _blocks_payload(user_input, output_preferences), start, content.article_markdown)
+        return content
+
+    async def generate_simple_text(self, prompt: str, model_name: str = "default") -> str:
+        start = time.perf_counter()
+        text = await self.inner.generate_simple_text(prompt=prompt, model_name=model_name)
+        self._record("simple", model_name, prompt, start, text)
+        return text
+
+    async def generate_structured_text(self, prompt: str, model_name: str = "default", json_object: bool = False) -> str:
+        start = time.perf_counter()
+        text = await self.inner.generate_structured_text(prompt=prompt, model_name=model_name, json_object=json_object)
+        self._record("structured", model_name, prompt, start, text)
+        return text
+
+    async def generate_long_text(self, prompt: str, model_name: str = "default") -> Tuple[str, bool]:
+        start = time.perf_counter()
+        text, truncated = await self.inner.generate_long_text(prompt=prompt, model_name=model_name)
+        self._record("long", model_name, prompt, start, text, truncated)
+        return text, truncated
+
+    async def generate_chat_reply(self, history: List[Dict[str, str]], message: str, model_name: str = "default") -> str:
+        start = time.perf_counter()
+        text = await self.inner.generate_chat_reply(history=history, message=message, model_name=model_name)
+        self._record("chat", model_name, _chat_payload(history, message), start, text)
+        return text
+
+
+class ReplayLLMProvider(BaseLLMProvider):
+    display_name = "Replay"
+    replays_recordings = True  # never wrapped for recording by the router
+
+    def __init__(self, corpus: Optional[ReplayCorpus] = None, speed: Optional[float] = None):
+        path = os.getenv("LLM_REPLAY_PATH")
+        self.corpus = corpus if corpus is not None else (ReplayCorpus(path) if path else None)
+        self.speed = speed if speed is not None else float(os.getenv("LLM_REPLAY_SPEED", "1"))
+        if self.corpus is None:
+            print("WARNING: LLM_REPLAY_PATH environment variable not found. ReplayLLMProvider will not be functional.")
+
+    def is_configured(self) -> bool:
+        return self.corpus is not None
+
+    async def _replay(self, method: str, model_name: str, payload: str) -> Dict:
+        if self.corpus is None:
+            raise ValueError("Replay corpus is not configured")
+        key = request_key(method, model_name, payload)
+        entry = self.corpus.next(key)
+        if entry is None:
+            raise ReplayMissError(f"No recorded {method} response for model {model_name} (request {key[:12]})")
+        if self.speed > 0:
+            await asyncio.sleep(entry["latency_s"] / self.speed)
+        return entry
+
+    async def generate_content_from_blocks(
+        self,
+        user_input: UserInput,
+        llm_selection: LLMSelection,
+        output_preferences: Optional[OutputPreferences] = None
+    ) -> GeneratedContent:
+        # Build the prompt as a live provider would so the prompt path is part of the profile;
+        # images are not fetched because the recorded response already reflects them.
+        from .article_prompt import article_from_markdown, build_article_parts
+        build_article_parts(user_input, output_preferences, {}, False)
+        entry = await self._replay("blocks", llm_selection.model_name, _blocks_payload(user_input, output_preferences))
+        return article_from_markdown(user_input, entry["response"], llm_selection.model_name, output_preferences)
+
+    async def generate_simple_text(self, prompt: str, model_name: str = "default") -> str:
+        return (await self._replay("simple", model_name, prompt))["response"]
+
+    async def generate_structured_text(self, prompt: str, model_name: str = "default", json_object: bool = False) -> str:
+        return (await self._replay("structured", model_name, prompt))["response"]
+
+    async def generate_long_text(self, prompt: str, model_name: str = "default") -> Tuple[str, bool]:
+        entry = await self._replay("long", model_name, prompt)
+        return entry["response"], bool(entry.get("truncated"))
+
+    async def generate_chat_reply(self, history: List[Dict[str, str]], message: str, model_name: str = "default") -> str:
+        return (await self._replay("chat", model_name, _chat_payload(history, message)))["response"]
+
+
+def recording_corpus_from_env() -> Optional[ReplayCorpus]:
+    path = os.getenv("LLM_RECORD_PATH")
+    if not path:
+        return None
+    print(f"INFO: Recording upstream LLM responses to {path}")
+    return ReplayCorpus(path)
@@ -0,0 +1,147 @@
+# File: agent-app/backend/llm_providers/resilience.py
+"""
+Retry, circuit breaking and model downgrade for provider calls.
+
+RetryPolicy retries transient upstream errors (timeouts, dropped connections, 408/429/5xx) with
+jittered exponential backoff. CircuitBreaker tracks consecutive transient failures per model:
+once it opens, calls are not sent to that model until the reset timeout has passed, after which a
+single trial call decides whether it closes again. Errors that is_retryable() rejects (a missing
+API key, a 400, an empty response) say nothing about upstream health and are not counted. While
+a model's breaker is open the router downgrades to the configured cheaper model instead of
+failing outright.
+
+Environment:
+    LLM_RETRY_MAX_ATTEMPTS     attempts per call including the first (default 3)
+    LLM_RETRY_BASE_DELAY       first backoff in seconds (default 0.5)
+    LLM_RETRY_MAX_DELAY        backoff cap in seconds (default 8)
+    LLM_BREAKER_FAILURES       consecutive failures that open a breaker (default 5)
+    LLM_BREAKER_RESET_SECONDS  how long a breaker stays open (default 30)
+    LLM_MODEL_DOWNGRADES       e.g. "gemini-2.5-pro=google:gemini-2.5-flash,gpt-4o=openai:gpt-4o-mini"
+"""
+import asyncio
+import os
+import random
+import sys
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+ModelKey = Tuple[str, str]  # (provider name, model name)
+
+RETRYABLE_STATUS_CODES = {408, 425, 429, 500, 502, 503, 504}
+
+DEFAULT_MODEL_DOWNGRADES: Dict[str, ModelKey] = {
+    "gemini-2.5-pro": ("google", "gemini-2.5-flash"),
+    "gpt-4o": ("openai", "gpt-4o-mini"),
+    "claude-3-opus-20240229": ("anthropic", "claude-3-sonnet-20240229"),
+    "claude-3-sonnet-20240229": ("anthropic", "claude-3-haiku-20240307"),
+}
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(RuntimeError):
+    """Raised without calling upstream because the model's breaker is open."""
+
+
+def is_retryable(exc: BaseException) -> bool:
+    """True for errors that are likely to succeed when the same call is repeated."""
+    # httpx errors can only exist once a provider has imported httpx; do not import it just to check
+    httpx = sys.modules.get("httpx")
+    seen = set()
+    while exc is not None and id(exc) not in seen:
+        seen.add(id(exc))
+        if httpx is not None and isinstance(exc, httpx.HTTPStatusError):
+            return exc.response.status_code in RETRYABLE_STATUS_CODES
+        if httpx is not None and isinstance(exc, httpx.TransportError):
+            return True
+        if isinstance(exc, (asyncio.TimeoutError, TimeoutError, ConnectionError)):
+            return True
+        # google.api_core exceptions carry the HTTP status as an int .code
+        code = getattr(exc, "code", None)
+        if isinstance(code, int) and code in RETRYABLE_STATUS_CODES:
+            return True
+        exc = exc.__cause__ or exc.__context__
+    return False
+
+
+def parse_model_downgrades(spec: str) -> Dict[str, ModelKey]:
+    downgrades = {}
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        try:
+            model, target = item.split("=", 1)
+            provider_name, fallback_model = target.split(":", 1)
+            downgrades[model.strip()] = (provider_name.strip().lower(), fallback_model.strip())
+        except ValueError:
+            print(f"WARNING: Ignoring malformed LLM_MODEL_DOWNGRADES entry: {item}")
+    return downgrades
+
+
+class RetryPolicy:
+    def __init__(
+        self,
+        max_attempts: Optional[int] = None,
+        base_delay: Optional[float] = None,
+        max_delay: Optional[float] = None
+    ):
+        self.max_attempts = max(1, max_attempts if max_attempts is not None else int(os.getenv("LLM_RETRY_MAX_ATTEMPTS", "3")))
+        self.base_delay = base_delay if base_delay is not None else float(os.getenv("LLM_RETRY_BASE_DELAY", "0.5"))
+        self.max_delay = max_delay if max_delay is not None else float(os.getenv("LLM_RETRY_MAX_DELAY", "8"))
+
+    def backoff(self, attempt: int) -> float:
+        """Full-jitter delay before retry number `attempt` (1-based)."""
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** (attempt - 1))))
+
+
+class CircuitBreaker:
+    def __init__(self, failure_threshold: Optional[int] = None, reset_seconds: Optional[float] = None):
+        self.failure_threshold = failure_threshold if failure_threshold is not None else int(os.getenv("LLM_BREAKER_FAILURES", "5"))
+        self.reset_seconds = reset_seconds if reset_seconds is not None else float(os.getenv("LLM_BREAKER_RESET_SECONDS", "30"))
+        self.consecutive_failures = 0
+        self.opened_at: Optional[float] = None
+        self.times_opened = 0
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return CLOSED
+        if time.monotonic() - self.opened_at >= self.reset_seconds:
+            return HALF_OPEN
+        return OPEN
+
+    def allow(self) -> bool:
+        """Whether a call may go upstream now. In half-open state only one trial call is let through."""
+        with self._lock:
+            state = self.state
+            if state == CLOSED:
+                return True
+            if state == HALF_OPEN and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            return False
+
+    def record_success(self) -> None:
+        with self._lock:
+            if self.opened_at is not None:
+                print("INFO: Circuit breaker closed after successful trial call")
+            self.consecutive_failures = 0
+            self.opened_at = None
+            self._trial_in_flight = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.consecutive_failures += 1
+            if self._trial_in_flight or self.consecutive_failures >= self.failure_threshold:
+                if self.opened_at is None or self._trial_in_flight:
+                    self.times_opened += 1
+                self.opened_at = time.monotonic()
+            self._trial_in_flight = False
+
+    def release(self) -> None:
+        """A trial call ended without an outcome (cancelled, or a non-transient error); let the next call try again."""
+        with self._lock:
+            self._trial_in_flight = False
@@ -0,0 +1,370 @@
+# File: agent-app/backend/llm_providers/router.py
+"""
+Latency-aware routing across providers.
+
+LLMRouter keeps one provider instance per provider name and records latency and outcome of every
+call per (provider, model). For interactive requests it can hedge: if the primary model has not
+answered after roughly its observed p95 latency, the same call is sent to an alternate model and
+whichever succeeds first wins. RoutedLLMProvider exposes the router through the normal
+BaseLLMProvider interface, so endpoints and the analysis pipeline do not need to know about it.
+
+Every leg goes through the policies in resilience.py: transient errors are retried with backoff,
+each model has a circuit breaker, and a model whose breaker is open is downgraded to its
+configured fallback. Retry, downgrade and breaker counters are part of the stats snapshot.
+
+With a recording corpus (LLM_RECORD_PATH, see replay_llm.py) every provider instance is wrapped so
+its upstream responses are recorded for offline replay.
+
+Alternates can be overridden with LLM_HEDGE_ALTERNATES, e.g.
+    LLM_HEDGE_ALTERNATES="gemini-2.5-pro=google:gemini-2.5-flash,gpt-4o=openai:gpt-4o-mini"
+"""
+import asyncio
+import os
+import time
+from collections import deque
+from typing import Awaitable, Callable, Deque, Dict, List, Optional, Tuple, Type, TypeVar
+
+import numpy as np
+
+from .base_llm import BaseLLMProvider
+from .replay_llm import RecordingLLMProvider, ReplayCorpus, recording_corpus_from_env
+from .resilience import (
+    CircuitBreaker, CircuitOpenError, RetryPolicy, DEFAULT_MODEL_DOWNGRADES, is_retryable, parse_model_downgrades
+)
+from observability import tracing
+from observability.metrics import MetricsRegistry, record_upstream_error
+from schemas import UserInput, LLMSelection, GeneratedContent, OutputPreferences
+
+T = TypeVar("T")
+ModelKey = Tuple[str, str]  # (provider name, model name)
+
+LATENCY_WINDOW = 200  # most recent calls kept per model
+MIN_SAMPLES_FOR_HEDGE = 10  # below this the default delay is used
+HEDGE_DEFAULT_DELAY = 8.0
+HEDGE_MIN_DELAY = 0.5
+HEDGE_MAX_DELAY = 60.0
+
+DEFAULT_HEDGE_ALTERNATES: Dict[str, ModelKey] = {
+    "gemini-2.5-pro": ("google", "gemini-2.5-flash"),
+    "gemini-2.5-flash": ("openai", "gpt-4o-mini"),
+    "gpt-4o": ("openai", "gpt-4o-mini"),
+    "gpt-4o-mini": ("google", "gemini-2.5-flash"),
+    "claude-3-opus-20240229": ("anthropic", "claude-3-sonnet-20240229"),
+    "claude-3-sonnet-20240229": ("anthropic", "claude-3-haiku-20240307"),
+    "claude-3-haiku-20240307": ("google", "gemini-2.5-flash"),
+}
+
+
+def parse_hedge_alternates(spec: str) -> Dict[str, ModelKey]:
+    alternates = {}
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        try:
+            model, target = item.split("=", 1)
+            provider_name, alternate_model = target.split(":", 1)
+            alternates[model.strip()] = (provider_name.strip().lower(), alternate_model.strip())
+        except ValueError:
+            print(f"WARNING: Ignoring malformed LLM_HEDGE_ALTERNATES entry: {item}")
+    return alternates
+
+
+class ModelStats:
+    """Rolling latency and outcome window for one model."""
+
+    def __init__(self, window: int = LATENCY_WINDOW):
+        self.latencies: Deque[float] = deque(maxlen=window)  # successful calls and legs cancelled by a hedge
+        self.outcomes: Deque[bool] = deque(maxlen=window)
+        self.hedges_started = 0
+        self.hedges_won = 0
+        self.retries = 0
+        self.downgrades = 0
+        self.breaker = CircuitBreaker()
+
+    def record(self, latency: float, ok: bool) -> None:
+        self.outcomes.append(ok)
+        if ok:
+            self.latencies.append(latency)
+
+    def record_cancelled(self, elapsed: float) -> None:
+        """A leg cancelled by a faster hedge took at least this long; keep it so p95 is not biased low."""
+        self.latencies.append(elapsed)
+
+    def percentile(self, q: float) -> Optional[float]:
+        return float(np.percentile(self.latencies, q)) if self.latencies else None
+
+    def error_rate(self) -> float:
+        return (len(self.outcomes) - sum(self.outcomes)) / len(self.outcomes) if self.outcomes else 0.0
+
+    def snapshot(self) -> Dict:
+        return {
+            "calls": len(self.outcomes),
+            "p50_seconds": self.percentile(50),
+            "p95_seconds": self.percentile(95),
+            "p99_seconds": self.percentile(99),
+            "error_rate": round(self.error_rate(), 4),
+            "hedges_started": self.hedges_started,
+            "hedges_won": self.hedges_won,
+            "retries": self.retries,
+            "downgrades": self.downgrades,
+            "circuit_state": self.breaker.state,
+            "circuit_opened": self.breaker.times_opened,
+            "consecutive_failures": self.breaker.consecutive_failures,
+        }
+
+
+class LLMRouter:
+    def __init__(
+        self,
+        provider_classes: Dict[str, Type[BaseLLMProvider]],
+        alternates: Optional[Dict[str, ModelKey]] = None,
+        downgrades: Optional[Dict[str, ModelKey]] = None,
+        retry_policy: Optional[RetryPolicy] = None,
+        recording_corpus: Optional[ReplayCorpus] = None
+    ):
+        self.provider_classes = provider_classes
+        self.alternates = dict(DEFAULT_HEDGE_ALTERNATES)
+        self.alternates.update(alternates if alternates is not None else parse_hedge_alternates(os.getenv("LLM_HEDGE_ALTERNATES", "")))
+        self.downgrades = dict(DEFAULT_MODEL_DOWNGRADES)
+        self.downgrades.update(downgrades if downgrades is not None else parse_model_downgrades(os.getenv("LLM_MODEL_DOWNGRADES", "")))
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.recording_corpus = recording_corpus if recording_corpus is not None else recording_corpus_from_env()
+        self._providers: Dict[str, BaseLLMProvider] = {}
+        self._stats: Dict[ModelKey, ModelStats] = {}
+
+    def provider(self, provider_name: str) -> BaseLLMProvider:
+        provider_name = provider_name.lower()
+        if provider_name not in self._providers:
+            provider_class = self.provider_classes[provider_name]
+            provider = provider_class()
+            if self.recording_corpus is not None and not getattr(provider_class, "replays_recordings", False):
+                provider = RecordingLLMProvider(provider, self.recording_corpus)
+            self._providers[provider_name] = provider
+        return self._providers[provider_name]
+
+    def stats(self, provider_name: str, model_name: str) -> ModelStats:
+        key = (provider_name.lower(), model_name)
+        if key not in self._stats:
+            self._stats[key] = ModelStats()
+        return self._stats[key]
+
+    def hedge_delay(self, provider_name: str, model_name: str) -> float:
+        stats = self.stats(provider_name, model_name)
+        if len(stats.latencies) < MIN_SAMPLES_FOR_HEDGE:
+            return HEDGE_DEFAULT_DELAY
+        return min(max(stats.percentile(95), HEDGE_MIN_DELAY), HEDGE_MAX_DELAY)
+
+    def alternate_for(self, provider_name: str, model_name: str) -> Optional[ModelKey]:
+        alternate = self.alternates.get(model_name)
+        if not alternate or alternate == (provider_name.lower(), model_name) or alternate[0] not in self.provider_classes:
+            return None
+        return alternate if self.provider(alternate[0]).is_configured() else None
+
+    def downgrade_for(self, provider_name: str, model_name: str) -> Optional[ModelKey]:
+        fallback = self.downgrades.get(model_name)
+        if not fallback or fallback == (provider_name.lower(), model_name) or fallback[0] not in self.provider_classes:
+            return None
+        return fallback if self.provider(fallback[0]).is_configured() else None
+
+    def _select_target(self, provider_name: str, model_name: str) -> ModelKey:
+        """The requested model if its breaker admits the call, otherwise its downgrade target."""
+        if self.stats(provider_name, model_name).breaker.allow():
+            return provider_name, model_name
+        fallback = self.downgrade_for(provider_name, model_name)
+        if fallback is not None and self.stats(*fallback).breaker.allow():
+            self.stats(provider_name, model_name).downgrades += 1
+            print(f"INFO: Circuit open for {provider_name}/{model_name}, downgrading to {fallback[0]}/{fallback[1]}")
+            return fallback
+        raise CircuitOpenError(f"Circuit breaker open for {provider_name}/{model_name}; upstream is failing, try again later")
+
+    async def _timed(
+        self,
+        provider_name: str,
+        model_name: str,
+        call: Callable[[BaseLLMProvider, str, str], Awaitable[T]],
+        is_failure: Optional[Callable[[T], bool]]
+    ) -> T:
+        start = time.perf_counter()
+        try:
+            with tracing.span("llm_call", **{"llm.provider": provider_name, "llm.model": model_name}):
+                result = await call(self.provider(provider_name), provider_name, model_name)
+        except asyncio.CancelledError:
+            self.stats(provider_name, model_name).record_cancelled(time.perf_counter() - start)
+            raise
+        except Exception as e:
+            self.stats(provider_name, model_name).record(time.perf_counter() - start, False)
+            record_upstream_error(provider_name, model_name, e)
+            raise
+        failed = bool(is_failure and is_failure(result))
+        self.stats(provider_name, model_name).record(time.perf_counter() - start, not failed)
+        return result
+
+    async def _run_leg(
+        self,
+        provider_name: str,
+        model_name: str,
+        call: Callable[[BaseLLMProvider, str, str], Awaitable[T]],
+        is_failure: Optional[Callable[[T], bool]]
+    ) -> T:
+        """One logical call: breaker check and downgrade, then retries of transient errors."""
+        for attempt in range(1, self.retry_policy.max_attempts + 1):
+            target = self._select_target(provider_name, model_name)
+            breaker = self.stats(*target).breaker
+            try:
+                result = await self._timed(target[0], target[1], call, is_failure)
+            except asyncio.CancelledError:
+                breaker.release()
+                raise
+            except Exception as e:
+                retryable = is_retryable(e)
+                if retryable:
+                    breaker.record_failure()
+                else:
+                    breaker.release()  # not configured, bad request, empty response: not an upstream outage
+                if attempt == self.retry_policy.max_attempts or not retryable:
+                    raise
+                delay = self.retry_policy.backoff(attempt)
+                self.stats(provider_name, model_name).retries += 1
+                print(f"WARNING: {target[0]}/{target[1]} failed ({e}); retry {attempt} in {delay:.2f}s")
+                await asyncio.sleep(delay)
+                continue
+            if is_failure and is_failure(result):
+                breaker.release()  # e.g. not configured: says nothing about upstream health
+            else:
+                breaker.record_success()
+            return result
+
+    async def call(
+        self,
+        provider_name: str,
+        model_name: str,
+        call: Callable[[BaseLLMProvider, str, str], Awaitable[T]],
+        hedge: bool = False,
+        is_failure: Optional[Callable[[T], bool]] = None
+    ) -> T:
+        """
+        Runs call(provider, provider_name, model_name) against the primary model, optionally hedged.
+
+        is_failure marks results that count as errors even though no exception was raised
+        (e.g. the not-configured article); a failed hedge leg never wins.
+        """
+        alternate = self.alternate_for(provider_name, model_name) if hedge else None
+        if alternate is None:
+            return await self._run_leg(provider_name, model_name, call, is_failure)
+
+        delay = self.hedge_delay(provider_name, model_name)
+        primary = asyncio.ensure_future(self._run_leg(provider_name, model_name, call, is_failure))
+        done, _ = await asyncio.wait({primary}, timeout=delay)
+        if done and not self._leg_failed(primary, is_failure):
+            return primary.result()
+
+        stats = self.stats(provider_name, model_name)
+        stats.hedges_started += 1
+        print(f"INFO: Hedging {provider_name}/{model_name} to {alternate[0]}/{alternate[1]} after {delay:.2f}s")
+        secondary = asyncio.ensure_future(self._run_leg(alternate[0], alternate[1], call, is_failure))
+        pending = {secondary} if done else {primary, secondary}
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if not self._leg_failed(task, is_failure):
+                        if task is secondary:
+                            stats.hedges_won += 1
+                        return task.result()
+            # Every leg failed: surface the primary outcome
+            return primary.result()
+        finally:
+            # The losing leg is cancelled; a provider call already running in a worker thread
+            # still finishes in the background but its result is discarded.
+            for task in (primary, secondary):
+                if not task.done():
+                    task.cancel()
+
+    @staticmethod
+    def _leg_failed(task: "asyncio.Future", is_failure: Optional[Callable]) -> bool:
+        if task.cancelled() or task.exception() is not None:
+            return True
+        return bool(is_failure and is_failure(task.result()))
+
+    def snapshot(self) -> Dict[str, Dict]:
+        return {f"{provider}/{model}": stats.snapshot() for (provider, model), stats in sorted(self._stats.items())}
+
+    def register_metrics(self, registry: MetricsRegistry) -> None:
+        """Exposes retry, downgrade, hedging and circuit breaker state, read at scrape time."""
+        def samples(value: Callable[[ModelStats], float]):
+            return lambda: [
+                ({"provider": provider, "model": model}, value(stats))
+                for (provider, model), stats in sorted(self._stats.items())
+            ]
+
+        circuit_states = {"closed": 0, "half_open": 1, "open": 2}
+        registry.collector("llm_retries_total", "counter", "Retries of transient upstream errors.", samples(lambda s: s.retries))
+        registry.collector("llm_downgrades_total", "counter", "Calls sent to the downgrade model because the circuit was open.", samples(lambda s: s.downgrades))
+        registry.collector("llm_hedges_started_total", "counter", "Hedged requests sent to an alternate model.", samples(lambda s: s.hedges_started))
+        registry.collector("llm_hedges_won_total", "counter", "Hedged requests answered first by the alternate model.", samples(lambda s: s.hedges_won))
+        registry.collector("llm_circuit_opened_total", "counter", "Times the circuit breaker opened.", samples(lambda s: s.breaker.times_opened))
+        registry.collector("llm_circuit_state", "gauge", "Circuit breaker state: 0 closed, 1 half-open, 2 open.", samples(lambda s: circuit_states[s.breaker.state]))
+
+
+def is_error_article(content: GeneratedContent) -> bool:
+    return content.title.startswith("Error")
+
+
+class RoutedLLMProvider(BaseLLMProvider):
+    """BaseLLMProvider facade that sends every call through an LLMRouter."""
+
+    def __init__(self, router: LLMRouter, provider_name: str, hedge: bool = False):
+        self.router = router
+        self.provider_name = provider_name.lower()
+        self.hedge = hedge
+
+    def is_configured(self) -> bool:
+        return self.router.provider(self.provider_name).is_configured()
+
+    async def generate_content_from_blocks(
+        self,
+        user_input: UserInput,
+        llm_selection: LLMSelection,
+        output_preferences: Optional[OutputPreferences] = None
+    ) -> GeneratedContent:
+        # Providers raise so that the router can retry; the endpoint still gets an error article
+        try:
+            return await self.router.call(
+                self.provider_name,
+                llm_selection.model_name,
+                lambda provider, provider_name, model_name: provider.generate_content_from_blocks(
+                    user_input, LLMSelection(provider=provider_name, model_name=model_name), output_preferences
+                ),
+                hedge=self.hedge,
+                is_failure=is_error_article
+            )
+        except Exception as e:
+            # Imported here: article_prompt pulls in PIL and httpx, which the router itself does not need
+            from .article_prompt import generation_error_article
+            return generation_error_article(self.router.provider(self.provider_name).display_name, e)
+
+    async def generate_simple_text(self, prompt: str, model_name: str = "default") -> str:
+        return await self.router.call(
+            self.provider_name, model_name,
+            lambda provider, _, model: provider.generate_simple_text(prompt=prompt, model_name=model),
+            hedge=self.hedge
+        )
+
+    async def generate_structured_text(self, prompt: str, model_name: str = "default", json_object: bool = False) -> str:
+        return await self.router.call(
+            self.provider_name, model_name,
+            lambda provider, _, model: provider.generate_structured_text(prompt=prompt, model_name=model, json_object=json_object),
+            hedge=self.hedge
+        )
+
+    async def generate_long_text(self, prompt: str, model_name: str = "default") -> Tuple[str, bool]:
+        return await self.router.call(
+            self.provider_name, model_name,
+            lambda provider, _, model: provider.generate_long_text(prompt=prompt, model_name=model),
+            hedge=self.hedge
+        )
+
+    async def generate_chat_reply(self, history: List[Dict[str, str]], message: str, model_name: str = "default") -> str:
+        return await self.router.call(
+            self.provider_name, model_name,
+            lambda provider, _, model: provider.generate_chat_reply(history=history, message=message, model_name=model),
+            hedge=self.hedge
+        )
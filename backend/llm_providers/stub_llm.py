@@ -0,0 +1,172 @@
+# File: agent-app/backend/llm_providers/stub_llm.py
+"""
+A local provider that never leaves the process. It returns deterministic, well-formed responses
+for every prompt the backend sends (articles, analysis JSON, outlines, per-block analysis) after
+a configurable simulated latency, so routing, load tests and the frontend can be exercised
+without API keys. Registered as provider "stub" when ENABLE_STUB_LLM=1.
+
+Environment:
+    STUB_LLM_LATENCY_MS     base latency per call (default 200)
+    STUB_LLM_JITTER_MS      uniform jitter added on top (default 100)
+    STUB_LLM_LATENCY_DIST   "uniform" (base + jitter, default) or "lognormal" (median = base,
+                            long tail like real APIs; shape from STUB_LLM_LATENCY_SIGMA, default 0.6)
+    STUB_LLM_OUTPUT_WORDS   filler words appended to articles and sections (default 0)
+    STUB_LLM_ERROR_RATE     fraction of calls that raise (default 0)
+"""
+import asyncio
+import json
+import os
+import random
+import re
+from typing import Dict, List, Optional, Tuple
+
+from .base_llm import BaseLLMProvider
+from observability.metrics import record_llm_usage, upstream_timer
+from analysis.tokens import estimate_tokens
+from .article_prompt import article_from_markdown
+from schemas import UserInput, LLMSelection, GeneratedContent, OutputPreferences
+
+
+class StubLLMError(ConnectionError):
+    """Simulated transient upstream failure; retryable like a dropped connection."""
+
+
+def _text_of(block) -> str:
+    if block.type == "text":
+        return block.content
+    if block.type == "code":
+        return f"```{block.language}\n{block.code}\n```"
+    return f"*{block.alt_text or block.caption or 'image'}*"
+
+
+_FILLER_WORDS = "知识 管理 笔记 链接 回顾 notes links review retrieval practice 概念 关联".split()
+
+
+def filler_text(words: int) -> str:
+    """Deterministic filler of roughly `words` words, in paragraphs of 60."""
+    if words <= 0:
+        return ""
+    tokens = [_FILLER_WORDS[i % len(_FILLER_WORDS)] for i in range(words)]
+    return "\n\n" + "\n\n".join(" ".join(tokens[i:i + 60]) + "." for i in range(0, words, 60))
+
+
+class StubLLMProvider(BaseLLMProvider):
+    display_name = "Stub"
+
+    def __init__(
+        self,
+        latency_ms: Optional[float] = None,
+        jitter_ms: Optional[float] = None,
+        error_rate: Optional[float] = None,
+        seed: Optional[int] = None,
+        latency_distribution: Optional[str] = None,
+        latency_sigma: Optional[float] = None,
+        output_words: Optional[int] = None
+    ):
+        self.latency_ms = latency_ms if latency_ms is not None else float(os.getenv("STUB_LLM_LATENCY_MS", "200"))
+        self.jitter_ms = jitter_ms if jitter_ms is not None else float(os.getenv("STUB_LLM_JITTER_MS", "100"))
+        self.error_rate = error_rate if error_rate is not None else float(os.getenv("STUB_LLM_ERROR_RATE", "0"))
+        self.latency_distribution = latency_distribution or os.getenv("STUB_LLM_LATENCY_DIST", "uniform")
+        self.latency_sigma = latency_sigma if latency_sigma is not None else float(os.getenv("STUB_LLM_LATENCY_SIGMA", "0.6"))
+        self.output_words = output_words if output_words is not None else int(os.getenv("STUB_LLM_OUTPUT_WORDS", "0"))
+        self._random = random.Random(seed)
+
+    def sample_latency_ms(self) -> float:
+        if self.latency_distribution == "lognormal":
+            return self.latency_ms * self._random.lognormvariate(0, self.latency_sigma)
+        return self.latency_ms + self._random.uniform(0, self.jitter_ms)
+
+    async def _simulate(self, model_name: str) -> None:
+        with upstream_timer("stub", model_name):
+            await asyncio.sleep(self.sample_latency_ms() / 1000)
+        if self._random.random() < self.error_rate:
+            raise StubLLMError(f"Simulated upstream error from stub model {model_name}")
+
+    @staticmethod
+    def _record_usage(model_name: str, prompt: str, output: str) -> str:
+        record_llm_usage(
+            "stub", model_name, estimate_tokens(prompt), estimate_tokens(output),
+            len(prompt.encode("utf-8")), len(output.encode("utf-8"))
+        )
+        return output
+
+    async def generate_content_from_blocks(
+        self,
+        user_input: UserInput,
+        llm_selection: LLMSelection,
+        output_preferences: Optional[OutputPreferences] = None
+    ) -> GeneratedContent:
+        await self._simulate(llm_selection.model_name)
+        body = "\n\n".join(_text_of(block) for block in user_input.blocks) or "No content blocks were provided."
+        markdown = self._record_usage(
+            llm_selection.model_name, body, f"# Stub Article\n\n## Overview\n\n{body}{filler_text(self.output_words)}\n"
+        )
+        return article_from_markdown(user_input, markdown, llm_selection.model_name, output_preferences)
+
+    async def generate_simple_text(self, prompt: str, model_name: str = "stub") -> str:
+        await self._simulate(model_name)
+        output = self.respond(prompt)
+        if output.startswith("## "):
+            output += filler_text(self.output_words)  # only prose sections grow; JSON shapes stay valid
+        return self._record_usage(model_name, prompt, output)
+
+    async def generate_long_text(self, prompt: str, model_name: str = "stub") -> Tuple[str, bool]:
+        return await self.generate_simple_text(prompt, model_name), False
+
+    async def generate_chat_reply(self, history: List[Dict[str, str]], message: str, model_name: str = "stub") -> str:
+        await self._simulate(model_name)
+        previous = next((turn["content"] for turn in reversed(history) if turn["role"] == "model"), "# Stub Article\n")
+        reply = f"{previous.rstrip()}\n\n> Revised: {message.splitlines()[0]}\n"
+        return self._record_usage(model_name, "".join(turn["content"] for turn in history) + message, reply)
+
+    @staticmethod
+    def respond(prompt: str) -> str:
+        """Canned response shaped like whatever the prompt asks for."""
+        if "综合分析" in prompt:
+            payload = {}
+            for field in re.findall(r'字段 "(\w+)"', prompt):
+                payload[field] = json.loads(StubLLMProvider._stage_response(field))
+            return json.dumps(payload, ensure_ascii=False)
+        if "--- 分析任务 " in prompt:
+            tasks = re.findall(r'^--- 分析任务 (\d+)（(\S+?)） ---$', prompt, re.MULTILINE)
+            stages = {"关键词": "keywords", "思维导图": "mindmap", "内容概要": "summary"}
+            return json.dumps([
+                {"item": int(n), "result": json.loads(StubLLMProvider._stage_response(stages.get(name, "summary")))}
+                for n, name in tasks
+            ], ensure_ascii=False)
+        if "--- 内容块 " in prompt:
+            count = len(re.findall(r'^--- 内容块 \d+ ---$', prompt, re.MULTILINE))
+            return json.dumps([
+                {"block": n, "keywords": [{"keyword": f"概念{n}", "importance": 0.8, "category": "核心概念"}],
+                 "summary": f"内容块{n}的概要。", "key_points": [f"内容块{n}的要点"], "quote": ""}
+                for n in range(1, count + 1)
+            ], ensure_ascii=False)
+        if '"sections"' in prompt:
+            return json.dumps({"title": "Stub Article", "sections": [
+                {"heading": f"Section {n}", "brief": "", "blocks": [], "target_words": 500} for n in range(1, 4)
+            ]})
+        section = re.search(r"Write only section \d+, \"([^\"]+)\"", prompt)
+        if section:
+            return f"## {section.group(1)}\n\nStub section text."
+        for stage in ("keywords", "mindmap", "summary"):
+            if StubLLMProvider._stage_marker(stage) in prompt:
+                return StubLLMProvider._stage_response(stage)
+        return "Stub response."
+
+    @staticmethod
+    def _stage_marker(stage: str) -> str:
+        return {"keywords": '"keyword"', "mindmap": '"level"', "summary": '"key_points"'}[stage]
+
+    @staticmethod
+    def _stage_response(stage: str) -> str:
+        if stage == "keywords":
+            return json.dumps([{"keyword": f"关键词{i}", "importance": round(1 - i * 0.1, 1), "category": "核心概念"} for i in range(5)], ensure_ascii=False)
+        if stage == "mindmap":
+            return json.dumps([
+                {"id": "root", "text": "主题", "level": 1, "parent_id": None, "children": ["n1", "n2"]},
+                {"id": "n1", "text": "分支一", "level": 2, "parent_id": "root", "children": []},
+                {"id": "n2", "text": "分支二", "level": 2, "parent_id": "root", "children": []},
+            ], ensure_ascii=False)
+        return json.dumps({
+            "title": "概要", "summary": "这是桩提供者返回的概要。", "key_points": ["要点一", "要点二", "要点三"], "references": []
+        }, ensure_ascii=False)
@@ -1,182 +1,352 @@
-from fastapi import FastAPI, HTTPException, File, UploadFile
+from fastapi import FastAPI, HTTPException, File, UploadFile, Request
+from fastapi.responses import PlainTextResponse, Response, StreamingResponse
 from fastapi.staticfiles import StaticFiles
+import asyncio
 import shutil
 import os
 import time
+from contextlib import asynccontextmanager
+from functools import lru_cache
 from pathlib import Path
 from schemas import (
-    GenerationRequest, GeneratedContent, UserInput, LLMSelection, # For /generate endpoint
+    GenerationRequest, GeneratedContent, RegenerationRequest, UserInput, LLMSelection, # For /generate endpoint
+    RefinementInstructionRequest, RefinementSessionResponse, # For /refine endpoints
     AvailableLLMsResponse, LLMProviderInfo, LLMModelInfo, ModelCapability, # For /llms endpoint
     ObsidianVaultRequest, ObsidianVaultResponse, ObsidianFile, ObsidianSaveRequest, # For /obsidian endpoint
+    ObsidianBulkSaveRequest, ObsidianBulkSaveResponse, ObsidianSaveResult, ObsidianAttachmentResult, # For /obsidian/save/batch
     ObsidianDirectoryRequest, ObsidianDirectoryResponse, DirectoryItem, # For directory listing
-    ContentAnalysisRequest, ContentAnalysisResponse, KeywordTag, MindMapNode, ContentSummary, ContentReference # For /content-analysis endpoint
+    ContentAnalysisRequest, ContentAnalysisResponse, IncrementalAnalysisRequest, KeywordTag, MindMapNode, ContentSummary, ContentReference, # For /content-analysis endpoint
+    RelatedNotesRequest, RelatedNotesResponse, RelatedNote, # For /related-notes endpoint
+    NoteLinksRequest, NoteLinksResponse, NeighborhoodRequest, NeighborhoodResponse, GraphNode, GraphEdge, # For vault link graph endpoints
+    VaultTagsRequest, VaultTagsResponse, VaultTag,
+    DeduplicateRequest, DeduplicateResponse, DeduplicationReport, DuplicateParagraph, # For near-duplicate compaction
+    VaultDuplicatesRequest, VaultDuplicatesResponse, VaultDuplicateGroup, DuplicateLocation
 )
 from typing import List # Ensure List is imported if not already
-from typing import List
+from typing import Iterator, List, Optional, Tuple
+from urllib.parse import quote
 
 # LLM Provider imports
 from llm_providers.base_llm import BaseLLMProvider
-from llm_providers.google_gemini_llm import GoogleGeminiLLMProvider
-# Add other provider imports here as they are implemented, e.g.:
-# from llm_providers.anthropic_llm import AnthropicLLMProvider
-# from llm_providers.openai_llm import OpenAILLMProvider
-
-app = FastAPI()
+from llm_providers.registry import ProviderRegistry, parse_provider_plugins
+from llm_providers.router import LLMRouter, RoutedLLMProvider
+
+from analysis.orchestrator import run_content_analysis
+from analysis.batching import analysis_batcher
+from analysis.incremental import run_incremental_analysis
+from analysis.dedup import DeduplicationResult, deduplicate_blocks, get_vault_duplicate_index, start_background_indexing
+from analysis.related import find_related_notes, linked_note_blocks, related_note_blocks
+from generation.longform import ArticleNotFoundError, SectionGenerationError, generate_longform_article, regenerate_article, use_longform
+from generation.refinement import create_session, refine_session, session_store
+from http_cache import CompressionMiddleware, conditional_json, etag_matches, make_etag
+from vault.attachments import PIC_DIR, AttachmentResult, export_attachments
+from vault.index import get_vault_index, refresh_vault_index
+from vault.links import get_link_graph
+from vault.writer import MAX_BATCH_NOTES, NoteWrite, NoteWriteResult, resolve_note_path, write_notes
+from observability import metrics, tracing
+from observability.profiler import ProfilerBusyError, profiler
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Optionally import provider SDKs in the background so the first LLM request does not pay for them
+    SUPPORTED_PROVIDERS.start_warm_up()
+    # Optionally build the near-duplicate index of the vaults in DEDUP_INDEX_VAULTS in the background
+    start_background_indexing()
+    # With several workers, publish this worker's metrics so /metrics on any worker covers all of them
+    metrics.registry.start_flushing()
+    yield
+    if metrics.registry.directory:
+        metrics.registry.write_snapshot()
+
+app = FastAPI(lifespan=lifespan)
 
 # Mount static files for uploaded images
-app.mount("/pic", StaticFiles(directory="pic"), name="pic")
-
-# LLM Provider Factory
-SUPPORTED_PROVIDERS = {
-    "google": GoogleGeminiLLMProvider,
-    "gemini": GoogleGeminiLLMProvider, # Alias for google
-    # "anthropic": AnthropicLLMProvider,
-    # "openai": OpenAILLMProvider,
+PIC_DIR.mkdir(parents=True, exist_ok=True)
+app.mount("/pic", StaticFiles(directory=PIC_DIR), name="pic")
+
+# LLM Provider Factory; provider modules and their SDKs are imported on first use
+SUPPORTED_PROVIDERS = ProviderRegistry({
+    "google": "llm_providers.google_gemini_llm:GoogleGeminiLLMProvider",
+    "gemini": "llm_providers.google_gemini_llm:GoogleGeminiLLMProvider", # Alias for google
+    "anthropic": "llm_providers.anthropic_llm:AnthropicLLMProvider",
+    "openai": "llm_providers.openai_llm:OpenAILLMProvider",
+})
+if os.getenv("ENABLE_STUB_LLM") == "1":
+    SUPPORTED_PROVIDERS.register("stub", "llm_providers.stub_llm:StubLLMProvider") # Local provider for tests and load testing
+if os.getenv("LLM_REPLAY_PATH"):
+    SUPPORTED_PROVIDERS.register("replay", "llm_providers.replay_llm:ReplayLLMProvider") # Serves responses recorded with LLM_RECORD_PATH
+for plugin_name, plugin_path in parse_provider_plugins(os.getenv("LLM_PROVIDER_PLUGINS", "")).items():
+    SUPPORTED_PROVIDERS.register(plugin_name, plugin_path)
+
+# Provider used by the content analysis endpoints (set to "stub" or "replay" for offline runs)
+ANALYSIS_LLM_PROVIDER = os.getenv("ANALYSIS_LLM_PROVIDER", "google")
+# Model for the analysis endpoints; defaults to a small model of the analysis provider
+# (providers without an entry keep gemini-2.5-flash so recorded replay keys still match)
+ANALYSIS_DEFAULT_MODELS = {
+    "anthropic": "claude-3-haiku-20240307",
+    "openai": "gpt-4o-mini",
 }
+ANALYSIS_LLM_MODEL = os.getenv("ANALYSIS_LLM_MODEL") or ANALYSIS_DEFAULT_MODELS.get(ANALYSIS_LLM_PROVIDER, "gemini-2.5-flash")
+
+# Replaces a collapsed paragraph in the content sent to the analysis LLM (the block labels there are Chinese)
+ANALYSIS_DUPLICATE_REFERENCE = "[与内容块 {block} 第 {paragraph} 段近似重复，已省略]"
+
+# Streamed vault listings are sent in chunks of about this size (NDJSON lines are never split)
+NDJSON_CHUNK_BYTES = 64 * 1024
+
+# Tracks per-model latency and error rates and hedges interactive requests
+llm_router = LLMRouter(SUPPORTED_PROVIDERS)
+llm_router.register_metrics(metrics.registry)
+analysis_batcher.register_metrics(metrics.registry)
+
+
+@app.middleware("http")
+async def trace_requests(request: Request, call_next):
+    """Root tracing span per request; the per-stage breakdown is returned as Server-Timing."""
+    with tracing.request_span(
+        f"{request.method} {request.url.path}",
+        traceparent=request.headers.get("traceparent"),
+        **{"http.method": request.method, "http.target": request.url.path}
+    ) as root:
+        response = await call_next(request)
+        route = request.scope.get("route")
+        if route is not None:
+            root.name = f"{request.method} {route.path}"
+            root.set_attribute("http.route", route.path)
+        root.set_attribute("http.status_code", response.status_code)
+        response.headers["Server-Timing"] = tracing.server_timing(root)
+        return response
+
+
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    start = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        # Label by route template, not raw path, so ids in URLs do not create new series
+        route = request.scope.get("route")
+        route_path = getattr(route, "path", "unmatched")
+        metrics.HTTP_REQUESTS.inc(method=request.method, route=route_path, status=str(status))
+        metrics.HTTP_REQUEST_SECONDS.observe(time.perf_counter() - start, method=request.method, route=route_path)
+
+
+
+@app.middleware("http")
+async def profile_requests(request: Request, call_next):
+    """Profiles the worker while this request runs when X-Debug-Profile carries the debug token."""
+    if profiler.busy or not profiler.authorized(request.headers.get("x-debug-profile")):
+        return await call_next(request)
+    async with profiler.session("request", f"{request.method} {request.url.path}") as holder:
+        response = await call_next(request)
+    response.headers["X-Profile-Id"] = holder["result"].profile_id
+    return response
+
+
+# Outermost: compresses whatever the handlers and the middlewares above produced
+app.add_middleware(CompressionMiddleware)
+
+
+# Hardcoded list of available LLMs for the /api/v1/llms endpoint, built on first request
+@lru_cache(maxsize=1)
+def hardcoded_available_llms() -> AvailableLLMsResponse:
+    return AvailableLLMsResponse(
+        providers=[
+            LLMProviderInfo(
+                provider_id="google",
+                display_name="谷歌 AI",
+                models=[
+                    LLMModelInfo(
+                        model_id="gemini-2.5-flash",
+                        display_name="Gemini 2.5 Flash",
+                        capabilities=ModelCapability(supports_images=True, max_input_tokens=1000000, max_output_tokens=8192, notes="最佳性价比，具备思维能力，比之前版本效率提升20-30%。"),
+                        description="谷歌最高效的多模态模型，具备先进的推理和思维能力，支持原生音频、视频理解和工具集成。",
+                        provider_id="google"
+                    ),
+                    LLMModelInfo(
+                        model_id="gemini-2.5-pro",
+                        display_name="Gemini 2.5 Pro",
+                        capabilities=ModelCapability(supports_images=True, max_input_tokens=1000000, max_output_tokens=8192, notes="高级推理模型，具备深度思考模式，在编程、数学和科学基准测试中表现领先。"),
+                        description="谷歌最先进的推理模型，具备思维能力，在复杂问题解决、编程、数学和多模态理解方面表现出色。",
+                        provider_id="google"
+                    ),
+                ]
+            ),
+            LLMProviderInfo(
+                provider_id="anthropic",
+                display_name="Anthropic",
+                models=[
+                    LLMModelInfo(
+                        model_id="claude-3-opus-20240229",
+                        display_name="Claude 3 Opus",
+                        capabilities=ModelCapability(supports_images=True, max_input_tokens=200000, max_output_tokens=4096, notes="顶级推理能力，适合复杂分析任务。"),
+                        description="Anthropic 最强大的模型。",
+                        provider_id="anthropic"
+                    ),
+                    LLMModelInfo(
+                        model_id="claude-3-sonnet-20240229",
+                        display_name="Claude 3 Sonnet",
+                        capabilities=ModelCapability(supports_images=True, max_input_tokens=200000, max_output_tokens=4096, notes="平衡速度和智能。"),
+                        description="Anthropic 的平衡型模型，适合企业工作负载。",
+                        provider_id="anthropic"
+                    ),
+                    LLMModelInfo(
+                        model_id="claude-3-haiku-20240307",
+                        display_name="Claude 3 Haiku",
+                        capabilities=ModelCapability(supports_images=True, max_input_tokens=200000, max_output_tokens=4096, notes="最快且最紧凑，近乎即时响应。"),
+                        description="Anthropic 最快的模型，适合实时交互。",
+                        provider_id="anthropic"
+                    ),
+                ]
+            ),
+            LLMProviderInfo(
+                provider_id="openai",
+                display_name="OpenAI",
+                models=[
+                    LLMModelInfo(
+                        model_id="gpt-4o-mini",
+                        display_name="GPT-4o mini",
+                        capabilities=ModelCapability(supports_images=True, max_input_tokens=128000, max_output_tokens=16385, notes="OpenAI 最新、最经济实惠且智能的小型模型。"),
+                        description="GPT-3.5 Turbo 的继任者，高智能小型模型。",
+                        provider_id="openai"
+                    ),
+                    LLMModelInfo(
+                        model_id="gpt-4o",
+                        display_name="GPT-4o",
+                        capabilities=ModelCapability(supports_images=True, max_input_tokens=128000, max_output_tokens=4096, notes="OpenAI 最先进的多模态模型。"),
+                        description="OpenAI 的旗舰模型，结合文本和视觉能力。",
+                        provider_id="openai"
+                    ),
+                    LLMModelInfo(
+                        model_id="gpt-3.5-turbo",
+                        display_name="GPT-3.5 Turbo",
+                        capabilities=ModelCapability(supports_images=False, max_input_tokens=16385, max_output_tokens=4096),
+                        description="快速且能力强的文本任务模型。",
+                        provider_id="openai"
+                    ),
+                ]
+            )
+        ]
+    )
 
-# Hardcoded list of available LLMs for the /api/v1/llms endpoint
-HARDCODED_AVAILABLE_LLMS = AvailableLLMsResponse(
-    providers=[
-        LLMProviderInfo(
-            provider_id="google",
-            display_name="谷歌 AI",
-            models=[
-                LLMModelInfo(
-                    model_id="gemini-2.5-flash",
-                    display_name="Gemini 2.5 Flash",
-                    capabilities=ModelCapability(supports_images=True, max_input_tokens=1000000, max_output_tokens=8192, notes="最佳性价比，具备思维能力，比之前版本效率提升20-30%。"),
-                    description="谷歌最高效的多模态模型，具备先进的推理和思维能力，支持原生音频、视频理解和工具集成。",
-                    provider_id="google"
-                ),
-                LLMModelInfo(
-                    model_id="gemini-2.5-pro",
-                    display_name="Gemini 2.5 Pro",
-                    capabilities=ModelCapability(supports_images=True, max_input_tokens=1000000, max_output_tokens=8192, notes="高级推理模型，具备深度思考模式，在编程、数学和科学基准测试中表现领先。"),
-                    description="谷歌最先进的推理模型，具备思维能力，在复杂问题解决、编程、数学和多模态理解方面表现出色。",
-                    provider_id="google"
-                ),
-            ]
-        ),
-        LLMProviderInfo(
-            provider_id="anthropic",
-            display_name="Anthropic",
-            models=[
-                LLMModelInfo(
-                    model_id="claude-3-opus-20240229",
-                    display_name="Claude 3 Opus",
-                    capabilities=ModelCapability(supports_images=True, max_input_tokens=200000, max_output_tokens=4096, notes="顶级推理能力，适合复杂分析任务。"),
-                    description="Anthropic 最强大的模型。",
-                    provider_id="anthropic"
-                ),
-                LLMModelInfo(
-                    model_id="claude-3-sonnet-20240229",
-                    display_name="Claude 3 Sonnet",
-                    capabilities=ModelCapability(supports_images=True, max_input_tokens=200000, max_output_tokens=4096, notes="平衡速度和智能。"),
-                    description="Anthropic 的平衡型模型，适合企业工作负载。",
-                    provider_id="anthropic"
-                ),
-                LLMModelInfo(
-                    model_id="claude-3-haiku-20240307",
-                    display_name="Claude 3 Haiku",
-                    capabilities=ModelCapability(supports_images=True, max_input_tokens=200000, max_output_tokens=4096, notes="最快且最紧凑，近乎即时响应。"),
-                    description="Anthropic 最快的模型，适合实时交互。",
-                    provider_id="anthropic"
-                ),
-            ]
-        ),
-        LLMProviderInfo(
-            provider_id="openai",
-            display_name="OpenAI",
-            models=[
-                LLMModelInfo(
-                    model_id="gpt-4o-mini",
-                    display_name="GPT-4o mini",
-                    capabilities=ModelCapability(supports_images=True, max_input_tokens=128000, max_output_tokens=16385, notes="OpenAI 最新、最经济实惠且智能的小型模型。"),
-                    description="GPT-3.5 Turbo 的继任者，高智能小型模型。",
-                    provider_id="openai"
-                ),
-                LLMModelInfo(
-                    model_id="gpt-4o",
-                    display_name="GPT-4o",
-                    capabilities=ModelCapability(supports_images=True, max_input_tokens=128000, max_output_tokens=4096, notes="OpenAI 最先进的多模态模型。"),
-                    description="OpenAI 的旗舰模型，结合文本和视觉能力。",
-                    provider_id="openai"
-                ),
-                LLMModelInfo(
-                    model_id="gpt-3.5-turbo",
-                    display_name="GPT-3.5 Turbo",
-                    capabilities=ModelCapability(supports_images=False, max_input_tokens=16385, max_output_tokens=4096),
-                    description="快速且能力强的文本任务模型。",
-                    provider_id="openai"
-                ),
-            ]
-        )
-    ]
-)
+@lru_cache(maxsize=1)
+def available_llms_etag() -> str:
+    return make_etag(hardcoded_available_llms().model_dump_json())
 
 @app.get("/api/v1/llms", response_model=AvailableLLMsResponse)
-async def get_available_llms():
-    return HARDCODED_AVAILABLE_LLMS
+async def get_available_llms(request: Request):
+    return await conditional_json(request, available_llms_etag(), hardcoded_available_llms)
+
+@app.get("/api/v1/llms/stats")
+async def get_llm_stats():
+    """Rolling per-model latency percentiles, error rates and hedging counts."""
+    return llm_router.snapshot()
 
-def get_llm_provider(provider_name: str) -> BaseLLMProvider:
+def get_llm_provider(provider_name: str, hedge: bool = False) -> BaseLLMProvider:
     provider_key = provider_name.lower()
-    provider_class = SUPPORTED_PROVIDERS.get(provider_key)
-    if not provider_class:
+    if provider_key not in SUPPORTED_PROVIDERS:
         raise HTTPException(
             status_code=400,
             detail=f"Unsupported LLM provider: {provider_name}. Supported: {list(SUPPORTED_PROVIDERS.keys())}"
         )
-    return provider_class()
+    return RoutedLLMProvider(llm_router, provider_key, hedge=hedge)
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    """Prometheus scrape endpoint."""
+    return PlainTextResponse(metrics.registry.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+def require_profiler_access(request: Request) -> None:
+    if not profiler.enabled:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not profiler.authorized(request.headers.get("authorization") or request.headers.get("x-debug-token")):
+        raise HTTPException(status_code=401, detail="Invalid debug token")
+
+def profile_response(result, output_format: str):
+    if output_format == "collapsed":
+        return PlainTextResponse(result.collapsed(), headers={"X-Profile-Id": result.profile_id})
+    return {**result.summary(), "collapsed": result.collapsed()}
+
+@app.post("/debug/profile")
+async def profile_worker(request: Request, seconds: float = 10.0, interval_ms: float = 10.0, format: str = "json", include_idle: bool = False):
+    """Samples this worker for N seconds; format=collapsed returns flamegraph input only."""
+    require_profiler_access(request)
+    try:
+        result = await profiler.profile_worker(seconds, interval_ms, include_idle)
+    except ProfilerBusyError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return profile_response(result, format)
+
+@app.get("/debug/profiles")
+async def list_profiles(request: Request):
+    require_profiler_access(request)
+    return await asyncio.to_thread(profiler.list)
+
+@app.get("/debug/profiles/{profile_id}")
+async def get_profile(request: Request, profile_id: str, format: str = "json"):
+    require_profiler_access(request)
+    result = await asyncio.to_thread(profiler.get, profile_id)
+    if result is None:
+        raise HTTPException(status_code=404, detail=f"Profile not found or expired: {profile_id}")
+    return profile_response(result, format)
 
 @app.get("/")
 async def root():
     return {"message": "Hello Agent App Backend - Now with LLM Integration!"}
 
-@app.post("/api/v1/obsidian/files", response_model=ObsidianVaultResponse)
-async def get_obsidian_files(request: ObsidianVaultRequest):
-    vault_path = Path(request.vault_path)
-    
+def check_vault_path(vault_path: Path) -> None:
     if not vault_path.exists():
         raise HTTPException(status_code=404, detail="Vault path not found")
-    
     if not vault_path.is_dir():
         raise HTTPException(status_code=400, detail="Path is not a directory")
-    
-    files = []
-    
-    def read_markdown_files(directory: Path, prefix: str = ""):
-        for item in directory.iterdir():
-            if item.name.startswith('.'):
-                continue
-                
-            relative_path = f"{prefix}{item.name}" if prefix else item.name
-            
-            if item.is_dir():
-                files.append(ObsidianFile(
+
+
+async def vault_etag(vault_path: Path, tree_only: bool = False) -> str:
+    """Strong ETag from the vault index, so an unchanged vault is answered without reading it."""
+    index = await asyncio.to_thread(get_vault_index, str(vault_path))
+    return f'"{index.fingerprint(tree_only)}"'
+
+
+def iter_vault_files(directory: Path, prefix: str = "") -> Iterator[ObsidianFile]:
+    """Yields folders and markdown files depth-first; only one note's content is held at a time."""
+    for item in directory.iterdir():
+        if item.name.startswith('.'):
+            continue
+
+        relative_path = f"{prefix}{item.name}" if prefix else item.name
+
+        if item.is_dir():
+            yield ObsidianFile(
+                path=relative_path,
+                name=item.name,
+                content="",
+                size=0,
+                modified_time=str(item.stat().st_mtime),
+                is_directory=True
+            )
+            yield from iter_vault_files(item, f"{relative_path}/")
+        elif item.suffix == '.md':
+            try:
+                content = item.read_text(encoding='utf-8')
+                yield ObsidianFile(
                     path=relative_path,
                     name=item.name,
-                    content="",
-                    size=0,
+                    content=content,
+                    size=len(content),
                     modified_time=str(item.stat().st_mtime),
-                    is_directory=True
-                ))
-                read_markdown_files(item, f"{relative_path}/")
-            elif item.suffix == '.md':
-                try:
-                    content = item.read_text(encoding='utf-8')
-                    files.append(ObsidianFile(
-                        path=relative_path,
-                        name=item.name,
-                        content=content,
-                        size=len(content),
-                        modified_time=str(item.stat().st_mtime),
-                        is_directory=False
-                    ))
-                except Exception as e:
-                    print(f"Error reading file {item}: {e}")
-    
+                    is_directory=False
+                )
+            except Exception as e:
+                print(f"Error reading file {item}: {e}")
+
+
+def build_vault_files(vault_path: Path) -> ObsidianVaultResponse:
     try:
-        read_markdown_files(vault_path)
+        with metrics.stage_timer("vault_scan"):
+            files = list(iter_vault_files(vault_path))
         return ObsidianVaultResponse(
             files=files,
             vault_name=vault_path.name
@@ -186,6 +356,61 @@ async def get_obsidian_files(request: ObsidianVaultRequest):
         raise HTTPException(status_code=500, detail="Error reading vault files")
 
 
+def vault_files_ndjson(vault_path: Path) -> Iterator[bytes]:
+    """One ObsidianFile per line, sent in chunks of about NDJSON_CHUNK_BYTES."""
+    chunk: List[bytes] = []
+    size = 0
+    count = 0
+    try:
+        for file in iter_vault_files(vault_path):
+            line = file.model_dump_json().encode("utf-8") + b"\n"
+            chunk.append(line)
+            size += len(line)
+            count += 1
+            if size >= NDJSON_CHUNK_BYTES:
+                yield b"".join(chunk)
+                chunk, size = [], 0
+    except Exception as e:
+        # Headers are already sent; the client sees a truncated stream
+        print(f"Error streaming vault {vault_path} after {count} entries: {e}")
+    if chunk:
+        yield b"".join(chunk)
+
+
+@app.post("/api/v1/obsidian/files", response_model=ObsidianVaultResponse)
+async def get_obsidian_files(request: ObsidianVaultRequest, http_request: Request):
+    vault_path = Path(request.vault_path)
+    check_vault_path(vault_path)
+    return await conditional_json(http_request, await vault_etag(vault_path), lambda: build_vault_files(vault_path), offload=True)
+
+
+@app.get("/api/v1/obsidian/files", response_model=ObsidianVaultResponse)
+async def get_obsidian_files_cacheable(vault_path: str, http_request: Request):
+    """GET form of the vault listing, so browsers revalidate it with If-None-Match on their own."""
+    return await get_obsidian_files(ObsidianVaultRequest(vault_path=vault_path), http_request)
+
+
+@app.post("/api/v1/obsidian/files/stream")
+async def stream_obsidian_files(request: ObsidianVaultRequest, http_request: Request):
+    """
+    The vault listing as NDJSON (one ObsidianFile per line), produced while the vault is traversed:
+    server memory stays flat regardless of vault size and clients can render the first notes at once.
+    The vault name is in the X-Vault-Name header (URL-encoded).
+    """
+    vault_path = Path(request.vault_path)
+    check_vault_path(vault_path)
+    etag = (await vault_etag(vault_path))[:-1] + '-ndjson"'
+    headers = {"ETag": etag, "Cache-Control": "no-cache", "X-Vault-Name": quote(vault_path.name)}
+    if etag_matches(http_request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    return StreamingResponse(vault_files_ndjson(vault_path), media_type="application/x-ndjson", headers=headers)
+
+
+@app.get("/api/v1/obsidian/files/stream")
+async def stream_obsidian_files_cacheable(vault_path: str, http_request: Request):
+    return await stream_obsidian_files(ObsidianVaultRequest(vault_path=vault_path), http_request)
+
+
 def scan_directories(path: Path) -> List[DirectoryItem]:
     """Recursively scans a directory and returns a tree structure."""
     items = []
@@ -199,12 +424,7 @@ def scan_directories(path: Path) -> List[DirectoryItem]:
             ))
     return items
 
-@app.post("/api/v1/obsidian/directories", response_model=ObsidianDirectoryResponse)
-async def get_obsidian_directories(request: ObsidianDirectoryRequest):
-    vault_path = Path(request.vault_path)
-    if not vault_path.exists() or not vault_path.is_dir():
-        raise HTTPException(status_code=404, detail="Obsidian vault path not found or is not a directory.")
-    
+def build_vault_directories(vault_path: Path) -> ObsidianDirectoryResponse:
     # Adjust the key to be relative to the vault path itself
     def scan_and_adjust_keys(path: Path, base_path: Path) -> List[DirectoryItem]:
         items = []
@@ -219,28 +439,87 @@ async def get_obsidian_directories(request: ObsidianDirectoryRequest):
                 ))
         return items
 
-    directories = scan_and_adjust_keys(vault_path, vault_path)
+    with metrics.stage_timer("vault_scan"):
+        directories = scan_and_adjust_keys(vault_path, vault_path)
     return ObsidianDirectoryResponse(directories=directories)
 
 
-@app.post("/api/v1/obsidian/save")
-async def save_to_obsidian(request: ObsidianSaveRequest):
+@app.post("/api/v1/obsidian/directories", response_model=ObsidianDirectoryResponse)
+async def get_obsidian_directories(request: ObsidianDirectoryRequest, http_request: Request):
     vault_path = Path(request.vault_path)
     if not vault_path.exists() or not vault_path.is_dir():
         raise HTTPException(status_code=404, detail="Obsidian vault path not found or is not a directory.")
+    etag = await vault_etag(vault_path, tree_only=True)
+    return await conditional_json(http_request, etag, lambda: build_vault_directories(vault_path), offload=True)
 
-    folder_path = vault_path / request.folder_name
-    folder_path.mkdir(parents=True, exist_ok=True)
 
-    file_name = request.file_name if request.file_name.endswith(".md") else f"{request.file_name}.md"
-    file_path = folder_path / file_name
+@app.get("/api/v1/obsidian/directories", response_model=ObsidianDirectoryResponse)
+async def get_obsidian_directories_cacheable(vault_path: str, http_request: Request):
+    return await get_obsidian_directories(ObsidianDirectoryRequest(vault_path=vault_path), http_request)
 
+
+def save_notes_with_images(
+    vault_path: Path, notes: List[NoteWrite], overwrite: bool, include_images: bool, attachments_folder: str
+) -> Tuple[List[NoteWriteResult], List[AttachmentResult]]:
+    """Places referenced /pic/ images in the vault first, so the notes never link to a missing file."""
+    attachments: List[AttachmentResult] = []
+    if include_images:
+        try:
+            notes, attachments = export_attachments(vault_path, notes, attachments_folder)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    results = write_notes(vault_path, notes, overwrite)
+    refresh_vault_index(str(vault_path))  # new ETags for the vault listings right away
+    return results, attachments
+
+
+@app.post("/api/v1/obsidian/save")
+async def save_to_obsidian(request: ObsidianSaveRequest):
+    vault_path = Path(request.vault_path)
+    if not vault_path.exists() or not vault_path.is_dir():
+        raise HTTPException(status_code=404, detail="Obsidian vault path not found or is not a directory.")
     try:
-        with open(file_path, "w", encoding="utf-8") as f:
-            f.write(request.content)
-        return {"message": f"Successfully saved to {file_path}"}
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Failed to save file: {e}")
+        # A bad folder or file name is the client's error; only I/O failures below are reported as 500
+        resolve_note_path(vault_path.resolve(), request.folder_name, request.file_name)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    note = NoteWrite(folder_name=request.folder_name, file_name=request.file_name, content=request.content)
+    with metrics.stage_timer("file_save"):
+        results, attachments = await asyncio.to_thread(
+            save_notes_with_images, vault_path, [note], True, request.include_images, request.attachments_folder
+        )
+    result = results[0]
+    if not result.success:
+        raise HTTPException(status_code=500, detail=f"Failed to save file: {result.error}")
+    message = f"Successfully saved to {vault_path.resolve() / result.path}"
+    if attachments:
+        message += f" with {sum(a.success for a in attachments)}/{len(attachments)} images"
+    return {"message": message, "attachments": [vars(a) for a in attachments]}
+
+
+@app.post("/api/v1/obsidian/save/batch", response_model=ObsidianBulkSaveResponse)
+async def save_batch_to_obsidian(request: ObsidianBulkSaveRequest):
+    """Saves many notes in one call; every note is written atomically and reported separately."""
+    vault_path = Path(request.vault_path)
+    if not vault_path.exists() or not vault_path.is_dir():
+        raise HTTPException(status_code=404, detail="Obsidian vault path not found or is not a directory.")
+    if len(request.notes) > MAX_BATCH_NOTES:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BATCH_NOTES} notes can be saved in one call")
+
+    notes = [NoteWrite(folder_name=n.folder_name, file_name=n.file_name, content=n.content) for n in request.notes]
+    with metrics.stage_timer("file_save"):
+        results, attachments = await asyncio.to_thread(
+            save_notes_with_images, vault_path, notes, request.overwrite, request.include_images, request.attachments_folder
+        )
+    saved = sum(r.success for r in results)
+    print(f"INFO: Saved {saved}/{len(results)} notes to {vault_path}")
+    return ObsidianBulkSaveResponse(
+        results=[ObsidianSaveResult(path=r.path, success=r.success, error=r.error, bytes_written=r.bytes_written) for r in results],
+        saved=saved,
+        failed=len(results) - saved,
+        attachments=[ObsidianAttachmentResult(**vars(a)) for a in attachments]
+    )
 
 
 @app.post("/api/v1/upload_image")
@@ -249,14 +528,14 @@ async def upload_image(file: UploadFile = File(...)):
         # Create a unique directory using a timestamp
         timestamp = str(int(time.time() * 1000))
         # Correctly join the path for the timestamped directory
-        upload_dir = Path("pic") / timestamp
+        upload_dir = PIC_DIR / timestamp
         os.makedirs(upload_dir, exist_ok=True)
 
         # Define the full file path
         file_path = upload_dir / file.filename
         
         # Save the uploaded file
-        with open(file_path, "wb") as buffer:
+        with metrics.stage_timer("file_save"), open(file_path, "wb") as buffer:
             shutil.copyfileobj(file.file, buffer)
             
         # Return the path relative to the static mount point
@@ -269,9 +548,178 @@ async def upload_image(file: UploadFile = File(...)):
         raise HTTPException(status_code=500, detail="Error uploading file.")
 
 
+async def with_vault_context(request: GenerationRequest) -> GenerationRequest:
+    """
+    Appends vault notes as extra context blocks: the notes most related to the blocks (related_notes)
+    and the linked neighborhood of given notes (linked_notes). Both are opt-in; failures only log.
+    """
+    extra = []
+    related, linked = request.related_notes, request.linked_notes
+    if related is not None and related.token_budget > 0:
+        try:
+            with metrics.stage_timer("related_notes"):
+                extra += await asyncio.to_thread(
+                    related_note_blocks, related.vault_path, request.user_input.blocks, related.top_k, related.token_budget, related.min_score
+                )
+        except Exception as e:
+            print(f"WARNING: Related-notes retrieval failed, generating without it: {e}")
+    if linked is not None and linked.token_budget > 0:
+        try:
+            with metrics.stage_timer("related_notes"):
+                extra += await asyncio.to_thread(
+                    linked_note_blocks, linked.vault_path, linked.paths, linked.depth, linked.direction,
+                    linked.max_notes, linked.token_budget, linked.include_seeds
+                )
+        except Exception as e:
+            print(f"WARNING: Linked-notes lookup failed, generating without it: {e}")
+    if related is None and linked is None:
+        return request
+    # The options are cleared so the notes are attached once even when the request is passed on
+    update = {"related_notes": None, "linked_notes": None}
+    if extra:
+        update["user_input"] = UserInput(blocks=[*request.user_input.blocks, *extra])
+    return request.model_copy(update=update)
+
+
+def deduplication_report(result: DeduplicationResult) -> DeduplicationReport:
+    return DeduplicationReport(
+        paragraphs=result.paragraphs,
+        duplicates=[
+            DuplicateParagraph(
+                block_index=d.block_index, paragraph_index=d.paragraph_index,
+                duplicate_of_block=d.duplicate_of[0], duplicate_of_paragraph=d.duplicate_of[1],
+                similarity=d.similarity, tokens_saved=d.tokens_saved
+            )
+            for d in result.duplicates
+        ],
+        tokens_before=result.tokens_before,
+        tokens_after=result.tokens_after,
+        tokens_saved=result.tokens_saved
+    )
+
+
+async def with_deduplicated_blocks(request: GenerationRequest) -> Tuple[GenerationRequest, Optional[DeduplicationReport]]:
+    """
+    Collapses near-duplicate paragraphs across the blocks, attached vault notes included, into short references.
+    Block count and order are kept. The option is cleared so a request passed on is not compacted twice.
+    """
+    if not request.deduplicate:
+        return request, None
+    with metrics.stage_timer("deduplicate"):
+        result = await asyncio.to_thread(deduplicate_blocks, request.user_input.blocks)
+    metrics.count_deduplicated_tokens("generate", result.tokens_saved)
+    if result.duplicates:
+        print(f"INFO: Collapsed {len(result.duplicates)} near-duplicate paragraphs ({result.tokens_saved} of {result.tokens_before} tokens)")
+    update = {"deduplicate": False}
+    if result.duplicates:
+        update["user_input"] = UserInput(blocks=result.blocks)
+    return request.model_copy(update=update), deduplication_report(result)
+
+
+@app.post("/api/v1/deduplicate", response_model=DeduplicateResponse)
+async def deduplicate_endpoint(request: DeduplicateRequest):
+    """Near-duplicate paragraphs across the blocks (MinHash/LSH, no LLM call) and the compacted blocks."""
+    with metrics.stage_timer("deduplicate"):
+        result = await asyncio.to_thread(deduplicate_blocks, request.user_input.blocks, request.threshold)
+    return DeduplicateResponse(user_input=UserInput(blocks=result.blocks), report=deduplication_report(result))
+
+
+@app.post("/api/v1/obsidian/duplicates", response_model=VaultDuplicatesResponse)
+async def vault_duplicates_endpoint(request: VaultDuplicatesRequest):
+    """
+    Groups of near-duplicate paragraphs across the vault. The index is updated incrementally in the
+    background; unless `wait` is set, the answer comes from the last indexed state while it catches up.
+    """
+    if not Path(request.vault_path).is_dir():
+        raise HTTPException(status_code=404, detail="Obsidian vault path not found or is not a directory.")
+    with metrics.stage_timer("vault_scan"):
+        duplicates = await asyncio.to_thread(get_vault_duplicate_index, request.vault_path)
+    if request.wait:
+        with metrics.stage_timer("deduplicate"):
+            await asyncio.to_thread(duplicates.update)
+    indexing = duplicates.update_in_background()
+    with metrics.stage_timer("deduplicate"):
+        groups = await asyncio.to_thread(duplicates.groups, request.threshold)
+
+    def location(path: str, paragraph_index: int) -> DuplicateLocation:
+        return DuplicateLocation(path=path, paragraph_index=paragraph_index, preview=duplicates.paragraph_preview(path, paragraph_index))
+
+    returned = await asyncio.to_thread(lambda: [
+        VaultDuplicateGroup(
+            paragraphs=[location(path, i) for path, i in group.paragraphs],
+            similarity=group.similarity,
+            tokens_saveable=group.tokens_saveable
+        )
+        for group in groups[:request.max_groups]
+    ])
+    return VaultDuplicatesResponse(
+        groups=returned,
+        group_count=len(groups),
+        tokens_saveable=sum(group.tokens_saveable for group in groups),
+        notes=len(duplicates.notes),
+        paragraphs=duplicates.paragraph_count,
+        indexing=indexing
+    )
+
+
+@app.post("/api/v1/related-notes", response_model=RelatedNotesResponse)
+async def related_notes_endpoint(request: RelatedNotesRequest):
+    """Top-k vault notes related to the given blocks, from the local vector index (no LLM call)."""
+    vault_path = Path(request.vault_path)
+    if not vault_path.exists() or not vault_path.is_dir():
+        raise HTTPException(status_code=404, detail="Obsidian vault path not found or is not a directory.")
+    with metrics.stage_timer("related_notes"):
+        hits = await asyncio.to_thread(
+            find_related_notes, request.vault_path, request.user_input.blocks, request.top_k, request.min_score, request.exclude_paths
+        )
+    return RelatedNotesResponse(notes=[RelatedNote(path=hit.path, score=round(hit.score, 4)) for hit in hits])
+
+
+async def load_link_graph(vault_path: str):
+    if not Path(vault_path).is_dir():
+        raise HTTPException(status_code=404, detail="Obsidian vault path not found or is not a directory.")
+    with metrics.stage_timer("vault_scan"):
+        return await asyncio.to_thread(get_link_graph, vault_path)
+
+
+@app.post("/api/v1/obsidian/links", response_model=NoteLinksResponse)
+async def note_links_endpoint(request: NoteLinksRequest):
+    """Forward links, backlinks, tags and frontmatter of one note, from the incrementally kept link graph."""
+    graph = await load_link_graph(request.vault_path)
+    note = graph.describe(request.path)
+    if note is None:
+        raise HTTPException(status_code=404, detail=f"Note not found in vault: {request.path}")
+    return NoteLinksResponse(**note)
+
+
+@app.post("/api/v1/obsidian/graph/neighborhood", response_model=NeighborhoodResponse)
+async def note_neighborhood_endpoint(request: NeighborhoodRequest):
+    """Notes within `depth` links of the given notes, with the links between them."""
+    graph = await load_link_graph(request.vault_path)
+    seeds = [found for found in (graph.find_note(p) for p in request.paths) if found]
+    if not seeds:
+        raise HTTPException(status_code=404, detail="None of the given notes were found in the vault")
+    distances, edges = graph.neighborhood(seeds, request.depth, request.direction, request.max_notes)
+    return NeighborhoodResponse(
+        nodes=[GraphNode(path=path, distance=distance) for path, distance in distances.items()],
+        edges=[GraphEdge(source=source, target=target) for source, target in edges if source in distances and target in distances]
+    )
+
+
+@app.post("/api/v1/obsidian/tags", response_model=VaultTagsResponse)
+async def vault_tags_endpoint(request: VaultTagsRequest):
+    graph = await load_link_graph(request.vault_path)
+    return VaultTagsResponse(
+        tags=[VaultTag(tag=tag, count=count) for tag, count in graph.tag_counts()],
+        notes=graph.notes_with_tag(request.tag) if request.tag else []
+    )
+
+
 @app.post("/api/v1/generate", response_model=GeneratedContent)
 async def generate_content_endpoint(request: GenerationRequest):
     print(f"Received request for provider: {request.llm_selection.provider}, model: {request.llm_selection.model_name}")
+    request = await with_vault_context(request)
+    request, deduplication = await with_deduplicated_blocks(request)
     
     # Pre-process image blocks to handle local paths
     for block in request.user_input.blocks:
@@ -290,7 +738,7 @@ async def generate_content_endpoint(request: GenerationRequest):
             print(f"Found local image at: {full_image_path}")
 
     try:
-        llm_provider = get_llm_provider(request.llm_selection.provider)
+        llm_provider = get_llm_provider(request.llm_selection.provider, hedge=bool(request.hedge))
     except HTTPException as e:
         # Forward the HTTPException from the factory
         raise e
@@ -300,14 +748,23 @@ async def generate_content_endpoint(request: GenerationRequest):
         raise HTTPException(status_code=500, detail="Error initializing LLM provider.")
 
     try:
-        generated_data = await llm_provider.generate_content_from_blocks(
-            user_input=request.user_input,
-            llm_selection=request.llm_selection,
-            output_preferences=request.output_preferences
-        )
+        if use_longform(request.output_preferences):
+            print("INFO: Using outline-first long-form generation")
+            generated_data = await generate_longform_article(llm_provider, request)
+        else:
+            generated_data = await llm_provider.generate_content_from_blocks(
+                user_input=request.user_input,
+                llm_selection=request.llm_selection,
+                output_preferences=request.output_preferences
+            )
+        if deduplication is not None:
+            generated_data = generated_data.model_copy(update={"deduplication": deduplication})
         return generated_data
     except NotImplementedError: # If a provider method is not yet implemented
         raise HTTPException(status_code=501, detail="LLM provider method not implemented.")
+    except SectionGenerationError as e:
+        print(f"Error during long-form generation with {request.llm_selection.provider}: {e}")
+        raise HTTPException(status_code=502, detail=f"Long-form generation with {request.llm_selection.provider} failed: {e}.")
     except Exception as e:
         # Catch errors during the LLM generation process
         print(f"Error during content generation with {request.llm_selection.provider}: {e}")
@@ -315,6 +772,69 @@ async def generate_content_endpoint(request: GenerationRequest):
         raise HTTPException(status_code=500, detail=f"Error generating content with {request.llm_selection.provider}.")
 
 
+@app.post("/api/v1/generate/regenerate", response_model=GeneratedContent)
+async def regenerate_content_endpoint(request: RegenerationRequest):
+    """
+    Regenerates a long-form article after its blocks or preferences changed. Only sections whose
+    source blocks, preferences or length target changed are generated again; the rest are reused.
+    """
+    print(f"Received regeneration request for article {request.article_id}")
+    llm_provider = get_llm_provider(request.llm_selection.provider)
+    try:
+        return await regenerate_article(llm_provider, request)
+    except ArticleNotFoundError as e:
+        print(f"Error during content regeneration: {e}")
+        raise HTTPException(status_code=404, detail=f"{e}; generate the article again with /api/v1/generate.")
+    except SectionGenerationError as e:
+        print(f"Error during content regeneration with {request.llm_selection.provider}: {e}")
+        raise HTTPException(status_code=502, detail=f"Regeneration with {request.llm_selection.provider} failed: {e}.")
+    except Exception as e:
+        print(f"Error during content regeneration with {request.llm_selection.provider}: {e}")
+        raise HTTPException(status_code=500, detail=f"Error regenerating content with {request.llm_selection.provider}.")
+
+
+@app.post("/api/v1/refine/sessions", response_model=RefinementSessionResponse)
+async def create_refinement_session_endpoint(request: GenerationRequest):
+    """
+    Generates an article from the full request and opens a refinement session for it.
+    Follow-up instructions sent to the session reuse the conversation instead of resending every block.
+    """
+    request = await with_vault_context(request)  # the session keeps the attached notes as part of its blocks
+    request, deduplication = await with_deduplicated_blocks(request)  # and the compacted blocks
+    content = await generate_content_endpoint(request)
+    if content.title.startswith("Error"):
+        raise HTTPException(status_code=502, detail=content.title)
+    session = await asyncio.to_thread(create_session, request, content)
+    if deduplication is not None:
+        content = content.model_copy(update={"deduplication": deduplication})
+    print(f"INFO: Opened refinement session {session.session_id}")
+    return RefinementSessionResponse(session_id=session.session_id, turn=session.turn, content=content)
+
+
+@app.post("/api/v1/refine/sessions/{session_id}", response_model=RefinementSessionResponse)
+async def refine_session_endpoint(session_id: str, request: RefinementInstructionRequest):
+    session = await asyncio.to_thread(session_store.get, session_id)
+    if session is None:
+        raise HTTPException(status_code=404, detail=f"Refinement session not found or expired: {session_id}")
+    if not request.instruction.strip():
+        raise HTTPException(status_code=400, detail="Instruction must not be empty")
+
+    llm_provider = get_llm_provider(session.provider_name)
+    try:
+        content = await refine_session(llm_provider, session, request.instruction.strip())
+    except Exception as e:
+        print(f"Error during refinement of session {session_id}: {e}")
+        raise HTTPException(status_code=500, detail=f"Error refining content with {session.provider_name}.")
+    return RefinementSessionResponse(session_id=session_id, turn=session.turn, content=content)
+
+
+@app.delete("/api/v1/refine/sessions/{session_id}")
+async def close_refinement_session_endpoint(session_id: str):
+    if not await asyncio.to_thread(session_store.delete, session_id):
+        raise HTTPException(status_code=404, detail=f"Refinement session not found or expired: {session_id}")
+    return {"message": "Session closed", "session_id": session_id}
+
+
 @app.post("/api/v1/content-analysis", response_model=ContentAnalysisResponse)
 async def analyze_content_endpoint(request: ContentAnalysisRequest):
     """
@@ -322,9 +842,18 @@ async def analyze_content_endpoint(request: ContentAnalysisRequest):
     """
     print(f"Received content analysis request for types: {request.analysis_types}")
     
-    # 构建内容字符串用于分析
+    # 构建内容字符串用于分析；deduplicate 时近似重复的段落折叠为引用，本地分析仍使用请求中的原文
+    blocks = request.user_input.blocks
+    deduplication = None
+    if request.deduplicate:
+        with metrics.stage_timer("deduplicate"):
+            result = await asyncio.to_thread(deduplicate_blocks, blocks, reference=ANALYSIS_DUPLICATE_REFERENCE)
+        if request.mode != "local":
+            metrics.count_deduplicated_tokens("content_analysis", result.tokens_saved)
+        blocks, deduplication = result.blocks, deduplication_report(result)
+
     content_blocks = []
-    for i, block in enumerate(request.user_input.blocks):
+    for i, block in enumerate(blocks):
         if block.type == 'text':
             content_blocks.append(f"文本块 {i+1}: {block.content}")
         elif block.type == 'code':
@@ -339,360 +868,34 @@ async def analyze_content_endpoint(request: ContentAnalysisRequest):
     
     try:
         # 获取LLM提供者（默认使用Google Gemini）
-        llm_provider = get_llm_provider("google")
-        
-        response_data = ContentAnalysisResponse(analysis_language=request.language)
-        
-        # 关键词提取
-        if "keywords" in request.analysis_types:
-            keywords_prompt = f"""
-请分析以下内容，提取10-15个最重要的关键词，并按重要性排序。对每个关键词给出0-1的重要性评分（1为最重要），并将其分类（如：核心概念、技术方法、工具平台、设计理念、实现细节等）。
-
-分析内容：
-{combined_content}
-
-请严格按照以下JSON格式返回结果，不要添加任何其他文字：
-[
-  {{"keyword": "关键词1", "importance": 0.9, "category": "核心概念"}},
-  {{"keyword": "关键词2", "importance": 0.8, "category": "技术方法"}},
-  ...
-]
-            """
-            
-            try:
-                keywords_result = await llm_provider.generate_simple_text(
-                    prompt=keywords_prompt,
-                    model_name="gemini-2.5-flash"
-                )
-                
-                # 尝试解析JSON响应
-                import json
-                import re
-                
-                # 清理响应，提取JSON部分
-                json_match = re.search(r'\[(.*?)\]', keywords_result, re.DOTALL)
-                if json_match:
-                    json_str = '[' + json_match.group(1) + ']'
-                    try:
-                        keywords_data = json.loads(json_str)
-                        keywords_list = []
-                        for item in keywords_data:
-                            if isinstance(item, dict) and all(k in item for k in ['keyword', 'importance', 'category']):
-                                keywords_list.append(KeywordTag(
-                                    keyword=item['keyword'],
-                                    importance=min(max(float(item['importance']), 0.0), 1.0),
-                                    category=item['category']
-                                ))
-                        response_data.keywords = keywords_list[:15]  # 限制最多15个关键词
-                    except (json.JSONDecodeError, ValueError, KeyError) as e:
-                        print(f"Failed to parse keywords JSON: {e}")
-                        # 如果解析失败，使用文本分析的备用方案
-                        response_data.keywords = await _extract_keywords_fallback(keywords_result, combined_content)
-                else:
-                    response_data.keywords = await _extract_keywords_fallback(keywords_result, combined_content)
-                    
-            except Exception as e:
-                print(f"Error extracting keywords: {e}")
-                response_data.keywords = []
-        
-        # 思维导图生成
-        if "mindmap" in request.analysis_types:
-            mindmap_prompt = f"""
-请为以下内容创建一个思维导图结构，包含主要概念和子概念的层级关系。要求：
-1. 识别一个核心主题作为根节点
-2. 创建2-4个主要分支（二级节点）
-3. 每个主要分支下可以有1-3个子节点（三级节点）
-4. 保持层级关系清晰
-
-分析内容：
-{combined_content}
-
-请严格按照以下JSON格式返回思维导图结构，不要添加任何其他文字：
-[
-  {{"id": "root", "text": "根节点主题", "level": 1, "parent_id": null, "children": ["node1", "node2", "node3"]}},
-  {{"id": "node1", "text": "主要概念1", "level": 2, "parent_id": "root", "children": ["node1_1", "node1_2"]}},
-  {{"id": "node1_1", "text": "子概念1-1", "level": 3, "parent_id": "node1", "children": []}},
-  ...
-]
-            """
-            
-            try:
-                print(f"Sending mindmap prompt for content: {combined_content[:200]}...")
-                mindmap_result = await llm_provider.generate_simple_text(
-                    prompt=mindmap_prompt,
-                    model_name="gemini-2.5-flash"
-                )
-                print(f"Received mindmap result length: {len(mindmap_result)}")
-                print(f"First 500 chars of mindmap result: {mindmap_result[:500]}...")
-                
-                # 解析思维导图JSON响应
-                import json
-                import re
-                
-                print(f"Raw mindmap result: {mindmap_result}")
-                
-                # 尝试多种JSON提取方法
-                json_str = None
-                
-                # 方法1: 提取完整的JSON数组 (贪婪匹配)
-                json_match = re.search(r'\[.*\]', mindmap_result, re.DOTALL)
-                if json_match:
-                    json_str = json_match.group(0)
-                else:
-                    # 方法2: 查找第一个[到最后一个]之间的内容
-                    start_idx = mindmap_result.find('[')
-                    end_idx = mindmap_result.rfind(']')
-                    if start_idx != -1 and end_idx != -1 and end_idx > start_idx:
-                        json_str = mindmap_result[start_idx:end_idx+1]
-                
-                if json_str:
-                    try:
-                        # 清理可能的问题字符
-                        json_str = json_str.strip()
-                        print(f"Extracted JSON string: {json_str}")
-                        
-                        mindmap_data = json.loads(json_str)
-                        mindmap_nodes = []
-                        
-                        for item in mindmap_data:
-                            if isinstance(item, dict) and all(k in item for k in ['id', 'text', 'level']):
-                                mindmap_nodes.append(MindMapNode(
-                                    id=item['id'],
-                                    text=item['text'],
-                                    level=int(item['level']),
-                                    parent_id=item.get('parent_id'),
-                                    children=item.get('children', [])
-                                ))
-                        
-                        if mindmap_nodes:
-                            response_data.mindmap = mindmap_nodes
-                            print(f"Successfully parsed {len(mindmap_nodes)} mindmap nodes")
-                            for node in mindmap_nodes:
-                                print(f"  Node: {node.id} - {node.text} (level {node.level})")
-                        else:
-                            print("No valid mindmap nodes found, using fallback")
-                            response_data.mindmap = await _generate_mindmap_fallback(mindmap_result, combined_content)
-                            
-                    except (json.JSONDecodeError, ValueError, KeyError) as e:
-                        print(f"Failed to parse mindmap JSON: {e}")
-                        print(f"JSON string that failed: {json_str}")
-                        response_data.mindmap = await _generate_mindmap_fallback(mindmap_result, combined_content)
-                else:
-                    print("No JSON array found in mindmap result")
-                    response_data.mindmap = await _generate_mindmap_fallback(mindmap_result, combined_content)
-                    
-            except Exception as e:
-                print(f"Error generating mindmap: {e}")
-                import traceback
-                print(f"Mindmap generation traceback: {traceback.format_exc()}")
-                response_data.mindmap = await _generate_mindmap_fallback("", combined_content)
-        
-        # 内容概要
-        if "summary" in request.analysis_types:
-            summary_prompt = f"""
-请为以下内容生成一个详细的概要总结。要求：
-1. 提取一个简洁明确的标题（10字以内）
-2. 生成核心摘要（150-200字）
-3. 列出3-5个最重要的关键要点
-4. 为每个要点标注来源内容的引用
-
-分析内容：
-{combined_content}
-
-请严格按照以下JSON格式返回，不要添加任何其他文字：
-{{
-  "title": "内容标题",
-  "summary": "核心摘要内容...",
-  "key_points": ["要点1", "要点2", "要点3"],
-  "references": [
-    {{"source_block_index": 0, "source_text": "引用的具体文本", "reference_type": "quote", "start_position": 0, "end_position": 50}}
-  ]
-}}
-            """
-            
-            try:
-                summary_result = await llm_provider.generate_simple_text(
-                    prompt=summary_prompt,
-                    model_name="gemini-2.5-flash"
-                )
-                
-                # 解析概要JSON响应
-                import json
-                import re
-                
-                json_match = re.search(r'\{.*\}', summary_result, re.DOTALL)
-                if json_match:
-                    json_str = json_match.group(0)
-                    try:
-                        summary_data = json.loads(json_str)
-                        
-                        # 处理引用数据
-                        references = []
-                        for ref in summary_data.get('references', []):
-                            if isinstance(ref, dict) and 'source_text' in ref:
-                                references.append(ContentReference(
-                                    source_block_index=ref.get('source_block_index', 0),
-                                    source_text=ref['source_text'],
-                                    reference_type=ref.get('reference_type', 'quote'),
-                                    start_position=ref.get('start_position'),
-                                    end_position=ref.get('end_position')
-                                ))
-                        
-                        response_data.summary = ContentSummary(
-                            title=summary_data.get('title', '内容概要'),
-                            summary=summary_data.get('summary', ''),
-                            key_points=summary_data.get('key_points', []),
-                            references=references
-                        )
-                        
-                    except (json.JSONDecodeError, ValueError, KeyError) as e:
-                        print(f"Failed to parse summary JSON: {e}")
-                        response_data.summary = await _generate_summary_fallback(summary_result, combined_content)
-                else:
-                    response_data.summary = await _generate_summary_fallback(summary_result, combined_content)
-                    
-            except Exception as e:
-                print(f"Error generating summary: {e}")
-                response_data.summary = None
-        
-        return response_data
+        llm_provider = get_llm_provider(ANALYSIS_LLM_PROVIDER, hedge=request.hedge)
+        response = await run_content_analysis(llm_provider, request, combined_content, ANALYSIS_LLM_MODEL)
+        if deduplication is not None:
+            response = response.model_copy(update={"deduplication": deduplication})
+        return response
         
     except Exception as e:
         print(f"Error during content analysis: {e}")
         raise HTTPException(status_code=500, detail=f"Error analyzing content: {str(e)}")
 
 
-async def _extract_keywords_fallback(llm_result: str, content: str) -> List[KeywordTag]:
+@app.post("/api/v1/content-analysis/incremental", response_model=ContentAnalysisResponse)
+async def analyze_content_incremental_endpoint(request: IncrementalAnalysisRequest):
     """
-    备用关键词提取方案，当LLM JSON解析失败时使用
+    边输入边分析：按内容块缓存分析结果，只分析新增或修改过的块。
+    带 session_id 的请求会先防抖，被同一会话更新的请求取代时返回 superseded=True。
     """
-    try:
-        # 简单的关键词提取逻辑
-        words = content.lower().split()
-        # 移除常见停用词
-        stop_words = {'的', '是', '在', '有', '和', '与', '或', '但', '而', '了', '以', '及', '为', '由', '对', 'the', 'and', 'or', 'but', 'in', 'on', 'at', 'to', 'for', 'of', 'with', 'by'}
-        
-        # 统计词频
-        word_freq = {}
-        for word in words:
-            if len(word) > 2 and word not in stop_words:
-                word_freq[word] = word_freq.get(word, 0) + 1
-        
-        # 取前10个高频词作为关键词
-        top_words = sorted(word_freq.items(), key=lambda x: x[1], reverse=True)[:10]
-        
-        keywords = []
-        for i, (word, freq) in enumerate(top_words):
-            importance = max(0.3, 1.0 - (i * 0.1))  # 递减的重要性评分
-            category = "核心概念" if i < 3 else "相关术语"
-            keywords.append(KeywordTag(keyword=word, importance=importance, category=category))
-        
-        return keywords
-    except Exception:
-        return []
-
+    if not any(block.type != 'image' for block in request.user_input.blocks):
+        raise HTTPException(status_code=400, detail="No content to analyze")
 
-async def _generate_mindmap_fallback(llm_result: str, content: str) -> List[MindMapNode]:
-    """
-    备用思维导图生成方案，当LLM JSON解析失败时使用
-    基于内容生成简化的思维导图
-    """
     try:
-        print(f"Using fallback mindmap generation for content: {content[:100]}...")
-        
-        # 尝试从内容中提取关键信息生成动态思维导图
-        content_lower = content.lower()
-        
-        # 根据内容类型判断主题
-        if '代码' in content or 'code' in content_lower or 'function' in content_lower:
-            root_text = "代码分析"
-            nodes = [
-                MindMapNode(id="root", text=root_text, level=1, children=["structure", "logic", "optimization"]),
-                MindMapNode(id="structure", text="代码结构", level=2, parent_id="root", children=["modules"]),
-                MindMapNode(id="logic", text="逻辑实现", level=2, parent_id="root", children=["algorithm"]),
-                MindMapNode(id="optimization", text="优化建议", level=2, parent_id="root"),
-                MindMapNode(id="modules", text="模块分解", level=3, parent_id="structure"),
-                MindMapNode(id="algorithm", text="算法分析", level=3, parent_id="logic")
-            ]
-        elif '数据' in content or 'data' in content_lower or '分析' in content:
-            root_text = "数据分析"
-            nodes = [
-                MindMapNode(id="root", text=root_text, level=1, children=["source", "process", "result"]),
-                MindMapNode(id="source", text="数据来源", level=2, parent_id="root", children=["collection"]),
-                MindMapNode(id="process", text="处理方法", level=2, parent_id="root", children=["analysis"]),
-                MindMapNode(id="result", text="结果输出", level=2, parent_id="root"),
-                MindMapNode(id="collection", text="数据收集", level=3, parent_id="source"),
-                MindMapNode(id="analysis", text="分析算法", level=3, parent_id="process")
-            ]
-        elif '项目' in content or 'project' in content_lower or '开发' in content:
-            root_text = "项目分析"
-            nodes = [
-                MindMapNode(id="root", text=root_text, level=1, children=["requirements", "design", "implementation"]),
-                MindMapNode(id="requirements", text="需求分析", level=2, parent_id="root", children=["features"]),
-                MindMapNode(id="design", text="设计方案", level=2, parent_id="root", children=["architecture"]),
-                MindMapNode(id="implementation", text="实现计划", level=2, parent_id="root"),
-                MindMapNode(id="features", text="功能特性", level=3, parent_id="requirements"),
-                MindMapNode(id="architecture", text="架构设计", level=3, parent_id="design")
-            ]
-        else:
-            # 默认通用结构
-            # 尝试从内容中提取第一个有意义的词作为主题
-            words = content.split()[:10]  # 取前10个词
-            meaningful_words = [w for w in words if len(w) > 2 and w not in ['的', '是', '在', '了', '和']]
-            root_text = meaningful_words[0] if meaningful_words else "内容分析"
-            
-            nodes = [
-                MindMapNode(id="root", text=root_text, level=1, children=["overview", "details", "conclusion"]),
-                MindMapNode(id="overview", text="概述", level=2, parent_id="root", children=["background"]),
-                MindMapNode(id="details", text="详细内容", level=2, parent_id="root", children=["key_points"]),
-                MindMapNode(id="conclusion", text="结论", level=2, parent_id="root"),
-                MindMapNode(id="background", text="背景信息", level=3, parent_id="overview"),
-                MindMapNode(id="key_points", text="关键要点", level=3, parent_id="details")
-            ]
-        
-        print(f"Generated fallback mindmap with root: {root_text}")
-        return nodes
-        
+        llm_provider = get_llm_provider(ANALYSIS_LLM_PROVIDER) if request.engine == "llm" else None
+        return await run_incremental_analysis(llm_provider, request, ANALYSIS_LLM_MODEL)
+    except HTTPException:
+        raise
     except Exception as e:
-        print(f"Error in fallback mindmap generation: {e}")
-        # 最后的备用方案
-        return [
-            MindMapNode(id="root", text="内容分析", level=1, children=["concept", "method"]),
-            MindMapNode(id="concept", text="核心概念", level=2, parent_id="root"),
-            MindMapNode(id="method", text="实现方法", level=2, parent_id="root")
-        ]
-
-
-async def _generate_summary_fallback(llm_result: str, content: str) -> ContentSummary:
-    """
-    备用概要生成方案，当LLM JSON解析失败时使用
-    """
-    try:
-        # 简化的概要生成
-        title = "内容概要"
-        summary = content[:200] + "..." if len(content) > 200 else content
-        key_points = ["主要内容分析", "核心概念提取", "关键信息整理"]
-        references = [
-            ContentReference(
-                source_block_index=0,
-                source_text=content[:100] if content else "内容摘要",
-                reference_type="summary"
-            )
-        ]
-        
-        return ContentSummary(
-            title=title,
-            summary=summary,
-            key_points=key_points,
-            references=references
-        )
-    except Exception:
-        return ContentSummary(
-            title="分析错误",
-            summary="无法生成内容概要",
-            key_points=[],
-            references=[]
-        )
+        print(f"Error during incremental content analysis: {e}")
+        raise HTTPException(status_code=500, detail=f"Error analyzing content: {str(e)}")
 
 
 # To run the app (from the 'backend' directory):
@@ -0,0 +1,372 @@
+# File: agent-app/backend/observability/metrics.py
+"""
+Prometheus metrics without an extra client dependency.
+
+Counters and histograms are kept in process memory and rendered in the Prometheus text
+exposition format by GET /metrics. State owned elsewhere (router stats, the analysis batcher) is
+read at scrape time through registered collectors, so the hot paths keep their own counters and
+do not update metrics twice.
+
+With several workers (serve.py sets METRICS_DIR) every worker writes a snapshot of its counters,
+histograms and collector samples to METRICS_DIR/worker-<pid>.json at every scrape and every
+METRICS_FLUSH_SECONDS in the background. /metrics on any worker merges all snapshots: counters and
+histograms are summed (snapshots of exited workers are kept so totals never go backwards), and
+collector samples of live workers are reported with a worker label. Other workers' values can be
+up to METRICS_FLUSH_SECONDS old.
+
+Pipeline stages timed with stage_timer():
+    image_fetch, prompt_build, upstream_call, markdown_render, json_parse, vault_scan, file_save, related_notes, deduplicate
+Each timed stage is also recorded as a tracing span of the same name.
+"""
+import json
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from . import tracing
+
+LabelValues = Tuple[str, ...]
+Sample = Tuple[Dict[str, str], float]
+
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+METRICS_FLUSH_SECONDS = 5.0
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> LabelValues:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        if amount < 0:
+            raise ValueError("Counters can only increase")
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels: str) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def dump(self) -> List:
+        with self._lock:
+            return [[list(key), v] for key, v in self._values.items()]
+
+    def load(self, dumped: List) -> None:
+        """Adds the values of another process's dump()."""
+        with self._lock:
+            for key, v in dumped:
+                key = tuple(key)
+                self._values[key] = self._values.get(key, 0.0) + v
+
+    def empty_copy(self) -> "Counter":
+        return Counter(self.name, self.documentation, self.labelnames)
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return self.header() + [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(v)}" for key, v in items]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._counts: Dict[LabelValues, List[int]] = {}
+        self._sums: Dict[LabelValues, float] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            counts = self._counts.setdefault(key, [0] * (len(self.buckets) + 1))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+                    break
+            else:
+                counts[-1] += 1
+            self._sums[key] = self._sums.get(key, 0.0) + value
+
+    def dump(self) -> List:
+        with self._lock:
+            return [[list(key), list(counts), self._sums[key]] for key, counts in self._counts.items()]
+
+    def load(self, dumped: List) -> None:
+        """Adds the observations of another process's dump()."""
+        with self._lock:
+            for key, counts, total in dumped:
+                key = tuple(key)
+                merged = self._counts.setdefault(key, [0] * (len(self.buckets) + 1))
+                for i, count in enumerate(counts[:len(merged)]):
+                    merged[i] += count
+                self._sums[key] = self._sums.get(key, 0.0) + total
+
+    def empty_copy(self) -> "Histogram":
+        return Histogram(self.name, self.documentation, self.labelnames, self.buckets)
+
+    @contextmanager
+    def time(self, **labels: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = sorted((key, list(counts), self._sums[key]) for key, counts in self._counts.items())
+        lines = self.header()
+        for key, counts, total in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), counts):
+                cumulative += count
+                le = 'le="' + _format_value(bound) + '"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {cumulative}")
+        return lines
+
+
+class _Collector:
+    """Metric whose samples are produced by a callback at scrape time."""
+
+    def __init__(self, name: str, kind: str, documentation: str, collect: Callable[[], Iterable[Sample]]):
+        self.name = name
+        self.kind = kind
+        self.documentation = documentation
+        self.collect = collect
+
+    def samples(self) -> List[Sample]:
+        try:
+            return list(self.collect())
+        except Exception as e:
+            print(f"ERROR: Metrics collector {self.name} failed: {e}")
+            return []
+
+    def dump(self) -> List:
+        return [[labels, value] for labels, value in self.samples()]
+
+    def render(self, samples: Optional[List[Sample]] = None) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for labels, value in (samples if samples is not None else self.samples()):
+            names = sorted(labels)
+            lines.append(f"{self.name}{_format_labels(names, [labels[n] for n in names])} {_format_value(value)}")
+        return lines
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class MetricsRegistry:
+    def __init__(self, directory: Optional[str] = None):
+        self._metrics: Dict[str, object] = {}
+        self._lock = threading.Lock()
+        # Shared snapshot directory of a multi-worker server; empty for a single process
+        self.directory = directory if directory is not None else os.getenv("METRICS_DIR", "")
+        self._flusher: Optional[threading.Thread] = None
+
+    def _register(self, metric):
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Metric already registered: {metric.name}")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def collector(self, name: str, kind: str, documentation: str, collect: Callable[[], Iterable[Sample]]) -> None:
+        """Registers (or replaces) a gauge/counter read from collect() at scrape time."""
+        with self._lock:
+            self._metrics[name] = _Collector(name, kind, documentation, collect)
+
+    def dump(self) -> Dict[str, Any]:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return {metric.name: metric.dump() for metric in metrics}
+
+    def write_snapshot(self) -> None:
+        """Writes this process's values to the shared directory (atomically, readers never see half a file)."""
+        directory = Path(self.directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        target = directory / f"worker-{os.getpid()}.json"
+        temp = directory / f".worker-{os.getpid()}.json.tmp"
+        temp.write_text(json.dumps(self.dump()), encoding="utf-8")
+        os.replace(temp, target)
+
+    def _read_snapshots(self) -> List[Tuple[int, Dict[str, Any]]]:
+        snapshots = []
+        for path in Path(self.directory).glob("worker-*.json"):
+            try:
+                pid = int(path.stem.split("-", 1)[1])
+                snapshots.append((pid, json.loads(path.read_text(encoding="utf-8"))))
+            except (OSError, ValueError) as e:
+                print(f"WARNING: Skipping unreadable metrics snapshot {path}: {e}")
+        return snapshots
+
+    def _flush_loop(self) -> None:
+        while True:
+            try:
+                self.write_snapshot()
+            except OSError as e:
+                print(f"WARNING: Failed to write metrics snapshot: {e}")
+            time.sleep(METRICS_FLUSH_SECONDS)
+
+    def start_flushing(self) -> None:
+        """Starts the background snapshot writer in this worker (no-op without a shared directory)."""
+        if not self.directory or (self._flusher is not None and self._flusher.is_alive()):
+            return
+        self._flusher = threading.Thread(target=self._flush_loop, name="metrics-flush", daemon=True)
+        self._flusher.start()
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines: List[str] = []
+        if not self.directory:
+            for metric in metrics:
+                lines.extend(metric.render())
+            return "\n".join(lines) + "\n"
+
+        self.write_snapshot()
+        snapshots = self._read_snapshots()
+        for metric in metrics:
+            if isinstance(metric, _Collector):
+                samples = [
+                    (dict(labels, worker=str(pid)), value)
+                    for pid, snapshot in snapshots if _pid_alive(pid)
+                    for labels, value in snapshot.get(metric.name, [])
+                ]
+                lines.extend(metric.render(samples))
+                continue
+            merged = metric.empty_copy()
+            for _, snapshot in snapshots:
+                merged.load(snapshot.get(metric.name, []))
+            lines.extend(merged.render())
+        return "\n".join(lines) + "\n"
+
+
+def reset_snapshot_directory(directory: str) -> None:
+    """Removes the snapshots of a previous server run; called by the master before starting workers."""
+    for path in Path(directory).glob("worker-*.json"):
+        path.unlink(missing_ok=True)
+
+
+registry = MetricsRegistry()
+
+HTTP_REQUESTS = registry.counter("http_requests_total", "HTTP requests by route and status.", ("method", "route", "status"))
+HTTP_REQUEST_SECONDS = registry.histogram("http_request_duration_seconds", "HTTP request latency by route.", ("method", "route"))
+STAGE_SECONDS = registry.histogram("pipeline_stage_duration_seconds", "Time spent in each pipeline stage.", ("stage",))
+LLM_UPSTREAM_SECONDS = registry.histogram("llm_upstream_duration_seconds", "Latency of single upstream LLM API calls.", ("provider", "model"))
+LLM_UPSTREAM_ERRORS = registry.counter("llm_upstream_errors_total", "Failed LLM calls by exception type.", ("provider", "model", "error"))
+LLM_TOKENS = registry.counter("llm_tokens_total", "LLM tokens; reported usage when the API returns it, estimated otherwise.", ("provider", "model", "direction"))
+LLM_BYTES = registry.counter("llm_bytes_total", "Request and response payload bytes of LLM calls (text parts only for the Gemini SDK).", ("provider", "model", "direction"))
+FALLBACKS = registry.counter("fallbacks_total", "Fallback paths taken instead of the primary result.", ("kind",))
+CACHE_HITS = registry.counter("cache_hits_total", "Cache hits by cache.", ("cache",))
+CACHE_MISSES = registry.counter("cache_misses_total", "Cache misses by cache.", ("cache",))
+DEDUPLICATED_TOKENS = registry.counter("deduplicated_tokens_total", "Estimated input tokens removed by collapsing near-duplicate paragraphs.", ("endpoint",))
+
+
+@contextmanager
+def stage_timer(stage: str) -> Iterator[None]:
+    with STAGE_SECONDS.time(stage=stage), tracing.span(stage):
+        yield
+
+
+@contextmanager
+def upstream_timer(provider_name: str, model_name: str) -> Iterator[None]:
+    """Times one upstream API call as the upstream_call stage and per provider/model."""
+    start = time.perf_counter()
+    try:
+        with tracing.span("upstream_call", **{"llm.provider": provider_name, "llm.model": model_name}):
+            yield
+    finally:
+        elapsed = time.perf_counter() - start
+        STAGE_SECONDS.observe(elapsed, stage="upstream_call")
+        LLM_UPSTREAM_SECONDS.observe(elapsed, provider=provider_name, model=model_name)
+
+
+def record_llm_usage(
+    provider_name: str,
+    model_name: str,
+    input_tokens: int,
+    output_tokens: int,
+    request_bytes: int,
+    response_bytes: int
+) -> None:
+    LLM_TOKENS.inc(input_tokens, provider=provider_name, model=model_name, direction="input")
+    LLM_TOKENS.inc(output_tokens, provider=provider_name, model=model_name, direction="output")
+    LLM_BYTES.inc(request_bytes, provider=provider_name, model=model_name, direction="request")
+    LLM_BYTES.inc(response_bytes, provider=provider_name, model=model_name, direction="response")
+
+
+def record_upstream_error(provider_name: str, model_name: str, error: BaseException) -> None:
+    LLM_UPSTREAM_ERRORS.inc(provider=provider_name, model=model_name, error=type(error).__name__)
+
+
+def count_fallback(kind: str, amount: int = 1) -> None:
+    FALLBACKS.inc(amount, kind=kind)
+
+
+def count_cache(cache: str, hit: bool, amount: int = 1) -> None:
+    (CACHE_HITS if hit else CACHE_MISSES).inc(amount, cache=cache)
+
+
+def count_deduplicated_tokens(endpoint: str, amount: int) -> None:
+    DEDUPLICATED_TOKENS.inc(amount, endpoint=endpoint)
+
+
+def text_bytes(parts: Iterable[object]) -> int:
+    """UTF-8 size of the text parts of a prompt; images are not counted."""
+    return sum(len(part.encode("utf-8")) for part in parts if isinstance(part, str))
@@ -0,0 +1,297 @@
+# File: agent-app/backend/observability/profiler.py
+"""
+On-demand sampling profiler for a live worker.
+
+A background thread snapshots every thread's Python stack with sys._current_frames() at a fixed
+interval and counts identical stacks, so the overhead is one stack walk per thread per interval and
+nothing at all while no profile is running. Results are returned in the collapsed-stack format
+understood by flamegraph.pl, speedscope and inferno ("thread;outer;...;inner count").
+
+While sampling, an asyncio task measures event-loop lag: how late a short sleep wakes up. Lag
+means something blocked the loop (CPU-bound parsing or rendering done inline rather than in a
+worker thread).
+
+Two ways to profile, both behind DEBUG_PROFILE_TOKEN (the debug endpoints are disabled when it is
+unset):
+- POST /debug/profile?seconds=N profiles the whole worker for N seconds;
+- sending X-Debug-Profile: <token> with any request profiles the worker while that request runs;
+  the response carries X-Profile-Id and the result is fetched from /debug/profiles/{id}.
+  Other requests running at the same time are part of the samples too.
+
+Only one profile runs per worker at a time; the most recent results are kept in memory and, when
+the shared cache tier is enabled (serve.py), also there for PROFILE_TTL_SECONDS, so the follow-up
+fetch of a request profile works whichever worker answers it.
+"""
+import asyncio
+import os
+import secrets
+import sys
+import threading
+import time
+from collections import Counter, OrderedDict
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from types import CodeType, FrameType
+from typing import AsyncIterator, Dict, List, Optional
+
+import numpy as np
+
+from shared_cache import SharedCache, shared_cache
+
+DEFAULT_INTERVAL_MS = 10.0
+MIN_INTERVAL_MS = 1.0
+MAX_PROFILE_SECONDS = 60.0
+MAX_STACK_DEPTH = 128
+LOOP_LAG_INTERVAL = 0.01
+KEEP_RESULTS = 20
+PROFILE_NAMESPACE = "debug_profiles"
+PROFILE_INDEX_KEY = "_index"  # summaries of the most recent profiles of all workers
+PROFILE_TTL_SECONDS = 3600.0
+
+# Leaf frames of threads parked waiting for work; dropped unless idle stacks are requested
+IDLE_LEAVES = {
+    ("selectors.py", "select"), ("threading.py", "wait"), ("queue.py", "get"),
+    ("thread.py", "_worker"), ("socket.py", "accept"),
+}
+
+_BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+class ProfilerBusyError(RuntimeError):
+    """Another profile is already running in this worker."""
+
+
+def _label(code: CodeType, cache: Dict[CodeType, str]) -> str:
+    label = cache.get(code)
+    if label is None:
+        path = code.co_filename
+        if path.startswith(_BACKEND_DIR):
+            path = os.path.relpath(path, _BACKEND_DIR)
+        else:
+            path = "/".join(path.replace("\\", "/").split("/")[-2:])
+        label = f"{code.co_qualname} ({path}:{code.co_firstlineno})".replace(";", ":")
+        cache[code] = label
+    return label
+
+
+class StackSampler:
+    def __init__(self, interval: float, include_idle: bool = False):
+        self.interval = interval
+        self.include_idle = include_idle
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._labels: Dict[CodeType, str] = {}
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _run(self) -> None:
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            names = {t.ident: t.name for t in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id != own:
+                    self._sample(names.get(thread_id, f"thread-{thread_id}"), frame)
+            self.samples += 1
+
+    def _sample(self, thread_name: str, frame: Optional[FrameType]) -> None:
+        leaf = frame.f_code
+        if not self.include_idle and (os.path.basename(leaf.co_filename), leaf.co_name) in IDLE_LEAVES:
+            return
+        frames: List[str] = []
+        while frame is not None and len(frames) < MAX_STACK_DEPTH:
+            frames.append(_label(frame.f_code, self._labels))
+            frame = frame.f_back
+        frames.append(thread_name)
+        self.stacks[tuple(reversed(frames))] += 1
+
+
+class LoopLagMonitor:
+    def __init__(self, interval: float = LOOP_LAG_INTERVAL):
+        self.interval = interval
+        self.lags: List[float] = []
+        self._task: Optional["asyncio.Task"] = None
+
+    def start(self) -> None:
+        self._task = asyncio.ensure_future(self._run())
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            self.lags.append(max(0.0, loop.time() - expected))
+
+    def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+
+    def stats(self) -> Dict:
+        if not self.lags:
+            return {"samples": 0}
+        ms = np.array(self.lags) * 1000
+        return {
+            "samples": len(ms),
+            "mean_ms": round(float(ms.mean()), 2),
+            "p50_ms": round(float(np.percentile(ms, 50)), 2),
+            "p95_ms": round(float(np.percentile(ms, 95)), 2),
+            "p99_ms": round(float(np.percentile(ms, 99)), 2),
+            "max_ms": round(float(ms.max()), 2),
+            "over_100ms": int((ms > 100).sum()),
+        }
+
+
+@dataclass
+class ProfileResult:
+    profile_id: str
+    kind: str  # "worker" or "request"
+    target: str
+    started_at: float
+    duration_s: float
+    interval_ms: float
+    samples: int
+    stacks: Counter = field(repr=False)
+    loop_lag: Dict = field(default_factory=dict)
+
+    def collapsed(self) -> str:
+        return "\n".join(f"{';'.join(stack)} {count}" for stack, count in self.stacks.most_common()) + "\n"
+
+    def top_functions(self, limit: int = 20) -> List[Dict]:
+        """Functions with the most samples at the top of the stack (self time)."""
+        leaves: Counter = Counter()
+        for stack, count in self.stacks.items():
+            leaves[stack[-1]] += count
+        total = sum(leaves.values()) or 1
+        return [{"function": name, "samples": count, "share": round(count / total, 3)} for name, count in leaves.most_common(limit)]
+
+    def to_json(self) -> Dict:
+        return {
+            "profile_id": self.profile_id,
+            "kind": self.kind,
+            "target": self.target,
+            "started_at": self.started_at,
+            "duration_s": self.duration_s,
+            "interval_ms": self.interval_ms,
+            "samples": self.samples,
+            "stacks": [[list(stack), count] for stack, count in self.stacks.items()],
+            "loop_lag": self.loop_lag,
+        }
+
+    @classmethod
+    def from_json(cls, data: Dict) -> "ProfileResult":
+        return cls(
+            profile_id=data["profile_id"], kind=data["kind"], target=data["target"], started_at=data["started_at"],
+            duration_s=data["duration_s"], interval_ms=data["interval_ms"], samples=data["samples"],
+            stacks=Counter({tuple(stack): count for stack, count in data["stacks"]}), loop_lag=data["loop_lag"]
+        )
+
+    def listing(self) -> Dict:
+        return {"profile_id": self.profile_id, "kind": self.kind, "target": self.target, "started_at": self.started_at, "duration_s": round(self.duration_s, 3), "samples": self.samples}
+
+    def summary(self) -> Dict:
+        return {
+            "profile_id": self.profile_id,
+            "kind": self.kind,
+            "target": self.target,
+            "started_at": self.started_at,
+            "duration_s": round(self.duration_s, 3),
+            "interval_ms": self.interval_ms,
+            "samples": self.samples,
+            "loop_lag": self.loop_lag,
+            "top_functions": self.top_functions(),
+        }
+
+
+class Profiler:
+    def __init__(self, token: Optional[str] = None, keep: int = KEEP_RESULTS, shared: Optional[SharedCache] = None):
+        self.token = token if token is not None else os.getenv("DEBUG_PROFILE_TOKEN", "")
+        self.keep = keep
+        self.shared = shared if shared is not None else shared_cache
+        self._lock = threading.Lock()
+        self._results: "OrderedDict[str, ProfileResult]" = OrderedDict()
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.token)
+
+    @property
+    def busy(self) -> bool:
+        return self._lock.locked()
+
+    def authorized(self, credential: Optional[str]) -> bool:
+        if not self.enabled or not credential:
+            return False
+        if credential.lower().startswith("bearer "):
+            credential = credential[7:]
+        return secrets.compare_digest(credential.strip().encode(), self.token.encode())
+
+    @asynccontextmanager
+    async def session(self, kind: str, target: str, interval_ms: float = DEFAULT_INTERVAL_MS, include_idle: bool = False) -> AsyncIterator[Dict]:
+        """Samples while the block runs; the yielded dict receives "result" when the block exits."""
+        if not self._lock.acquire(blocking=False):
+            raise ProfilerBusyError("A profile is already running in this worker")
+        interval_ms = max(MIN_INTERVAL_MS, interval_ms)
+        holder: Dict = {}
+        sampler = StackSampler(interval_ms / 1000, include_idle)
+        lag = LoopLagMonitor()
+        started_at = time.time()
+        start = time.perf_counter()
+        try:
+            sampler.start()
+            lag.start()
+            try:
+                yield holder
+            finally:
+                lag.stop()
+                sampler.stop()
+            result = ProfileResult(
+                profile_id=secrets.token_hex(6), kind=kind, target=target, started_at=started_at,
+                duration_s=time.perf_counter() - start, interval_ms=interval_ms, samples=sampler.samples,
+                stacks=sampler.stacks, loop_lag=lag.stats()
+            )
+            await asyncio.to_thread(self._store, result)
+            holder["result"] = result
+        finally:
+            self._lock.release()
+
+    async def profile_worker(self, seconds: float, interval_ms: float = DEFAULT_INTERVAL_MS, include_idle: bool = False) -> ProfileResult:
+        seconds = min(max(seconds, 0.1), MAX_PROFILE_SECONDS)
+        async with self.session("worker", f"pid {os.getpid()}", interval_ms, include_idle) as holder:
+            await asyncio.sleep(seconds)
+        print(f"INFO: Profiled worker for {seconds:.1f}s ({holder['result'].samples} samples)")
+        return holder["result"]
+
+    def _store(self, result: ProfileResult) -> None:
+        self._results[result.profile_id] = result
+        while len(self._results) > self.keep:
+            self._results.popitem(last=False)
+        if self.shared.enabled:
+            self.shared.set_json(PROFILE_NAMESPACE, result.profile_id, result.to_json(), ttl=PROFILE_TTL_SECONDS)
+            # Best effort: two workers finishing a profile at the same moment may drop one listing entry
+            index = self.shared.get_json(PROFILE_NAMESPACE, PROFILE_INDEX_KEY) or []
+            index = [result.listing()] + [entry for entry in index if entry["profile_id"] != result.profile_id]
+            self.shared.set_json(PROFILE_NAMESPACE, PROFILE_INDEX_KEY, index[:self.keep], ttl=PROFILE_TTL_SECONDS)
+
+    def get(self, profile_id: str) -> Optional[ProfileResult]:
+        """Blocking when the shared tier is enabled; call from a worker thread."""
+        result = self._results.get(profile_id)
+        if result is None and self.shared.enabled and profile_id != PROFILE_INDEX_KEY:
+            stored = self.shared.get_json(PROFILE_NAMESPACE, profile_id)
+            result = ProfileResult.from_json(stored) if stored else None
+        return result
+
+    def list(self) -> List[Dict]:
+        """Blocking when the shared tier is enabled; call from a worker thread."""
+        if self.shared.enabled:
+            return self.shared.get_json(PROFILE_NAMESPACE, PROFILE_INDEX_KEY) or []
+        return [r.listing() for r in reversed(self._results.values())]
+
+
+profiler = Profiler()
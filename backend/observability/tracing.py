@@ -0,0 +1,225 @@
+# File: agent-app/backend/observability/tracing.py
+"""
+Request-scoped tracing without an OpenTelemetry SDK dependency.
+
+The HTTP middleware opens a root span per request; span() opens child spans anywhere below it
+(pipeline stages, upstream LLM calls). The current span travels in a contextvar, so spans opened
+in tasks started with asyncio.gather / asyncio.to_thread are parented correctly. Outside a
+request, span() does nothing.
+
+When a request finishes:
+- its spans are summarized per name in a Server-Timing header for the browser devtools;
+- if TRACE_EXPORT_PATH is set, the trace is appended to that file as one OTLP/JSON
+  ExportTraceServiceRequest per line (the OpenTelemetry Collector file exporter format) by a
+  background writer thread.
+
+An incoming W3C traceparent header is honoured, so traces join the caller's trace id.
+"""
+import contextvars
+import json
+import os
+import queue
+import re
+import secrets
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+SERVICE_NAME = "make-page-backend"
+SPAN_KIND_INTERNAL = 1
+SPAN_KIND_SERVER = 2
+STATUS_OK = 1
+STATUS_ERROR = 2
+MAX_SPANS_PER_TRACE = 2000  # spans beyond this are dropped so a runaway request cannot grow without bound
+
+_TRACEPARENT = re.compile(r"^00-([0-9a-f]{32})-([0-9a-f]{16})-[0-9a-f]{2}$")
+
+
+@dataclass
+class Span:
+    trace: "Trace"
+    name: str
+    span_id: str
+    parent_span_id: str
+    kind: int = SPAN_KIND_INTERNAL
+    start_ns: int = field(default_factory=time.time_ns)
+    end_ns: int = 0
+    attributes: Dict[str, Any] = field(default_factory=dict)
+    status_code: int = 0
+    status_message: str = ""
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        self.attributes[key] = value
+
+    @property
+    def duration_ms(self) -> float:
+        return (self.end_ns - self.start_ns) / 1e6
+
+    def to_otlp(self) -> Dict:
+        span = {
+            "traceId": self.trace.trace_id,
+            "spanId": self.span_id,
+            "parentSpanId": self.parent_span_id,
+            "name": self.name,
+            "kind": self.kind,
+            "startTimeUnixNano": str(self.start_ns),
+            "endTimeUnixNano": str(self.end_ns),
+            "attributes": [_otlp_attribute(k, v) for k, v in self.attributes.items()],
+        }
+        if self.status_code:
+            span["status"] = {"code": self.status_code, "message": self.status_message} if self.status_message else {"code": self.status_code}
+        return span
+
+
+@dataclass
+class Trace:
+    trace_id: str
+    spans: List[Span] = field(default_factory=list)
+    dropped: int = 0
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    def add(self, span: Span) -> None:
+        with self._lock:
+            if len(self.spans) >= MAX_SPANS_PER_TRACE:
+                self.dropped += 1
+                return
+            self.spans.append(span)
+
+
+_current_span: contextvars.ContextVar[Optional[Span]] = contextvars.ContextVar("current_span", default=None)
+
+
+def _otlp_attribute(key: str, value: Any) -> Dict:
+    if isinstance(value, bool):
+        return {"key": key, "value": {"boolValue": value}}
+    if isinstance(value, int):
+        return {"key": key, "value": {"intValue": str(value)}}
+    if isinstance(value, float):
+        return {"key": key, "value": {"doubleValue": value}}
+    return {"key": key, "value": {"stringValue": str(value)}}
+
+
+def current_span() -> Optional[Span]:
+    return _current_span.get()
+
+
+def _finish(span: Span, error: Optional[BaseException]) -> None:
+    span.end_ns = time.time_ns()
+    if error is not None:
+        span.status_code = STATUS_ERROR
+        span.status_message = f"{type(error).__name__}: {error}"
+    span.trace.add(span)
+
+
+@contextmanager
+def span(name: str, **attributes: Any) -> Iterator[Optional[Span]]:
+    """Child span of the current span; a no-op (yields None) outside a traced request."""
+    parent = _current_span.get()
+    if parent is None:
+        yield None
+        return
+    child = Span(trace=parent.trace, name=name, span_id=secrets.token_hex(8), parent_span_id=parent.span_id, attributes=attributes)
+    token = _current_span.set(child)
+    error: Optional[BaseException] = None
+    try:
+        yield child
+    except BaseException as e:
+        error = e
+        raise
+    finally:
+        _current_span.reset(token)
+        _finish(child, error)
+
+
+def parse_traceparent(header: Optional[str]) -> Tuple[Optional[str], str]:
+    """(trace id, parent span id) from a W3C traceparent header, or (None, "")."""
+    match = _TRACEPARENT.match((header or "").strip().lower())
+    if not match or set(match.group(1)) == {"0"}:
+        return None, ""
+    return match.group(1), match.group(2)
+
+
+@contextmanager
+def request_span(name: str, traceparent: Optional[str] = None, **attributes: Any) -> Iterator[Span]:
+    """Root span of one HTTP request; the finished trace is exported when it closes."""
+    trace_id, parent_span_id = parse_traceparent(traceparent)
+    trace = Trace(trace_id=trace_id or secrets.token_hex(16))
+    root = Span(
+        trace=trace, name=name, span_id=secrets.token_hex(8), parent_span_id=parent_span_id,
+        kind=SPAN_KIND_SERVER, attributes=attributes
+    )
+    token = _current_span.set(root)
+    error: Optional[BaseException] = None
+    try:
+        yield root
+    except BaseException as e:
+        error = e
+        raise
+    finally:
+        _current_span.reset(token)
+        _finish(root, error)
+        exporter.export(trace)
+
+
+def server_timing(root: Span) -> str:
+    """Server-Timing header value: total request time plus summed duration and count per span name."""
+    totals: Dict[str, List[float]] = {}
+    for s in root.trace.spans:
+        if s is root:
+            continue
+        entry = totals.setdefault(s.name, [0.0, 0])
+        entry[0] += s.duration_ms
+        entry[1] += 1
+    elapsed_ms = (time.time_ns() - root.start_ns) / 1e6 if not root.end_ns else root.duration_ms
+    parts = [f"total;dur={elapsed_ms:.1f}"]
+    for name, (duration, count) in sorted(totals.items(), key=lambda item: -item[1][0]):
+        metric = re.sub(r"[^A-Za-z0-9_.-]", "_", name)
+        parts.append(f'{metric};dur={duration:.1f};desc="{count}x"')
+    return ", ".join(parts)
+
+
+class OTLPFileExporter:
+    """Appends finished traces to a file as OTLP/JSON lines from a background thread."""
+
+    def __init__(self, path: Optional[str]):
+        self.path = path
+        self._queue: "queue.SimpleQueue[Optional[Trace]]" = queue.SimpleQueue()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def export(self, trace: Trace) -> None:
+        if not self.path:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="otlp-file-exporter", daemon=True)
+                self._thread.start()
+        self._queue.put(trace)
+
+    @staticmethod
+    def encode(trace: Trace) -> str:
+        return json.dumps({
+            "resourceSpans": [{
+                "resource": {"attributes": [_otlp_attribute("service.name", SERVICE_NAME)]},
+                "scopeSpans": [{
+                    "scope": {"name": SERVICE_NAME},
+                    "spans": [s.to_otlp() for s in trace.spans],
+                }],
+            }]
+        }, ensure_ascii=False)
+
+    def _run(self) -> None:
+        while True:
+            trace = self._queue.get()
+            if trace is None:
+                return
+            try:
+                with open(self.path, "a", encoding="utf-8") as f:
+                    f.write(self.encode(trace) + "\n")
+            except Exception as e:
+                print(f"ERROR: Failed to export trace {trace.trace_id} to {self.path}: {e}")
+
+
+exporter = OTLPFileExporter(os.getenv("TRACE_EXPORT_PATH"))
@@ -1,4 +1,4 @@
-from typing import Literal, Union, Optional, List, Annotated
+from typing import Any, Dict, Literal, Union, Optional, List, Annotated
 from pydantic import BaseModel, Field, HttpUrl
 
 # --- Content Block Models ---
@@ -43,17 +43,77 @@ class OutputPreferences(BaseModel):
     max_word_count: Optional[int] = None  # Maximum word count
     fusion_degree: Optional[str] = "medium"  # Content fusion degree: low, medium, high
     enable_svg_output: Optional[bool] = False  # Enable SVG-based HTML output with illustrations
+    generation_mode: Optional[Literal["auto", "single", "longform"]] = "auto"  # longform: outline first, then sections in parallel; auto picks longform for large min_word_count
+
+class RelatedNotesOptions(BaseModel):
+    vault_path: str
+    top_k: int = Field(5, ge=1, le=50)
+    token_budget: int = Field(2000, ge=0)  # upper bound for all attached notes together (estimated tokens)
+    min_score: float = 0.05  # cosine similarity below which a note is not considered related
+
+class LinkedNotesOptions(BaseModel):
+    vault_path: str
+    paths: List[str]  # seed notes: vault-relative paths or wikilink names
+    depth: int = Field(1, ge=1, le=5)
+    direction: Literal["out", "in", "both"] = "both"  # follow forward links, backlinks or both
+    max_notes: int = Field(10, ge=1, le=100)
+    token_budget: int = Field(2000, ge=0)
+    include_seeds: bool = False  # also attach the seed notes themselves
+
+class DuplicateParagraph(BaseModel):
+    block_index: int  # 0-based, like GeneratedSection.source_block_indices
+    paragraph_index: int  # 0-based paragraph (blank-line separated) within the block
+    duplicate_of_block: int  # the earlier paragraph that was kept
+    duplicate_of_paragraph: int
+    similarity: float  # estimated Jaccard similarity of the character shingles (MinHash)
+    tokens_saved: int
+
+class DeduplicationReport(BaseModel):
+    paragraphs: int  # paragraphs long enough to be compared
+    duplicates: List[DuplicateParagraph] = []
+    tokens_before: int  # estimated tokens of all blocks
+    tokens_after: int
+    tokens_saved: int
 
 class GenerationRequest(BaseModel):
     user_input: UserInput
     llm_selection: LLMSelection
     output_preferences: Optional[OutputPreferences] = None
+    hedge: Optional[bool] = False  # Send a backup request to an alternate model if the primary is slower than its p95
+    related_notes: Optional[RelatedNotesOptions] = None  # Opt-in: attach the vault notes most related to the blocks as extra context
+    linked_notes: Optional[LinkedNotesOptions] = None  # Opt-in: attach the linked neighborhood of the given notes as extra context
+    deduplicate: Optional[bool] = False  # Opt-in: collapse near-duplicate paragraphs (including attached notes) into references before prompting
+
+class GeneratedSection(BaseModel):
+    heading: str
+    source_block_indices: List[int] = []  # 0-based indices of the input blocks this section was written from
+    cached: bool = False  # True when the section was reused instead of generated again
+    failed: bool = False  # True when generation failed and the section holds a placeholder
 
 class GeneratedContent(BaseModel):
     title: str
     article_markdown: str
     preview_html: str
     suggestions: Optional[List[str]] = None
+    article_id: Optional[str] = None  # Set for long-form articles; pass to /generate/regenerate to reuse unchanged sections
+    sections: Optional[List[GeneratedSection]] = None
+    failed_sections: Optional[List[str]] = None  # Headings of long-form sections that could not be generated (placeholders in the article)
+    deduplication: Optional[DeduplicationReport] = None  # Set when the request asked for deduplicate
+
+class RegenerationRequest(BaseModel):
+    article_id: str
+    user_input: UserInput
+    llm_selection: LLMSelection
+    output_preferences: Optional[OutputPreferences] = None
+    regenerate_sections: Optional[List[int]] = None  # 0-based section positions to regenerate even if unchanged
+
+class RefinementInstructionRequest(BaseModel):
+    instruction: str  # E.g., "make it shorter", "more technical"
+
+class RefinementSessionResponse(BaseModel):
+    session_id: str
+    turn: int  # 0 for the initial generation, incremented by each refinement
+    content: GeneratedContent
 
 # --- Models for /api/v1/llms endpoint ---
 
@@ -101,7 +161,136 @@ class ObsidianSaveRequest(BaseModel):
     folder_name: str
     file_name: str
     content: str
+    include_images: bool = True  # copy images referenced under /pic/ into the vault and rewrite their links
+    attachments_folder: str = "attachments"  # relative to the vault root
 
+class ObsidianNoteItem(BaseModel):
+    folder_name: str = ""
+    file_name: str
+    content: str
+
+class ObsidianBulkSaveRequest(BaseModel):
+    vault_path: str
+    notes: List[ObsidianNoteItem]
+    overwrite: bool = True  # False: existing files are left untouched and reported as failed
+    include_images: bool = True
+    attachments_folder: str = "attachments"
+
+class ObsidianSaveResult(BaseModel):
+    path: str  # relative to the vault root
+    success: bool
+    error: Optional[str] = None
+    bytes_written: int = 0
+
+class ObsidianAttachmentResult(BaseModel):
+    source: str  # relative to pic/
+    path: str  # relative to the vault root
+    success: bool
+    method: Optional[str] = None  # hardlink, reflink, copy_file_range, sendfile, copy or existing
+    error: Optional[str] = None
+    size: int = 0
+
+class ObsidianBulkSaveResponse(BaseModel):
+    results: List[ObsidianSaveResult]
+    saved: int
+    failed: int
+    attachments: List[ObsidianAttachmentResult] = []
+
+
+# --- Related Notes Models ---
+
+class RelatedNotesRequest(BaseModel):
+    vault_path: str
+    user_input: UserInput
+    top_k: int = Field(10, ge=1, le=100)
+    min_score: float = 0.05
+    exclude_paths: List[str] = []  # e.g. the notes already pasted as blocks
+
+class RelatedNote(BaseModel):
+    path: str  # relative to the vault root
+    score: float  # cosine similarity of the hashed TF-IDF vectors
+
+class RelatedNotesResponse(BaseModel):
+    notes: List[RelatedNote]
+
+# --- Vault Link Graph Models ---
+
+class NoteLinksRequest(BaseModel):
+    vault_path: str
+    path: str  # vault-relative path or wikilink name
+
+class NoteLinksResponse(BaseModel):
+    path: str
+    links: List[str]  # resolved forward links (vault-relative paths)
+    unresolved_links: List[str]
+    backlinks: List[str]
+    tags: List[str]
+    frontmatter: Dict[str, Any]
+
+class NeighborhoodRequest(BaseModel):
+    vault_path: str
+    paths: List[str]
+    depth: int = Field(1, ge=1, le=5)
+    direction: Literal["out", "in", "both"] = "both"
+    max_notes: int = Field(50, ge=1, le=1000)
+
+class GraphNode(BaseModel):
+    path: str
+    distance: int  # number of links from the nearest seed note
+
+class GraphEdge(BaseModel):
+    source: str
+    target: str
+
+class NeighborhoodResponse(BaseModel):
+    nodes: List[GraphNode]
+    edges: List[GraphEdge]
+
+class VaultTagsRequest(BaseModel):
+    vault_path: str
+    tag: Optional[str] = None  # when set, also list the notes carrying this tag
+
+class VaultTag(BaseModel):
+    tag: str
+    count: int
+
+class VaultTagsResponse(BaseModel):
+    tags: List[VaultTag]
+    notes: List[str] = []
+
+# --- Near-Duplicate Models ---
+
+class DeduplicateRequest(BaseModel):
+    user_input: UserInput
+    threshold: float = Field(0.8, ge=0.5, le=1.0)  # estimated Jaccard similarity at which paragraphs count as duplicates
+
+class DeduplicateResponse(BaseModel):
+    user_input: UserInput  # the blocks with duplicate paragraphs replaced by references
+    report: DeduplicationReport
+
+class VaultDuplicatesRequest(BaseModel):
+    vault_path: str
+    threshold: float = Field(0.8, ge=0.5, le=1.0)
+    max_groups: int = Field(50, ge=1, le=1000)
+    wait: bool = False  # wait for the index to catch up instead of answering from the last indexed state
+
+class DuplicateLocation(BaseModel):
+    path: str
+    paragraph_index: int  # 0-based paragraph (blank-line separated) within the note
+    preview: str
+
+class VaultDuplicateGroup(BaseModel):
+    paragraphs: List[DuplicateLocation]  # the first one is treated as the original
+    similarity: float  # lowest estimated similarity to the original
+    tokens_saveable: int
+
+class VaultDuplicatesResponse(BaseModel):
+    groups: List[VaultDuplicateGroup]
+    group_count: int
+    tokens_saveable: int  # over all groups, not only the returned ones
+    notes: int
+    paragraphs: int  # indexed paragraphs
+    indexing: bool  # True while a background update is running; results are from the previous state
 
 # --- Obsidian Directory Models ---
 
@@ -151,9 +340,26 @@ class ContentAnalysisRequest(BaseModel):
     user_input: UserInput
     analysis_types: List[Literal["keywords", "mindmap", "summary"]] = ["keywords", "mindmap", "summary"]
     language: Optional[str] = "zh"  # 分析语言
+    mode: Literal["auto", "fused", "staged", "local"] = "auto"  # 分析模式：auto 自动选择，fused 单次调用返回全部结果，staged 每种类型单独调用，local 本地计算不调用LLM
+    vault_path: Optional[str] = None  # 可选的 Obsidian 库路径，本地关键词提取用其统计IDF
+    mindmap_refine: bool = False  # 结构化内容是否仍交给LLM，在标题/列表生成的骨架上完善思维导图
+    hedge: bool = False  # 主模型超过其p95延迟仍未返回时，向备用模型发送对冲请求
+    deduplicate: bool = False  # 发送给LLM之前把近似重复的段落折叠为引用（本地分析仍使用原文）
+
+class IncrementalAnalysisRequest(BaseModel):
+    user_input: UserInput
+    analysis_types: List[Literal["keywords", "mindmap", "summary"]] = ["keywords", "mindmap", "summary"]
+    language: Optional[str] = "zh"
+    engine: Literal["llm", "local"] = "llm"  # 逐块分析使用的引擎
+    session_id: Optional[str] = None  # 编辑会话ID，同一会话的连续请求会被防抖
 
 class ContentAnalysisResponse(BaseModel):
     keywords: Optional[List[KeywordTag]] = None
     mindmap: Optional[List[MindMapNode]] = None
     summary: Optional[ContentSummary] = None
     analysis_language: str = "zh"
+    analysis_mode: Optional[str] = None  # 实际采用的分析模式
+    cached_blocks: Optional[int] = None  # 增量分析：命中缓存的块数
+    analyzed_blocks: Optional[int] = None  # 增量分析：重新分析的块数
+    superseded: bool = False  # 增量分析：该请求已被同一会话的更新请求取代，未返回结果
+    deduplication: Optional[DeduplicationReport] = None  # 请求 deduplicate 时的折叠结果
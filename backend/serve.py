@@ -0,0 +1,159 @@
+# File: agent-app/backend/serve.py
+"""
+Production entry point: several uvicorn workers behind one listening socket.
+
+The master process imports the app once (preload), binds the socket and forks the workers, so
+the workers share the imported code and read-only data copy-on-write and start serving at once.
+The master restarts workers that die and forwards SIGINT/SIGTERM for a graceful shutdown.
+
+In-process caches stay per worker; results worth sharing go through the SQLite tier in
+shared_cache.py, which this entry point enables by default (SHARED_CACHE_PATH, default
+.cache/shared.sqlite3 next to this file). That tier also holds the state follow-up requests need
+(refinement sessions, long-form article records and sections), since a follow-up usually reaches a
+different worker; starting more than one worker with SHARED_CACHE_PATH set to "" is refused.
+With several workers, /metrics on any worker reports the totals of all of them (METRICS_DIR,
+default .cache/metrics next to this file), so a single scrape target is enough.
+
+    uv run python serve.py --workers 4 --port 8000
+
+Development keeps using `uvicorn main:app --reload`. Forking needs a POSIX system; elsewhere a
+single worker is started.
+"""
+import argparse
+import os
+import signal
+import socket
+import sys
+import time
+import traceback
+from typing import Dict
+
+import uvicorn
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+RESTART_BACKOFF_SECONDS = 1.0  # a worker that dies sooner than this after starting is restarted after a pause
+SHUTDOWN_TIMEOUT_SECONDS = 30.0
+POLL_SECONDS = 0.1  # the master polls for exited workers so the shutdown deadline is always checked
+
+
+def bind_socket(host: str, port: int) -> socket.socket:
+    family = socket.AF_INET6 if ":" in host else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+    return sock
+
+
+def run_worker(app, sock: socket.socket, args: argparse.Namespace) -> None:
+    config = uvicorn.Config(app, log_level=args.log_level, timeout_keep_alive=args.keep_alive, proxy_headers=True)
+    uvicorn.Server(config).run(sockets=[sock])
+
+
+class Supervisor:
+    def __init__(self, app, sock: socket.socket, args: argparse.Namespace):
+        self.app = app
+        self.sock = sock
+        self.args = args
+        self.workers: Dict[int, float] = {}  # pid -> start time
+        self.stopping = False
+
+    def spawn(self) -> None:
+        pid = os.fork()
+        if pid == 0:
+            signal.signal(signal.SIGINT, signal.SIG_DFL)
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            code = 1
+            try:
+                run_worker(self.app, self.sock, self.args)
+                code = 0
+            except SystemExit as e:
+                code = e.code if isinstance(e.code, int) else 1
+            except BaseException:
+                traceback.print_exc()
+            finally:
+                os._exit(code)  # a crashed worker is reported (and restarted) with a non-zero status
+        self.workers[pid] = time.monotonic()
+        print(f"INFO: Started worker {pid}")
+
+    def stop(self, signum, frame) -> None:
+        if self.stopping:
+            return
+        self.stopping = True
+        print(f"INFO: Received signal {signum}, stopping {len(self.workers)} workers")
+        for pid in self.workers:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    def run(self) -> None:
+        signal.signal(signal.SIGINT, self.stop)
+        signal.signal(signal.SIGTERM, self.stop)
+        for _ in range(self.args.workers):
+            self.spawn()
+        deadline = None
+        while self.workers:
+            if self.stopping and deadline is None:
+                deadline = time.monotonic() + SHUTDOWN_TIMEOUT_SECONDS
+            if deadline is not None and time.monotonic() > deadline:
+                print(f"WARNING: Workers did not stop within {SHUTDOWN_TIMEOUT_SECONDS:.0f}s, killing them")
+                for pid in self.workers:
+                    os.kill(pid, signal.SIGKILL)
+                deadline = float("inf")
+            # A blocking waitpid would be resumed after the signal handler runs (PEP 475) and never
+            # reach the deadline check, so poll instead
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                break
+            if pid == 0:
+                time.sleep(POLL_SECONDS)
+                continue
+            started = self.workers.pop(pid, None)
+            if started is None or self.stopping:
+                continue
+            print(f"WARNING: Worker {pid} exited with status {os.waitstatus_to_exitcode(status)}, restarting")
+            if time.monotonic() - started < RESTART_BACKOFF_SECONDS:
+                time.sleep(RESTART_BACKOFF_SECONDS)
+            if not self.stopping:
+                self.spawn()
+        print("INFO: All workers stopped")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default=os.getenv("HOST", "0.0.0.0"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("PORT", "8000")))
+    parser.add_argument("--workers", type=int, default=int(os.getenv("WEB_CONCURRENCY", str(os.cpu_count() or 1))))
+    parser.add_argument("--log-level", default="info")
+    parser.add_argument("--keep-alive", type=int, default=5, help="keep-alive timeout in seconds")
+    args = parser.parse_args()
+
+    os.chdir(BACKEND_DIR)  # relative paths in the environment resolve against the backend directory
+    os.environ.setdefault("SHARED_CACHE_PATH", os.path.join(BACKEND_DIR, ".cache", "shared.sqlite3"))
+    sys.path.insert(0, BACKEND_DIR)
+
+    if args.workers > 1 and not os.environ["SHARED_CACHE_PATH"]:
+        sys.exit("ERROR: Several workers need the shared cache for refinement sessions and article regeneration; set SHARED_CACHE_PATH or use --workers 1")
+
+    if args.workers > 1 and hasattr(os, "fork"):
+        os.environ.setdefault("METRICS_DIR", os.path.join(BACKEND_DIR, ".cache", "metrics"))
+
+    import main as app_module  # preload: imported once, inherited by every worker
+    from observability.metrics import reset_snapshot_directory
+
+    if os.environ.get("METRICS_DIR"):
+        reset_snapshot_directory(os.environ["METRICS_DIR"])  # totals start from zero with every server run
+
+    sock = bind_socket(args.host, args.port)
+    print(f"INFO: Serving on {args.host}:{args.port} with {args.workers} workers (shared cache: {os.environ['SHARED_CACHE_PATH']})")
+    if args.workers <= 1 or not hasattr(os, "fork"):
+        run_worker(app_module.app, sock, args)
+        return
+    Supervisor(app_module.app, sock, args).run()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,199 @@
+# File: agent-app/backend/shared_cache.py
+"""
+Cache tier shared by all worker processes on one host.
+
+Each worker keeps its small in-process LRU caches; behind them this SQLite store (WAL mode, so
+readers never block each other or the writer) holds entries every worker can reuse: per-block
+analysis results, vault scans and per-note term statistics, and fetched image bytes. It also holds
+state that follow-up requests need whichever worker answers them: refinement sessions, long-form
+article records and their section Markdown. A result
+computed by one worker is a cache hit for the others, so adding workers does not multiply cold
+misses, and large derived data lives once on disk instead of once per process.
+
+Values are bytes grouped by namespace. Entries may expire (ttl) and the store is trimmed to its
+size budget by evicting the least recently used entries. Any SQLite error is logged and treated
+as a miss: the cache can never fail a request.
+
+Environment:
+    SHARED_CACHE_PATH         SQLite file; the shared tier is off when unset (serve.py sets a default)
+    SHARED_CACHE_MAX_MB       size budget (default 512)
+    SHARED_CACHE_MAX_ITEM_MB  larger values are not stored (default 16)
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Iterable, Optional
+
+from observability.metrics import count_cache
+
+TOUCH_INTERVAL = 60.0  # accessed_at is refreshed at most this often per entry, to keep reads read-only
+TRIM_EVERY_WRITES = 200
+TRIM_TARGET = 0.9  # trimming evicts down to this fraction of the budget
+QUERY_CHUNK = 500
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    namespace TEXT NOT NULL,
+    key TEXT NOT NULL,
+    value BLOB NOT NULL,
+    size INTEGER NOT NULL,
+    expires_at REAL,
+    accessed_at REAL NOT NULL,
+    PRIMARY KEY (namespace, key)
+);
+CREATE INDEX IF NOT EXISTS entries_accessed_at ON entries (accessed_at);
+"""
+
+
+class SharedCache:
+    def __init__(self, path: Optional[str] = None, max_bytes: Optional[int] = None, max_item_bytes: Optional[int] = None):
+        self.path = path if path is not None else os.getenv("SHARED_CACHE_PATH", "")
+        self.max_bytes = max_bytes if max_bytes is not None else int(float(os.getenv("SHARED_CACHE_MAX_MB", "512")) * 2 ** 20)
+        self.max_item_bytes = max_item_bytes if max_item_bytes is not None else int(float(os.getenv("SHARED_CACHE_MAX_ITEM_MB", "16")) * 2 ** 20)
+        self._local = threading.local()
+        self._writes = 0
+        self._writes_lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.path)
+
+    def _connection(self) -> sqlite3.Connection:
+        # One connection per thread and process: SQLite connections must not cross a fork
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(_SCHEMA)
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def get(self, namespace: str, key: str) -> Optional[bytes]:
+        return self.get_many(namespace, [key]).get(key)
+
+    def get_many(self, namespace: str, keys: Iterable[str]) -> Dict[str, bytes]:
+        keys = list(keys)
+        if not self.enabled or not keys:
+            return {}
+        found: Dict[str, bytes] = {}
+        stale_touch = []
+        now = time.time()
+        try:
+            conn = self._connection()
+            for start in range(0, len(keys), QUERY_CHUNK):
+                chunk = keys[start:start + QUERY_CHUNK]
+                rows = conn.execute(
+                    f"SELECT key, value, expires_at, accessed_at FROM entries WHERE namespace = ? AND key IN ({','.join('?' * len(chunk))})",
+                    [namespace, *chunk]
+                ).fetchall()
+                for key, value, expires_at, accessed_at in rows:
+                    if expires_at is not None and expires_at < now:
+                        continue
+                    found[key] = value
+                    if now - accessed_at > TOUCH_INTERVAL:
+                        stale_touch.append((now, namespace, key))
+            if stale_touch:
+                conn.executemany("UPDATE entries SET accessed_at = ? WHERE namespace = ? AND key = ?", stale_touch)
+        except sqlite3.Error as e:
+            print(f"ERROR: Shared cache read failed ({namespace}): {e}")
+            return {}
+        count_cache(f"shared_{namespace}", hit=True, amount=len(found))
+        count_cache(f"shared_{namespace}", hit=False, amount=len(keys) - len(found))
+        return found
+
+    def set(self, namespace: str, key: str, value: bytes, ttl: Optional[float] = None) -> None:
+        self.set_many(namespace, {key: value}, ttl)
+
+    def set_many(self, namespace: str, items: Dict[str, bytes], ttl: Optional[float] = None) -> None:
+        if not self.enabled or not items:
+            return
+        now = time.time()
+        expires_at = now + ttl if ttl is not None else None
+        rows = [
+            (namespace, key, sqlite3.Binary(value), len(value), expires_at, now)
+            for key, value in items.items() if len(value) <= self.max_item_bytes
+        ]
+        if not rows:
+            return
+        try:
+            conn = self._connection()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                conn.executemany("INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?, ?)", rows)
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+        except sqlite3.Error as e:
+            print(f"ERROR: Shared cache write failed ({namespace}): {e}")
+            return
+        with self._writes_lock:
+            self._writes += len(rows)
+            due = self._writes >= TRIM_EVERY_WRITES
+            if due:
+                self._writes = 0
+        if due:
+            self.trim()
+
+    def delete(self, namespace: str, key: str) -> bool:
+        """Removes one entry; returns whether it existed (False when the tier is off or on error)."""
+        if not self.enabled:
+            return False
+        try:
+            cursor = self._connection().execute("DELETE FROM entries WHERE namespace = ? AND key = ?", (namespace, key))
+        except sqlite3.Error as e:
+            print(f"ERROR: Shared cache delete failed ({namespace}): {e}")
+            return False
+        return cursor.rowcount > 0
+
+    def get_json(self, namespace: str, key: str) -> Any:
+        value = self.get(namespace, key)
+        return json.loads(value) if value is not None else None
+
+    def set_json(self, namespace: str, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        if self.enabled:
+            self.set(namespace, key, json.dumps(value, ensure_ascii=False).encode("utf-8"), ttl)
+
+    def trim(self) -> None:
+        """Drops expired entries, then the least recently used ones until the store fits its budget."""
+        try:
+            conn = self._connection()
+            conn.execute("DELETE FROM entries WHERE expires_at IS NOT NULL AND expires_at < ?", (time.time(),))
+            total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+            if total <= self.max_bytes:
+                return
+            excess = total - int(self.max_bytes * TRIM_TARGET)
+            victims, freed = [], 0
+            for rowid, size in conn.execute("SELECT rowid, size FROM entries ORDER BY accessed_at"):
+                victims.append((rowid,))
+                freed += size
+                if freed >= excess:
+                    break
+            conn.executemany("DELETE FROM entries WHERE rowid = ?", victims)
+            print(f"INFO: Shared cache trimmed {len(victims)} entries ({freed / 2 ** 20:.1f} MB)")
+        except sqlite3.Error as e:
+            print(f"ERROR: Shared cache trim failed: {e}")
+
+    def snapshot(self) -> Dict:
+        if not self.enabled:
+            return {"enabled": False}
+        try:
+            rows = self._connection().execute("SELECT namespace, COUNT(*), SUM(size) FROM entries GROUP BY namespace").fetchall()
+        except sqlite3.Error as e:
+            return {"enabled": True, "path": self.path, "error": str(e)}
+        return {
+            "enabled": True,
+            "path": self.path,
+            "max_mb": round(self.max_bytes / 2 ** 20, 1),
+            "namespaces": {ns: {"entries": count, "mb": round(size / 2 ** 20, 2)} for ns, count, size in rows},
+        }
+
+
+shared_cache = SharedCache()
@@ -0,0 +1,40 @@
+import asyncio
+
+from analysis import incremental
+from analysis.incremental import BlockAnalysisCache, SessionDebouncer, resolve_block_artifacts
+from shared_cache import SharedCache
+
+
+def test_local_engine_caches_blocks(monkeypatch):
+    monkeypatch.setattr(incremental, "block_cache", BlockAnalysisCache(shared=None))
+    texts = ["知识管理是一种把信息组织成体系的方法。知识管理需要工具。", "Obsidian stores notes as Markdown files."]
+    artifacts, hits, analyzed = asyncio.run(resolve_block_artifacts(None, "local", texts))
+    assert (hits, analyzed) == (0, 2)
+    assert all(artifact.summary for artifact in artifacts)
+    again, hits, analyzed = asyncio.run(resolve_block_artifacts(None, "local", texts))
+    assert (hits, analyzed) == (2, 0)
+    assert [a.summary for a in again] == [a.summary for a in artifacts]
+
+
+def test_debouncer_supersedes_within_one_process():
+    debouncer = SessionDebouncer(delay=0.05, shared=None)
+
+    async def run():
+        first = asyncio.ensure_future(debouncer.wait("s"))
+        await asyncio.sleep(0.01)
+        return await asyncio.gather(first, debouncer.wait("s"))
+
+    assert asyncio.run(run()) == [False, True]
+
+
+def test_debouncer_supersedes_across_workers(tmp_path):
+    shared = SharedCache(path=str(tmp_path / "shared.sqlite3"))
+    worker_a = SessionDebouncer(delay=0.1, shared=shared)
+    worker_b = SessionDebouncer(delay=0.1, shared=shared)
+
+    async def run():
+        first = asyncio.ensure_future(worker_a.wait("s"))
+        await asyncio.sleep(0.03)
+        return await asyncio.gather(first, worker_b.wait("s"))
+
+    assert asyncio.run(run()) == [False, True]
@@ -0,0 +1,52 @@
+import json
+import os
+
+from observability.metrics import MetricsRegistry, reset_snapshot_directory
+
+
+def _registry(directory: str) -> MetricsRegistry:
+    registry = MetricsRegistry(directory=directory)
+    registry.counter("requests_total", "Requests.", ("route",))
+    registry.histogram("latency_seconds", "Latency.", buckets=(0.1, 1.0))
+    registry.collector("queue_depth", "gauge", "Queue depth.", lambda: [({}, 3)])
+    return registry
+
+
+def test_single_process_render_has_no_worker_label():
+    registry = _registry("")
+    registry._metrics["requests_total"].inc(route="/a")
+    text = registry.render()
+    assert 'requests_total{route="/a"} 1' in text
+    assert "queue_depth 3" in text
+
+
+def test_render_sums_snapshots_of_all_workers(tmp_path):
+    other = _registry(str(tmp_path))
+    other._metrics["requests_total"].inc(2, route="/a")
+    other._metrics["latency_seconds"].observe(0.05)
+    snapshot = other.dump()
+    # A worker that has exited: its counters stay in the totals, its gauges are dropped
+    (tmp_path / "worker-999999999.json").write_text(json.dumps(snapshot))
+
+    registry = _registry(str(tmp_path))
+    registry._metrics["requests_total"].inc(route="/a")
+    registry._metrics["requests_total"].inc(route="/b")
+    registry._metrics["latency_seconds"].observe(0.5)
+    text = registry.render()
+
+    assert 'requests_total{route="/a"} 3' in text
+    assert 'requests_total{route="/b"} 1' in text
+    assert 'latency_seconds_bucket{le="0.1"} 1' in text
+    assert 'latency_seconds_bucket{le="1"} 2' in text
+    assert "latency_seconds_count 2" in text
+    assert f'queue_depth{{worker="{os.getpid()}"}} 3' in text
+    assert 'worker="999999999"' not in text
+    assert (tmp_path / f"worker-{os.getpid()}.json").exists()
+
+
+def test_reset_snapshot_directory(tmp_path):
+    (tmp_path / "worker-1.json").write_text("{}")
+    (tmp_path / "other.txt").write_text("keep")
+    reset_snapshot_directory(str(tmp_path))
+    assert not (tmp_path / "worker-1.json").exists()
+    assert (tmp_path / "other.txt").exists()
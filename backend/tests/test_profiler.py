@@ -0,0 +1,44 @@
+import asyncio
+from collections import Counter
+
+from observability.profiler import ProfileResult, Profiler
+from shared_cache import SharedCache
+
+
+def _result(profile_id: str) -> ProfileResult:
+    return ProfileResult(
+        profile_id=profile_id, kind="request", target="GET /x", started_at=1.0, duration_s=0.5,
+        interval_ms=10.0, samples=3, stacks=Counter({("MainThread", "main.py:f", "main.py:g"): 2, ("MainThread", "main.py:f"): 1}),
+        loop_lag={"samples": 0}
+    )
+
+
+def test_profile_result_json_round_trip():
+    result = _result("abc")
+    restored = ProfileResult.from_json(result.to_json())
+    assert restored.collapsed() == result.collapsed()
+    assert restored.summary() == result.summary()
+
+
+def test_profiles_are_visible_to_other_workers(tmp_path):
+    shared = SharedCache(path=str(tmp_path / "shared.sqlite3"))
+    worker_a = Profiler(token="t", shared=shared)
+    worker_b = Profiler(token="t", shared=shared)
+    worker_a._store(_result("abc"))
+    fetched = worker_b.get("abc")
+    assert fetched is not None and fetched.collapsed() == _result("abc").collapsed()
+    assert [entry["profile_id"] for entry in worker_b.list()] == ["abc"]
+    assert worker_b.get("missing") is None
+
+
+def test_session_stores_result_without_shared_tier():
+    profiler = Profiler(token="t", shared=SharedCache(path=""))
+
+    async def run():
+        async with profiler.session("request", "GET /x") as holder:
+            await asyncio.sleep(0.02)
+        return holder["result"]
+
+    result = asyncio.run(run())
+    assert profiler.get(result.profile_id) is result
+    assert profiler.list()[0]["profile_id"] == result.profile_id
@@ -0,0 +1,41 @@
+import gzip
+import json
+import multiprocessing
+
+from llm_providers.replay_llm import ReplayCorpus, request_key
+
+
+def _entry(i: int, worker: int = 0) -> dict:
+    return {"key": request_key("simple", "m", f"prompt {worker} {i}"), "method": "simple", "model": "m", "latency_s": 0.1, "response": f"r{worker}-{i}" * 50, "truncated": False}
+
+
+def test_append_is_replayable_at_once_and_reloads(tmp_path):
+    path = str(tmp_path / "corpus.jsonl.gz")
+    corpus = ReplayCorpus(path)
+    for i in range(20):
+        corpus.append(_entry(i))
+    assert corpus.next(_entry(3)["key"])["response"] == _entry(3)["response"]
+    corpus.flush()
+    reloaded = ReplayCorpus(path)
+    assert len(reloaded) == 20
+    assert reloaded.next(_entry(19)["key"])["response"] == _entry(19)["response"]
+
+
+def _record(path: str, worker: int) -> None:
+    corpus = ReplayCorpus(path)
+    for i in range(200):
+        corpus.append(_entry(i, worker))
+    corpus.flush()
+
+
+def test_concurrent_processes_do_not_corrupt_corpus(tmp_path):
+    path = str(tmp_path / "corpus.jsonl.gz")
+    workers = [multiprocessing.get_context("fork").Process(target=_record, args=(path, w)) for w in range(4)]
+    for process in workers:
+        process.start()
+    for process in workers:
+        process.join()
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        lines = [json.loads(line) for line in f if line.strip()]
+    assert len(lines) == 800
+    assert len({line["key"] for line in lines}) == 800
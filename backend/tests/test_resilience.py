@@ -0,0 +1,139 @@
+import asyncio
+
+import httpx
+import pytest
+
+from llm_providers.base_llm import BaseLLMProvider
+from llm_providers.resilience import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, CircuitOpenError, RetryPolicy, is_retryable
+from llm_providers.router import LLMRouter
+
+
+def _status_error(status_code: int) -> httpx.HTTPStatusError:
+    request = httpx.Request("POST", "https://upstream.test/v1")
+    return httpx.HTTPStatusError("error", request=request, response=httpx.Response(status_code, request=request))
+
+
+@pytest.mark.parametrize("exc", [
+    _status_error(429),
+    _status_error(503),
+    httpx.ConnectTimeout("timed out"),
+    asyncio.TimeoutError(),
+    ConnectionResetError(),
+])
+def test_is_retryable_transient_errors(exc):
+    assert is_retryable(exc)
+
+
+@pytest.mark.parametrize("exc", [
+    _status_error(400),
+    _status_error(401),
+    ValueError("OpenAI API key is not configured"),
+    ValueError("OpenAI API response did not contain any usable text content"),
+])
+def test_is_retryable_permanent_errors(exc):
+    assert not is_retryable(exc)
+
+
+def test_is_retryable_follows_cause():
+    try:
+        try:
+            raise _status_error(502)
+        except httpx.HTTPStatusError as e:
+            raise RuntimeError("provider call failed") from e
+    except RuntimeError as wrapped:
+        assert is_retryable(wrapped)
+
+
+def test_breaker_opens_after_threshold_and_half_opens(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr("llm_providers.resilience.time.monotonic", lambda: now[0])
+    breaker = CircuitBreaker(failure_threshold=3, reset_seconds=10)
+    for _ in range(2):
+        assert breaker.allow()
+        breaker.record_failure()
+    assert breaker.state == CLOSED
+    breaker.record_failure()
+    assert breaker.state == OPEN
+    assert not breaker.allow()
+
+    now[0] += 10
+    assert breaker.state == HALF_OPEN
+    assert breaker.allow()
+    assert not breaker.allow()  # only one trial call
+    breaker.record_success()
+    assert breaker.state == CLOSED
+    assert breaker.times_opened == 1
+
+
+def test_breaker_failed_trial_reopens(monkeypatch):
+    now = [0.0]
+    monkeypatch.setattr("llm_providers.resilience.time.monotonic", lambda: now[0])
+    breaker = CircuitBreaker(failure_threshold=1, reset_seconds=5)
+    breaker.record_failure()
+    now[0] += 5
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == OPEN
+    assert breaker.times_opened == 2
+
+
+def test_breaker_release_frees_trial(monkeypatch):
+    now = [0.0]
+    monkeypatch.setattr("llm_providers.resilience.time.monotonic", lambda: now[0])
+    breaker = CircuitBreaker(failure_threshold=1, reset_seconds=5)
+    breaker.record_failure()
+    now[0] += 5
+    assert breaker.allow()
+    breaker.release()
+    assert breaker.state == HALF_OPEN
+    assert breaker.allow()
+
+
+class _FailingProvider(BaseLLMProvider):
+    error: Exception = ValueError("API key is not configured")
+    calls = 0
+
+    def __init__(self):
+        pass
+
+    async def generate_content_from_blocks(self, user_input, llm_selection, output_preferences=None):
+        raise NotImplementedError
+
+    async def generate_simple_text(self, prompt: str, model_name: str = "default") -> str:
+        type(self).calls += 1
+        raise self.error
+
+
+def _router(error: Exception) -> LLMRouter:
+    provider_class = type("Provider", (_FailingProvider,), {"error": error, "calls": 0})
+    return LLMRouter(
+        {"fake": provider_class}, alternates={}, downgrades={},
+        retry_policy=RetryPolicy(max_attempts=2, base_delay=0, max_delay=0), recording_corpus=None
+    )
+
+
+async def _call(router: LLMRouter) -> None:
+    await router.call("fake", "m", lambda provider, _, model: provider.generate_simple_text("hi", model))
+
+
+def test_router_permanent_errors_do_not_open_breaker():
+    router = _router(ValueError("API key is not configured"))
+    breaker = router.stats("fake", "m").breaker
+    for _ in range(breaker.failure_threshold + 2):
+        with pytest.raises(ValueError):
+            asyncio.run(_call(router))
+    assert breaker.state == CLOSED
+    assert breaker.consecutive_failures == 0
+    assert router.provider("fake").calls == breaker.failure_threshold + 2  # never retried
+
+
+def test_router_transient_errors_open_breaker():
+    router = _router(_status_error(503))
+    breaker = router.stats("fake", "m").breaker
+    while breaker.state == CLOSED:
+        with pytest.raises((httpx.HTTPStatusError, CircuitOpenError)):
+            asyncio.run(_call(router))
+    assert breaker.state == OPEN
+    assert breaker.consecutive_failures == breaker.failure_threshold
+    with pytest.raises(CircuitOpenError):
+        asyncio.run(_call(router))
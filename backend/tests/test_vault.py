@@ -0,0 +1,64 @@
+import pytest
+
+from vault.attachments import export_attachments
+from vault.writer import NoteWrite, resolve_note_path, write_notes
+
+
+def test_resolve_note_path_rejects_escapes(tmp_path):
+    vault = tmp_path.resolve()
+    assert resolve_note_path(vault, "a/b", "note") == vault / "a" / "b" / "note.md"
+    with pytest.raises(ValueError):
+        resolve_note_path(vault, "../outside", "note")
+    with pytest.raises(ValueError):
+        resolve_note_path(vault, "a", "../../note")
+
+
+def test_write_notes_reports_escape_and_duplicates(tmp_path):
+    notes = [
+        NoteWrite(folder_name="notes", file_name="a", content="first"),
+        NoteWrite(folder_name="../outside", file_name="x", content="escape"),
+        NoteWrite(folder_name="notes/", file_name="a.md", content="second"),
+        NoteWrite(folder_name="notes", file_name="b", content="中文"),
+    ]
+    results = write_notes(tmp_path, notes, durable=False)
+    assert [r.success for r in results] == [True, False, False, True]
+    assert results[1].error == "Path escapes the vault"
+    assert results[2].error == "Duplicate path in batch"
+    assert (tmp_path / "notes" / "a.md").read_text(encoding="utf-8") == "first"
+    assert results[3].bytes_written == len("中文".encode("utf-8"))
+    assert not (tmp_path.parent / "outside").exists()
+    assert not list(tmp_path.rglob("*.tmp"))
+
+
+def test_write_notes_keeps_existing_file_without_overwrite(tmp_path):
+    write_notes(tmp_path, [NoteWrite(folder_name="n", file_name="a", content="old")], durable=False)
+    [kept] = write_notes(tmp_path, [NoteWrite(folder_name="n", file_name="a", content="new")], overwrite=False, durable=False)
+    assert not kept.success and kept.error == "File already exists" and kept.bytes_written == 0
+    assert (tmp_path / "n" / "a.md").read_text(encoding="utf-8") == "old"
+    assert not list(tmp_path.rglob("*.tmp"))
+    [replaced] = write_notes(tmp_path, [NoteWrite(folder_name="n", file_name="a", content="new")], durable=False)
+    assert replaced.success
+    assert (tmp_path / "n" / "a.md").read_text(encoding="utf-8") == "new"
+
+
+def test_export_attachments_links_relative_to_nested_notes(tmp_path):
+    pic_dir = tmp_path / "pic"
+    (pic_dir / "1700000000").mkdir(parents=True)
+    (pic_dir / "1700000000" / "a b.png").write_bytes(b"png-data")
+    vault = tmp_path / "vault"
+    vault.mkdir()
+    notes = [
+        NoteWrite(folder_name="projects/2024", file_name="deep", content="![x](/pic/1700000000/a%20b.png) ![y](/pic/1700000000/missing.png)"),
+        NoteWrite(folder_name="", file_name="top", content='<img src="http://localhost:8000/pic/1700000000/a%20b.png">'),
+    ]
+    rewritten, results = export_attachments(vault, notes, pic_dir=pic_dir, durable=False)
+
+    assert rewritten[0].content == "![x](../../attachments/1700000000/a%20b.png) ![y](/pic/1700000000/missing.png)"
+    assert rewritten[1].content == '<img src="attachments/1700000000/a%20b.png">'
+    by_source = {r.source: r for r in results}
+    assert by_source["1700000000/a b.png"].success
+    assert by_source["1700000000/missing.png"].error == "Image not found"
+    assert (vault / "attachments" / "1700000000" / "a b.png").read_bytes() == b"png-data"
+
+    _, again = export_attachments(vault, notes[:1], pic_dir=pic_dir, durable=False)
+    assert {r.source: r.method for r in again}["1700000000/a b.png"] == "existing"
@@ -0,0 +1,262 @@
+"""
+导出笔记时把引用的图片一并放进 Obsidian 库。
+
+生成的文章通过 /pic/<时间戳>/<文件名> 引用上传到 pic/ 目录的图片（Markdown 的 ![](...)
+或 HTML 的 <img src="...">），原样写进库里这些链接就失效了。这里把引用到的图片放进库的附件目录
+（保留 pic/ 下的相对路径，不同上传之间不会重名），再把链接改写成相对笔记所在目录的路径。
+
+放置图片时按代价从低到高尝试，数据始终在内核中从文件描述符到文件描述符传递，不经过 Python 缓冲区：
+1. 硬链接：同一文件系统上只增加一个目录项（上传的图片不会再被修改，共享 inode 是安全的）；
+2. reflink（FICLONE）：跨目录但支持写时复制的文件系统（btrfs、XFS）共享数据块；
+3. copy_file_range：内核内复制，部分文件系统（NFS、较新内核上的 XFS）在服务端或块层完成；
+4. sendfile：旧内核或跨文件系统时仍在内核中复制；
+5. 其他平台退回 shutil.copyfile（macOS 上使用 fcopyfile）。
+每张图片先放到同目录的临时名再 rename，与笔记的写入一样是原子的。
+
+上传、/pic 静态目录和导出都使用 PIC_DIR（默认 backend/pic，可用环境变量 PIC_DIR 指定），与工作目录无关。
+"""
+import errno
+import os
+import re
+import secrets
+import shutil
+import sys
+from dataclasses import dataclass
+from pathlib import Path, PurePosixPath
+from typing import Dict, List, Optional, Sequence, Set, Tuple
+from urllib.parse import quote, unquote, urlsplit
+
+from .writer import NoteWrite, _create_directories, _fsync_directory, resolve_note_path
+
+PIC_DIR = Path(os.getenv("PIC_DIR") or Path(__file__).resolve().parent.parent / "pic").resolve()
+DEFAULT_ATTACHMENTS_FOLDER = "attachments"
+FICLONE = 0x40049409  # linux/fs.h: _IOW(0x94, 9, int)
+LOCAL_HOSTS = {"localhost", "127.0.0.1", "0.0.0.0", "[::1]"}
+
+# ![alt](url "title") 与 <img ... src="url" ...>
+_MARKDOWN_IMAGE = re.compile(r'(!\[[^\]]*\]\()(<[^>]+>|[^)\s]+)((?:\s+"[^"]*")?\))')
+_HTML_IMAGE = re.compile(r'(<img\b[^>]*?\bsrc=)(["\'])(.*?)\2', re.IGNORECASE)
+# 这些错误表示当前方式在此文件系统上不可用，继续尝试下一种方式
+_UNSUPPORTED_ERRNOS = {errno.EXDEV, errno.EPERM, errno.EACCES, errno.EINVAL, errno.ENOSYS, errno.EOPNOTSUPP, errno.ENOTTY, errno.EBADF, errno.EMLINK}
+
+
+@dataclass
+class AttachmentResult:
+    source: str  # pic/ 下的相对路径
+    path: str  # 相对库根目录的路径
+    success: bool = False
+    method: Optional[str] = None  # hardlink / reflink / copy_file_range / sendfile / copy / existing
+    error: Optional[str] = None
+    size: int = 0
+
+
+def pic_reference(url: str) -> Optional[str]:
+    """链接指向 pic/ 下的文件时返回其相对路径（已解码），否则返回 None。"""
+    url = url.strip("<>")
+    parts = urlsplit(url)
+    if parts.scheme not in ("", "http", "https") or (parts.netloc and parts.netloc.split(":")[0] not in LOCAL_HOSTS):
+        return None
+    path = unquote(parts.path)
+    if path.startswith("/"):
+        path = path[1:]
+    if not path.startswith("pic/"):
+        return None
+    relative = os.path.normpath(path[len("pic/"):]).replace(os.sep, "/")
+    if relative in ("", ".") or relative.startswith("../") or relative == "..":
+        return None
+    return relative
+
+
+def find_pic_references(content: str) -> List[str]:
+    """返回笔记中引用的 pic/ 文件（去重，Markdown 图片在前、HTML 图片在后）。"""
+    found: Dict[str, None] = {}
+    for match in _MARKDOWN_IMAGE.finditer(content):
+        reference = pic_reference(match.group(2))
+        if reference:
+            found[reference] = None
+    for match in _HTML_IMAGE.finditer(content):
+        reference = pic_reference(match.group(3))
+        if reference:
+            found[reference] = None
+    return list(found)
+
+
+def rewrite_pic_links(content: str, replacements: Dict[str, str]) -> str:
+    """把 pic/ 链接替换为 replacements 中的新链接（键为 pic/ 下的相对路径），其余链接不变。"""
+    def markdown(match: re.Match) -> str:
+        reference = pic_reference(match.group(2))
+        if reference not in replacements:
+            return match.group(0)
+        return f"{match.group(1)}{replacements[reference]}{match.group(3)}"
+
+    def html(match: re.Match) -> str:
+        reference = pic_reference(match.group(3))
+        if reference not in replacements:
+            return match.group(0)
+        return f"{match.group(1)}{match.group(2)}{replacements[reference]}{match.group(2)}"
+
+    return _HTML_IMAGE.sub(html, _MARKDOWN_IMAGE.sub(markdown, content))
+
+
+def _clone(src_fd: int, dst_fd: int) -> None:
+    import fcntl
+    fcntl.ioctl(dst_fd, FICLONE, src_fd)
+
+
+def _copy_file_range(src_fd: int, dst_fd: int, size: int) -> None:
+    offset = 0
+    while offset < size:
+        copied = os.copy_file_range(src_fd, dst_fd, size - offset, offset, offset)
+        if copied == 0:
+            break
+        offset += copied
+
+
+def _sendfile(src_fd: int, dst_fd: int, size: int) -> None:
+    offset = 0
+    while offset < size:
+        sent = os.sendfile(dst_fd, src_fd, offset, size - offset)
+        if sent == 0:
+            break
+        offset += sent
+
+
+def place_file(source: Path, temp: Path) -> str:
+    """把 source 的内容放到 temp（temp 不能已存在），返回所用的方式。"""
+    try:
+        os.link(source, temp)
+        return "hardlink"
+    except OSError as e:
+        if e.errno not in _UNSUPPORTED_ERRNOS:
+            raise
+
+    src_fd = os.open(source, os.O_RDONLY)
+    try:
+        size = os.fstat(src_fd).st_size
+        dst_fd = os.open(temp, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o644)
+        try:
+            strategies = []
+            if sys.platform.startswith("linux"):
+                strategies.append(("reflink", lambda: _clone(src_fd, dst_fd)))
+            if hasattr(os, "copy_file_range"):
+                strategies.append(("copy_file_range", lambda: _copy_file_range(src_fd, dst_fd, size)))
+            if sys.platform.startswith("linux"):  # 其他系统的 sendfile 只能写入套接字
+                strategies.append(("sendfile", lambda: _sendfile(src_fd, dst_fd, size)))
+            for method, strategy in strategies:
+                try:
+                    strategy()
+                except OSError as e:
+                    if e.errno not in _UNSUPPORTED_ERRNOS:
+                        raise
+                    os.ftruncate(dst_fd, 0)  # 丢弃失败前可能写入的部分
+                    continue
+                if os.fstat(dst_fd).st_size == size:
+                    return method
+                os.ftruncate(dst_fd, 0)
+        finally:
+            os.close(dst_fd)
+    finally:
+        os.close(src_fd)
+
+    shutil.copyfile(source, temp)
+    return "copy"
+
+
+def export_attachments(
+    vault_path: Path,
+    notes: Sequence[NoteWrite],
+    attachments_folder: str = DEFAULT_ATTACHMENTS_FOLDER,
+    pic_dir: Path = PIC_DIR,
+    durable: bool = True,
+) -> Tuple[List[NoteWrite], List[AttachmentResult]]:
+    """
+    把笔记引用的 pic/ 图片放进 <库>/<attachments_folder>/，返回 (改写了链接的笔记, 每张图片的结果)。
+    同一张图片被多篇笔记引用时只放置一次；找不到或放置失败的图片保留原链接，不影响笔记本身的保存。
+    应在写入笔记之前调用，使笔记落盘时引用的图片已经存在。
+    """
+    vault_path = vault_path.resolve()
+    pic_dir = pic_dir.resolve()
+    attachments_root = Path(os.path.normpath(vault_path / attachments_folder.strip("/")))
+    if not attachments_root.is_relative_to(vault_path):
+        raise ValueError("Attachments folder escapes the vault")
+
+    references: Dict[str, None] = {}
+    for note in notes:
+        for reference in find_pic_references(note.content):
+            references[reference] = None
+
+    results: Dict[str, AttachmentResult] = {}
+    pending: Dict[str, Tuple[Path, Path]] = {}
+    for reference in references:
+        target = attachments_root / reference
+        result = AttachmentResult(source=reference, path=target.relative_to(vault_path).as_posix())
+        results[reference] = result
+        source = pic_dir / reference
+        if not source.is_file():
+            result.error = "Image not found"
+            continue
+        result.size = source.stat().st_size
+        if target.exists():
+            # 上传的图片按时间戳分目录且不会被修改，同名同大小即为同一张图片
+            if target.is_file() and (os.path.samefile(source, target) or target.stat().st_size == result.size):
+                result.success, result.method = True, "existing"
+            else:
+                result.error = "A different file already exists at the attachment path"
+            continue
+        pending[reference] = (source, target)
+
+    dirty_directories: Set[Path] = set()
+    try:
+        dirty_directories |= _create_directories({target.parent for _, target in pending.values()})
+    except OSError as e:
+        print(f"ERROR: Failed to create attachment folders: {e}")
+
+    for reference, (source, target) in pending.items():
+        result = results[reference]
+        temp = target.parent / f".{target.name}.{secrets.token_hex(4)}.tmp"
+        try:
+            result.method = place_file(source, temp)
+            if durable and result.method != "hardlink":  # 硬链接没有新数据，只需持久化目录项
+                fd = os.open(temp, os.O_RDONLY)
+                try:
+                    os.fsync(fd)
+                finally:
+                    os.close(fd)
+            os.replace(temp, target)
+            result.success = True
+            dirty_directories.add(target.parent)
+        except OSError as e:
+            result.method = None
+            result.error = f"Failed to export image: {e}"
+            temp.unlink(missing_ok=True)
+
+    if durable:
+        for directory in dirty_directories:
+            try:
+                _fsync_directory(directory)
+            except OSError as e:
+                print(f"WARNING: Failed to sync attachment folder {directory}: {e}")
+
+    rewritten: List[NoteWrite] = []
+    for note in notes:
+        replacements = {}
+        try:
+            note_folder = resolve_note_path(vault_path, note.folder_name, note.file_name).parent
+        except ValueError:
+            rewritten.append(note)  # 写入时会报告路径错误
+            continue
+        for reference in find_pic_references(note.content):
+            result = results[reference]
+            if result.success:
+                relative = os.path.relpath(vault_path / result.path, note_folder)
+                replacements[reference] = quote(PurePosixPath(*Path(relative).parts).as_posix())
+        content = rewrite_pic_links(note.content, replacements) if replacements else note.content
+        rewritten.append(NoteWrite(folder_name=note.folder_name, file_name=note.file_name, content=content))
+
+    methods: Dict[str, int] = {}
+    for result in results.values():
+        if result.success:
+            methods[result.method] = methods.get(result.method, 0) + 1
+    if results:
+        print(f"INFO: Exported {sum(methods.values())}/{len(results)} images to {attachments_root} ({', '.join(f'{m}: {n}' for m, n in methods.items()) or 'none'})")
+    return rewritten, list(results.values())
@@ -0,0 +1,166 @@
+"""
+Obsidian 库的轻量索引：记录每篇笔记的路径、修改时间和大小以及各目录的修改时间，并维护一个版本号。
+
+派生数据（IDF统计、链接图、向量索引等）根据 version 和 changed/removed 集合做增量更新，
+而不是每次请求都重新读取整个库。
+"""
+import hashlib
+import os
+import threading
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, List, Optional, Set, Tuple
+
+from observability.metrics import stage_timer
+from shared_cache import shared_cache
+
+# 两次扫描文件系统之间的最小间隔（秒），避免同一批请求重复遍历整个库
+REFRESH_MIN_INTERVAL = 2.0
+
+
+@dataclass
+class NoteEntry:
+    path: str  # 相对库根目录的路径，使用 "/" 分隔
+    mtime: float
+    size: int
+
+
+@dataclass
+class VaultChanges:
+    changed: Set[str] = field(default_factory=set)  # 新增或修改的笔记
+    removed: Set[str] = field(default_factory=set)  # 被删除的笔记
+
+    def __bool__(self) -> bool:
+        return bool(self.changed or self.removed)
+
+
+class VaultIndex:
+    def __init__(self, vault_path: Path):
+        self.vault_path = vault_path
+        self.notes: Dict[str, NoteEntry] = {}
+        self.directories: Dict[str, float] = {}  # 相对路径 -> 修改时间
+        self.version = 0
+        self._last_scan = 0.0
+        self._lock = threading.Lock()
+        self._fingerprints: Dict[Tuple[int, bool], str] = {}
+
+    def _scan(self, use_shared: bool = True) -> Tuple[Dict[str, NoteEntry], Dict[str, float]]:
+        """
+        扫描文件系统。扫描结果在共享缓存中保留 REFRESH_MIN_INTERVAL 秒，
+        多个工作进程在这段时间内刷新同一个库时只有一个真正遍历文件系统。
+        """
+        key = str(self.vault_path)
+        snapshot = shared_cache.get_json("vault_scan", key) if use_shared else None
+        if snapshot is not None:
+            notes = {path: NoteEntry(path, mtime, size) for path, (mtime, size) in snapshot["notes"].items()}
+            return notes, snapshot["directories"]
+        with stage_timer("vault_scan"):
+            notes, directories = self._scan_entries()
+        if shared_cache.enabled:
+            snapshot = {"notes": {p: [e.mtime, e.size] for p, e in notes.items()}, "directories": directories}
+            shared_cache.set_json("vault_scan", key, snapshot, ttl=REFRESH_MIN_INTERVAL)
+        return notes, directories
+
+    def _scan_entries(self) -> Tuple[Dict[str, NoteEntry], Dict[str, float]]:
+        notes: Dict[str, NoteEntry] = {}
+        directories: Dict[str, float] = {}
+        stack = [(self.vault_path, "")]
+        while stack:
+            directory, prefix = stack.pop()
+            try:
+                entries = list(os.scandir(directory))
+            except OSError as e:
+                print(f"Error scanning vault directory {directory}: {e}")
+                continue
+            for entry in entries:
+                if entry.name.startswith('.'):
+                    continue
+                relative_path = f"{prefix}{entry.name}"
+                try:
+                    if entry.is_dir():
+                        directories[relative_path] = entry.stat().st_mtime
+                        stack.append((Path(entry.path), f"{relative_path}/"))
+                    elif entry.name.endswith('.md'):
+                        stat = entry.stat()
+                        notes[relative_path] = NoteEntry(relative_path, stat.st_mtime, stat.st_size)
+                except OSError as e:
+                    print(f"Error reading vault entry {entry.path}: {e}")
+        return notes, directories
+
+    def refresh(self, force: bool = False) -> VaultChanges:
+        """重新扫描库，返回自上次扫描以来的变化；有变化时 version 加一。"""
+        with self._lock:
+            now = time.monotonic()
+            if not force and self._last_scan and now - self._last_scan < REFRESH_MIN_INTERVAL:
+                return VaultChanges()
+            scanned, directories = self._scan(use_shared=not force)
+            self._last_scan = now
+
+            changes = VaultChanges()
+            for path, entry in scanned.items():
+                previous = self.notes.get(path)
+                if previous is None or previous.mtime != entry.mtime or previous.size != entry.size:
+                    changes.changed.add(path)
+            changes.removed = set(self.notes) - set(scanned)
+
+            if changes or directories != self.directories:
+                self.notes = scanned
+                self.directories = directories
+                self.version += 1
+            return changes
+
+    def fingerprint(self, tree_only: bool = False) -> str:
+        """
+        当前扫描结果的指纹（sha256，按 version 缓存），可作为 HTTP 强 ETag。
+        默认包含每篇笔记的路径、修改时间和大小以及目录的修改时间；tree_only 时只包含目录结构。
+        """
+        with self._lock:
+            key = (self.version, tree_only)
+            fingerprint = self._fingerprints.get(key)
+            if fingerprint is None:
+                digest = hashlib.sha256(str(self.vault_path).encode("utf-8"))
+                for path in sorted(self.directories):
+                    digest.update(f"\0d{path}".encode("utf-8") if tree_only else f"\0d{path}\0{self.directories[path]!r}".encode("utf-8"))
+                if not tree_only:
+                    for path in sorted(self.notes):
+                        entry = self.notes[path]
+                        digest.update(f"\0n{path}\0{entry.mtime!r}\0{entry.size}".encode("utf-8"))
+                fingerprint = digest.hexdigest()[:32]
+                self._fingerprints = {key: fingerprint, **{k: v for k, v in self._fingerprints.items() if k[0] == self.version}}
+            return fingerprint
+
+    def read_note(self, path: str) -> Optional[str]:
+        try:
+            return (self.vault_path / path).read_text(encoding='utf-8')
+        except Exception as e:
+            print(f"Error reading file {path}: {e}")
+            return None
+
+    def note_paths(self) -> List[str]:
+        return sorted(self.notes)
+
+
+_indexes: Dict[str, VaultIndex] = {}
+_indexes_lock = threading.Lock()
+
+
+def get_vault_index(vault_path: str) -> VaultIndex:
+    """按库路径返回进程内共享的索引实例，并刷新到最新状态。"""
+    resolved = Path(vault_path).expanduser().resolve()
+    with _indexes_lock:
+        index = _indexes.get(str(resolved))
+        if index is None:
+            index = VaultIndex(resolved)
+            _indexes[str(resolved)] = index
+    index.refresh()
+    return index
+
+
+def refresh_vault_index(vault_path: str) -> None:
+    """本服务写入库之后调用：已建立的索引立即重新扫描，版本号和指纹不必等到刷新间隔结束。"""
+    resolved = Path(vault_path).expanduser().resolve()
+    with _indexes_lock:
+        index = _indexes.get(str(resolved))
+    if index is not None:
+        index.refresh(force=True)
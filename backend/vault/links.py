@@ -0,0 +1,384 @@
+"""
+Obsidian 库的链接图：每篇笔记的出链（[[wikilink]]、![[嵌入]] 和指向 .md 的 Markdown 链接）、反向链接、
+标签（正文 #标签 与 frontmatter 的 tags）和 frontmatter 属性。
+
+链接按 Obsidian 的规则解析到笔记：带路径的链接匹配路径后缀，只有名称的链接匹配文件名或 frontmatter
+中的 aliases；同名笔记有多篇时优先选与源笔记同目录的，其次选路径最短的。解析不到的链接单独记录。
+
+图随 VaultIndex 的 version 增量更新：只重新解析新增或修改的笔记（解析结果按 (路径, 修改时间, 大小)
+存入共享缓存，其他工作进程无需重新读取）。笔记的增删或别名变化只会影响以对应名称为目标的链接，
+这些链接通过按名称索引的引用表找到并重新解析，无需遍历全库。查询邻居、反向链接和标签都是
+O(度数) 的字典查找。
+"""
+import json
+import posixpath
+import re
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+from urllib.parse import unquote
+
+from shared_cache import shared_cache
+from .index import VaultIndex, get_vault_index
+
+_FENCED_CODE = re.compile(r'^(```|~~~).*?^\1[^\n]*$', re.MULTILINE | re.DOTALL)
+_INLINE_CODE = re.compile(r'`[^`\n]*`')
+_WIKILINK = re.compile(r'!?\[\[([^\[\]|#^\n]*)(?:[#^][^\[\]|\n]*)?(?:\|[^\[\]\n]*)?\]\]')
+_MARKDOWN_LINK = re.compile(r'(?<!!)\[[^\]\n]*\]\(<?([^)>\s]+\.md)(?:#[^)\s>]*)?>?(?:\s+"[^"]*")?\)', re.IGNORECASE)
+_TAG = re.compile(r'(?<![\w#&/\\])#([^\W\d][\w\-/]*|\d+[^\W\d][\w\-/]*)')
+_FRONTMATTER_KEY = re.compile(r'^([A-Za-z0-9_\-一-鿿 ]+):\s*(.*)$')
+# ![[...]] 嵌入的附件不是笔记，不计入链接图
+ATTACHMENT_EXTENSIONS = {
+    ".png", ".jpg", ".jpeg", ".gif", ".svg", ".webp", ".bmp", ".avif", ".pdf",
+    ".mp3", ".wav", ".ogg", ".m4a", ".flac", ".mp4", ".webm", ".mov", ".mkv", ".canvas",
+}
+
+
+@dataclass
+class NoteLinks:
+    wikilinks: List[str] = field(default_factory=list)  # 链接目标（去掉 #标题、^块 和 |别名）
+    markdown_links: List[str] = field(default_factory=list)  # 相对源笔记目录的 .md 路径（已解码）
+    tags: List[str] = field(default_factory=list)  # 小写，不带 "#"
+    frontmatter: Dict[str, Any] = field(default_factory=dict)
+
+    @property
+    def aliases(self) -> List[str]:
+        aliases = self.frontmatter.get("aliases") or self.frontmatter.get("alias") or []
+        return [aliases] if isinstance(aliases, str) else [str(a) for a in aliases]
+
+    def to_json(self) -> Dict:
+        return {"wikilinks": self.wikilinks, "markdown_links": self.markdown_links, "tags": self.tags, "frontmatter": self.frontmatter}
+
+    @classmethod
+    def from_json(cls, data: Dict) -> "NoteLinks":
+        return cls(data["wikilinks"], data["markdown_links"], data["tags"], data["frontmatter"])
+
+
+def _frontmatter_value(raw: str) -> Any:
+    raw = raw.strip()
+    if raw.startswith("[") and raw.endswith("]"):
+        return [item.strip().strip("'\"") for item in raw[1:-1].split(",") if item.strip()]
+    return raw.strip("'\"")
+
+
+def parse_frontmatter(text: str) -> Tuple[Dict[str, Any], int]:
+    """
+    解析笔记开头 "---" 之间的 YAML 属性，返回 (属性, 正文起始位置)。
+    只支持 Obsidian 属性常用的写法：标量、[a, b] 行内列表和 "- item" 块列表。
+    """
+    if not text.startswith("---"):
+        return {}, 0
+    lines = text.split("\n")
+    if lines[0].rstrip() != "---":
+        return {}, 0
+    fields: Dict[str, Any] = {}
+    current: Optional[str] = None
+    offset = len(lines[0]) + 1
+    for line in lines[1:]:
+        offset += len(line) + 1
+        stripped = line.rstrip()
+        if stripped in ("---", "..."):
+            return fields, min(offset, len(text))
+        item = stripped.lstrip()
+        if current is not None and item.startswith("- "):
+            if not isinstance(fields[current], list):
+                fields[current] = []
+            fields[current].append(_frontmatter_value(item[2:]))
+            continue
+        match = _FRONTMATTER_KEY.match(stripped)
+        if match:
+            current = match.group(1).strip()
+            fields[current] = _frontmatter_value(match.group(2)) if match.group(2).strip() else []
+    return {}, 0  # 没有结束标记，不是 frontmatter
+
+
+def parse_note(text: str) -> NoteLinks:
+    frontmatter, body_start = parse_frontmatter(text)
+    body = _INLINE_CODE.sub(" ", _FENCED_CODE.sub(" ", text[body_start:]))
+    wikilinks: Dict[str, None] = {}
+    for match in _WIKILINK.finditer(body):
+        target = match.group(1).strip()
+        if target:
+            wikilinks[target] = None
+    markdown_links: Dict[str, None] = {}
+    for match in _MARKDOWN_LINK.finditer(body):
+        target = unquote(match.group(1))
+        if "://" not in target:
+            markdown_links[target] = None
+    tags: Dict[str, None] = {}
+    raw_tags = frontmatter.get("tags") or frontmatter.get("tag") or []
+    for tag in ([raw_tags] if isinstance(raw_tags, str) else raw_tags):
+        for part in str(tag).replace(",", " ").split():
+            tags[part.lstrip("#").lower()] = None
+    for match in _TAG.finditer(body):
+        tags[match.group(1).rstrip("/").lower()] = None
+    return NoteLinks(list(wikilinks), list(markdown_links), [t for t in tags if t], frontmatter)
+
+
+def _note_name(path: str) -> str:
+    return posixpath.basename(path)[:-3].lower() if path.lower().endswith(".md") else posixpath.basename(path).lower()
+
+
+def _target_name(target: str) -> str:
+    return _note_name(target if target.lower().endswith(".md") else f"{target}.md")
+
+
+def _note_links_key(vault_path: str, path: str, mtime: float, size: int) -> str:
+    return f"{vault_path}\0{path}\0{mtime}\0{size}"
+
+
+class LinkGraph:
+    def __init__(self, index: VaultIndex):
+        self.index = index
+        self.notes: Dict[str, NoteLinks] = {}
+        self.note_mtimes: Dict[str, Tuple[float, int]] = {}
+        self.paths_by_name: Dict[str, Set[str]] = {}  # 小写文件名或别名 -> 笔记
+        self.referrers_by_name: Dict[str, Set[str]] = {}  # 链接目标的小写名称 -> 链向它的笔记
+        self.forward: Dict[str, List[str]] = {}  # 已解析的出链
+        self.unresolved: Dict[str, List[str]] = {}
+        self.backlinks: Dict[str, Set[str]] = {}
+        self.notes_by_tag: Dict[str, Set[str]] = {}
+        self.version = -1
+        self._lock = threading.Lock()
+
+    # --- 名称与链接解析 ---
+
+    def _names(self, path: str) -> List[str]:
+        return [_note_name(path), *(alias.lower() for alias in self.notes[path].aliases)]
+
+    def _target_names(self, path: str) -> Set[str]:
+        links = self.notes[path]
+        return {_target_name(t) for t in links.wikilinks} | {_note_name(t) for t in links.markdown_links}
+
+    def resolve(self, source: str, target: str) -> Optional[str]:
+        """按 Obsidian 的规则把 wikilink 目标解析为笔记路径。"""
+        target = target.strip().lstrip("/")
+        path_key = (target if target.lower().endswith(".md") else f"{target}.md").lower()
+        candidates = self.paths_by_name.get(_target_name(target), set())
+        if "/" in target:
+            candidates = {p for p in candidates if p.lower() == path_key or p.lower().endswith("/" + path_key)}
+        if not candidates:
+            return None
+        if len(candidates) == 1:
+            return next(iter(candidates))
+        folder = posixpath.dirname(source)
+        return min(candidates, key=lambda p: (posixpath.dirname(p) != folder, p.count("/"), len(p), p))
+
+    def _resolve_markdown(self, source: str, target: str) -> Optional[str]:
+        path = posixpath.normpath(posixpath.join(posixpath.dirname(source), target))
+        if path in self.notes:
+            return path
+        return self.resolve(source, target)  # Obsidian 也会生成相对库根目录的 Markdown 链接
+
+    def _link_note(self, source: str) -> None:
+        links = self.notes[source]
+        resolved: Dict[str, None] = {}
+        unresolved: Dict[str, None] = {}
+        for target in links.wikilinks:
+            if posixpath.splitext(target)[1].lower() in ATTACHMENT_EXTENSIONS:
+                continue
+            if target.startswith(("./", "../")):
+                path = self._resolve_markdown(source, target if target.lower().endswith(".md") else f"{target}.md")
+            else:
+                path = self.resolve(source, target)
+            if path is None:
+                unresolved[target] = None
+            elif path != source:
+                resolved[path] = None
+        for target in links.markdown_links:
+            path = self._resolve_markdown(source, target)
+            if path is None:
+                unresolved[target] = None
+            elif path != source:
+                resolved[path] = None
+        for path in resolved:
+            self.backlinks.setdefault(path, set()).add(source)
+        self.forward[source] = list(resolved)
+        self.unresolved[source] = list(unresolved)
+
+    def _unlink_note(self, source: str) -> None:
+        for path in self.forward.pop(source, []):
+            referrers = self.backlinks.get(path)
+            if referrers is not None:
+                referrers.discard(source)
+                if not referrers:
+                    del self.backlinks[path]
+        self.unresolved.pop(source, None)
+
+    def _add_note(self, path: str, links: NoteLinks) -> None:
+        self.notes[path] = links
+        for name in self._names(path):
+            self.paths_by_name.setdefault(name, set()).add(path)
+        for name in self._target_names(path):
+            self.referrers_by_name.setdefault(name, set()).add(path)
+        for tag in links.tags:
+            self.notes_by_tag.setdefault(tag, set()).add(path)
+
+    def _remove_note(self, path: str) -> None:
+        self._unlink_note(path)
+        for index, names in ((self.paths_by_name, self._names(path)), (self.referrers_by_name, self._target_names(path))):
+            for name in names:
+                paths = index.get(name)
+                if paths is not None:
+                    paths.discard(path)
+                    if not paths:
+                        del index[name]
+        for tag in self.notes[path].tags:
+            paths = self.notes_by_tag.get(tag)
+            if paths is not None:
+                paths.discard(path)
+                if not paths:
+                    del self.notes_by_tag[tag]
+        del self.notes[path]
+
+    # --- 增量更新 ---
+
+    def _parse_changed(self, changed: List[str]) -> Dict[str, NoteLinks]:
+        vault_path = str(self.index.vault_path)
+        entries = {path: self.index.notes[path] for path in changed}
+        keys = {path: _note_links_key(vault_path, path, e.mtime, e.size) for path, e in entries.items()}
+        shared = shared_cache.get_many("vault_note_links", keys.values())
+        parsed: Dict[str, NoteLinks] = {}
+        computed: Dict[str, bytes] = {}
+        for path in changed:
+            cached = shared.get(keys[path])
+            if cached is not None:
+                parsed[path] = NoteLinks.from_json(json.loads(cached))
+                continue
+            text = self.index.read_note(path)
+            if text is None:
+                continue
+            parsed[path] = parse_note(text)
+            if shared_cache.enabled:
+                computed[keys[path]] = json.dumps(parsed[path].to_json(), ensure_ascii=False).encode("utf-8")
+        shared_cache.set_many("vault_note_links", computed)
+        return parsed
+
+    def update(self) -> None:
+        with self._lock:
+            if self.version == self.index.version:
+                return
+            start = time.perf_counter()
+            current = self.index.notes
+            removed = [p for p in self.notes if p not in current]
+            changed = [p for p, e in current.items() if self.note_mtimes.get(p) != (e.mtime, e.size)]
+            parsed = self._parse_changed(changed)
+
+            # 名称集合变化（笔记增删、别名变化）会影响以这些名称为目标的链接
+            affected_names: Set[str] = set()
+            for path in removed + [p for p in changed if p in self.notes]:
+                affected_names.update(self._names(path))
+                self._remove_note(path)
+                self.note_mtimes.pop(path, None)
+            for path, links in parsed.items():
+                self._add_note(path, links)
+                self.note_mtimes[path] = (current[path].mtime, current[path].size)
+                affected_names.update(self._names(path))
+
+            relink: Set[str] = set(parsed)
+            for name in affected_names:
+                relink.update(self.referrers_by_name.get(name, ()))
+            for source in relink:
+                if source in self.notes:
+                    self._unlink_note(source)
+                    self._link_note(source)
+            self.version = self.index.version
+            print(f"INFO: Vault link graph updated ({len(parsed)} parsed, {len(removed)} removed, {len(relink)} relinked, {len(self.notes)} notes, {(time.perf_counter() - start) * 1000:.0f}ms)")
+
+    # --- 查询 ---
+
+    # 查询持有与更新相同的锁，读到的总是一次完整更新之后的状态
+
+    def find_note(self, path_or_name: str) -> Optional[str]:
+        """接受相对路径（可省略 .md）或 wikilink 形式的名称。"""
+        with self._lock:
+            return self._find_note(path_or_name)
+
+    def _find_note(self, path_or_name: str) -> Optional[str]:
+        path = path_or_name.strip().lstrip("/")
+        if path in self.notes:
+            return path
+        if f"{path}.md" in self.notes:
+            return f"{path}.md"
+        return self.resolve("", path)
+
+    def describe(self, path_or_name: str) -> Optional[Dict[str, Any]]:
+        """一篇笔记的出链、未解析链接、反向链接、标签和 frontmatter；笔记不存在时返回 None。"""
+        with self._lock:
+            path = self._find_note(path_or_name)
+            if path is None:
+                return None
+            links = self.notes[path]
+            return {
+                "path": path,
+                "links": list(self.forward.get(path, [])),
+                "unresolved_links": list(self.unresolved.get(path, [])),
+                "backlinks": sorted(self.backlinks.get(path, ())),
+                "tags": list(links.tags),
+                "frontmatter": dict(links.frontmatter),
+            }
+
+    def tag_counts(self) -> List[Tuple[str, int]]:
+        """全部标签及其笔记数，按笔记数从多到少排列。"""
+        with self._lock:
+            counts = [(tag, len(paths)) for tag, paths in self.notes_by_tag.items()]
+        return sorted(counts, key=lambda item: (-item[1], item[0]))
+
+    def notes_with_tag(self, tag: str) -> List[str]:
+        with self._lock:
+            return sorted(self.notes_by_tag.get(tag.lstrip("#").lower(), ()))
+
+    def neighborhood(self, seeds: Iterable[str], depth: int = 1, direction: str = "both", max_notes: int = 50) -> Tuple[Dict[str, int], List[Tuple[str, str]]]:
+        """
+        从 seeds 出发按广度优先遍历链接图，返回 ({笔记: 距离}, [(源, 目标)])。
+        direction 为 "out" 只沿出链，"in" 只沿反向链接，"both" 两者都沿。每一步只访问当前笔记的邻居。
+        """
+        with self._lock:
+            return self._neighborhood(seeds, depth, direction, max_notes)
+
+    def _neighborhood(self, seeds: Iterable[str], depth: int, direction: str, max_notes: int) -> Tuple[Dict[str, int], List[Tuple[str, str]]]:
+        distances: Dict[str, int] = {}
+        queue = deque()
+        for seed in seeds:
+            if seed in self.notes and seed not in distances:
+                distances[seed] = 0
+                queue.append(seed)
+        edges: Set[Tuple[str, str]] = set()
+        while queue:
+            path = queue.popleft()
+            distance = distances[path]
+            if distance >= depth:
+                continue
+            neighbors: List[Tuple[str, Tuple[str, str]]] = []
+            if direction in ("out", "both"):
+                neighbors.extend((target, (path, target)) for target in self.forward.get(path, ()))
+            if direction in ("in", "both"):
+                neighbors.extend((source, (source, path)) for source in sorted(self.backlinks.get(path, ())))
+            for neighbor, edge in neighbors:
+                if neighbor not in distances:
+                    if len(distances) >= max_notes:
+                        continue
+                    distances[neighbor] = distance + 1
+                    queue.append(neighbor)
+                edges.add(edge)
+        return distances, sorted(edges)
+
+
+_graphs: Dict[str, LinkGraph] = {}
+_graphs_lock = threading.Lock()
+
+
+def get_link_graph(vault_path: str) -> LinkGraph:
+    """按库路径返回进程内共享的链接图，并增量更新到库的最新状态。"""
+    index = get_vault_index(vault_path)
+    if not index.vault_path.is_dir():
+        raise FileNotFoundError(f"Vault path not found: {vault_path}")
+    with _graphs_lock:
+        graph = _graphs.get(str(index.vault_path))
+        if graph is None:
+            graph = LinkGraph(index)
+            _graphs[str(index.vault_path)] = graph
+    graph.update()
+    return graph
@@ -0,0 +1,159 @@
+"""
+把笔记原子地写入 Obsidian 库：先写入同目录下的临时文件，再用 rename 替换目标文件，
+进程或机器在任何时刻崩溃都只会留下旧文件或新文件，不会出现写了一半的笔记。
+
+批量写入分阶段进行，使同一批文件共享磁盘同步的开销：
+1. 每个目标目录只创建一次；
+2. 写入全部临时文件；
+3. 逐个 fsync 临时文件（第一次 fsync 提交日志后，其余的代价很小）；
+4. 全部 rename 到目标位置；
+5. 每个受影响的目录只 fsync 一次，使 rename 本身持久化。
+每个文件单独报告结果，一个文件失败不影响同批的其他文件。
+"""
+import os
+import secrets
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Set
+
+MAX_BATCH_NOTES = 1000
+
+
+@dataclass
+class NoteWrite:
+    folder_name: str
+    file_name: str
+    content: str
+
+
+@dataclass
+class NoteWriteResult:
+    path: str  # 相对库根目录的路径
+    success: bool = False
+    error: Optional[str] = None
+    bytes_written: int = 0
+
+
+def note_file_name(file_name: str) -> str:
+    return file_name if file_name.endswith(".md") else f"{file_name}.md"
+
+
+def resolve_note_path(vault_path: Path, folder_name: str, file_name: str) -> Path:
+    """目标文件的绝对路径；按字面规范化后拒绝指向库目录之外的路径（库内的符号链接目录照常可用）。"""
+    target = Path(os.path.normpath(vault_path / folder_name / note_file_name(file_name)))
+    if not target.is_relative_to(vault_path) or target == vault_path:
+        raise ValueError("Path escapes the vault")
+    return target
+
+
+def _fsync_directory(directory: Path) -> None:
+    if os.name != "posix":
+        return  # Windows 不支持对目录 fsync，rename 由文件系统自身保证
+    fd = os.open(directory, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def _create_directories(directories: Set[Path]) -> Set[Path]:
+    """创建缺失的目录，返回需要 fsync 的父目录（新目录项所在的目录）。"""
+    touched: Set[Path] = set()
+    for directory in sorted(directories, key=lambda p: len(p.parts)):
+        missing = []
+        current = directory
+        while not current.exists():
+            missing.append(current)
+            current = current.parent
+        if missing:
+            directory.mkdir(parents=True, exist_ok=True)
+            touched.update(p.parent for p in missing)
+    return touched
+
+
+def write_notes(vault_path: Path, notes: Sequence[NoteWrite], overwrite: bool = True, durable: bool = True) -> List[NoteWriteResult]:
+    """
+    原子地写入一批笔记，返回与输入顺序一致的结果列表。
+    overwrite 为 False 时已存在的文件不会被替换（用硬链接实现不覆盖的原子写入）。
+    durable 为 False 时跳过 fsync，只保证原子性，不保证掉电后的持久性。
+    """
+    vault_path = vault_path.resolve()
+    results: List[NoteWriteResult] = []
+    targets: Dict[int, Path] = {}
+    seen: Set[Path] = set()
+    for i, note in enumerate(notes):
+        relative = f"{note.folder_name.strip('/')}/{note_file_name(note.file_name)}".lstrip("/")
+        result = NoteWriteResult(path=relative)
+        results.append(result)
+        try:
+            target = resolve_note_path(vault_path, note.folder_name, note.file_name)
+        except ValueError as e:
+            result.error = str(e)
+            continue
+        if target in seen:
+            result.error = "Duplicate path in batch"
+            continue
+        seen.add(target)
+        result.path = target.relative_to(vault_path).as_posix()
+        targets[i] = target
+
+    dirty_directories: Set[Path] = set()
+    try:
+        dirty_directories |= _create_directories({t.parent for t in targets.values()})
+    except OSError as e:
+        print(f"ERROR: Failed to create vault folders: {e}")
+
+    temps: Dict[int, Path] = {}
+    for i, target in targets.items():
+        temp = target.parent / f".{target.name}.{secrets.token_hex(4)}.tmp"  # 以 "." 开头，库扫描会忽略
+        try:
+            data = notes[i].content.encode("utf-8")
+            with open(temp, "wb") as f:
+                f.write(data)
+            results[i].bytes_written = len(data)
+            temps[i] = temp
+        except OSError as e:
+            results[i].error = f"Failed to write file: {e}"
+            temp.unlink(missing_ok=True)
+
+    if durable:
+        for i, temp in list(temps.items()):
+            try:
+                fd = os.open(temp, os.O_RDONLY)
+                try:
+                    os.fsync(fd)
+                finally:
+                    os.close(fd)
+            except OSError as e:
+                results[i].error = f"Failed to sync file: {e}"
+                temp.unlink(missing_ok=True)
+                del temps[i]
+
+    for i, temp in temps.items():
+        target = targets[i]
+        try:
+            if overwrite:
+                os.replace(temp, target)
+            else:
+                os.link(temp, target)  # 目标已存在时失败，不会覆盖
+                temp.unlink()
+            results[i].success = True
+            dirty_directories.add(target.parent)
+        except FileExistsError:
+            results[i].error = "File already exists"
+            temp.unlink(missing_ok=True)
+        except OSError as e:
+            results[i].error = f"Failed to save file: {e}"
+            temp.unlink(missing_ok=True)
+
+    if durable:
+        for directory in dirty_directories:
+            try:
+                _fsync_directory(directory)
+            except OSError as e:
+                print(f"WARNING: Failed to sync vault folder {directory}: {e}")
+
+    for result in results:
+        if not result.success:
+            result.bytes_written = 0
+    return results
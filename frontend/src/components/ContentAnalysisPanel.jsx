@@ -1,4 +1,4 @@
-import React, { useState, useCallback } from 'react';
+import React, { useState, useCallback, useRef } from 'react';
 import { Card, Typography, Space, Button, Row, Col, message, Alert, Spin, Tabs, Empty } from 'antd';
 import { 
   ExperimentOutlined, 
@@ -21,6 +21,9 @@ const ContentAnalysisPanel = ({
   const [isAnalyzing, setIsAnalyzing] = useState(false);
   const [error, setError] = useState(null);
   const [activeTab, setActiveTab] = useState('keywords');
+  // 每次分析的编号和中止控制器：重新分析时中止上一次的请求，迟到的预览和结果一律丢弃
+  const analysisRunRef = useRef(0);
+  const abortControllerRef = useRef(null);
 
   // 执行内容分析
   const handleAnalyzeContent = useCallback(async () => {
@@ -29,8 +32,15 @@ const ContentAnalysisPanel = ({
       return;
     }
 
+    abortControllerRef.current?.abort();
+    const controller = new AbortController();
+    abortControllerRef.current = controller;
+    const runId = ++analysisRunRef.current;
+    const isCurrentRun = () => analysisRunRef.current === runId;
+
     setIsAnalyzing(true);
     setError(null);
+    setAnalysisData(null);
 
     try {
       const requestPayload = {
@@ -44,11 +54,34 @@ const ContentAnalysisPanel = ({
         language: language
       };
 
-      const response = await fetch('/api/v1/content-analysis', {
+      // 本地摘要和结构化思维导图几乎即时返回，在 LLM 分析完成前先作为预览展示；
+      // LLM 结果到达或请求失败后（llmSettled），以及本次分析已被新的分析取代时，都不再使用预览
+      let llmSettled = false;
+      fetch('/api/v1/content-analysis', {
         method: 'POST',
         headers: { 'Content-Type': 'application/json' },
-        body: JSON.stringify(requestPayload)
-      });
+        body: JSON.stringify({ ...requestPayload, analysis_types: ['mindmap', 'summary'], mode: 'local' }),
+        signal: controller.signal
+      })
+        .then((previewResponse) => (previewResponse.ok ? previewResponse.json() : null))
+        .then((preview) => {
+          if (preview && !llmSettled && isCurrentRun()) {
+            setAnalysisData({ mindmap: preview.mindmap, summary: preview.summary });
+          }
+        })
+        .catch(() => {});
+
+      let response;
+      try {
+        response = await fetch('/api/v1/content-analysis', {
+          method: 'POST',
+          headers: { 'Content-Type': 'application/json' },
+          body: JSON.stringify(requestPayload),
+          signal: controller.signal
+        });
+      } finally {
+        llmSettled = true;
+      }
 
       if (!response.ok) {
         const errorData = await response.json().catch(() => ({
@@ -58,20 +91,33 @@ const ContentAnalysisPanel = ({
       }
 
       const data = await response.json();
+      if (!isCurrentRun()) {
+        return;
+      }
       setAnalysisData(data);
       message.success(language === 'zh' ? '内容分析完成！' : 'Content analysis completed!');
       
     } catch (error) {
+      if (!isCurrentRun()) {
+        return; // 已被新的分析取代（包括被中止的请求），不显示旧的错误
+      }
       console.error('Content analysis error:', error);
+      setAnalysisData(null);
       setError(error.message);
       message.error(`${language === 'zh' ? '分析失败' : 'Analysis failed'}: ${error.message}`);
     } finally {
-      setIsAnalyzing(false);
+      if (isCurrentRun()) {
+        setIsAnalyzing(false);
+      }
     }
   }, [contentBlocks, language]);
 
   // 清除分析结果
   const handleClearAnalysis = useCallback(() => {
+    // 清除时放弃仍在进行的分析，避免其结果在清除后出现
+    abortControllerRef.current?.abort();
+    analysisRunRef.current += 1;
+    setIsAnalyzing(false);
     setAnalysisData(null);
     setError(null);
     setActiveTab('keywords');
@@ -126,7 +172,7 @@ const ContentAnalysisPanel = ({
       children: (
         <MindMap 
           mindmapData={analysisData?.mindmap} 
-          loading={isAnalyzing && activeTab === 'mindmap'}
+          loading={isAnalyzing && activeTab === 'mindmap' && !analysisData?.mindmap}
           language={language}
         />
       )
@@ -147,7 +193,7 @@ const ContentAnalysisPanel = ({
       children: (
         <ContentSummary 
           summaryData={analysisData?.summary} 
-          loading={isAnalyzing && activeTab === 'summary'}
+          loading={isAnalyzing && activeTab === 'summary' && !analysisData?.summary}
           language={language}
           onJumpToSource={onJumpToSource}
         />
@@ -19,14 +19,20 @@ cd "$BACKEND_DIR" || { echo "Failed to navigate to backend directory"; exit 1; }
 # Install backend dependencies
 echo "Installing backend dependencies with uv..."
 uv venv --allow-existing || { echo "Failed to create virtual environment"; exit 1; }
-uv pip install fastapi uvicorn[standard] pydantic python-multipart google-generativeai httpx pillow markdown-it-py || { echo "Failed to install backend dependencies"; exit 1; }
+uv pip install fastapi uvicorn[standard] pydantic python-multipart google-generativeai httpx pillow markdown-it-py numpy || { echo "Failed to install backend dependencies"; exit 1; }
 
 # Assuming GOOGLE_API_KEY is already set globally by the user, as per user instruction.
 # If not, it should be exported here or before running the script.
 # Example: export GOOGLE_API_KEY="YOUR_ACTUAL_KEY_HERE"
 
-echo "Starting Uvicorn for backend..."
-uv run uvicorn main:app --reload --port 8000 > "$BACKEND_LOG" 2>&1 &
+# Set BACKEND_WORKERS=N to run the production server (N preloaded workers sharing a cache) instead of the reloader
+if [ -n "$BACKEND_WORKERS" ]; then
+    echo "Starting backend with $BACKEND_WORKERS workers..."
+    uv run python serve.py --workers "$BACKEND_WORKERS" --port 8000 > "$BACKEND_LOG" 2>&1 &
+else
+    echo "Starting Uvicorn for backend..."
+    uv run uvicorn main:app --reload --port 8000 > "$BACKEND_LOG" 2>&1 &
+fi
 BACKEND_PID=$!
 
 if [ -z "$BACKEND_PID" ]; then